@@ -0,0 +1,65 @@
+"""reconcile_sessions: maintained selected_total/selected_count/account_total
+
+Revision ID: 0007_reconcile_session_totals
+Revises: 0006_draft_currency_txndate
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0007_reconcile_session_totals"
+down_revision = "0006_draft_currency_txndate"
+branch_labels = None
+depends_on = None
+
+
+def _insp():
+    return sa.inspect(op.get_bind())
+
+
+def _has_column(table: str, col: str) -> bool:
+    try:
+        cols = {c["name"] for c in _insp().get_columns(table)}
+    except Exception:
+        return False
+    return col in cols
+
+
+def upgrade() -> None:
+    if not _has_column("reconcile_sessions", "selected_total"):
+        op.add_column(
+            "reconcile_sessions",
+            sa.Column("selected_total", sa.Numeric(18, 2), nullable=False, server_default=sa.text("0")),
+        )
+    if not _has_column("reconcile_sessions", "selected_count"):
+        op.add_column(
+            "reconcile_sessions",
+            sa.Column("selected_count", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        )
+    if not _has_column("reconcile_sessions", "account_total"):
+        op.add_column(
+            "reconcile_sessions",
+            sa.Column("account_total", sa.Numeric(18, 2), nullable=False, server_default=sa.text("0")),
+        )
+
+    # 回填：已有会话按当前选中分录重算（之后由 toggle 增量维护）
+    op.execute(
+        """
+        UPDATE reconcile_sessions SET
+          selected_count = (SELECT COUNT(*) FROM reconcile_matches m WHERE m.session_id = reconcile_sessions.id),
+          selected_total = COALESCE((
+            SELECT SUM(CASE WHEN a.type IN ('LIABILITY','EQUITY','INCOME','AP') THEN -s.value ELSE s.value END)
+            FROM reconcile_matches m
+            JOIN splits s ON s.id = m.split_id
+            JOIN accounts a ON a.id = s.account_id
+            WHERE m.session_id = reconcile_sessions.id
+          ), 0)
+        """
+    )
+
+
+def downgrade() -> None:
+    pass
@@ -0,0 +1,52 @@
+"""bank_statement_lines: imported bank statement lines per reconcile session
+
+Revision ID: 0008_bank_statement_lines
+Revises: 0007_reconcile_session_totals
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0008_bank_statement_lines"
+down_revision = "0007_reconcile_session_totals"
+branch_labels = None
+depends_on = None
+
+ID36 = sa.String(length=36)
+
+
+def _insp():
+    return sa.inspect(op.get_bind())
+
+
+def _has_table(name: str) -> bool:
+    try:
+        return _insp().has_table(name)
+    except Exception:
+        return False
+
+
+def upgrade() -> None:
+    if _has_table("bank_statement_lines"):
+        return
+    op.create_table(
+        "bank_statement_lines",
+        sa.Column("id", ID36, primary_key=True),
+        sa.Column("session_id", ID36, sa.ForeignKey("reconcile_sessions.id"), nullable=False),
+        sa.Column("line_no", sa.Integer(), nullable=False),
+        sa.Column("txn_date", sa.Date(), nullable=False),
+        sa.Column("amount", sa.Numeric(18, 2), nullable=False),
+        sa.Column("description", sa.String(length=512), nullable=False, server_default=""),
+        sa.Column("reference", sa.String(length=128), nullable=False, server_default=""),
+        sa.Column("counterparty", sa.String(length=255), nullable=False, server_default=""),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.UniqueConstraint("session_id", "line_no", name="uq_bank_stmt_session_line"),
+    )
+    op.create_index("ix_bank_stmt_session_date", "bank_statement_lines", ["session_id", "txn_date"], unique=False)
+
+
+def downgrade() -> None:
+    pass
@@ -0,0 +1,63 @@
+"""reconcile_match_proposals + reconcile_matches.statement_line_id/confidence
+
+Revision ID: 0009_reconcile_match_proposals
+Revises: 0008_bank_statement_lines
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0009_reconcile_match_proposals"
+down_revision = "0008_bank_statement_lines"
+branch_labels = None
+depends_on = None
+
+ID36 = sa.String(length=36)
+
+
+def _insp():
+    return sa.inspect(op.get_bind())
+
+
+def _has_table(name: str) -> bool:
+    try:
+        return _insp().has_table(name)
+    except Exception:
+        return False
+
+
+def _has_column(table: str, col: str) -> bool:
+    try:
+        cols = {c["name"] for c in _insp().get_columns(table)}
+    except Exception:
+        return False
+    return col in cols
+
+
+def upgrade() -> None:
+    if not _has_column("reconcile_matches", "statement_line_id"):
+        op.add_column("reconcile_matches", sa.Column("statement_line_id", ID36, nullable=True))
+    if not _has_column("reconcile_matches", "confidence"):
+        op.add_column("reconcile_matches", sa.Column("confidence", sa.Numeric(5, 4), nullable=True))
+
+    if not _has_table("reconcile_match_proposals"):
+        op.create_table(
+            "reconcile_match_proposals",
+            sa.Column("id", ID36, primary_key=True),
+            sa.Column("session_id", ID36, sa.ForeignKey("reconcile_sessions.id"), nullable=False),
+            sa.Column("group_no", sa.Integer(), nullable=False),
+            sa.Column("statement_line_id", ID36, sa.ForeignKey("bank_statement_lines.id"), nullable=False),
+            sa.Column("split_id", ID36, sa.ForeignKey("splits.id"), nullable=False),
+            sa.Column("rule", sa.String(length=16), nullable=False),
+            sa.Column("confidence", sa.Numeric(5, 4), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.UniqueConstraint("session_id", "split_id", name="uq_recon_proposal_split"),
+        )
+        op.create_index("ix_recon_proposal_session_group", "reconcile_match_proposals", ["session_id", "group_no"], unique=False)
+
+
+def downgrade() -> None:
+    pass
@@ -0,0 +1,43 @@
+"""splits(account_id, reconcile_state) index for reconcile candidate paging
+
+Revision ID: 0010_splits_reconcile_index
+Revises: 0009_reconcile_match_proposals
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0010_splits_reconcile_index"
+down_revision = "0009_reconcile_match_proposals"
+branch_labels = None
+depends_on = None
+
+
+def _has_index(table: str, index_name: str) -> bool:
+    insp = sa.inspect(op.get_bind())
+    try:
+        idx = insp.get_indexes(table)
+    except Exception:
+        return False
+    return any(i.get("name") == index_name for i in idx)
+
+
+def upgrade() -> None:
+    if _has_index("splits", "ix_splits_account_recstate"):
+        return
+    # PG/SQLite 支持部分索引：只收录未对账分录；MySQL 忽略 where，建普通复合索引
+    op.create_index(
+        "ix_splits_account_recstate",
+        "splits",
+        ["account_id", "reconcile_state"],
+        unique=False,
+        postgresql_where=sa.text("reconcile_state <> 'y'"),
+        sqlite_where=sa.text("reconcile_state <> 'y'"),
+    )
+
+
+def downgrade() -> None:
+    pass
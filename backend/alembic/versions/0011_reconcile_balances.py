@@ -0,0 +1,84 @@
+"""reconcile_balances + reconcile_sessions.opening_balance
+
+Revision ID: 0011_reconcile_balances
+Revises: 0010_splits_reconcile_index
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0011_reconcile_balances"
+down_revision = "0010_splits_reconcile_index"
+branch_labels = None
+depends_on = None
+
+ID36 = sa.String(length=36)
+
+
+def _insp():
+    return sa.inspect(op.get_bind())
+
+
+def _has_table(name: str) -> bool:
+    try:
+        return _insp().has_table(name)
+    except Exception:
+        return False
+
+
+def _has_column(table: str, col: str) -> bool:
+    try:
+        cols = {c["name"] for c in _insp().get_columns(table)}
+    except Exception:
+        return False
+    return col in cols
+
+
+def upgrade() -> None:
+    # 已有会话期初记 0：保持其原有差额口径，只有新建会话才带期初
+    if not _has_column("reconcile_sessions", "opening_balance"):
+        op.add_column(
+            "reconcile_sessions",
+            sa.Column("opening_balance", sa.Numeric(18, 2), nullable=False, server_default=sa.text("0")),
+        )
+
+    if _has_table("reconcile_balances"):
+        return
+    op.create_table(
+        "reconcile_balances",
+        sa.Column("account_id", ID36, sa.ForeignKey("accounts.id"), primary_key=True),
+        sa.Column("book_id", ID36, sa.ForeignKey("books.id"), nullable=False),
+        sa.Column("balance", sa.Numeric(18, 2), nullable=False, server_default=sa.text("0")),
+        sa.Column("statement_date", sa.Date(), nullable=False),
+        sa.Column("session_id", ID36, sa.ForeignKey("reconcile_sessions.id"), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_reconcile_balances_book_id", "reconcile_balances", ["book_id"], unique=False)
+
+    # 回填（仅此一次扫描历史）：已对账(y)分录按科目方向汇总；截止日取最近完成的会话，没有则取最后一笔已对账交易日
+    last_txn_day = "date(MAX(t.txn_date))" if op.get_bind().dialect.name == "sqlite" else "CAST(MAX(t.txn_date) AS DATE)"
+    op.execute(
+        f"""
+        INSERT INTO reconcile_balances (account_id, book_id, balance, statement_date, session_id, updated_at)
+        SELECT a.id, a.book_id,
+               SUM(CASE WHEN a.type IN ('LIABILITY','EQUITY','INCOME','AP') THEN -s.value ELSE s.value END),
+               COALESCE(
+                 (SELECT MAX(r.statement_date) FROM reconcile_sessions r WHERE r.account_id = a.id AND r.status = 'FINISHED'),
+                 {last_txn_day}
+               ),
+               NULL,
+               CURRENT_TIMESTAMP
+        FROM splits s
+        JOIN accounts a ON a.id = s.account_id
+        JOIN transactions t ON t.id = s.txn_id
+        WHERE s.reconcile_state = 'y'
+        GROUP BY a.id, a.book_id
+        """
+    )
+
+
+def downgrade() -> None:
+    pass
@@ -0,0 +1,55 @@
+"""bank_rules
+
+Revision ID: 0012_bank_rules
+Revises: 0011_reconcile_balances
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0012_bank_rules"
+down_revision = "0011_reconcile_balances"
+branch_labels = None
+depends_on = None
+
+ID36 = sa.String(length=36)
+
+
+def _insp():
+    return sa.inspect(op.get_bind())
+
+
+def _has_table(name: str) -> bool:
+    try:
+        return _insp().has_table(name)
+    except Exception:
+        return False
+
+
+def upgrade() -> None:
+    if not _has_table("bank_rules"):
+        op.create_table(
+            "bank_rules",
+            sa.Column("id", ID36, primary_key=True),
+            sa.Column("book_id", ID36, sa.ForeignKey("books.id"), nullable=False),
+            sa.Column("name", sa.String(length=128), nullable=False),
+            sa.Column("priority", sa.Integer(), nullable=False, server_default="100"),
+            sa.Column("enabled", sa.Boolean(), nullable=False, server_default=sa.text("true")),
+            sa.Column("match_type", sa.String(length=16), nullable=False, server_default="KEYWORD"),
+            sa.Column("pattern", sa.String(length=256), nullable=False, server_default=""),
+            sa.Column("counterparty", sa.String(length=255), nullable=False, server_default=""),
+            sa.Column("min_amount", sa.Numeric(18, 2), nullable=True),
+            sa.Column("max_amount", sa.Numeric(18, 2), nullable=True),
+            sa.Column("counter_account_id", ID36, sa.ForeignKey("accounts.id"), nullable=False),
+            sa.Column("memo", sa.String(length=256), nullable=False, server_default=""),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+        )
+        op.create_index("ix_bank_rules_book_priority", "bank_rules", ["book_id", "priority"], unique=False)
+
+
+def downgrade() -> None:
+    pass
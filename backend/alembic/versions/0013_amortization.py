@@ -0,0 +1,72 @@
+"""amortization_schedules + amortization_entries
+
+Revision ID: 0013_amortization
+Revises: 0012_bank_rules
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0013_amortization"
+down_revision = "0012_bank_rules"
+branch_labels = None
+depends_on = None
+
+ID36 = sa.String(length=36)
+
+
+def _insp():
+    return sa.inspect(op.get_bind())
+
+
+def _has_table(name: str) -> bool:
+    try:
+        return _insp().has_table(name)
+    except Exception:
+        return False
+
+
+def upgrade() -> None:
+    if not _has_table("amortization_schedules"):
+        op.create_table(
+            "amortization_schedules",
+            sa.Column("id", ID36, primary_key=True),
+            sa.Column("book_id", ID36, sa.ForeignKey("books.id"), nullable=False),
+            sa.Column("name", sa.String(length=128), nullable=False),
+            sa.Column("kind", sa.String(length=16), nullable=False, server_default="ASSET"),
+            sa.Column("method", sa.String(length=24), nullable=False, server_default="STRAIGHT_LINE"),
+            sa.Column("cost", sa.Numeric(18, 2), nullable=False),
+            sa.Column("salvage", sa.Numeric(18, 2), nullable=False, server_default="0"),
+            sa.Column("start_date", sa.Date(), nullable=False),
+            sa.Column("life_months", sa.Integer(), nullable=False),
+            sa.Column("db_factor", sa.Numeric(6, 4), nullable=False, server_default="2"),
+            sa.Column("expense_account_id", ID36, sa.ForeignKey("accounts.id"), nullable=False),
+            sa.Column("contra_account_id", ID36, sa.ForeignKey("accounts.id"), nullable=False),
+            sa.Column("enabled", sa.Boolean(), nullable=False, server_default=sa.text("true")),
+            sa.Column("created_by", ID36, sa.ForeignKey("users.id"), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+        )
+        op.create_index("ix_amortization_schedules_book_id", "amortization_schedules", ["book_id"], unique=False)
+
+    if not _has_table("amortization_entries"):
+        op.create_table(
+            "amortization_entries",
+            sa.Column("id", ID36, primary_key=True),
+            sa.Column("schedule_id", ID36, sa.ForeignKey("amortization_schedules.id"), nullable=False),
+            sa.Column("period_id", ID36, sa.ForeignKey("accounting_periods.id"), nullable=False),
+            sa.Column("period_no", sa.Integer(), nullable=False),
+            sa.Column("amount", sa.Numeric(18, 2), nullable=False),
+            sa.Column("draft_id", ID36, sa.ForeignKey("transaction_drafts.id"), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.UniqueConstraint("schedule_id", "period_id", name="uq_amort_entry_period"),
+        )
+        op.create_index("ix_amortization_entries_period_id", "amortization_entries", ["period_id"], unique=False)
+        op.create_index("ix_amortization_entries_draft_id", "amortization_entries", ["draft_id"], unique=False)
+
+
+def downgrade() -> None:
+    pass
@@ -0,0 +1,78 @@
+"""invoices.applied_amount/outstanding_amount + ix_invoices_open
+
+Revision ID: 0014_invoice_outstanding
+Revises: 0013_amortization
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0014_invoice_outstanding"
+down_revision = "0013_amortization"
+branch_labels = None
+depends_on = None
+
+
+def _insp():
+    return sa.inspect(op.get_bind())
+
+
+def _has_column(table: str, col: str) -> bool:
+    try:
+        cols = {c["name"] for c in _insp().get_columns(table)}
+    except Exception:
+        return False
+    return col in cols
+
+
+def _has_index(table: str, index_name: str) -> bool:
+    try:
+        idx = _insp().get_indexes(table)
+    except Exception:
+        return False
+    return any(i.get("name") == index_name for i in idx)
+
+
+def upgrade() -> None:
+    if not _has_column("invoices", "applied_amount"):
+        op.add_column("invoices", sa.Column("applied_amount", sa.Numeric(18, 2), nullable=False, server_default="0"))
+    if not _has_column("invoices", "outstanding_amount"):
+        op.add_column("invoices", sa.Column("outstanding_amount", sa.Numeric(18, 2), nullable=False, server_default="0"))
+
+    # 回填：只统计已过账收/付款的核销
+    op.execute(
+        sa.text(
+            """
+            UPDATE invoices SET applied_amount = COALESCE((
+                SELECT SUM(pa.amount) FROM payment_applications pa
+                JOIN payments p ON p.id = pa.payment_id
+                WHERE pa.invoice_id = invoices.id AND p.status = 'POSTED'
+            ), 0)
+            """
+        )
+    )
+    op.execute(
+        sa.text(
+            """
+            UPDATE invoices SET outstanding_amount =
+                CASE WHEN total_gross - applied_amount < 0 THEN 0 ELSE total_gross - applied_amount END
+            """
+        )
+    )
+
+    if not _has_index("invoices", "ix_invoices_open"):
+        op.create_index(
+            "ix_invoices_open",
+            "invoices",
+            ["book_id", "invoice_type", "due_date"],
+            unique=False,
+            postgresql_where=sa.text("status = 'POSTED' AND outstanding_amount > 0"),
+            sqlite_where=sa.text("status = 'POSTED' AND outstanding_amount > 0"),
+        )
+
+
+def downgrade() -> None:
+    pass
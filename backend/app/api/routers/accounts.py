@@ -12,6 +12,8 @@ from app.api.schemas.accounts import AccountNode
 from app.api.schemas.accounts_crud import AccountCreateIn, AccountOut, AccountUpdateIn
 from app.api.schemas.gl import RegisterResponse, RegisterSplitOut
 from app.application.engine.accounts import AccountRow, build_account_children_map, list_accounts
+from app.application.engine.versions import bump_accounts_version
+from app.application.gl.register import load_register_page
 from app.infra.db.models import Account, AccountingPeriod, Book, Commodity, Split, Transaction
 
 router = APIRouter(prefix="/accounts", tags=["accounts"])
@@ -108,34 +110,39 @@ def get_accounts_tree(
 def get_register(
     account_id: str,
     period_id: str | None = Query(default=None),
+    limit: int = Query(default=100, ge=1, le=500),
+    before: str | None = Query(default=None, description="游标：取更早的一页"),
+    after: str | None = Query(default=None, description="游标：取更新的一页"),
     db: Session = Depends(db_session),
     _=Depends(get_current_user),
 ) -> RegisterResponse:
-    q = (
-        db.query(Split, Transaction)
-        .join(Transaction, Split.txn_id == Transaction.id)
-        .filter(Split.account_id == account_id)
-        .order_by(Transaction.posted_at.desc(), Split.line_no.asc())
-    )
-    if period_id:
-        q = q.filter(Transaction.period_id == period_id)
-
-    rows = q.limit(500).all()
+    try:
+        page = load_register_page(db, account_id, period_id=period_id, limit=limit, before=before, after=after)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     items = [
         RegisterSplitOut(
-            split_id=str(sp.id),
-            txn_id=str(txn.id),
-            txn_num=txn.num,
-            txn_date=txn.txn_date.date().isoformat(),
-            description=txn.description,
-            split_line_no=sp.line_no,
-            value=sp.value,
-            memo=sp.memo,
-            reconcile_state=sp.reconcile_state,
+            split_id=r.split_id,
+            txn_id=r.txn_id,
+            txn_num=r.txn_num,
+            txn_date=r.txn_date,
+            description=r.description,
+            split_line_no=r.split_line_no,
+            value=r.value,
+            memo=r.memo,
+            reconcile_state=r.reconcile_state,
+            amount=r.amount,
+            balance=r.balance,
         )
-        for sp, txn in rows
+        for r in page.items
     ]
-    return RegisterResponse(account_id=account_id, items=items)
+    return RegisterResponse(
+        account_id=account_id,
+        items=items,
+        opening_balance=page.opening_balance,
+        before_cursor=page.before_cursor,
+        after_cursor=page.after_cursor,
+    )
 
 
 @router.post("/splits/{split_id}:set_reconcile")
@@ -215,6 +222,7 @@ def create_account(
             )
             db.add(a)
             db.flush()
+            bump_accounts_version(db, body.book_id)
             return AccountOut(
                 id=str(a.id),
                 book_id=str(a.book_id),
@@ -247,40 +255,41 @@ def update_account(
             if not a:
                 raise HTTPException(status_code=404, detail="科目不存在")
 
-        if body.parent_id is not None:
-            if body.parent_id == "":
-                a.parent_id = None
-            else:
-                parent = db.query(Account).filter(Account.id == body.parent_id).one_or_none()
-                if not parent or str(parent.book_id) != str(a.book_id):
-                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="父科目不存在或不属于该账簿")
-                a.parent_id = parent.id
-        if body.code is not None:
-            a.code = body.code
-        if body.name is not None:
-            a.name = body.name
-        if body.description is not None:
-            a.description = body.description
-        if body.type is not None:
-            a.type = body.type
-        if body.commodity_id is not None:
-            if not db.query(Commodity).filter(Commodity.id == body.commodity_id).one_or_none():
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="币种/商品不存在")
-            a.commodity_id = body.commodity_id
-        if body.is_hidden is not None:
-            a.is_hidden = body.is_hidden
-        if body.is_placeholder is not None:
-            a.is_placeholder = body.is_placeholder
-        if body.is_active is not None:
-            a.is_active = body.is_active
-        if body.allow_post is not None:
-            a.allow_post = body.allow_post
-
-        # placeholder 强制不可记账
-        if bool(getattr(a, "is_placeholder", False)):
-            a.allow_post = False
+            if body.parent_id is not None:
+                if body.parent_id == "":
+                    a.parent_id = None
+                else:
+                    parent = db.query(Account).filter(Account.id == body.parent_id).one_or_none()
+                    if not parent or str(parent.book_id) != str(a.book_id):
+                        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="父科目不存在或不属于该账簿")
+                    a.parent_id = parent.id
+            if body.code is not None:
+                a.code = body.code
+            if body.name is not None:
+                a.name = body.name
+            if body.description is not None:
+                a.description = body.description
+            if body.type is not None:
+                a.type = body.type
+            if body.commodity_id is not None:
+                if not db.query(Commodity).filter(Commodity.id == body.commodity_id).one_or_none():
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="币种/商品不存在")
+                a.commodity_id = body.commodity_id
+            if body.is_hidden is not None:
+                a.is_hidden = body.is_hidden
+            if body.is_placeholder is not None:
+                a.is_placeholder = body.is_placeholder
+            if body.is_active is not None:
+                a.is_active = body.is_active
+            if body.allow_post is not None:
+                a.allow_post = body.allow_post
+
+            # placeholder 强制不可记账
+            if bool(getattr(a, "is_placeholder", False)):
+                a.allow_post = False
 
             db.flush()
+            bump_accounts_version(db, str(a.book_id))
             return AccountOut(
                 id=str(a.id),
                 book_id=str(a.book_id),
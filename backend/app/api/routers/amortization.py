@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+from decimal import Decimal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from app.api.deps import CurrentUser, db_session, require_roles
+from app.api.schemas.amortization import (
+    AmortizationRunIn,
+    AmortizationRunOut,
+    AmortizationScheduleIn,
+    AmortizationScheduleOut,
+    AmortizationTableOut,
+    AmortizationTableRow,
+)
+from app.application.gl.amortization import compute_schedule, run_amortization, validate_schedule
+from app.application.gl.scheduled import add_months
+from app.infra.db.models import Account, AmortizationSchedule
+
+router = APIRouter(prefix="/amortization", tags=["amortization"])
+
+
+def _decimal(v) -> Decimal:
+    if isinstance(v, Decimal):
+        return v
+    return Decimal(str(v))
+
+
+def _schedule_out(s: AmortizationSchedule) -> AmortizationScheduleOut:
+    return AmortizationScheduleOut(
+        id=str(s.id),
+        book_id=str(s.book_id),
+        name=s.name,
+        kind=s.kind,
+        method=s.method,
+        cost=_decimal(s.cost),
+        salvage=_decimal(s.salvage),
+        start_date=s.start_date,
+        life_months=int(s.life_months),
+        db_factor=_decimal(s.db_factor),
+        expense_account_id=str(s.expense_account_id),
+        contra_account_id=str(s.contra_account_id),
+        enabled=bool(s.enabled),
+    )
+
+
+def _validate(db: Session, body: AmortizationScheduleIn) -> None:
+    try:
+        validate_schedule(body.method, body.cost, body.salvage, body.life_months, body.db_factor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if body.expense_account_id == body.contra_account_id:
+        raise HTTPException(status_code=400, detail="费用科目与对方科目不能相同")
+    for aid in (body.expense_account_id, body.contra_account_id):
+        a = db.query(Account).filter(Account.id == aid).one_or_none()
+        if not a or str(a.book_id) != str(body.book_id):
+            raise HTTPException(status_code=400, detail="科目不存在或不属于该账簿")
+        if not a.is_active or not a.allow_post or a.is_placeholder:
+            raise HTTPException(status_code=400, detail=f"科目 {a.code} 不允许记账")
+
+
+@router.get("/schedules", response_model=list[AmortizationScheduleOut])
+def list_schedules(
+    book_id: str = Query(...),
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+) -> list[AmortizationScheduleOut]:
+    rows = (
+        db.query(AmortizationSchedule)
+        .filter(AmortizationSchedule.book_id == book_id)
+        .order_by(AmortizationSchedule.start_date.asc(), AmortizationSchedule.name.asc())
+        .all()
+    )
+    return [_schedule_out(s) for s in rows]
+
+
+@router.post("/schedules", response_model=AmortizationScheduleOut)
+def create_schedule(
+    body: AmortizationScheduleIn,
+    db: Session = Depends(db_session),
+    u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+) -> AmortizationScheduleOut:
+    with db.begin():
+        _validate(db, body)
+        s = AmortizationSchedule(**body.model_dump(), created_by=u.id)
+        db.add(s)
+        db.flush()
+        return _schedule_out(s)
+
+
+@router.put("/schedules/{schedule_id}", response_model=AmortizationScheduleOut)
+def update_schedule(
+    schedule_id: str,
+    body: AmortizationScheduleIn,
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+) -> AmortizationScheduleOut:
+    # 已计入的期间不回溯调整：修改只影响之后尚未生成的期间
+    with db.begin():
+        s = db.query(AmortizationSchedule).filter(AmortizationSchedule.id == schedule_id).with_for_update().one_or_none()
+        if not s:
+            raise HTTPException(status_code=404, detail="摊销计划不存在")
+        if str(s.book_id) != str(body.book_id):
+            raise HTTPException(status_code=400, detail="不能修改计划所属账簿")
+        _validate(db, body)
+        for k, v in body.model_dump().items():
+            setattr(s, k, v)
+        db.flush()
+        return _schedule_out(s)
+
+
+@router.get("/schedules/{schedule_id}/table", response_model=AmortizationTableOut)
+def schedule_table(
+    schedule_id: str,
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant", "manager"])),
+) -> AmortizationTableOut:
+    s = db.query(AmortizationSchedule).filter(AmortizationSchedule.id == schedule_id).one_or_none()
+    if not s:
+        raise HTTPException(status_code=404, detail="摊销计划不存在")
+    cost = _decimal(s.cost)
+    amounts = compute_schedule(s.method, cost, _decimal(s.salvage), int(s.life_months), _decimal(s.db_factor))
+    rows: list[AmortizationTableRow] = []
+    acc = Decimal("0")
+    first = s.start_date.replace(day=1)
+    for i, amt in enumerate(amounts):
+        d = add_months(first, i)
+        acc += amt
+        rows.append(AmortizationTableRow(period_no=i + 1, year=d.year, month=d.month, amount=amt, accumulated=acc, book_value=cost - acc))
+    return AmortizationTableOut(schedule_id=str(s.id), rows=rows)
+
+
+@router.post(":run", response_model=AmortizationRunOut)
+def run(
+    body: AmortizationRunIn,
+    db: Session = Depends(db_session),
+    u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+) -> AmortizationRunOut:
+    try:
+        r = run_amortization(db, book_id=body.book_id, period_id=body.period_id, actor_user_id=u.id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return AmortizationRunOut(book_id=r.book_id, period_id=r.period_id, draft_id=r.draft_id, schedules=r.schedules, total=r.total)
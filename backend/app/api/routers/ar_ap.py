@@ -1,21 +1,39 @@
 from __future__ import annotations
 
-from datetime import date
+import io
+from datetime import date, datetime
+from decimal import Decimal
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.api.deps import CurrentUser, db_session, require_roles
 from app.api.schemas.ar_ap import (
     AgingResponse,
+    AgingSummaryResponse,
+    AgingSummaryRow,
     InvoiceCreateIn,
+    InvoiceImportErrorOut,
+    InvoiceImportOut,
     InvoiceOut,
     PaymentCreateIn,
     PaymentOut,
+    PaymentRunIn,
+    PaymentRunItemOut,
+    PaymentRunOut,
+    PriceImportErrorOut,
+    PriceImportOut,
     PriceOut,
     PriceUpsertIn,
 )
-from app.application.ar_ap.service import aging_report, create_invoice, create_payment
+from app.application.ar_ap.invoice_import import import_invoices
+from app.application.ar_ap.payment_run import payment_run_csv, run_ap_payments
+from app.application.ar_ap.price_import import import_prices
+from app.application.ar_ap.service import aging_report, aging_summary, create_invoice, create_payment
+from app.application.engine.prices import get_price_book
+from app.application.engine.versions import bump_prices_version
+from app.application.gl.register import pack_cursor, unpack_cursor
 from app.infra.db.models import Commodity, Invoice, InvoiceLine, Payment, PaymentApplication, Price
 
 router = APIRouter(prefix="/ar-ap", tags=["ar/ap"])
@@ -33,12 +51,12 @@ def upsert_price(
     _u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
 ) -> PriceOut:
     # 简化：用唯一约束 upsert（先查，存在则更新）
-    com = db.query(Commodity).filter(Commodity.type == body.commodity_type, Commodity.code == body.commodity_code).one_or_none()
-    cur = db.query(Commodity).filter(Commodity.type == body.currency_type, Commodity.code == body.currency_code).one_or_none()
-    if not com or not cur:
-        raise HTTPException(status_code=400, detail="commodity/currency 不存在")
-
     with db.begin():
+        com = db.query(Commodity).filter(Commodity.type == body.commodity_type, Commodity.code == body.commodity_code).one_or_none()
+        cur = db.query(Commodity).filter(Commodity.type == body.currency_type, Commodity.code == body.currency_code).one_or_none()
+        if not com or not cur:
+            raise HTTPException(status_code=400, detail="commodity/currency 不存在")
+
         row = (
             db.query(Price)
             .filter(
@@ -65,6 +83,8 @@ def upsert_price(
             )
             db.add(row)
         db.flush()
+        # 价格变了：递增版本号，使进程内价格缓存失效
+        bump_prices_version(db, body.book_id)
         return PriceOut(
             id=str(row.id),
             book_id=str(row.book_id),
@@ -77,6 +97,33 @@ def upsert_price(
         )
 
 
+@router.post("/prices:import", response_model=PriceImportOut)
+def import_prices_api(
+    book_id: str = Form(...),
+    file: UploadFile = File(...),
+    format: str | None = Form(default=None),
+    delimiter: str | None = Form(default=None),
+    dry_run: bool = Form(default=False),
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+) -> PriceImportOut:
+    # 逐行校验：有问题的行在 errors 中返回，其余按批 upsert
+    try:
+        res = import_prices(db, book_id, file.file, filename=file.filename, fmt=format, delimiter=delimiter, dry_run=dry_run)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return PriceImportOut(
+        book_id=res.book_id,
+        format=res.format,
+        rows=res.rows,
+        upserted=res.upserted,
+        chunks=res.chunks,
+        failed=res.failed,
+        errors=[PriceImportErrorOut(row_no=e.row_no, error=e.error) for e in res.errors],
+        dry_run=res.dry_run,
+    )
+
+
 @router.get("/prices/latest", response_model=PriceOut)
 def get_latest_price(
     book_id: str,
@@ -91,14 +138,8 @@ def get_latest_price(
     if not com or not cur:
         raise HTTPException(status_code=400, detail="币种不存在")
 
-    q = (
-        db.query(Price)
-        .filter(Price.book_id == book_id, Price.commodity_id == str(com.id), Price.currency_id == str(cur.id))
-        .order_by(Price.price_date.desc())
-    )
-    if as_of:
-        q = q.filter(Price.price_date <= as_of)
-    row = q.first()
+    pid = get_price_book(db, book_id).latest_id(str(com.id), str(cur.id), as_of or date.max)
+    row = db.get(Price, pid) if pid else None
     if not row:
         raise HTTPException(status_code=404, detail="未找到价格/汇率")
     return PriceOut(
@@ -155,6 +196,8 @@ def create_invoice_api(
         total_net=inv.total_net,
         total_tax=inv.total_tax,
         total_gross=inv.total_gross,
+        applied_amount=inv.applied_amount or 0,
+        outstanding_amount=inv.outstanding_amount or 0,
         posted_txn_id=str(inv.posted_txn_id) if inv.posted_txn_id else None,
         lot_id=str(inv.lot_id) if inv.lot_id else None,
         draft_id=r.draft_id,
@@ -175,6 +218,44 @@ def create_invoice_api(
     )
 
 
+@router.post("/invoices:import", response_model=InvoiceImportOut)
+def import_invoices_api(
+    book_id: str = Form(...),
+    file: UploadFile = File(...),
+    format: str | None = Form(default=None),
+    delimiter: str | None = Form(default=None),
+    create_draft: bool = Form(default=True),
+    dry_run: bool = Form(default=False),
+    db: Session = Depends(db_session),
+    u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+) -> InvoiceImportOut:
+    # 逐张校验：有问题的发票在 errors 中返回，其余照常导入
+    try:
+        res = import_invoices(
+            db,
+            book_id,
+            file.file,
+            filename=file.filename,
+            fmt=format,
+            delimiter=delimiter,
+            create_draft=create_draft,
+            dry_run=dry_run,
+            actor_user_id=u.id,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return InvoiceImportOut(
+        book_id=res.book_id,
+        format=res.format,
+        invoices=res.invoices,
+        lines=res.lines,
+        drafts=res.drafts,
+        failed=res.failed,
+        errors=[InvoiceImportErrorOut(row_no=e.row_no, doc_no=e.doc_no, error=e.error) for e in res.errors],
+        dry_run=res.dry_run,
+    )
+
+
 @router.get("/invoices/{invoice_id}", response_model=InvoiceOut)
 def get_invoice(
     invoice_id: str,
@@ -199,6 +280,8 @@ def get_invoice(
         total_net=inv.total_net,
         total_tax=inv.total_tax,
         total_gross=inv.total_gross,
+        applied_amount=inv.applied_amount or 0,
+        outstanding_amount=inv.outstanding_amount or 0,
         posted_txn_id=str(inv.posted_txn_id) if inv.posted_txn_id else None,
         lot_id=str(inv.lot_id) if inv.lot_id else None,
         draft_id=None,
@@ -243,6 +326,7 @@ def create_payment_api(
             applications=[x.model_dump() for x in body.applications],
             actor_user_id=u.id,
             create_draft=body.create_draft,
+            auto_apply=body.auto_apply,
         )
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -264,6 +348,71 @@ def create_payment_api(
         txn_id=str(pay.txn_id) if pay.txn_id else None,
         draft_id=r.draft_id,
         applications=[{"invoice_id": str(x.invoice_id), "amount": x.amount, "applied_at": x.applied_at} for x in apps],
+        unapplied_amount=pay.amount - sum((x.amount for x in apps), Decimal("0")),
+    )
+
+
+@router.post("/payment-runs", response_model=PaymentRunOut)
+def create_payment_run(
+    body: PaymentRunIn,
+    db: Session = Depends(db_session),
+    u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+) -> PaymentRunOut:
+    try:
+        r = run_ap_payments(
+            db,
+            book_id=body.book_id,
+            period_id=body.period_id,
+            pay_date=body.pay_date,
+            due_on_or_before=body.due_on_or_before,
+            cash_account_id=body.cash_account_id,
+            party_ids=body.party_ids,
+            currency_code=body.currency_code,
+            method=body.method,
+            dry_run=body.dry_run,
+            actor_user_id=u.id,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return PaymentRunOut(
+        run_ref=r.run_ref,
+        book_id=r.book_id,
+        currency_code=r.currency_code,
+        due_on_or_before=r.due_on_or_before,
+        payments=r.payments,
+        invoices=r.invoices,
+        total=r.total,
+        items=[
+            PaymentRunItemOut(
+                party_id=x.party_id,
+                party_name=x.party_name,
+                payment_id=x.payment_id,
+                draft_id=x.draft_id,
+                amount=x.amount,
+                invoice_count=x.invoice_count,
+            )
+            for x in r.items
+        ],
+        dry_run=r.dry_run,
+    )
+
+
+@router.get("/payment-runs/{run_ref}/file")
+def export_payment_run_file(
+    run_ref: str,
+    book_id: str,
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+):
+    try:
+        text = payment_run_csv(db, book_id=book_id, run_ref=run_ref)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    # utf-8-sig：Excel 打开不乱码
+    return StreamingResponse(
+        io.BytesIO(text.encode("utf-8-sig")),
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=payment-run-{run_ref}.csv"},
     )
 
 
@@ -292,6 +441,7 @@ def get_payment(
         txn_id=str(pay.txn_id) if pay.txn_id else None,
         draft_id=None,
         applications=[{"invoice_id": str(x.invoice_id), "amount": x.amount, "applied_at": x.applied_at} for x in apps],
+        unapplied_amount=pay.amount - sum((x.amount for x in apps), Decimal("0")),
     )
 
 
@@ -300,10 +450,32 @@ def aging(
     book_id: str,
     as_of: date = Query(...),
     invoice_type: str | None = Query(default=None),
+    after: str | None = Query(default=None, description="上一页返回的 next_cursor"),
+    limit: int = Query(default=500, ge=1, le=2000),
     db: Session = Depends(db_session),
     _u: CurrentUser = Depends(require_roles(["admin", "accountant", "manager"])),
 ) -> AgingResponse:
-    items = aging_report(db, book_id=book_id, as_of=as_of, invoice_type=invoice_type)
-    return AgingResponse(book_id=book_id, as_of=as_of, items=items)  # type: ignore[arg-type]
+    after_key = None
+    if after:
+        try:
+            ts, invoice_id = unpack_cursor(after)
+            after_key = (datetime.fromisoformat(ts), str(invoice_id))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="分页游标无效")
+    items = aging_report(db, book_id=book_id, as_of=as_of, invoice_type=invoice_type, limit=limit, after=after_key)
+    next_cursor = pack_cursor(items[-1]["doc_date"], items[-1]["invoice_id"]) if len(items) == limit else None
+    return AgingResponse(book_id=book_id, as_of=as_of, items=items, next_cursor=next_cursor)  # type: ignore[arg-type]
+
+
+@router.get("/aging/summary", response_model=AgingSummaryResponse)
+def aging_summary_api(
+    book_id: str,
+    as_of: date = Query(...),
+    invoice_type: str | None = Query(default=None),
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant", "manager"])),
+) -> AgingSummaryResponse:
+    rows = aging_summary(db, book_id=book_id, as_of=as_of, invoice_type=invoice_type)
+    return AgingSummaryResponse(book_id=book_id, as_of=as_of, rows=[AgingSummaryRow(**r) for r in rows])
 
 
@@ -15,11 +15,15 @@ from app.api.schemas.gl import (
     DraftCreateResponse,
     DraftListItem,
     DraftOut,
+    FxRevaluationItemOut,
+    FxRevaluationRunIn,
+    FxRevaluationRunOut,
     PrecheckResponse,
     PostResponse,
     RejectRequest,
 )
 from app.application.gl.draft_workflow import approve_draft, reject_draft
+from app.application.gl.fx_revaluation import run_fx_revaluation
 from app.application.gl.posting import post_draft, precheck_draft
 from app.application.gl.draft_workflow import append_revision
 from app.infra.db.models import Account, AccountingPeriod, Book, Commodity, TransactionDraft, TransactionDraftLine
@@ -258,3 +262,43 @@ def reject(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
+@router.post("/fx-revaluation:run", response_model=FxRevaluationRunOut)
+def fx_revaluation_run(
+    body: FxRevaluationRunIn,
+    db: Session = Depends(db_session),
+    u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+) -> FxRevaluationRunOut:
+    try:
+        r = run_fx_revaluation(
+            db,
+            book_id=body.book_id,
+            period_id=body.period_id,
+            gain_account_id=body.gain_account_id,
+            loss_account_id=body.loss_account_id,
+            dry_run=body.dry_run,
+            actor_user_id=u.id,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return FxRevaluationRunOut(
+        book_id=r.book_id,
+        period_id=r.period_id,
+        rate_date=r.rate_date,
+        draft_id=r.draft_id,
+        gain=r.gain,
+        loss=r.loss,
+        items=[
+            FxRevaluationItemOut(
+                account_id=x.account_id,
+                account_code=x.account_code,
+                commodity_code=x.commodity_code,
+                amount=x.amount,
+                carrying_value=x.carrying_value,
+                rate=x.rate,
+                revalued_value=x.revalued_value,
+                adjustment=x.adjustment,
+            )
+            for x in r.items
+        ],
+        dry_run=r.dry_run,
+    )
@@ -9,6 +9,7 @@ from sqlalchemy.orm import Session
 
 from app.api.deps import CurrentUser, db_session, require_roles
 from app.api.schemas.imports import AccountImportCommitResponse, AccountImportPreviewResponse, AccountImportPreviewRow
+from app.application.engine.versions import bump_accounts_version
 from app.infra.db.models import Account, Book
 
 router = APIRouter(prefix="/imports", tags=["imports"])
@@ -268,6 +269,9 @@ async def commit_accounts_csv(
                 by_code[a.code] = a
                 created += 1
 
+        if created or updated:
+            bump_accounts_version(db, book_id)
+
     return AccountImportCommitResponse(book_id=book_id, created=created, updated=updated, skipped=skipped, warnings=warnings)
 
 
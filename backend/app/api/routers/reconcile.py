@@ -4,19 +4,51 @@ from datetime import date, datetime, time
 from decimal import Decimal
 
 import sqlalchemy as sa
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile, status
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.api.deps import CurrentUser, db_session, require_roles
+from app.application.gl.register import pack_cursor, unpack_cursor
+from app.application.reconcile.auto_match import propose_matches
+from app.application.reconcile.rules import categorize_statement, rule_regex
+from app.application.reconcile.statement_import import import_bank_statement
 from app.api.schemas.reconcile import (
+    BankRuleIn,
+    BankRuleOut,
+    ReconcileAcceptIn,
+    ReconcileAutoMatchIn,
+    ReconcileAutoMatchOut,
+    ReconcileBulkIn,
+    ReconcileBulkOut,
+    ReconcileCategorizeIn,
+    ReconcileCategorizeOut,
     ReconcileCreateIn,
     ReconcileDetailOut,
     ReconcileFinishOut,
+    ReconcileProposalOut,
+    ReconcileProposalsOut,
+    ReconcileProposalSplit,
     ReconcileSessionOut,
     ReconcileToggleIn,
+    ReconcileToggleOut,
+    StatementImportOut,
+    StatementLineOut,
+    StatementLinesOut,
+)
+from app.infra.db.models import (
+    Account,
+    BankRule,
+    BankStatementLine,
+    ReconcileMatch,
+    ReconcileBalance,
+    ReconcileMatchProposal,
+    ReconcileSession,
+    Split,
+    Transaction,
+    utcnow,
+    uuid_str,
 )
-from app.infra.db.models import Account, ReconcileMatch, ReconcileSession, Split, Transaction, utcnow, uuid_str
 
 router = APIRouter(prefix="/reconcile", tags=["reconcile"])
 
@@ -41,69 +73,133 @@ def _as_dt(d: date) -> datetime:
     return datetime.combine(d, time.max)
 
 
-def _load_detail(db: Session, sess: ReconcileSession) -> ReconcileDetailOut:
+def _session_out(sess: ReconcileSession) -> ReconcileSessionOut:
+    return ReconcileSessionOut(
+        id=str(sess.id),
+        book_id=str(sess.book_id),
+        account_id=str(sess.account_id),
+        statement_date=sess.statement_date,
+        ending_balance=_decimal(sess.ending_balance),
+        opening_balance=_decimal(sess.opening_balance or 0),
+        status=sess.status,
+    )
+
+
+def _difference(sess: ReconcileSession) -> Decimal:
+    # 差额 = 对账单期末余额 -（期初已对账余额 + 本次选中分录合计）；期初余额在建会话时取自 reconcile_balances，无需回扫历史
+    return _decimal(sess.ending_balance) - _decimal(sess.opening_balance or 0) - _decimal(sess.selected_total)
+
+
+def _opening_balance(db: Session, account_id: str) -> Decimal:
+    rb = db.query(ReconcileBalance).filter(ReconcileBalance.account_id == account_id).one_or_none()
+    return _decimal(rb.balance) if rb else Decimal("0")
+
+
+def _item_out(sp: Split, txn: Transaction, selected: bool) -> dict:
+    return {
+        "split_id": str(sp.id),
+        "txn_id": str(txn.id),
+        "txn_num": txn.num,
+        "txn_date": txn.txn_date.date().isoformat(),
+        "description": txn.description,
+        "value": _decimal(sp.value),
+        "memo": sp.memo,
+        "reconcile_state": sp.reconcile_state,
+        "selected": selected,
+    }
+
+
+def _get_account(db: Session, sess: ReconcileSession) -> Account:
     acc = db.query(Account).filter(Account.id == sess.account_id).one_or_none()
     if not acc:
         # 避免 .one() 抛异常导致 500；给前端可理解的错误
         raise HTTPException(status_code=400, detail="对账科目不存在或已被删除")
+    return acc
 
-    # 候选：该科目在 statement_date（含）之前、且未对账(y)的 split
-    q = (
-        db.query(Split, Transaction)
+
+def _refresh_totals(db: Session, sess: ReconcileSession, acc: Account) -> None:
+    """
+    用 SQL 聚合重算会话维护的合计（创建/重开/查看详情时校准一次）；
+    之后的 toggle 只做增量更新，不再重读候选分录。
+    """
+    sign = -1 if (acc.type or "").upper() in _CREDIT_TYPES else 1
+    account_total = (
+        db.query(sa.func.coalesce(sa.func.sum(Split.value), 0))
         .join(Transaction, Split.txn_id == Transaction.id)
         .filter(Split.account_id == sess.account_id)
         .filter(Transaction.txn_date <= _as_dt(sess.statement_date))
         .filter(Split.reconcile_state != "y")
-        .order_by(Transaction.txn_date.asc(), Split.line_no.asc())
+        .scalar()
+    )
+    sel_count, sel_total = (
+        db.query(sa.func.count(ReconcileMatch.id), sa.func.coalesce(sa.func.sum(Split.value), 0))
+        .join(Split, ReconcileMatch.split_id == Split.id)
+        .filter(ReconcileMatch.session_id == sess.id)
+        .one()
     )
-    rows = q.limit(2000).all()
+    sess.account_total = sign * _decimal(account_total)
+    sess.selected_total = sign * _decimal(sel_total)
+    sess.selected_count = int(sel_count or 0)
+    db.flush()
 
-    selected_ids = {
-        str(x.split_id)
-        for x in db.query(ReconcileMatch.split_id).filter(ReconcileMatch.session_id == sess.id).all()
-    }
 
-    items = []
-    selected_total = Decimal("0")
-    account_total = Decimal("0")
+def _encode_cursor(txn: Transaction, sp: Split) -> str:
+    return pack_cursor(txn.txn_date, str(sp.id))
 
-    for sp, txn in rows:
-        nv = _normalize_value(acc.type, _decimal(sp.value))
-        account_total += nv
-        sel = str(sp.id) in selected_ids
-        if sel:
-            selected_total += nv
-        items.append(
-            {
-                "split_id": str(sp.id),
-                "txn_id": str(txn.id),
-                "txn_num": txn.num,
-                "txn_date": txn.txn_date.date().isoformat(),
-                "description": txn.description,
-                "value": _decimal(sp.value),
-                "memo": sp.memo,
-                "reconcile_state": sp.reconcile_state,
-                "selected": sel,
-            }
-        )
 
-    # difference：用“期末余额 - 选中分录之和”作为剩余差额（这里用简化口径）
-    # 说明：严格对账应该考虑期初余额；这里按“截至对账日该账户应有余额”为基准简化。
-    difference = _decimal(sess.ending_balance) - selected_total
+def _decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        ts, split_id = unpack_cursor(cursor)
+        return datetime.fromisoformat(ts), str(split_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="分页游标无效")
+
 
+def _load_detail(db: Session, sess: ReconcileSession, *, limit: int = 500, after: str | None = None) -> ReconcileDetailOut:
+    _get_account(db, sess)
+
+    # 候选：该科目在 statement_date（含）之前、且未对账(y)的 split。
+    # 按 (txn_date, split.id) 做 keyset 分页（走 splits(account_id, reconcile_state) 索引），
+    # 不再截断为前 2000 条；合计来自会话维护的 SQL 聚合，与分页无关。
+    q = (
+        db.query(Split, Transaction)
+        .join(Transaction, Split.txn_id == Transaction.id)
+        .filter(Split.account_id == sess.account_id)
+        .filter(Transaction.txn_date <= _as_dt(sess.statement_date))
+        .filter(Split.reconcile_state != "y")
+    )
+    if after:
+        after_dt, after_id = _decode_cursor(after)
+        q = q.filter(
+            sa.or_(
+                Transaction.txn_date > after_dt,
+                sa.and_(Transaction.txn_date == after_dt, Split.id > after_id),
+            )
+        )
+    rows = q.order_by(Transaction.txn_date.asc(), Split.id.asc()).limit(limit).all()
+
+    page_ids = [sp.id for sp, _ in rows]
+    selected_ids = (
+        {
+            str(x.split_id)
+            for x in db.query(ReconcileMatch.split_id)
+            .filter(ReconcileMatch.session_id == sess.id, ReconcileMatch.split_id.in_(page_ids))
+            .all()
+        }
+        if page_ids
+        else set()
+    )
+    items = [_item_out(sp, txn, str(sp.id) in selected_ids) for sp, txn in rows]
+
+    selected_total = _decimal(sess.selected_total)
     return ReconcileDetailOut(
-        session=ReconcileSessionOut(
-            id=str(sess.id),
-            book_id=str(sess.book_id),
-            account_id=str(sess.account_id),
-            statement_date=sess.statement_date,
-            ending_balance=_decimal(sess.ending_balance),
-            status=sess.status,
-        ),
+        session=_session_out(sess),
         items=items,  # type: ignore[arg-type]
         selected_total=selected_total,
-        account_total_asof_date=account_total,
-        difference=difference,
+        selected_count=int(sess.selected_count or 0),
+        account_total_asof_date=_decimal(sess.account_total),
+        difference=_difference(sess),
+        next_cursor=_encode_cursor(rows[-1][1], rows[-1][0]) if len(rows) == limit else None,
     )
 
 
@@ -134,15 +230,8 @@ def create_session(
                     existed.finished_at = None
                 # 允许用户用新的期末余额继续对账（例如后续补录了同日期交易）
                 existed.ending_balance = _decimal(payload.ending_balance)
-                db.flush()
-                return ReconcileSessionOut(
-                    id=str(existed.id),
-                    book_id=str(existed.book_id),
-                    account_id=str(existed.account_id),
-                    statement_date=existed.statement_date,
-                    ending_balance=_decimal(existed.ending_balance),
-                    status=existed.status,
-                )
+                _refresh_totals(db, existed, acc)
+                return _session_out(existed)
 
             sess = ReconcileSession(
                 id=uuid_str(),
@@ -150,6 +239,7 @@ def create_session(
                 account_id=payload.account_id,
                 statement_date=payload.statement_date,
                 ending_balance=_decimal(payload.ending_balance),
+                opening_balance=_opening_balance(db, payload.account_id),
                 status="OPEN",
                 created_by=u.id,
                 created_at=utcnow(),
@@ -157,14 +247,8 @@ def create_session(
             )
             db.add(sess)
             db.flush()
-            return ReconcileSessionOut(
-                id=str(sess.id),
-                book_id=str(sess.book_id),
-                account_id=str(sess.account_id),
-                statement_date=sess.statement_date,
-                ending_balance=_decimal(sess.ending_balance),
-                status=sess.status,
-            )
+            _refresh_totals(db, sess, acc)
+            return _session_out(sess)
     except IntegrityError:
         # 并发/重复点击兜底：唯一约束冲突后，返回已存在的会话
         db.rollback()
@@ -174,14 +258,7 @@ def create_session(
             .one_or_none()
         )
         if existed3:
-            return ReconcileSessionOut(
-                id=str(existed3.id),
-                book_id=str(existed3.book_id),
-                account_id=str(existed3.account_id),
-                statement_date=existed3.statement_date,
-                ending_balance=_decimal(existed3.ending_balance),
-                status=existed3.status,
-            )
+            return _session_out(existed3)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="对账会话创建失败，请稍后重试")
 
 
@@ -197,14 +274,7 @@ def list_sessions(
         q = q.filter(ReconcileSession.account_id == account_id)
     rows = q.limit(200).all()
     return [
-        ReconcileSessionOut(
-            id=str(s.id),
-            book_id=str(s.book_id),
-            account_id=str(s.account_id),
-            statement_date=s.statement_date,
-            ending_balance=_decimal(s.ending_balance),
-            status=s.status,
-        )
+        _session_out(s)
         for s in rows
     ]
 
@@ -212,45 +282,180 @@ def list_sessions(
 @router.get("/sessions/{session_id}", response_model=ReconcileDetailOut)
 def get_session_detail(
     session_id: str,
+    after: str | None = Query(default=None, description="上一页返回的 next_cursor"),
+    limit: int = Query(default=500, ge=1, le=2000),
     db: Session = Depends(db_session),
     _u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
 ) -> ReconcileDetailOut:
-    sess = db.query(ReconcileSession).filter(ReconcileSession.id == session_id).one_or_none()
-    if not sess:
-        raise HTTPException(status_code=404, detail="对账会话不存在")
-    return _load_detail(db, sess)
+    with db.begin():
+        sess = db.query(ReconcileSession).filter(ReconcileSession.id == session_id).one_or_none()
+        if not sess:
+            raise HTTPException(status_code=404, detail="对账会话不存在")
+        # 加载首页时顺带校准维护的合计（期间可能有新过账或其他会话完成对账）；翻页不再重复聚合
+        if sess.status == "OPEN" and not after:
+            _refresh_totals(db, sess, _get_account(db, sess))
+        return _load_detail(db, sess, limit=limit, after=after)
 
 
-@router.post("/sessions/{session_id}:toggle", response_model=ReconcileDetailOut)
+@router.post("/sessions/{session_id}:toggle", response_model=ReconcileToggleOut)
 def toggle_split(
     session_id: str,
     body: ReconcileToggleIn,
     db: Session = Depends(db_session),
     _u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
-) -> ReconcileDetailOut:
+) -> ReconcileToggleOut:
     with db.begin():
         sess = db.query(ReconcileSession).filter(ReconcileSession.id == session_id).with_for_update().one_or_none()
         if not sess:
             raise HTTPException(status_code=404, detail="对账会话不存在")
         if sess.status != "OPEN":
             raise HTTPException(status_code=400, detail="会话已结束")
+        acc = _get_account(db, sess)
 
-        sp = db.query(Split).filter(Split.id == body.split_id, Split.account_id == sess.account_id).one_or_none()
-        if not sp:
+        row = (
+            db.query(Split, Transaction)
+            .join(Transaction, Split.txn_id == Transaction.id)
+            .filter(Split.id == body.split_id, Split.account_id == sess.account_id)
+            .one_or_none()
+        )
+        if not row:
             raise HTTPException(status_code=400, detail="分录不存在或不属于该科目")
-        # toggle
+        sp, txn = row
+        nv = _normalize_value(acc.type, _decimal(sp.value))
+
+        # toggle：只在选中状态真正变化时调整会话合计（重复点击幂等）
         m = db.query(ReconcileMatch).filter(ReconcileMatch.session_id == sess.id, ReconcileMatch.split_id == sp.id).one_or_none()
         if body.selected:
             if not m:
                 db.add(ReconcileMatch(id=uuid_str(), session_id=sess.id, split_id=sp.id, created_at=utcnow()))
+                sess.selected_total = _decimal(sess.selected_total) + nv
+                sess.selected_count = int(sess.selected_count or 0) + 1
             # mark cleared
             if sp.reconcile_state == "n":
                 sp.reconcile_state = "c"
         else:
             if m:
                 db.delete(m)
+                sess.selected_total = _decimal(sess.selected_total) - nv
+                sess.selected_count = int(sess.selected_count or 0) - 1
         db.flush()
-        return _load_detail(db, sess)
+
+        selected_total = _decimal(sess.selected_total)
+        return ReconcileToggleOut(
+            session_id=str(sess.id),
+            item=_item_out(sp, txn, body.selected),  # type: ignore[arg-type]
+            selected_total=selected_total,
+            selected_count=int(sess.selected_count),
+            account_total_asof_date=_decimal(sess.account_total),
+            difference=_difference(sess),
+        )
+
+
+def _uuid_sql(db: Session):
+    # 集合式 INSERT ... SELECT 需要由数据库生成主键
+    dialect = db.get_bind().dialect.name
+    if dialect.startswith("postgres"):
+        return sa.cast(sa.func.gen_random_uuid(), sa.String(36))
+    if dialect == "mysql":
+        return sa.func.uuid()
+    return sa.func.lower(sa.func.hex(sa.func.randomblob(16)))
+
+
+def _like_escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@router.post("/sessions/{session_id}:bulk_select", response_model=ReconcileBulkOut)
+def bulk_select(
+    session_id: str,
+    body: ReconcileBulkIn,
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+) -> ReconcileBulkOut:
+    has_filter = (
+        body.split_ids is not None
+        or body.date_from is not None
+        or body.date_to is not None
+        or body.amount_min is not None
+        or body.amount_max is not None
+        or bool(body.memo_contains)
+        or body.cleared_only
+    )
+    if not has_filter:
+        raise HTTPException(status_code=400, detail="请至少指定一个筛选条件（分录列表/日期/金额/摘要/已清分）")
+
+    with db.begin():
+        sess = db.query(ReconcileSession).filter(ReconcileSession.id == session_id).with_for_update().one_or_none()
+        if not sess:
+            raise HTTPException(status_code=404, detail="对账会话不存在")
+        if sess.status != "OPEN":
+            raise HTTPException(status_code=400, detail="会话已结束")
+        acc = _get_account(db, sess)
+
+        sp = Split.__table__
+        tx = Transaction.__table__
+        rm = ReconcileMatch.__table__
+
+        # 候选范围与详情一致：本科目、截止日（含）之前、未对账
+        cond = [
+            sp.c.account_id == sess.account_id,
+            tx.c.txn_date <= _as_dt(sess.statement_date),
+            sp.c.reconcile_state != "y",
+        ]
+        if body.split_ids is not None:
+            cond.append(sp.c.id.in_(body.split_ids))
+        if body.date_from is not None:
+            cond.append(tx.c.txn_date >= datetime.combine(body.date_from, time.min))
+        if body.date_to is not None:
+            cond.append(tx.c.txn_date <= _as_dt(body.date_to))
+        if body.amount_min is not None:
+            cond.append(sp.c.value >= body.amount_min)
+        if body.amount_max is not None:
+            cond.append(sp.c.value <= body.amount_max)
+        if body.memo_contains:
+            pat = f"%{_like_escape(body.memo_contains.lower())}%"
+            cond.append(
+                sa.or_(
+                    sa.func.lower(sp.c.memo).like(pat, escape="\\"),
+                    sa.func.lower(tx.c.description).like(pat, escape="\\"),
+                )
+            )
+        if body.cleared_only:
+            cond.append(sp.c.reconcile_state == "c")
+        candidates = sa.select(sp.c.id).select_from(sp.join(tx, sp.c.txn_id == tx.c.id)).where(*cond)
+
+        if body.selected:
+            already = sa.select(rm.c.split_id).where(rm.c.session_id == sess.id)
+            ins = rm.insert().from_select(
+                ["id", "session_id", "split_id", "created_at"],
+                sa.select(_uuid_sql(db), sa.literal(str(sess.id)), sp.c.id, sa.literal(utcnow()))
+                .select_from(sp.join(tx, sp.c.txn_id == tx.c.id))
+                .where(*cond)
+                .where(sp.c.id.not_in(already)),
+            )
+            affected = db.execute(ins).rowcount or 0
+            # 选中即视为已清分（与单条 toggle 一致）
+            db.execute(
+                sp.update()
+                .where(sp.c.id.in_(sa.select(rm.c.split_id).where(rm.c.session_id == sess.id)))
+                .where(sp.c.reconcile_state == "n")
+                .values(reconcile_state="c")
+            )
+        else:
+            affected = (
+                db.execute(rm.delete().where(rm.c.session_id == sess.id).where(rm.c.split_id.in_(candidates))).rowcount or 0
+            )
+
+        _refresh_totals(db, sess, acc)
+        selected_total = _decimal(sess.selected_total)
+        return ReconcileBulkOut(
+            session_id=str(sess.id),
+            affected=int(affected),
+            selected_total=selected_total,
+            selected_count=int(sess.selected_count),
+            account_total_asof_date=_decimal(sess.account_total),
+            difference=_difference(sess),
+        )
 
 
 @router.post("/sessions/{session_id}:finish", response_model=ReconcileFinishOut)
@@ -266,22 +471,353 @@ def finish_session(
         if sess.status != "OPEN":
             raise HTTPException(status_code=400, detail="会话已结束")
 
-        detail = _load_detail(db, sess)
+        # 直接使用会话维护的合计（toggle 已在同一行锁下增量更新）
+        difference = _difference(sess)
         # 允许 0.01 的误差（浮点/四舍五入）
-        if abs(detail.difference) > Decimal("0.01"):
+        if abs(difference) > Decimal("0.01"):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"差额不为 0，不能完成对账（difference={detail.difference}）",
+                detail=f"差额不为 0，不能完成对账（difference={difference}）",
             )
 
         # set selected splits to reconciled
-        sel_ids = [x.split_id for x in db.query(ReconcileMatch.split_id).filter(ReconcileMatch.session_id == sess.id).all()]
-        if sel_ids:
-            db.query(Split).filter(Split.id.in_(sel_ids)).update({Split.reconcile_state: "y"}, synchronize_session=False)
+        sel_ids = db.query(ReconcileMatch.split_id).filter(ReconcileMatch.session_id == sess.id)
+        db.query(Split).filter(Split.id.in_(sel_ids)).update({Split.reconcile_state: "y"}, synchronize_session=False)
 
         sess.status = "FINISHED"
         sess.finished_at = utcnow()
+
+        # 记下本科目已对账余额，下一次会话直接以此为期初（加锁后 insert/update，兼容 MySQL）
+        reconciled = _decimal(sess.opening_balance or 0) + _decimal(sess.selected_total)
+        rb = db.query(ReconcileBalance).filter(ReconcileBalance.account_id == sess.account_id).with_for_update().one_or_none()
+        if rb is None:
+            db.add(
+                ReconcileBalance(
+                    account_id=sess.account_id,
+                    book_id=sess.book_id,
+                    balance=reconciled,
+                    statement_date=sess.statement_date,
+                    session_id=sess.id,
+                    updated_at=utcnow(),
+                )
+            )
+        elif sess.statement_date >= rb.statement_date:
+            # 重新完成更早截止日的会话时不回写：之后的会话已各自记下期初
+            rb.balance = reconciled
+            rb.statement_date = sess.statement_date
+            rb.session_id = sess.id
+            rb.updated_at = utcnow()
+        db.flush()
+        return ReconcileFinishOut(session_id=str(sess.id), status=sess.status, difference=difference)
+
+
+@router.post("/sessions/{session_id}/statement", response_model=StatementImportOut)
+def import_statement(
+    session_id: str,
+    file: UploadFile = File(...),
+    format: str | None = Form(default=None),
+    delimiter: str | None = Form(default=None),
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+) -> StatementImportOut:
+    # 直接读上传的临时文件（流式解析、分批写入），不把整个文件读进内存
+    try:
+        res = import_bank_statement(db, session_id, file.file, filename=file.filename, fmt=format, delimiter=delimiter)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return StatementImportOut(
+        session_id=res.session_id,
+        format=res.format,
+        encoding=res.encoding,
+        inserted=res.inserted,
+        skipped=res.skipped,
+        closing_balance=res.closing_balance,
+        warnings=res.warnings,
+    )
+
+
+@router.get("/sessions/{session_id}/statement", response_model=StatementLinesOut)
+def list_statement_lines(
+    session_id: str,
+    after_line_no: int = Query(default=0, ge=0),
+    limit: int = Query(default=200, ge=1, le=1000),
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+) -> StatementLinesOut:
+    if not db.query(ReconcileSession.id).filter(ReconcileSession.id == session_id).one_or_none():
+        raise HTTPException(status_code=404, detail="对账会话不存在")
+    rows = (
+        db.query(BankStatementLine)
+        .filter(BankStatementLine.session_id == session_id, BankStatementLine.line_no > after_line_no)
+        .order_by(BankStatementLine.line_no.asc())
+        .limit(limit)
+        .all()
+    )
+    return StatementLinesOut(
+        session_id=session_id,
+        lines=[
+            StatementLineOut(
+                line_no=int(r.line_no),
+                txn_date=r.txn_date,
+                amount=_decimal(r.amount),
+                description=r.description,
+                reference=r.reference,
+                counterparty=r.counterparty,
+            )
+            for r in rows
+        ],
+        next_after_line_no=int(rows[-1].line_no) if len(rows) == limit else None,
+    )
+
+
+@router.post("/sessions/{session_id}:auto_match", response_model=ReconcileAutoMatchOut)
+def auto_match(
+    session_id: str,
+    body: ReconcileAutoMatchIn,
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+) -> ReconcileAutoMatchOut:
+    try:
+        res = propose_matches(db, session_id, window_days=body.window_days)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return ReconcileAutoMatchOut(
+        session_id=res.session_id,
+        lines_considered=res.lines_considered,
+        candidates_considered=res.candidates_considered,
+        proposals=res.proposals,
+        by_rule=res.by_rule,
+    )
+
+
+@router.get("/sessions/{session_id}/proposals", response_model=ReconcileProposalsOut)
+def list_proposals(
+    session_id: str,
+    min_confidence: Decimal | None = Query(default=None, ge=0, le=1),
+    after_group_no: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=1, le=500),
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+) -> ReconcileProposalsOut:
+    if not db.query(ReconcileSession.id).filter(ReconcileSession.id == session_id).one_or_none():
+        raise HTTPException(status_code=404, detail="对账会话不存在")
+    P = ReconcileMatchProposal
+    groups = db.query(P.group_no).filter(P.session_id == session_id, P.group_no > after_group_no)
+    if min_confidence is not None:
+        groups = groups.filter(P.confidence >= min_confidence)
+    group_nos = [int(r[0]) for r in groups.group_by(P.group_no).order_by(P.group_no.asc()).limit(limit).all()]
+    if not group_nos:
+        return ReconcileProposalsOut(session_id=session_id, proposals=[], next_after_group_no=None)
+
+    rows = (
+        db.query(P, BankStatementLine, Split, Transaction)
+        .join(BankStatementLine, P.statement_line_id == BankStatementLine.id)
+        .join(Split, P.split_id == Split.id)
+        .join(Transaction, Split.txn_id == Transaction.id)
+        .filter(P.session_id == session_id, P.group_no.in_(group_nos))
+        .order_by(P.group_no.asc(), Transaction.txn_date.asc())
+        .all()
+    )
+    out: dict[int, ReconcileProposalOut] = {}
+    for p, line, sp, txn in rows:
+        g = out.get(int(p.group_no))
+        if g is None:
+            g = out[int(p.group_no)] = ReconcileProposalOut(
+                group_no=int(p.group_no),
+                rule=p.rule,
+                confidence=_decimal(p.confidence),
+                line=StatementLineOut(
+                    line_no=int(line.line_no),
+                    txn_date=line.txn_date,
+                    amount=_decimal(line.amount),
+                    description=line.description,
+                    reference=line.reference,
+                    counterparty=line.counterparty,
+                ),
+                splits=[],
+            )
+        g.splits.append(
+            ReconcileProposalSplit(
+                split_id=str(sp.id),
+                txn_date=txn.txn_date.date().isoformat(),
+                description=sp.memo or txn.description,
+                value=_decimal(sp.value),
+            )
+        )
+    return ReconcileProposalsOut(
+        session_id=session_id,
+        proposals=list(out.values()),
+        next_after_group_no=group_nos[-1] if len(group_nos) == limit else None,
+    )
+
+
+@router.post("/sessions/{session_id}:accept_proposals", response_model=ReconcileBulkOut)
+def accept_proposals(
+    session_id: str,
+    body: ReconcileAcceptIn,
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+) -> ReconcileBulkOut:
+    if body.min_confidence is None and body.group_nos is None:
+        raise HTTPException(status_code=400, detail="请指定置信度阈值或建议组")
+
+    with db.begin():
+        sess = db.query(ReconcileSession).filter(ReconcileSession.id == session_id).with_for_update().one_or_none()
+        if not sess:
+            raise HTTPException(status_code=404, detail="对账会话不存在")
+        if sess.status != "OPEN":
+            raise HTTPException(status_code=400, detail="会话已结束")
+        acc = _get_account(db, sess)
+
+        sp = Split.__table__
+        rm = ReconcileMatch.__table__
+        pr = ReconcileMatchProposal.__table__
+
+        cond = [pr.c.session_id == sess.id]
+        if body.min_confidence is not None:
+            cond.append(pr.c.confidence >= body.min_confidence)
+        if body.group_nos is not None:
+            cond.append(pr.c.group_no.in_(body.group_nos))
+
+        # 与 bulk_select 一样集合式写入：建议 -> 选中（记录来源行与置信度），已选中的分录跳过
+        already = sa.select(rm.c.split_id).where(rm.c.session_id == sess.id)
+        ins = rm.insert().from_select(
+            ["id", "session_id", "split_id", "statement_line_id", "confidence", "created_at"],
+            sa.select(_uuid_sql(db), pr.c.session_id, pr.c.split_id, pr.c.statement_line_id, pr.c.confidence, sa.literal(utcnow()))
+            .where(*cond)
+            .where(pr.c.split_id.not_in(already)),
+        )
+        affected = db.execute(ins).rowcount or 0
+        db.execute(
+            sp.update()
+            .where(sp.c.id.in_(sa.select(rm.c.split_id).where(rm.c.session_id == sess.id)))
+            .where(sp.c.reconcile_state == "n")
+            .values(reconcile_state="c")
+        )
+        db.execute(pr.delete().where(*cond))
+
+        _refresh_totals(db, sess, acc)
+        selected_total = _decimal(sess.selected_total)
+        return ReconcileBulkOut(
+            session_id=str(sess.id),
+            affected=int(affected),
+            selected_total=selected_total,
+            selected_count=int(sess.selected_count),
+            account_total_asof_date=_decimal(sess.account_total),
+            difference=_difference(sess),
+        )
+
+
+def _rule_out(r: BankRule) -> BankRuleOut:
+    return BankRuleOut(
+        id=str(r.id),
+        book_id=str(r.book_id),
+        name=r.name,
+        priority=int(r.priority),
+        enabled=bool(r.enabled),
+        match_type=r.match_type,
+        pattern=r.pattern or "",
+        counterparty=r.counterparty or "",
+        min_amount=_decimal(r.min_amount) if r.min_amount is not None else None,
+        max_amount=_decimal(r.max_amount) if r.max_amount is not None else None,
+        counter_account_id=str(r.counter_account_id),
+        memo=r.memo or "",
+    )
+
+
+def _validate_rule(db: Session, body: BankRuleIn) -> None:
+    try:
+        if body.pattern:
+            rule_regex(body.match_type, body.pattern)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not body.pattern and not body.counterparty and body.min_amount is None and body.max_amount is None:
+        raise HTTPException(status_code=400, detail="规则至少需要一个匹配条件")
+    if body.min_amount is not None and body.max_amount is not None and body.min_amount > body.max_amount:
+        raise HTTPException(status_code=400, detail="min_amount 不能大于 max_amount")
+    a = db.query(Account).filter(Account.id == body.counter_account_id).one_or_none()
+    if not a or str(a.book_id) != str(body.book_id):
+        raise HTTPException(status_code=400, detail="对方科目不存在或不属于该账簿")
+    if not a.is_active or not a.allow_post or a.is_placeholder:
+        raise HTTPException(status_code=400, detail="对方科目不允许记账")
+
+
+@router.get("/rules", response_model=list[BankRuleOut])
+def list_rules(
+    book_id: str = Query(...),
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+) -> list[BankRuleOut]:
+    rows = db.query(BankRule).filter(BankRule.book_id == book_id).order_by(BankRule.priority.asc(), BankRule.id.asc()).all()
+    return [_rule_out(r) for r in rows]
+
+
+@router.post("/rules", response_model=BankRuleOut)
+def create_rule(
+    body: BankRuleIn,
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+) -> BankRuleOut:
+    with db.begin():
+        _validate_rule(db, body)
+        r = BankRule(**body.model_dump())
+        db.add(r)
+        db.flush()
+        return _rule_out(r)
+
+
+@router.put("/rules/{rule_id}", response_model=BankRuleOut)
+def update_rule(
+    rule_id: str,
+    body: BankRuleIn,
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+) -> BankRuleOut:
+    with db.begin():
+        r = db.query(BankRule).filter(BankRule.id == rule_id).with_for_update().one_or_none()
+        if not r:
+            raise HTTPException(status_code=404, detail="规则不存在")
+        if str(r.book_id) != str(body.book_id):
+            raise HTTPException(status_code=400, detail="不能修改规则所属账簿")
+        _validate_rule(db, body)
+        for k, v in body.model_dump().items():
+            setattr(r, k, v)
+        r.updated_at = utcnow()
         db.flush()
-        return ReconcileFinishOut(session_id=str(sess.id), status=sess.status, difference=detail.difference)
+        return _rule_out(r)
 
 
+@router.delete("/rules/{rule_id}")
+def delete_rule(
+    rule_id: str,
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+) -> dict:
+    with db.begin():
+        r = db.query(BankRule).filter(BankRule.id == rule_id).one_or_none()
+        if not r:
+            raise HTTPException(status_code=404, detail="规则不存在")
+        db.delete(r)
+    return {"ok": True}
+
+
+@router.post("/sessions/{session_id}:categorize", response_model=ReconcileCategorizeOut)
+def categorize(
+    session_id: str,
+    body: ReconcileCategorizeIn,
+    db: Session = Depends(db_session),
+    u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+) -> ReconcileCategorizeOut:
+    try:
+        res = categorize_statement(db, session_id, dry_run=body.dry_run, actor_user_id=u.id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return ReconcileCategorizeOut(
+        session_id=res.session_id,
+        lines_considered=res.lines_considered,
+        matched=res.matched,
+        drafts_created=res.drafts_created,
+        skipped_period=res.skipped_period,
+        by_rule=res.by_rule,
+        dry_run=res.dry_run,
+    )
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import io
+from datetime import date
 from decimal import Decimal
 from typing import Any
 
@@ -14,16 +15,33 @@ from sqlalchemy.orm import Session
 
 from app.api.deps import CurrentUser, db_session, require_roles
 from app.api.schemas.reports import (
+    CashForecastAccountOut,
+    CashForecastBucketOut,
+    CashForecastOut,
     DrilldownResponse,
     DrilldownRegisterResponse,
+    PortfolioLotOut,
+    PortfolioPositionOut,
+    PortfolioValuationOut,
     ReportExportRequest,
     ReportGenerateRequest,
     ReportGenerateResponse,
+    ReportMappingRow,
+    ReportMappingsOut,
+    ReportMappingsPreviewIn,
+    ReportMappingsPreviewOut,
+    ReportPreviewDiffRow,
+    ReportMappingsReplaceIn,
     ReportSnapshotOut,
     TransactionDetailResponse,
 )
 from app.application.engine.accounts import build_account_children_map, collect_descendants, list_accounts
+from app.application.engine.versions import MAPPINGS_VERSION_KEY, get_versions
+from app.application.reports.forecast import cash_forecast
 from app.application.reports.generator import generate_reports
+from app.application.reports.mappings import MappingSpec, replace_basis_mappings
+from app.application.reports.portfolio import value_portfolio
+from app.application.reports.preview import preview_mappings
 from app.infra.db.models import (
     Account,
     AccountingPeriod,
@@ -100,6 +118,104 @@ def list_snapshots(
     ]
 
 
+@router.get("/mappings", response_model=ReportMappingsOut)
+def list_mappings(
+    book_id: str = Query(...),
+    basis_code: str = Query(default="LEGAL"),
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant", "manager"])),
+) -> ReportMappingsOut:
+    basis = db.query(ReportBasis).filter(ReportBasis.code == basis_code).one_or_none()
+    if not basis:
+        raise HTTPException(status_code=404, detail=f"报表口径不存在：{basis_code}")
+    rows = (
+        db.query(ReportMapping, ReportItem, Account)
+        .join(ReportItem, ReportMapping.item_id == ReportItem.id)
+        .join(Account, ReportMapping.account_id == Account.id)
+        .filter(ReportMapping.basis_id == basis.id, Account.book_id == book_id)
+        .order_by(ReportItem.statement_type.asc(), ReportItem.display_order.asc(), Account.code.asc())
+        .all()
+    )
+    vkey = ("report_basis", str(basis.id), MAPPINGS_VERSION_KEY)
+    return ReportMappingsOut(
+        book_id=book_id,
+        basis_code=basis_code,
+        mappings_version=get_versions(db, [vkey])[vkey],
+        mappings=[
+            ReportMappingRow(
+                statement_type=it.statement_type,
+                item_code=it.code,
+                account_id=str(a.id),
+                account_code=a.code,
+                account_name=a.name,
+                include_children=bool(m.include_children),
+                direction=m.direction or "NET",
+            )
+            for m, it, a in rows
+        ],
+    )
+
+
+@router.put("/mappings", response_model=ReportMappingsOut)
+def replace_mappings(
+    body: ReportMappingsReplaceIn,
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
+) -> ReportMappingsOut:
+    specs = [
+        MappingSpec(
+            statement_type=m.statement_type,
+            item_code=m.item_code,
+            account_id=m.account_id,
+            include_children=m.include_children,
+            direction=m.direction,
+        )
+        for m in body.mappings
+    ]
+    try:
+        replace_basis_mappings(db, book_id=body.book_id, basis_code=body.basis_code, specs=specs)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return list_mappings(book_id=body.book_id, basis_code=body.basis_code, db=db, _u=_u)
+
+
+@router.post("/mappings/preview", response_model=ReportMappingsPreviewOut)
+def preview_mappings_api(
+    body: ReportMappingsPreviewIn,
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant", "manager"])),
+) -> ReportMappingsPreviewOut:
+    specs = [
+        MappingSpec(
+            statement_type=m.statement_type,
+            item_code=m.item_code,
+            account_id=m.account_id,
+            include_children=m.include_children,
+            direction=m.direction,
+        )
+        for m in body.mappings
+    ]
+    try:
+        r = preview_mappings(db, book_id=body.book_id, period_id=body.period_id, basis_code=body.basis_code, specs=specs)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return ReportMappingsPreviewOut(
+        book_id=r.book_id,
+        period_id=r.period_id,
+        basis_code=r.basis_code,
+        snapshot_id=r.snapshot_id,
+        statements=r.statements,
+        checks=r.checks,
+        conflicts=r.conflicts,
+        diff=[
+            ReportPreviewDiffRow(
+                statement_type=d.statement_type, code=d.code, name=d.name, current=d.current, proposed=d.proposed, delta=d.delta
+            )
+            for d in r.diff
+        ],
+    )
+
+
 def _decimal(v) -> Decimal:
     if isinstance(v, Decimal):
         return v
@@ -145,6 +261,96 @@ def drilldown_register_api(
         raise HTTPException(status_code=404, detail=str(e))
 
 
+@router.get("/cash-forecast", response_model=CashForecastOut)
+def get_cash_forecast(
+    book_id: str = Query(...),
+    granularity: str = Query(default="WEEK", pattern="^(WEEK|MONTH)$"),
+    horizon: int | None = Query(default=None, ge=1, le=104),
+    as_of: date | None = Query(default=None),
+    settlement_account_id: str | None = Query(default=None),
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant", "manager"])),
+) -> CashForecastOut:
+    # 默认 13 周 / 12 个月
+    try:
+        r = cash_forecast(
+            db,
+            book_id=book_id,
+            as_of=as_of or date.today(),
+            granularity=granularity,
+            horizon=horizon or (13 if granularity == "WEEK" else 12),
+            settlement_account_id=settlement_account_id,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return CashForecastOut(
+        book_id=r.book_id,
+        as_of=r.as_of,
+        granularity=r.granularity,
+        opening=r.opening,
+        buckets=[
+            CashForecastBucketOut(
+                start=b.start,
+                end=b.end,
+                scheduled_net=r.scheduled_net[k],
+                receivables=r.receivables[k],
+                payables=r.payables[k],
+                balance=r.balance[k],
+            )
+            for k, b in enumerate(r.buckets)
+        ],
+        accounts=[
+            CashForecastAccountOut(account_id=a.account_id, code=a.code, name=a.name, opening=a.opening, net=a.net, balance=a.balance)
+            for a in r.accounts
+        ],
+        schedules=r.schedules,
+        invoices=r.invoices,
+        skipped_invoices=r.skipped_invoices,
+    )
+
+
+@router.get("/portfolio", response_model=PortfolioValuationOut)
+def get_portfolio_valuation(
+    book_id: str = Query(...),
+    as_of: date | None = Query(default=None),
+    method: str = Query(default="FIFO", pattern="^(FIFO|AVERAGE)$"),
+    realised_from: date | None = Query(default=None),
+    db: Session = Depends(db_session),
+    _u: CurrentUser = Depends(require_roles(["admin", "accountant", "manager"])),
+) -> PortfolioValuationOut:
+    try:
+        r = value_portfolio(db, book_id=book_id, as_of=as_of or date.today(), method=method, realised_from=realised_from)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return PortfolioValuationOut(
+        book_id=r.book_id,
+        as_of=r.as_of,
+        method=r.method,
+        positions=[
+            PortfolioPositionOut(
+                account_id=p.account_id,
+                account_code=p.account_code,
+                account_name=p.account_name,
+                commodity_id=p.commodity_id,
+                commodity_code=p.commodity_code,
+                quantity=p.quantity,
+                cost_basis=p.cost_basis,
+                price=p.price,
+                market_value=p.market_value,
+                unrealised=p.unrealised,
+                realised=p.realised,
+                lots=[PortfolioLotOut(lot_id=x.lot_id, opened=x.opened, quantity=x.quantity, cost=x.cost) for x in p.lots],
+            )
+            for p in r.positions
+        ],
+        cost_basis=r.cost_basis,
+        market_value=r.market_value,
+        unrealised=r.unrealised,
+        realised=r.realised,
+        unpriced=r.unpriced,
+    )
+
+
 @router.get("/transactions/{txn_id}", response_model=TransactionDetailResponse)
 def get_transaction_detail_api(
     txn_id: str,
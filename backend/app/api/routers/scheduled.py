@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from datetime import date, timedelta
+from datetime import date
 from decimal import Decimal
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
@@ -9,6 +9,7 @@ from sqlalchemy.orm import Session
 
 from app.api.deps import CurrentUser, db_session, require_roles
 from app.api.schemas.scheduled import ScheduledCreateIn, ScheduledOut, ScheduledRunOut, ScheduledRunRequest
+from app.application.gl.scheduled import next_run_date, validate_template
 from app.infra.db.models import AccountingPeriod, ScheduledRun, ScheduledTransaction, TransactionDraft, TransactionDraftLine, utcnow
 
 router = APIRouter(prefix="/scheduled", tags=["scheduled"])
@@ -28,38 +29,6 @@ def _ym_to_period(db: Session, book_id: str, d: date) -> AccountingPeriod | None
     )
 
 
-def _add_months(d: date, months: int) -> date:
-    y = d.year + (d.month - 1 + months) // 12
-    m = (d.month - 1 + months) % 12 + 1
-    # clamp day to last day of month
-    if m == 12:
-        last = date(y + 1, 1, 1) - timedelta(days=1)
-    else:
-        last = date(y, m + 1, 1) - timedelta(days=1)
-    day = min(d.day, last.day)
-    return date(y, m, day)
-
-
-def _next_date(rule: str, interval: int, d: date) -> date:
-    rule_u = (rule or "").upper()
-    if rule_u == "DAILY":
-        return d + timedelta(days=interval)
-    if rule_u == "WEEKLY":
-        return d + timedelta(days=7 * interval)
-    if rule_u == "MONTHLY":
-        return _add_months(d, interval)
-    raise ValueError("rule 必须是 DAILY/WEEKLY/MONTHLY")
-
-
-def _validate_template(lines: list[dict]) -> None:
-    if not lines or len(lines) < 2:
-        raise ValueError("template.lines 至少 2 行")
-    s_deb = sum((_decimal(x.get("debit", 0)) for x in lines), start=Decimal("0"))
-    s_cred = sum((_decimal(x.get("credit", 0)) for x in lines), start=Decimal("0"))
-    if s_deb != s_cred:
-        raise ValueError(f"模板不平衡：debit={s_deb} credit={s_cred}")
-
-
 @router.get("", response_model=list[ScheduledOut])
 def list_scheduled(
     book_id: str = Query(...),
@@ -96,7 +65,7 @@ def create_scheduled(
     u: CurrentUser = Depends(require_roles(["admin", "accountant"])),
 ) -> ScheduledOut:
     tpl = payload.template.model_dump()
-    _validate_template(tpl.get("lines") or [])
+    validate_template(tpl.get("lines") or [])
     if payload.end_date and payload.end_date < payload.next_run_date:
         raise HTTPException(status_code=400, detail="end_date 不能早于 next_run_date")
 
@@ -181,7 +150,7 @@ def run_scheduled(
         tpl = s.template_json or {}
         lines = tpl.get("lines") or []
         try:
-            _validate_template(lines)
+            validate_template(lines)
         except ValueError as e:
             r = ScheduledRun(sched_id=s.id, run_date=run_d, draft_id=None, status="FAILED", error=str(e), created_at=utcnow())
             db.add(r)
@@ -225,7 +194,7 @@ def run_scheduled(
         db.add(r)
 
         # advance next_run_date
-        s.next_run_date = _next_date(s.rule, int(s.interval), run_d)
+        s.next_run_date = next_run_date(s.rule, int(s.interval), run_d)
         s.updated_at = utcnow()
         db.flush()
         return ScheduledRunOut(sched_id=sched_id, run_date=run_d, status="OK", draft_id=str(d.id), error="")
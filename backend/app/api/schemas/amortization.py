@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+
+from pydantic import BaseModel, Field
+
+
+class AmortizationScheduleIn(BaseModel):
+    book_id: str
+    name: str = Field(min_length=1, max_length=128)
+    kind: str = Field(default="ASSET", pattern="^(ASSET|PREPAID|ACCRUAL)$")
+    method: str = Field(default="STRAIGHT_LINE", pattern="^(STRAIGHT_LINE|DECLINING_BALANCE)$")
+    cost: Decimal
+    salvage: Decimal = Decimal("0")
+    start_date: date
+    life_months: int = Field(ge=1, le=1200)
+    db_factor: Decimal = Decimal("2")
+    expense_account_id: str
+    contra_account_id: str
+    enabled: bool = True
+
+
+class AmortizationScheduleOut(AmortizationScheduleIn):
+    id: str
+
+
+class AmortizationTableRow(BaseModel):
+    period_no: int
+    year: int
+    month: int
+    amount: Decimal
+    accumulated: Decimal
+    book_value: Decimal
+
+
+class AmortizationTableOut(BaseModel):
+    schedule_id: str
+    rows: list[AmortizationTableRow]
+
+
+class AmortizationRunIn(BaseModel):
+    book_id: str
+    period_id: str
+
+
+class AmortizationRunOut(BaseModel):
+    book_id: str
+    period_id: str
+    draft_id: str | None = None
+    schedules: int
+    total: Decimal
@@ -30,6 +30,22 @@ class PriceOut(BaseModel):
     type: str
 
 
+class PriceImportErrorOut(BaseModel):
+    row_no: int
+    error: str
+
+
+class PriceImportOut(BaseModel):
+    book_id: str
+    format: str
+    rows: int
+    upserted: int
+    chunks: int
+    failed: int
+    errors: list[PriceImportErrorOut]  # 最多返回前 500 条
+    dry_run: bool
+
+
 class InvoiceLineIn(BaseModel):
     description: str = Field(default="", max_length=256)
     account_id: str
@@ -54,6 +70,23 @@ class InvoiceCreateIn(BaseModel):
     create_draft: bool = True
 
 
+class InvoiceImportErrorOut(BaseModel):
+    row_no: int
+    doc_no: str
+    error: str
+
+
+class InvoiceImportOut(BaseModel):
+    book_id: str
+    format: str
+    invoices: int
+    lines: int
+    drafts: int
+    failed: int
+    errors: list[InvoiceImportErrorOut]  # 最多返回前 500 条
+    dry_run: bool
+
+
 class InvoiceOut(BaseModel):
     id: str
     book_id: str
@@ -68,6 +101,8 @@ class InvoiceOut(BaseModel):
     total_net: Decimal
     total_tax: Decimal
     total_gross: Decimal
+    applied_amount: Decimal = Decimal("0")
+    outstanding_amount: Decimal = Decimal("0")
     posted_txn_id: str | None
     lot_id: str | None
     draft_id: str | None = None
@@ -93,9 +128,43 @@ class PaymentCreateIn(BaseModel):
     reference_no: str = Field(default="", max_length=64)
     notes: str = Field(default="", max_length=512)
     applications: list[PaymentApplyIn] = Field(default_factory=list)
+    auto_apply: str | None = Field(default=None, pattern=r"^(DUE_DATE|DOC_DATE)$")  # 与 applications 二选一
     create_draft: bool = True
 
 
+class PaymentRunIn(BaseModel):
+    book_id: str
+    period_id: str
+    pay_date: datetime = Field(default_factory=datetime.utcnow)
+    due_on_or_before: date
+    cash_account_id: str
+    party_ids: list[str] | None = None
+    currency_code: str | None = Field(default=None, max_length=32)
+    method: str = Field(default="BANK", max_length=32)
+    dry_run: bool = False
+
+
+class PaymentRunItemOut(BaseModel):
+    party_id: str
+    party_name: str
+    payment_id: str | None
+    draft_id: str | None
+    amount: Decimal
+    invoice_count: int
+
+
+class PaymentRunOut(BaseModel):
+    run_ref: str  # 导出付款文件用
+    book_id: str
+    currency_code: str
+    due_on_or_before: date
+    payments: int
+    invoices: int
+    total: Decimal
+    items: list[PaymentRunItemOut]
+    dry_run: bool
+
+
 class PaymentOut(BaseModel):
     id: str
     book_id: str
@@ -111,6 +180,7 @@ class PaymentOut(BaseModel):
     txn_id: str | None
     draft_id: str | None = None
     applications: list[dict[str, Any]] = Field(default_factory=list)
+    unapplied_amount: Decimal = Decimal("0")
 
 
 class ApplyResultOut(BaseModel):
@@ -141,5 +211,22 @@ class AgingResponse(BaseModel):
     book_id: str
     as_of: date
     items: list[AgingItemOut]
+    next_cursor: str | None = None  # 传回 after 取下一页
+
+
+class AgingSummaryRow(BaseModel):
+    invoice_type: str
+    party_id: str | None
+    party_name: str
+    currency_code: str
+    invoice_count: int
+    buckets: dict[str, Decimal]  # CURRENT / 1-30 / 31-60 / 61-90 / 90+
+    total: Decimal
+
+
+class AgingSummaryResponse(BaseModel):
+    book_id: str
+    as_of: date
+    rows: list[AgingSummaryRow]
 
 
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
 from typing import Any
 
@@ -84,11 +84,16 @@ class RegisterSplitOut(BaseModel):
     value: Decimal
     memo: str
     reconcile_state: str = "n"
+    amount: Decimal = Decimal("0")
+    balance: Decimal = Decimal("0")
 
 
 class RegisterResponse(BaseModel):
     account_id: str
     items: list[RegisterSplitOut]
+    opening_balance: Decimal = Decimal("0")
+    before_cursor: str | None = None
+    after_cursor: str | None = None
 
 
 class DraftCreateLineIn(BaseModel):
@@ -112,3 +117,31 @@ class DraftCreateResponse(BaseModel):
     draft_id: str
 
 
+class FxRevaluationRunIn(BaseModel):
+    book_id: str
+    period_id: str
+    gain_account_id: str
+    loss_account_id: str | None = None  # 不填则收益/损失记同一科目
+    dry_run: bool = False
+
+
+class FxRevaluationItemOut(BaseModel):
+    account_id: str
+    account_code: str
+    commodity_code: str
+    amount: Decimal
+    carrying_value: Decimal
+    rate: Decimal
+    revalued_value: Decimal
+    adjustment: Decimal
+
+
+class FxRevaluationRunOut(BaseModel):
+    book_id: str
+    period_id: str
+    rate_date: date
+    draft_id: str | None = None
+    gain: Decimal
+    loss: Decimal
+    items: list[FxRevaluationItemOut]
+    dry_run: bool
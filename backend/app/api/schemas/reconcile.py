@@ -19,6 +19,7 @@ class ReconcileSessionOut(BaseModel):
     account_id: str
     statement_date: date
     ending_balance: Decimal
+    opening_balance: Decimal = Decimal("0")  # 上次完成对账后的已对账余额
     status: str
 
 
@@ -38,8 +39,10 @@ class ReconcileDetailOut(BaseModel):
     session: ReconcileSessionOut
     items: list[ReconcileRegisterItem]
     selected_total: Decimal
+    selected_count: int = 0
     account_total_asof_date: Decimal
     difference: Decimal
+    next_cursor: str | None = None  # 还有更多候选时返回，传给 ?after= 取下一页
 
 
 class ReconcileToggleIn(BaseModel):
@@ -47,9 +50,133 @@ class ReconcileToggleIn(BaseModel):
     selected: bool = True
 
 
+class ReconcileToggleOut(BaseModel):
+    session_id: str
+    item: ReconcileRegisterItem
+    selected_total: Decimal
+    selected_count: int
+    account_total_asof_date: Decimal
+    difference: Decimal
+
+
 class ReconcileFinishOut(BaseModel):
     session_id: str
     status: str
     difference: Decimal
 
 
+class ReconcileBulkIn(BaseModel):
+    selected: bool = True
+    # 明确的分录列表，或按条件筛选（条件之间为 AND；至少指定一项）
+    split_ids: list[str] | None = None
+    date_from: date | None = None
+    date_to: date | None = None
+    amount_min: Decimal | None = None
+    amount_max: Decimal | None = None
+    memo_contains: str | None = Field(default=None, max_length=200)
+    cleared_only: bool = False
+
+
+class ReconcileBulkOut(BaseModel):
+    session_id: str
+    affected: int
+    selected_total: Decimal
+    selected_count: int
+    account_total_asof_date: Decimal
+    difference: Decimal
+
+
+class StatementImportOut(BaseModel):
+    session_id: str
+    format: str
+    encoding: str
+    inserted: int
+    skipped: int
+    closing_balance: Decimal | None = None
+    warnings: list[str] = []
+
+
+class StatementLineOut(BaseModel):
+    line_no: int
+    txn_date: date
+    amount: Decimal
+    description: str
+    reference: str
+    counterparty: str
+
+
+class StatementLinesOut(BaseModel):
+    session_id: str
+    lines: list[StatementLineOut]
+    next_after_line_no: int | None = None
+
+
+class ReconcileAutoMatchIn(BaseModel):
+    window_days: int = Field(default=3, ge=0, le=31)
+
+
+class ReconcileAutoMatchOut(BaseModel):
+    session_id: str
+    lines_considered: int
+    candidates_considered: int
+    proposals: int
+    by_rule: dict[str, int]
+
+
+class ReconcileProposalSplit(BaseModel):
+    split_id: str
+    txn_date: str
+    description: str
+    value: Decimal
+
+
+class ReconcileProposalOut(BaseModel):
+    group_no: int
+    rule: str
+    confidence: Decimal
+    line: StatementLineOut
+    splits: list[ReconcileProposalSplit]
+
+
+class ReconcileProposalsOut(BaseModel):
+    session_id: str
+    proposals: list[ReconcileProposalOut]
+    next_after_group_no: int | None = None
+
+
+class ReconcileAcceptIn(BaseModel):
+    # 按置信度阈值或指定建议组接受（二者同时给出时取交集；至少指定一项）
+    min_confidence: Decimal | None = Field(default=None, ge=0, le=1)
+    group_nos: list[int] | None = None
+
+
+class BankRuleIn(BaseModel):
+    book_id: str
+    name: str = Field(min_length=1, max_length=128)
+    priority: int = 100
+    enabled: bool = True
+    match_type: str = Field(default="KEYWORD", pattern="^(KEYWORD|REGEX)$")
+    pattern: str = Field(default="", max_length=256)
+    counterparty: str = Field(default="", max_length=255)
+    min_amount: Decimal | None = None
+    max_amount: Decimal | None = None
+    counter_account_id: str
+    memo: str = Field(default="", max_length=256)
+
+
+class BankRuleOut(BankRuleIn):
+    id: str
+
+
+class ReconcileCategorizeIn(BaseModel):
+    dry_run: bool = False
+
+
+class ReconcileCategorizeOut(BaseModel):
+    session_id: str
+    lines_considered: int
+    matched: int
+    drafts_created: int
+    skipped_period: int
+    by_rule: dict[str, int]
+    dry_run: bool
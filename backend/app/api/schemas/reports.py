@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from datetime import date
 from decimal import Decimal
 from typing import Any, Literal
 
@@ -38,6 +39,56 @@ class ReportGenerateResponse(BaseModel):
     snapshot_id: str
 
 
+class ReportMappingRow(BaseModel):
+    statement_type: Literal["BS", "IS", "CF"]
+    item_code: str
+    account_id: str
+    account_code: str = ""
+    account_name: str = ""
+    include_children: bool = True
+    direction: Literal["NET", "DEBIT", "CREDIT"] = "NET"
+
+
+class ReportMappingsOut(BaseModel):
+    book_id: str
+    basis_code: str
+    mappings_version: int
+    mappings: list[ReportMappingRow]
+
+
+class ReportMappingsReplaceIn(BaseModel):
+    book_id: str
+    basis_code: str
+    mappings: list[ReportMappingRow] = Field(default_factory=list)
+
+
+class ReportMappingsPreviewIn(BaseModel):
+    book_id: str
+    period_id: str
+    basis_code: str
+    mappings: list[ReportMappingRow] = Field(default_factory=list)
+
+
+class ReportPreviewDiffRow(BaseModel):
+    statement_type: str
+    code: str
+    name: str
+    current: Decimal | None = None
+    proposed: Decimal
+    delta: Decimal
+
+
+class ReportMappingsPreviewOut(BaseModel):
+    book_id: str
+    period_id: str
+    basis_code: str
+    snapshot_id: str | None = None
+    statements: dict[str, list[ReportItemAmount]]
+    checks: dict[str, Any]
+    conflicts: list[dict[str, Any]]
+    diff: list[ReportPreviewDiffRow]
+
+
 class DrilldownAccountAmount(BaseModel):
     account_id: str
     code: str
@@ -111,3 +162,67 @@ class ReportExportRequest(BaseModel):
     format: Literal["pdf", "excel"] = "excel"
 
 
+
+
+class CashForecastBucketOut(BaseModel):
+    start: date
+    end: date
+    scheduled_net: Decimal
+    receivables: Decimal
+    payables: Decimal
+    balance: Decimal
+
+
+class CashForecastAccountOut(BaseModel):
+    account_id: str
+    code: str
+    name: str
+    opening: Decimal
+    net: list[Decimal]
+    balance: list[Decimal]
+
+
+class CashForecastOut(BaseModel):
+    book_id: str
+    as_of: date
+    granularity: str
+    opening: Decimal
+    buckets: list[CashForecastBucketOut]
+    accounts: list[CashForecastAccountOut]
+    schedules: int
+    invoices: int
+    skipped_invoices: int = 0
+
+
+class PortfolioLotOut(BaseModel):
+    lot_id: str | None = None
+    opened: date
+    quantity: Decimal
+    cost: Decimal
+
+
+class PortfolioPositionOut(BaseModel):
+    account_id: str
+    account_code: str
+    account_name: str
+    commodity_id: str
+    commodity_code: str
+    quantity: Decimal
+    cost_basis: Decimal
+    price: Decimal | None = None
+    market_value: Decimal | None = None
+    unrealised: Decimal | None = None
+    realised: Decimal
+    lots: list[PortfolioLotOut]
+
+
+class PortfolioValuationOut(BaseModel):
+    book_id: str
+    as_of: date
+    method: str
+    positions: list[PortfolioPositionOut]
+    cost_basis: Decimal
+    market_value: Decimal
+    unrealised: Decimal
+    realised: Decimal
+    unpriced: int
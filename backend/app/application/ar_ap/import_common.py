@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import csv
+import io
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from app.application.engine.parsing import normalize_number
+
+# 发票 / 价格批量导入（CSV / JSONL）共用的解析工具
+
+HEAD_BYTES = 64 * 1024
+
+
+def norm_header(h: str) -> str:
+    return (h or "").strip().lower().replace(" ", "").replace("-", "_")
+
+
+def detect_encoding(head: bytes) -> str:
+    for enc in ("utf-8-sig", "gbk"):
+        for cut in range(0, 4):
+            try:
+                head[: len(head) - cut].decode(enc)
+                return enc
+            except UnicodeDecodeError:
+                continue
+    return "utf-8"
+
+
+def detect_format(filename: str | None, head: bytes) -> str:
+    name = (filename or "").lower()
+    if name.endswith((".jsonl", ".ndjson", ".json")):
+        return "JSONL"
+    if head.lstrip(b"\xef\xbb\xbf \t\r\n").startswith(b"{"):
+        return "JSONL"
+    return "CSV"
+
+
+def read_csv_header(text: io.TextIOBase, delimiter: str | None, aliases: dict[str, set[str]]) -> tuple[str, dict[str, int]]:
+    """读表头行：未指定分隔符时按表头中 制表符/分号/逗号 出现最多者判定；返回 (分隔符, 字段 -> 列号)，一列只对应一个字段。"""
+    header_line = text.readline()
+    if not header_line:
+        raise ValueError("导入文件为空")
+    if not delimiter:
+        counts = {d: header_line.count(d) for d in ("\t", ";", ",")}
+        delimiter = max(counts, key=lambda d: counts[d]) if max(counts.values()) > 0 else ","
+    headers = next(csv.reader([header_line], delimiter=delimiter))
+    cols: dict[str, int] = {}
+    for key, names in aliases.items():
+        norm = {norm_header(a) for a in names}
+        for i, h in enumerate(headers):
+            if norm_header(h) in norm and i not in cols.values():
+                cols[key] = i
+                break
+    return delimiter, cols
+
+
+def parse_date(v: str) -> date | None:
+    s = (v or "").strip()
+    if not s:
+        return None
+    for fmt, n in (("%Y-%m-%d", 10), ("%Y/%m/%d", 10), ("%Y%m%d", 8)):
+        try:
+            return datetime.strptime(s[:n], fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"日期无法解析：{s}")
+
+
+def parse_decimal(v, name: str, default: str, *, precision: int = 18, scale: int = 4, decimal_comma: bool = False) -> Decimal:
+    """解析数值；小数点按 normalize_number 判定，"1,234" 这类歧义写法、NaN/Infinity 与超出 Numeric(precision, scale) 整数位的值按无法解析处理。"""
+    s = str(v).strip() if v is not None else ""
+    if not s:
+        return Decimal(default)
+    norm = normalize_number(s.replace(" ", ""), decimal_comma=decimal_comma)
+    if norm is None:
+        raise ValueError(f"{name} 小数点不明确：{s}")
+    try:
+        d = Decimal(norm)
+    except InvalidOperation:
+        raise ValueError(f"{name} 无法解析：{s}")
+    if not d.is_finite():
+        raise ValueError(f"{name} 无法解析：{s}")
+    if d and d.adjusted() >= precision - scale:
+        raise ValueError(f"{name} 超出范围：{s}")
+    return d
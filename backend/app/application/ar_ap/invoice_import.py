@@ -0,0 +1,425 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import BinaryIO, Iterator
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.application.ar_ap.import_common import HEAD_BYTES, detect_encoding, detect_format, parse_date, parse_decimal, read_csv_header
+from app.application.ar_ap.service import CONTROL_ACCOUNT_CODES, _calc_invoice_lines, invoice_draft_lines
+from app.application.gl.draft_workflow import draft_snapshot_payload
+from app.infra.db.models import (
+    Account,
+    AccountingPeriod,
+    Book,
+    Commodity,
+    Invoice,
+    InvoiceLine,
+    Lot,
+    Party,
+    TransactionDraft,
+    TransactionDraftLine,
+    TransactionDraftRevision,
+    utcnow,
+    uuid_str,
+)
+
+_BATCH_SIZE = 1000
+_MAX_ERRORS = 500
+
+FORMATS = ("CSV", "JSONL")
+TAX_PAYABLE_CODE = "2221"
+
+
+@dataclass(frozen=True)
+class InvoiceImportError:
+    row_no: int  # CSV：该发票第一行的行号；JSONL：行号
+    doc_no: str
+    error: str
+
+
+@dataclass(frozen=True)
+class InvoiceImportResult:
+    book_id: str
+    format: str
+    invoices: int
+    lines: int
+    drafts: int
+    failed: int
+    errors: list[InvoiceImportError]
+    dry_run: bool
+
+
+@dataclass
+class _InvoiceIn:
+    row_no: int
+    head: dict[str, str]
+    lines: list[dict]
+    decimal_comma: bool = False  # 分号分隔的欧式 CSV：数值以逗号为小数点
+
+
+# ---------- 解析 ----------
+
+_CSV_ALIASES = {
+    "invoice_type": {"invoice_type", "type", "发票类型", "类型"},
+    "doc_no": {"doc_no", "invoice_no", "number", "发票号", "单据号"},
+    "doc_date": {"doc_date", "invoice_date", "date", "开票日期", "日期"},
+    "due_date": {"due_date", "到期日"},
+    "party": {"party", "customer", "vendor", "往来单位", "客户", "供应商"},
+    "currency": {"currency", "currency_code", "币种"},
+    "notes": {"notes", "发票备注"},
+    "account_code": {"account_code", "account", "科目代码", "科目编码"},
+    "description": {"description", "item", "摘要", "项目"},
+    "quantity": {"quantity", "qty", "数量"},
+    "unit_price": {"unit_price", "price", "单价"},
+    "tax_rate": {"tax_rate", "税率"},
+    "memo": {"memo", "备注"},
+}
+_HEAD_KEYS = ("invoice_type", "doc_no", "doc_date", "due_date", "party", "currency", "notes")
+_LINE_KEYS = ("account_code", "description", "quantity", "unit_price", "tax_rate", "memo")
+
+
+def _iter_csv(text: io.TextIOBase, delimiter: str | None) -> Iterator[_InvoiceIn]:
+    """一行一条发票明细；相邻且 (invoice_type, doc_no) 相同的行合并成一张发票，表头字段取第一行。"""
+    delimiter, cols = read_csv_header(text, delimiter, _CSV_ALIASES)
+    if "invoice_type" not in cols or "account_code" not in cols:
+        raise ValueError("CSV 必须包含 invoice_type 与 account_code 列")
+
+    def cell(row: list[str], key: str) -> str:
+        i = cols.get(key)
+        return row[i].strip() if i is not None and i < len(row) else ""
+
+    cur: _InvoiceIn | None = None
+    for row_no, row in enumerate(csv.reader(text, delimiter=delimiter), start=2):
+        if not row or not any(x.strip() for x in row):
+            continue
+        key = (cell(row, "invoice_type").upper(), cell(row, "doc_no"))
+        if cur is None or not key[1] or key != (cur.head["invoice_type"].upper(), cur.head["doc_no"]):
+            if cur is not None:
+                yield cur
+            cur = _InvoiceIn(row_no=row_no, head={k: cell(row, k) for k in _HEAD_KEYS}, lines=[], decimal_comma=delimiter == ";")
+        cur.lines.append({k: cell(row, k) for k in _LINE_KEYS})
+    if cur is not None:
+        yield cur
+
+
+def _iter_jsonl(text: io.TextIOBase) -> Iterator[_InvoiceIn]:
+    """一行一张发票：{"invoice_type", "doc_no", ..., "lines": [{"account_code", "quantity", ...}]}。"""
+    for row_no, raw in enumerate(text, start=1):
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            obj = json.loads(raw)
+        except ValueError:
+            yield _InvoiceIn(row_no=row_no, head={}, lines=[{"_error": "JSON 无法解析"}])
+            continue
+        if not isinstance(obj, dict):
+            yield _InvoiceIn(row_no=row_no, head={}, lines=[{"_error": "每行必须是 JSON 对象"}])
+            continue
+        lines = obj.get("lines") if isinstance(obj.get("lines"), list) else []
+        yield _InvoiceIn(
+            row_no=row_no,
+            head={k: str(obj.get(k) if obj.get(k) is not None else "").strip() for k in _HEAD_KEYS},
+            lines=[ln if isinstance(ln, dict) else {"_error": "明细必须是 JSON 对象"} for ln in lines],
+        )
+
+
+def _iter_invoices(fp: BinaryIO, fmt: str, encoding: str, delimiter: str | None) -> Iterator[_InvoiceIn]:
+    text = io.TextIOWrapper(fp, encoding=encoding, errors="replace", newline="")
+    try:
+        if fmt == "JSONL":
+            yield from _iter_jsonl(text)
+        else:
+            yield from _iter_csv(text, delimiter)
+    finally:
+        text.detach()
+
+
+# ---------- 导入 ----------
+
+
+class _Refs:
+    """一次性预加载的参照数据：科目、往来单位、币种、开放期间、已有发票号。"""
+
+    def __init__(self, db: Session, book: Book, *, create_draft: bool) -> None:
+        self.accounts: dict[str, tuple[str, str | None]] = {}  # code/id -> (id, 不可用原因)
+        for a in db.query(Account.id, Account.code, Account.name, Account.is_active, Account.allow_post).filter(Account.book_id == book.id).all():
+            why = None if a.is_active and a.allow_post else f"科目不可用：{a.code} {a.name}"
+            self.accounts[a.code] = (str(a.id), why)
+            self.accounts[str(a.id)] = (str(a.id), why)
+        self.parties: dict[tuple[str, str], str] = {}
+        for p in db.query(Party.id, Party.type, Party.name).all():
+            self.parties[(p.type, p.name)] = str(p.id)
+            self.parties.setdefault(("", p.name), str(p.id))
+            self.parties[("", str(p.id))] = str(p.id)
+        self.currencies = {c.code.upper(): str(c.id) for c in db.query(Commodity.id, Commodity.code).filter(Commodity.type == "CURRENCY").all()}
+        self.base_currency_id = str(book.base_currency_id)
+        self.periods = {
+            (int(p.year), int(p.month)): str(p.id)
+            for p in db.query(AccountingPeriod.id, AccountingPeriod.year, AccountingPeriod.month)
+            .filter(AccountingPeriod.book_id == book.id, AccountingPeriod.status == "OPEN")
+            .all()
+        }
+        self.doc_nos = {
+            (t, n) for t, n in db.query(Invoice.invoice_type, Invoice.doc_no).filter(Invoice.book_id == book.id, Invoice.doc_no != "").all()
+        }
+        self.control: dict[str, str] = {}
+        self.tax_account_id: str | None = None
+        if create_draft:
+            # 控制科目与 create_invoice 一致；缺失时整个批次都无法生成草稿，直接报错
+            for t, code in CONTROL_ACCOUNT_CODES.items():
+                aid, why = self.accounts.get(code, (None, f"缺少科目(code={code})，请先初始化科目树"))
+                if why:
+                    raise ValueError(why)
+                self.control[t] = aid
+            aid, why = self.accounts.get(TAX_PAYABLE_CODE, (None, f"缺少科目(code={TAX_PAYABLE_CODE})，请先初始化科目树"))
+            if why:
+                raise ValueError(why)
+            self.tax_account_id = aid
+
+
+def _validate(item: _InvoiceIn, refs: _Refs) -> dict:
+    h = item.head
+    invoice_type = (h.get("invoice_type") or "").upper()
+    if invoice_type not in CONTROL_ACCOUNT_CODES:
+        raise ValueError("invoice_type 必须是 AR/AP")
+    doc_no = h.get("doc_no") or ""
+    if len(doc_no) > 32:
+        raise ValueError("发票号过长（最多 32 个字符）")
+    if doc_no and (invoice_type, doc_no) in refs.doc_nos:
+        raise ValueError("发票号已存在")
+    doc_day = parse_date(h.get("doc_date") or "") or utcnow().date()
+    period_id = refs.periods.get((doc_day.year, doc_day.month))
+    if not period_id:
+        raise ValueError(f"开票日期所在期间未开放/不存在：{doc_day.isoformat()}")
+    party_id = None
+    if h.get("party"):
+        party_type = "CUSTOMER" if invoice_type == "AR" else "VENDOR"
+        party_id = refs.parties.get((party_type, h["party"])) or refs.parties.get(("", h["party"]))
+        if not party_id:
+            raise ValueError(f"往来单位不存在：{h['party']}")
+    code = (h.get("currency") or "").upper()
+    currency_id = refs.currencies.get(code) if code else refs.base_currency_id
+    if not currency_id:
+        raise ValueError(f"币种不存在：{code}")
+    if not item.lines:
+        raise ValueError("发票没有明细")
+
+    raw_lines: list[dict] = []
+    for i, ln in enumerate(item.lines, start=1):
+        if ln.get("_error"):
+            raise ValueError(ln["_error"])
+        key = str(ln.get("account_code") or ln.get("account_id") or "").strip()
+        aid, why = refs.accounts.get(key, (None, f"第{i}行科目不存在：{key}"))
+        if why:
+            raise ValueError(why)
+        raw_lines.append(
+            {
+                "description": str(ln.get("description") or "")[:256],
+                "account_id": aid,
+                "quantity": parse_decimal(ln.get("quantity"), f"第{i}行数量", "1", decimal_comma=item.decimal_comma),
+                "unit_price": parse_decimal(ln.get("unit_price"), f"第{i}行单价", "0", decimal_comma=item.decimal_comma),
+                "tax_rate": parse_decimal(ln.get("tax_rate"), f"第{i}行税率", "0", precision=9, scale=6, decimal_comma=item.decimal_comma),
+                "memo": str(ln.get("memo") or "")[:256],
+            }
+        )
+    norm_lines, total_net, total_tax, total_gross = _calc_invoice_lines(raw_lines)
+    if total_gross.adjusted() >= 16:
+        raise ValueError(f"发票金额超出范围：{total_gross}")
+    return {
+        "invoice_type": invoice_type,
+        "doc_no": doc_no,
+        "doc_date": datetime.combine(doc_day, datetime.min.time()),
+        "due_date": parse_date(h.get("due_date") or ""),
+        "party_id": party_id,
+        "currency_id": currency_id,
+        "period_id": period_id,
+        "notes": (h.get("notes") or "")[:1024],
+        "norm_lines": norm_lines,
+        "total_net": total_net,
+        "total_tax": total_tax,
+        "total_gross": total_gross,
+    }
+
+
+class _Batch:
+    def __init__(self) -> None:
+        self.lots: list[dict] = []
+        self.invoices: list[dict] = []
+        self.invoice_lines: list[dict] = []
+        self.drafts: list[dict] = []
+        self.draft_lines: list[dict] = []
+        self.revisions: list[dict] = []
+
+    def flush(self, db: Session) -> None:
+        # 按外键依赖顺序：lot -> 发票 -> 明细 -> 草稿 -> 草稿行 -> 修订
+        for model, rows in (
+            (Lot, self.lots),
+            (Invoice, self.invoices),
+            (InvoiceLine, self.invoice_lines),
+            (TransactionDraft, self.drafts),
+            (TransactionDraftLine, self.draft_lines),
+            (TransactionDraftRevision, self.revisions),
+        ):
+            for k in range(0, len(rows), _BATCH_SIZE):
+                db.execute(sa.insert(model.__table__), rows[k : k + _BATCH_SIZE])
+            rows.clear()
+
+
+def import_invoices(
+    db: Session,
+    book_id: str,
+    fp: BinaryIO,
+    *,
+    filename: str | None = None,
+    fmt: str | None = None,
+    delimiter: str | None = None,
+    create_draft: bool = True,
+    dry_run: bool = False,
+    actor_user_id: str | None = None,
+) -> InvoiceImportResult:
+    """
+    批量导入 AR/AP 发票（CSV 按行明细 / JSONL 按张），逐张校验、整批写入：
+    - 科目、往来单位、币种、开放期间、已有发票号一次性预加载，校验不再逐行查库；
+    - 校验失败的发票记入 errors 并跳过，不影响同批其他发票；
+    - 发票/明细/lot/草稿/草稿行/修订按 _BATCH_SIZE 张一批用批量 INSERT 写入，语义与 create_invoice 一致。
+    """
+    head = fp.read(HEAD_BYTES)
+    fp.seek(0)
+    fmt = (fmt or detect_format(filename, head)).upper()
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的导入格式：{fmt}（支持 {'/'.join(FORMATS)}）")
+    encoding = detect_encoding(head)
+
+    errors: list[InvoiceImportError] = []
+    failed = invoices = lines = drafts = 0
+    with db.begin():
+        book = db.query(Book).filter(Book.id == book_id).one_or_none()
+        if not book:
+            raise ValueError("账簿不存在")
+        refs = _Refs(db, book, create_draft=create_draft)
+
+        batch = _Batch()
+        now = utcnow()
+        for item in _iter_invoices(fp, fmt, encoding, delimiter):
+            try:
+                v = _validate(item, refs)
+            except (ValueError, ArithmeticError) as e:
+                # 数值溢出等 decimal 运算错误同样只记到这张发票上
+                msg = str(e) if isinstance(e, ValueError) else "数值超出范围，无法计算金额"
+                failed += 1
+                if len(errors) < _MAX_ERRORS:
+                    errors.append(InvoiceImportError(row_no=item.row_no, doc_no=item.head.get("doc_no", ""), error=msg))
+                continue
+            if v["doc_no"]:
+                refs.doc_nos.add((v["invoice_type"], v["doc_no"]))
+            invoices += 1
+            lines += len(v["norm_lines"])
+            if dry_run:
+                continue
+
+            inv_id = uuid_str()
+            lot_id = None
+            if create_draft:
+                lot_id = uuid_str()
+                batch.lots.append(
+                    {
+                        "id": lot_id,
+                        "book_id": book.id,
+                        "account_id": refs.control[v["invoice_type"]],
+                        "title": f"{v['invoice_type']} 发票 {v['doc_no']}".strip(),
+                        "notes": "",
+                        "is_closed": False,
+                        "opened_at": now,
+                        "closed_at": None,
+                    }
+                )
+            batch.invoices.append(
+                {
+                    "id": inv_id,
+                    "book_id": book.id,
+                    "invoice_type": v["invoice_type"],
+                    "status": "DRAFT",
+                    "doc_no": v["doc_no"],
+                    "doc_date": v["doc_date"],
+                    "due_date": v["due_date"],
+                    "party_id": v["party_id"],
+                    "currency_id": v["currency_id"],
+                    "notes": v["notes"],
+                    "total_net": v["total_net"],
+                    "total_tax": v["total_tax"],
+                    "total_gross": v["total_gross"],
+                    "applied_amount": Decimal("0"),
+                    "outstanding_amount": v["total_gross"],
+                    "posted_txn_id": None,
+                    "lot_id": lot_id,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+            )
+            for ln in v["norm_lines"]:
+                batch.invoice_lines.append({"id": uuid_str(), "invoice_id": inv_id, **ln})
+
+            if create_draft:
+                draft = {
+                    "id": uuid_str(),
+                    "book_id": book.id,
+                    "period_id": v["period_id"],
+                    "currency_id": v["currency_id"],
+                    "txn_date": v["doc_date"],
+                    "source_type": f"INVOICE_{v['invoice_type']}",
+                    "source_id": inv_id,
+                    "version": 1,
+                    "description": f"发票:{v['doc_no']}".strip(),
+                    "status": "DRAFT",
+                    "created_by": actor_user_id,
+                    "approved_by": None,
+                    "posted_txn_id": None,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                dl = invoice_draft_lines(
+                    v["invoice_type"],
+                    invoice_id=inv_id,
+                    norm_lines=v["norm_lines"],
+                    control_account_id=refs.control[v["invoice_type"]],
+                    tax_account_id=refs.tax_account_id,
+                    lot_id=lot_id,
+                )
+                batch.drafts.append(draft)
+                batch.draft_lines.extend({"id": uuid_str(), "draft_id": draft["id"], **ln} for ln in dl)
+                batch.revisions.append(
+                    {
+                        "id": uuid_str(),
+                        "draft_id": draft["id"],
+                        "rev_no": 1,
+                        "action": "CREATE",
+                        "reason": "BULK_IMPORT",
+                        "actor_id": actor_user_id,
+                        "at": now,
+                        "payload_json": draft_snapshot_payload(draft, dl),
+                    }
+                )
+                drafts += 1
+
+            if len(batch.invoices) >= _BATCH_SIZE:
+                batch.flush(db)
+        batch.flush(db)
+
+    return InvoiceImportResult(
+        book_id=book_id,
+        format=fmt,
+        invoices=invoices,
+        lines=lines,
+        drafts=drafts,
+        failed=failed,
+        errors=errors,
+        dry_run=dry_run,
+    )
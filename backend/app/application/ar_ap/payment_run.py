@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import csv
+import io
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.application.ar_ap.service import (
+    CONTROL_ACCOUNT_CODES,
+    _d,
+    _pending_applied,
+    _pending_payment_ids,
+    _q2,
+    _require_account,
+    _require_account_by_code,
+    _require_book,
+    _require_period_open,
+    payment_draft_lines,
+)
+from app.application.gl.draft_workflow import draft_snapshot_payload
+from app.infra.db.models import (
+    Commodity,
+    Invoice,
+    Lot,
+    Party,
+    Payment,
+    PaymentApplication,
+    TransactionDraft,
+    TransactionDraftLine,
+    TransactionDraftRevision,
+    utcnow,
+    uuid_str,
+)
+
+_BATCH_SIZE = 1000
+_CHUNK_PARTIES = 200
+
+
+@dataclass(frozen=True)
+class PaymentRunItem:
+    party_id: str
+    party_name: str
+    payment_id: str | None  # dry_run 时为 None
+    draft_id: str | None
+    amount: Decimal
+    invoice_count: int
+
+
+@dataclass(frozen=True)
+class PaymentRunResult:
+    run_ref: str
+    book_id: str
+    currency_code: str
+    due_on_or_before: date
+    payments: int
+    invoices: int
+    total: Decimal
+    items: list[PaymentRunItem]
+    dry_run: bool
+
+
+def _due_invoices(book_id: str, currency_id: str, cutoff: date, party_ids: list[str] | None, *, skip_pending: bool = True):
+    inv = Invoice.__table__
+    q = sa.select(inv.c.id, inv.c.party_id, inv.c.doc_no, inv.c.outstanding_amount, inv.c.lot_id).where(
+        inv.c.book_id == book_id,
+        inv.c.invoice_type == "AP",
+        inv.c.status == "POSTED",
+        inv.c.outstanding_amount > 0,
+        inv.c.currency_id == currency_id,
+        inv.c.party_id.is_not(None),
+        # 无到期日的按开票日算
+        sa.or_(inv.c.due_date <= cutoff, sa.and_(inv.c.due_date.is_(None), inv.c.doc_date < datetime.combine(cutoff + timedelta(days=1), datetime.min.time()))),
+    )
+    # 已有待过账付款核销的发票（例如上一批次的草稿还没过账）不重复付款；草稿被驳回的付款不再占用。
+    # 加锁查询不能带这个子查询（READ COMMITTED 下 FOR UPDATE 不会重新评估它），锁定后用 _pending_applied 另行剔除。
+    if skip_pending:
+        pending = sa.select(PaymentApplication.invoice_id).where(PaymentApplication.payment_id.in_(_pending_payment_ids(book_id)))
+        q = q.where(inv.c.id.not_in(pending))
+    if party_ids:
+        q = q.where(inv.c.party_id.in_(party_ids))
+    return q
+
+
+def run_ap_payments(
+    db: Session,
+    *,
+    book_id: str,
+    period_id: str,
+    pay_date: datetime,
+    due_on_or_before: date,
+    cash_account_id: str,
+    party_ids: list[str] | None = None,
+    currency_code: str | None = None,
+    method: str = "BANK",
+    dry_run: bool = False,
+    actor_user_id: str | None = None,
+    chunk_parties: int = _CHUNK_PARTIES,
+) -> PaymentRunResult:
+    """
+    付款批次：把截止日前到期的 AP 发票按供应商汇总，每个供应商一笔付款（付清各发票未结金额）+ 一张 DISBURSEMENT 草稿。
+    - 币种取付款银行科目的币种，只处理同币种发票；已有未过账付款核销的发票跳过；
+    - 按 chunk_parties 个供应商一个事务，事务内锁定发票、批量 INSERT 付款/核销/lot/草稿/草稿行/修订；
+    - 本批次的付款 reference_no 统一为 run_ref，用于导出银行付款文件。
+    """
+    with db.begin():
+        _require_period_open(db, period_id)
+        _require_book(db, book_id)
+        cash = _require_account(db, book_id, cash_account_id)
+        cur = db.query(Commodity).filter(Commodity.id == cash.commodity_id).one()
+        if currency_code and currency_code.upper() != cur.code.upper():
+            raise ValueError("付款币种必须与银行科目币种一致（当前版本限制）")
+        control_id = str(_require_account_by_code(db, book_id, CONTROL_ACCOUNT_CODES["AP"]).id)
+        cash_id, currency_id, cur_code = str(cash.id), str(cur.id), cur.code
+        due = _due_invoices(book_id, currency_id, due_on_or_before, party_ids).subquery()
+        parties = db.execute(
+            sa.select(Party.id, Party.name).where(Party.id.in_(sa.select(due.c.party_id).distinct())).order_by(Party.name.asc(), Party.id.asc())
+        ).all()
+
+    run_ref = f"RUN-{pay_date:%Y%m%d}-{uuid_str()[:8]}"
+    items: list[PaymentRunItem] = []
+    invoices = 0
+    for k in range(0, len(parties), max(1, chunk_parties)):
+        chunk = parties[k : k + max(1, chunk_parties)]
+        names = {str(p.id): p.name for p in chunk}
+        with db.begin():
+            q = _due_invoices(book_id, currency_id, due_on_or_before, list(names), skip_pending=False)
+            q = q.order_by(Invoice.__table__.c.party_id.asc(), Invoice.__table__.c.due_date.asc(), Invoice.__table__.c.id.asc())
+            rows = db.execute(q if dry_run else q.with_for_update()).all()
+            # 先锁发票再读占用：并发批次已提交的付款核销在这里才能读到
+            reserved = _pending_applied(db, book_id, [str(r.id) for r in rows])
+            rows = [r for r in rows if str(r.id) not in reserved]
+            by_party: dict[str, list] = {}
+            for r in rows:
+                by_party.setdefault(str(r.party_id), []).append(r)
+
+            now = utcnow()
+            payments: list[dict] = []
+            applications: list[dict] = []
+            lots: list[dict] = []
+            lot_links: list[dict] = []
+            drafts: list[dict] = []
+            draft_lines: list[dict] = []
+            revisions: list[dict] = []
+            for party_id, invs in by_party.items():
+                amount = _q2(sum((_d(r.outstanding_amount) for r in invs), Decimal("0")))
+                invoices += len(invs)
+                if dry_run:
+                    items.append(PaymentRunItem(party_id, names[party_id], None, None, amount, len(invs)))
+                    continue
+                pay_id = uuid_str()
+                payments.append(
+                    {
+                        "id": pay_id,
+                        "book_id": book_id,
+                        "payment_type": "DISBURSEMENT",
+                        "status": "DRAFT",
+                        "pay_date": pay_date,
+                        "party_id": party_id,
+                        "currency_id": currency_id,
+                        "amount": amount,
+                        "method": method or "",
+                        "reference_no": run_ref,
+                        "notes": f"付款批次 {run_ref}",
+                        "txn_id": None,
+                        "created_at": now,
+                        "updated_at": now,
+                    }
+                )
+                applied: list[tuple[str, str, Decimal]] = []
+                for r in invs:
+                    lot_id = r.lot_id
+                    if not lot_id:
+                        lot_id = uuid_str()
+                        lots.append(
+                            {
+                                "id": lot_id,
+                                "book_id": book_id,
+                                "account_id": control_id,
+                                "title": f"AP 发票 {r.doc_no}".strip(),
+                                "notes": "",
+                                "is_closed": False,
+                                "opened_at": now,
+                                "closed_at": None,
+                            }
+                        )
+                        lot_links.append({"b_id": r.id, "b_lot": lot_id})
+                    amt = _q2(_d(r.outstanding_amount))
+                    applications.append({"id": uuid_str(), "payment_id": pay_id, "invoice_id": r.id, "amount": amt, "applied_at": now})
+                    applied.append((str(r.id), str(lot_id), amt))
+
+                draft = {
+                    "id": uuid_str(),
+                    "book_id": book_id,
+                    "period_id": period_id,
+                    "currency_id": currency_id,
+                    "txn_date": pay_date,
+                    "source_type": "PAYMENT_DISBURSEMENT",
+                    "source_id": pay_id,
+                    "version": 1,
+                    "description": f"收付款:{run_ref}",
+                    "status": "DRAFT",
+                    "created_by": actor_user_id,
+                    "approved_by": None,
+                    "posted_txn_id": None,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                lines = payment_draft_lines(
+                    "DISBURSEMENT",
+                    payment_id=pay_id,
+                    cash_account_id=cash_id,
+                    control_account_id=control_id,
+                    amount=amount,
+                    applied=applied,
+                )
+                drafts.append(draft)
+                draft_lines.extend({"id": uuid_str(), "draft_id": draft["id"], **ln} for ln in lines)
+                revisions.append(
+                    {
+                        "id": uuid_str(),
+                        "draft_id": draft["id"],
+                        "rev_no": 1,
+                        "action": "CREATE",
+                        "reason": "PAYMENT_RUN",
+                        "actor_id": actor_user_id,
+                        "at": now,
+                        "payload_json": draft_snapshot_payload(draft, lines),
+                    }
+                )
+                items.append(PaymentRunItem(party_id, names[party_id], pay_id, draft["id"], amount, len(invs)))
+
+            for model, batch in (
+                (Lot, lots),
+                (Payment, payments),
+                (PaymentApplication, applications),
+                (TransactionDraft, drafts),
+                (TransactionDraftLine, draft_lines),
+                (TransactionDraftRevision, revisions),
+            ):
+                for j in range(0, len(batch), _BATCH_SIZE):
+                    db.execute(sa.insert(model.__table__), batch[j : j + _BATCH_SIZE])
+            if lot_links:
+                inv = Invoice.__table__
+                db.execute(
+                    inv.update().where(inv.c.id == sa.bindparam("b_id")).values(lot_id=sa.bindparam("b_lot"), updated_at=now),
+                    lot_links,
+                )
+
+    return PaymentRunResult(
+        run_ref=run_ref,
+        book_id=book_id,
+        currency_code=cur_code,
+        due_on_or_before=due_on_or_before,
+        payments=len(items),
+        invoices=invoices,
+        total=sum((x.amount for x in items), Decimal("0")),
+        items=items,
+        dry_run=dry_run,
+    )
+
+
+PAYMENT_FILE_HEADERS = ["run_ref", "payment_id", "pay_date", "vendor", "tax_no", "bank_name", "bank_account", "currency", "amount", "invoices"]
+
+
+def payment_run_csv(db: Session, *, book_id: str, run_ref: str) -> str:
+    """导出付款批次的银行付款文件：每笔付款一行，收款账户取往来单位 contact_json 中的 bank_name/bank_account。"""
+    pays = db.execute(
+        sa.select(Payment.id, Payment.pay_date, Payment.amount, Party.name, Party.tax_no, Party.contact_json, Commodity.code)
+        .join(Party, Party.id == Payment.party_id)
+        .join(Commodity, Commodity.id == Payment.currency_id)
+        .where(Payment.book_id == book_id, Payment.reference_no == run_ref, Payment.payment_type == "DISBURSEMENT")
+        .order_by(Party.name.asc(), Payment.id.asc())
+    ).all()
+    if not pays:
+        raise ValueError("付款批次不存在")
+    doc_nos: dict[str, list[str]] = {}
+    for pid, doc_no in db.execute(
+        sa.select(PaymentApplication.payment_id, Invoice.doc_no)
+        .join(Invoice, Invoice.id == PaymentApplication.invoice_id)
+        .join(Payment, Payment.id == PaymentApplication.payment_id)
+        .where(Payment.book_id == book_id, Payment.reference_no == run_ref)
+        .order_by(Invoice.doc_no.asc())
+    ).all():
+        doc_nos.setdefault(str(pid), []).append(doc_no)
+
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(PAYMENT_FILE_HEADERS)
+    for p in pays:
+        contact = p.contact_json or {}
+        w.writerow(
+            [
+                run_ref,
+                str(p.id),
+                p.pay_date.date().isoformat(),
+                p.name,
+                p.tax_no,
+                contact.get("bank_name", ""),
+                contact.get("bank_account", ""),
+                p.code,
+                str(_q2(_d(p.amount))),
+                " ".join(x for x in doc_nos.get(str(p.id), []) if x),
+            ]
+        )
+    return buf.getvalue()
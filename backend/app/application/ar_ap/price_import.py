@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.application.ar_ap.import_common import HEAD_BYTES, detect_encoding, detect_format, parse_date, parse_decimal, read_csv_header
+from app.application.engine.versions import bump_prices_version
+from app.infra.db.models import Book, Commodity, Price, utcnow, uuid_str
+
+_CHUNK_SIZE = 1000
+_MAX_ERRORS = 500
+
+FORMATS = ("CSV", "JSONL")
+PRICE_UNIQUE_CONSTRAINT = "uq_prices_pair_date_source_type"
+_UNIQUE_COLS = ("book_id", "commodity_id", "currency_id", "price_date", "source", "type")
+
+
+@dataclass(frozen=True)
+class PriceImportError:
+    row_no: int
+    error: str
+
+
+@dataclass(frozen=True)
+class PriceImportResult:
+    book_id: str
+    format: str
+    rows: int
+    upserted: int  # 去重后写入（插入或更新）的行数
+    chunks: int
+    failed: int
+    errors: list[PriceImportError]
+    dry_run: bool
+
+
+# ---------- 解析 ----------
+
+_CSV_ALIASES = {
+    "commodity": {"commodity", "commodity_code", "symbol", "商品"},
+    "currency": {"currency", "currency_code", "quote", "计价币种"},
+    "date": {"date", "price_date", "日期"},
+    "value": {"value", "price", "rate", "价格", "汇率"},
+    "source": {"source", "来源"},
+    "type": {"type", "price_type", "类型"},
+    "commodity_type": {"commodity_type", "商品类型"},
+    "currency_type": {"currency_type"},
+}
+_KEYS = tuple(_CSV_ALIASES)
+
+
+def _iter_csv(text: io.TextIOBase, delimiter: str | None) -> Iterator[tuple[int, dict]]:
+    delimiter, cols = read_csv_header(text, delimiter, _CSV_ALIASES)
+    missing = [k for k in ("commodity", "currency", "date", "value") if k not in cols]
+    if missing:
+        raise ValueError(f"CSV 缺少列：{', '.join(missing)}")
+    for row_no, row in enumerate(csv.reader(text, delimiter=delimiter), start=2):
+        if not row or not any(x.strip() for x in row):
+            continue
+        # 分号分隔的欧式 CSV 以逗号为小数点（"7,1234"）
+        yield row_no, {**{k: row[i].strip() if i < len(row) else "" for k, i in cols.items()}, "_decimal_comma": delimiter == ";"}
+
+
+def _iter_jsonl(text: io.TextIOBase) -> Iterator[tuple[int, dict]]:
+    for row_no, raw in enumerate(text, start=1):
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            obj = json.loads(raw)
+        except ValueError:
+            yield row_no, {"_error": "JSON 无法解析"}
+            continue
+        if not isinstance(obj, dict):
+            yield row_no, {"_error": "每行必须是 JSON 对象"}
+            continue
+        # 兼容与单条接口相同的字段名
+        obj.setdefault("commodity", obj.get("commodity_code"))
+        obj.setdefault("currency", obj.get("currency_code"))
+        obj.setdefault("date", obj.get("price_date"))
+        yield row_no, {k: str(obj.get(k) if obj.get(k) is not None else "").strip() for k in _KEYS}
+
+
+class _Commodities:
+    def __init__(self, db: Session) -> None:
+        self.by_type_code = {(c.type.upper(), c.code.upper()): str(c.id) for c in db.query(Commodity.id, Commodity.type, Commodity.code).all()}
+
+    def get(self, type_: str, code: str) -> str:
+        cid = self.by_type_code.get(((type_ or "CURRENCY").upper(), code.upper()))
+        if not cid:
+            raise ValueError(f"commodity/currency 不存在：{(type_ or 'CURRENCY').upper()} {code}")
+        return cid
+
+
+def _validate(row: dict, book_id: str, refs: _Commodities) -> dict:
+    if row.get("_error"):
+        raise ValueError(row["_error"])
+    if not row.get("commodity") or not row.get("currency"):
+        raise ValueError("commodity/currency 不能为空")
+    com = refs.get(row.get("commodity_type") or "", row["commodity"])
+    cur = refs.get(row.get("currency_type") or "", row["currency"])
+    if com == cur:
+        raise ValueError("commodity 与 currency 不能相同")
+    d = parse_date(row.get("date") or "")
+    if d is None:
+        raise ValueError("日期不能为空")
+    if not row.get("value"):
+        raise ValueError("价格不能为空")
+    value = parse_decimal(row["value"], "价格", "0", precision=18, scale=8, decimal_comma=bool(row.get("_decimal_comma")))
+    if value <= 0:
+        raise ValueError("价格必须 > 0")
+    source = (row.get("source") or "IMPORT").upper()
+    type_ = (row.get("type") or "LAST").upper()
+    if len(source) > 32 or len(type_) > 32:
+        raise ValueError("source/type 过长（最多 32 个字符）")
+    return {
+        "book_id": book_id,
+        "commodity_id": com,
+        "currency_id": cur,
+        "price_date": d,
+        "source": source,
+        "type": type_,
+        "value": value,
+    }
+
+
+# ---------- 写入 ----------
+
+
+def _upsert_chunk(db: Session, rows: list[dict]) -> None:
+    """按 uq_prices_pair_date_source_type 批量 upsert：PG/SQLite 用 ON CONFLICT，MySQL 用 ON DUPLICATE KEY。"""
+    dialect = db.get_bind().dialect.name
+    tbl = Price.__table__
+    if dialect.startswith("postgres"):
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+        stmt = pg_insert(tbl)
+        db.execute(stmt.on_conflict_do_update(constraint=PRICE_UNIQUE_CONSTRAINT, set_={"value": stmt.excluded.value}), rows)
+        return
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+        stmt = sqlite_insert(tbl)
+        db.execute(stmt.on_conflict_do_update(index_elements=list(_UNIQUE_COLS), set_={"value": stmt.excluded.value}), rows)
+        return
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        stmt = mysql_insert(tbl)
+        db.execute(stmt.on_duplicate_key_update(value=stmt.inserted.value), rows)
+        return
+
+    # 其他方言：查出本批已存在的键，分别批量 UPDATE / INSERT
+    keys = {tuple(r[c] for c in _UNIQUE_COLS): r for r in rows}
+    existing = {
+        tuple(x[1:])
+        for x in db.execute(
+            sa.select(tbl.c.id, *(tbl.c[c] for c in _UNIQUE_COLS)).where(
+                tbl.c.book_id == rows[0]["book_id"],
+                tbl.c.price_date.in_({r["price_date"] for r in rows}),
+                tbl.c.commodity_id.in_({r["commodity_id"] for r in rows}),
+            )
+        ).all()
+    }
+    updates = [{**{f"b_{c}": k[i] for i, c in enumerate(_UNIQUE_COLS)}, "b_value": keys[k]["value"]} for k in keys if k in existing]
+    inserts = [r for k, r in keys.items() if k not in existing]
+    if updates:
+        db.execute(
+            tbl.update().where(*(tbl.c[c] == sa.bindparam(f"b_{c}") for c in _UNIQUE_COLS)).values(value=sa.bindparam("b_value")),
+            updates,
+        )
+    if inserts:
+        db.execute(sa.insert(tbl), inserts)
+
+
+def import_prices(
+    db: Session,
+    book_id: str,
+    fp: BinaryIO,
+    *,
+    filename: str | None = None,
+    fmt: str | None = None,
+    delimiter: str | None = None,
+    dry_run: bool = False,
+    chunk_size: int = _CHUNK_SIZE,
+) -> PriceImportResult:
+    """
+    批量导入价格/汇率（CSV / JSONL，字段 commodity, currency, date, value[, source, type, commodity_type, currency_type]）：
+    - 逐行校验，失败的行记入 errors 并跳过；
+    - 每 chunk_size 行一个事务，用数据库原生 upsert 按唯一约束插入或更新；同一批内重复的键以最后一行为准；
+    - 全部写完后递增一次 prices_version，使价格缓存失效（中途出错时已提交的批次同样会失效缓存）。
+    """
+    head = fp.read(HEAD_BYTES)
+    fp.seek(0)
+    fmt = (fmt or detect_format(filename, head)).upper()
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的导入格式：{fmt}（支持 {'/'.join(FORMATS)}）")
+    encoding = detect_encoding(head)
+
+    with db.begin():
+        if not db.query(Book.id).filter(Book.id == book_id).one_or_none():
+            raise ValueError("账簿不存在")
+        refs = _Commodities(db)
+
+    errors: list[PriceImportError] = []
+    rows = failed = upserted = chunks = 0
+    pending: dict[tuple, dict] = {}
+
+    def flush() -> None:
+        nonlocal upserted, chunks
+        if not pending:
+            return
+        if not dry_run:
+            now = utcnow()
+            with db.begin():
+                _upsert_chunk(db, [{"id": uuid_str(), "created_at": now, **r} for r in pending.values()])
+            chunks += 1
+        upserted += len(pending)
+        pending.clear()
+
+    text = io.TextIOWrapper(fp, encoding=encoding, errors="replace", newline="")
+    try:
+        it = _iter_jsonl(text) if fmt == "JSONL" else _iter_csv(text, delimiter)
+        for row_no, raw in it:
+            try:
+                r = _validate(raw, str(book_id), refs)
+            except ValueError as e:
+                failed += 1
+                if len(errors) < _MAX_ERRORS:
+                    errors.append(PriceImportError(row_no=row_no, error=str(e)))
+                continue
+            rows += 1
+            pending[tuple(r[c] for c in _UNIQUE_COLS)] = r
+            if len(pending) >= max(1, chunk_size):
+                flush()
+        flush()
+    finally:
+        text.detach()
+        if chunks:
+            with db.begin():
+                bump_prices_version(db, str(book_id))
+
+    return PriceImportResult(
+        book_id=str(book_id),
+        format=fmt,
+        rows=rows,
+        upserted=upserted,
+        chunks=chunks,
+        failed=failed,
+        errors=errors,
+        dry_run=dry_run,
+    )
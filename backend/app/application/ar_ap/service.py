@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from decimal import Decimal, ROUND_HALF_UP
 
 import sqlalchemy as sa
@@ -16,11 +16,13 @@ from app.infra.db.models import (
     Invoice,
     InvoiceLine,
     Lot,
+    Party,
     Payment,
     PaymentApplication,
     Price,
     TransactionDraft,
     TransactionDraftLine,
+    uuid_str,
 )
 
 
@@ -139,6 +141,83 @@ def _get_or_create_invoice_lot(db: Session, *, book_id: str, invoice: Invoice, c
     return lot
 
 
+def invoice_draft_lines(
+    invoice_type: str,
+    *,
+    invoice_id: str,
+    norm_lines: list[dict],
+    control_account_id: str,
+    tax_account_id: str | None,
+    lot_id: str,
+) -> list[dict]:
+    """发票草稿分录（不含 draft_id）；单张创建与批量导入共用。"""
+    out: list[dict] = []
+
+    def add_line(account_id: str, debit: Decimal, credit: Decimal, memo: str, aux: dict) -> None:
+        out.append(
+            {
+                "line_no": len(out) + 1,
+                "account_id": account_id,
+                "debit": _q2(debit),
+                "credit": _q2(credit),
+                "memo": memo or "",
+                "aux_json": aux,
+            }
+        )
+
+    if invoice_type == "AR":
+        # credit: revenue lines (net), credit: tax payable (tax), debit: AR control (gross)
+        total_tax2 = Decimal("0")
+        total_net2 = Decimal("0")
+        for ln in norm_lines:
+            total_net2 += _d(ln["amount"])
+            total_tax2 += _d(ln["tax_amount"])
+            add_line(
+                ln["account_id"],
+                debit=Decimal("0"),
+                credit=_d(ln["amount"]),
+                memo=ln["memo"] or ln["description"] or "贷：收入",
+                aux={"owner": "invoice", "invoice_id": invoice_id, "invoice_line_no": ln["line_no"], "role": "REVENUE"},
+            )
+        total_tax2 = _q2(total_tax2)
+        if total_tax2 != 0:
+            add_line(
+                str(tax_account_id),
+                debit=Decimal("0"),
+                credit=total_tax2,
+                memo="贷：应交税费",
+                aux={"owner": "invoice", "invoice_id": invoice_id, "role": "TAX"},
+            )
+        add_line(
+            control_account_id,
+            debit=_q2(_d(total_net2) + _d(total_tax2)),
+            credit=Decimal("0"),
+            memo="借：应收账款",
+            aux={"owner": "invoice", "invoice_id": invoice_id, "role": "AR", "lot_id": lot_id},
+        )
+    else:
+        # AP: debit expense/asset gross, credit AP control gross
+        total_gross2 = Decimal("0")
+        for ln in norm_lines:
+            gross = _q2(_d(ln["amount"]) + _d(ln["tax_amount"]))
+            total_gross2 += gross
+            add_line(
+                ln["account_id"],
+                debit=gross,
+                credit=Decimal("0"),
+                memo=ln["memo"] or ln["description"] or "借：成本/费用",
+                aux={"owner": "invoice", "invoice_id": invoice_id, "invoice_line_no": ln["line_no"], "role": "EXPENSE"},
+            )
+        add_line(
+            control_account_id,
+            debit=Decimal("0"),
+            credit=_q2(total_gross2),
+            memo="贷：应付账款",
+            aux={"owner": "invoice", "invoice_id": invoice_id, "role": "AP", "lot_id": lot_id},
+        )
+    return out
+
+
 @dataclass(frozen=True)
 class CreateInvoiceResult:
     invoice_id: str
@@ -184,6 +263,8 @@ def create_invoice(
             total_net=total_net,
             total_tax=total_tax,
             total_gross=total_gross,
+            applied_amount=Decimal("0"),
+            outstanding_amount=total_gross,
             posted_txn_id=None,
             lot_id=None,
             created_at=datetime.utcnow(),
@@ -240,79 +321,16 @@ def create_invoice(
             db.add(draft)
             db.flush()
 
-            def add_line(no: int, account_id: str, debit: Decimal, credit: Decimal, memo: str, aux: dict) -> None:
-                db.add(
-                    TransactionDraftLine(
-                        draft_id=str(draft.id),
-                        line_no=no,
-                        account_id=account_id,
-                        debit=_q2(debit),
-                        credit=_q2(credit),
-                        memo=memo or "",
-                        aux_json=aux,
-                    )
-                )
-
-            line_no = 1
-            if invoice_type == "AR":
-                # credit: revenue lines (net), credit: tax payable (tax), debit: AR control (gross)
-                tax_payable = _require_account_by_code(db, book_id, "2221")
-                total_tax2 = Decimal("0")
-                total_net2 = Decimal("0")
-                for ln in norm_lines:
-                    total_net2 += _d(ln["amount"])
-                    total_tax2 += _d(ln["tax_amount"])
-                    add_line(
-                        line_no,
-                        ln["account_id"],
-                        debit=Decimal("0"),
-                        credit=_d(ln["amount"]),
-                        memo=ln["memo"] or ln["description"] or "贷：收入",
-                        aux={"owner": "invoice", "invoice_id": str(inv.id), "invoice_line_no": ln["line_no"], "role": "REVENUE"},
-                    )
-                    line_no += 1
-                total_tax2 = _q2(total_tax2)
-                if total_tax2 != 0:
-                    add_line(
-                        line_no,
-                        str(tax_payable.id),
-                        debit=Decimal("0"),
-                        credit=total_tax2,
-                        memo="贷：应交税费",
-                        aux={"owner": "invoice", "invoice_id": str(inv.id), "role": "TAX"},
-                    )
-                    line_no += 1
-                add_line(
-                    line_no,
-                    str(control.id),
-                    debit=_q2(_d(total_net2) + _d(total_tax2)),
-                    credit=Decimal("0"),
-                    memo="借：应收账款",
-                    aux={"owner": "invoice", "invoice_id": str(inv.id), "role": "AR", "lot_id": str(lot.id)},
-                )
-            else:
-                # AP: debit expense/asset gross, credit AP control gross
-                total_gross2 = Decimal("0")
-                for ln in norm_lines:
-                    gross = _q2(_d(ln["amount"]) + _d(ln["tax_amount"]))
-                    total_gross2 += gross
-                    add_line(
-                        line_no,
-                        ln["account_id"],
-                        debit=gross,
-                        credit=Decimal("0"),
-                        memo=ln["memo"] or ln["description"] or "借：成本/费用",
-                        aux={"owner": "invoice", "invoice_id": str(inv.id), "invoice_line_no": ln["line_no"], "role": "EXPENSE"},
-                    )
-                    line_no += 1
-                add_line(
-                    line_no,
-                    str(control.id),
-                    debit=Decimal("0"),
-                    credit=_q2(total_gross2),
-                    memo="贷：应付账款",
-                    aux={"owner": "invoice", "invoice_id": str(inv.id), "role": "AP", "lot_id": str(lot.id)},
-                )
+            tax_payable_id = str(_require_account_by_code(db, book_id, "2221").id) if invoice_type == "AR" else None
+            for ln in invoice_draft_lines(
+                invoice_type,
+                invoice_id=str(inv.id),
+                norm_lines=norm_lines,
+                control_account_id=str(control.id),
+                tax_account_id=tax_payable_id,
+                lot_id=str(lot.id),
+            ):
+                db.add(TransactionDraftLine(draft_id=str(draft.id), **ln))
 
             db.flush()
             append_revision(db, draft, action="CREATE", reason="", actor_id=actor_user_id)
@@ -322,10 +340,115 @@ def create_invoice(
         return CreateInvoiceResult(invoice_id=str(inv.id), draft_id=draft_id)
 
 
+def payment_draft_lines(
+    payment_type: str,
+    *,
+    payment_id: str,
+    cash_account_id: str,
+    control_account_id: str,
+    amount: Decimal,
+    applied: list[tuple[str, str, Decimal]],
+    unapplied: Decimal = Decimal("0"),
+) -> list[dict]:
+    """
+    收/付款草稿分录（不含 draft_id）：applied 为 (invoice_id, lot_id, 金额)。
+    收款：借现金/银行，贷应收（按发票拆行并带 lot_id）；付款方向相反。未核销余额单独一行、不带 lot。
+    """
+    receipt = payment_type == "RECEIPT"
+    role = "AR" if receipt else "AP"
+    sign = Decimal("1") if receipt else Decimal("-1")
+    out: list[dict] = []
+
+    def add_line(account_id: str, value: Decimal, memo: str, aux: dict) -> None:
+        # value > 0 记借方，< 0 记贷方
+        out.append(
+            {
+                "line_no": len(out) + 1,
+                "account_id": account_id,
+                "debit": _q2(value) if value > 0 else Decimal("0"),
+                "credit": _q2(-value) if value < 0 else Decimal("0"),
+                "memo": memo,
+                "aux_json": aux,
+            }
+        )
+
+    add_line(cash_account_id, sign * amount, "借：现金/银行" if receipt else "贷：现金/银行", {"owner": "payment", "payment_id": payment_id, "role": "CASH"})
+    for invoice_id, lot_id, amt in applied:
+        add_line(
+            control_account_id,
+            -sign * amt,
+            "贷：应收账款" if receipt else "借：应付账款",
+            {"owner": "payment", "payment_id": payment_id, "invoice_id": invoice_id, "role": role, "lot_id": lot_id},
+        )
+    if unapplied > 0:
+        add_line(
+            control_account_id,
+            -sign * unapplied,
+            "贷：预收（未核销）" if receipt else "借：预付（未核销）",
+            {"owner": "payment", "payment_id": payment_id, "role": "UNAPPLIED"},
+        )
+    return out
+
+
 @dataclass(frozen=True)
 class CreatePaymentResult:
     payment_id: str
     draft_id: str | None
+    unapplied: Decimal = Decimal("0")  # 自动核销后未分配的余额（挂在控制科目上、不带 lot）
+
+
+PAYMENT_INVOICE_TYPES = {"RECEIPT": "AR", "DISBURSEMENT": "AP"}
+CONTROL_ACCOUNT_CODES = {"AR": "1122", "AP": "2001"}
+# 自动核销顺序：DUE_DATE=到期日最早优先（无到期日按开票日），DOC_DATE=开票日最早优先
+AUTO_APPLY_STRATEGIES = ("DUE_DATE", "DOC_DATE")
+
+
+# 草稿处于这些状态的收/付款尚未过账、也未被驳回：其核销额还没计入发票的 outstanding_amount
+PENDING_DRAFT_STATUSES = ("DRAFT", "SUBMITTED", "APPROVED")
+PAYMENT_DRAFT_SOURCE_TYPES = ("PAYMENT_RECEIPT", "PAYMENT_DISBURSEMENT")
+
+
+def _pending_payment_ids(book_id: str):
+    """草稿待过账的收/付款 id（子查询）。没有草稿或草稿已驳回的收/付款不算。"""
+    return (
+        sa.select(Payment.id)
+        .join(
+            TransactionDraft,
+            sa.and_(
+                TransactionDraft.book_id == Payment.book_id,
+                TransactionDraft.source_type.in_(PAYMENT_DRAFT_SOURCE_TYPES),
+                TransactionDraft.source_id == Payment.id,
+            ),
+        )
+        .where(Payment.book_id == book_id, Payment.status == "DRAFT", TransactionDraft.status.in_(PENDING_DRAFT_STATUSES))
+    )
+
+
+def _pending_applied(db: Session, book_id: str, invoice_ids: list[str]) -> dict[str, Decimal]:
+    """发票 -> 待过账收/付款已占用的核销额。须在锁定发票行之后调用，读到的是并发事务提交后的结果。"""
+    if not invoice_ids:
+        return {}
+    rows = (
+        db.query(PaymentApplication.invoice_id, sa.func.sum(PaymentApplication.amount))
+        .filter(PaymentApplication.invoice_id.in_(invoice_ids), PaymentApplication.payment_id.in_(_pending_payment_ids(book_id)))
+        .group_by(PaymentApplication.invoice_id)
+        .all()
+    )
+    return {str(iid): _q2(_d(s or 0)) for iid, s in rows}
+
+
+def _open_invoices_query(db: Session, *, book_id: str, party_id: str, invoice_type: str, currency_id: str, strategy: str):
+    q = db.query(Invoice).filter(
+        Invoice.book_id == book_id,
+        Invoice.party_id == party_id,
+        Invoice.invoice_type == invoice_type,
+        Invoice.currency_id == currency_id,
+        Invoice.status == "POSTED",
+        Invoice.outstanding_amount > 0,
+    )
+    if strategy == "DOC_DATE":
+        return q.order_by(Invoice.doc_date.asc(), Invoice.id.asc())
+    return q.order_by(sa.func.coalesce(Invoice.due_date, sa.func.date(Invoice.doc_date)).asc(), Invoice.doc_date.asc(), Invoice.id.asc())
 
 
 def create_payment(
@@ -346,11 +469,21 @@ def create_payment(
     applications: list[dict],
     actor_user_id: str | None,
     create_draft: bool,
+    auto_apply: str | None = None,
 ) -> CreatePaymentResult:
+    """
+    创建收/付款（可选生成草稿）。核销方式二选一：
+    - applications：逐张指定发票与金额，合计必须等于 amount；
+    - auto_apply：按策略把 amount 依次分配到该往来单位的未结发票（一次有序查询），剩余部分作为未核销余额；
+    两种方式都扣除草稿待过账的收/付款已占用的核销额。
+    """
     with db.begin():
         _require_period_open(db, period_id)
         _require_book(db, book_id)
         cur = _require_commodity_by_code(db, currency_type, currency_code)
+        invoice_type = PAYMENT_INVOICE_TYPES.get(payment_type)
+        if not invoice_type:
+            raise ValueError("payment_type 非法")
 
         cash = _require_account(db, book_id, cash_account_id)
         if str(cash.commodity_id) != str(cur.id):
@@ -358,6 +491,14 @@ def create_payment(
             raise ValueError("收/付款币种必须与现金/银行科目币种一致（当前版本限制）")
 
         apps = applications or []
+        strategy = (auto_apply or "").upper()
+        if strategy:
+            if apps:
+                raise ValueError("auto_apply 与 applications 不能同时指定")
+            if strategy not in AUTO_APPLY_STRATEGIES:
+                raise ValueError(f"auto_apply 必须是 {'/'.join(AUTO_APPLY_STRATEGIES)}")
+            if not party_id:
+                raise ValueError("自动核销必须指定往来单位")
         if apps:
             total_apply = _q2(sum((_d(x["amount"]) for x in apps), Decimal("0")))
             if amount and _q2(_d(amount)) != total_apply:
@@ -385,39 +526,84 @@ def create_payment(
         db.add(pay)
         db.flush()
 
-        invoice_rows: dict[str, Invoice] = {}
-        for x in apps:
-            inv = db.query(Invoice).filter(Invoice.id == x["invoice_id"]).one_or_none()
-            if not inv:
-                raise ValueError(f"发票不存在: {x['invoice_id']}")
-            if str(inv.book_id) != str(book_id):
-                raise ValueError("发票不属于当前账簿")
-            if str(inv.currency_id) != str(cur.id):
-                raise ValueError("收/付款币种必须与发票币种一致（当前版本限制）")
-            if payment_type == "RECEIPT" and inv.invoice_type != "AR":
-                raise ValueError("收款只能核销 AR 发票")
-            if payment_type == "DISBURSEMENT" and inv.invoice_type != "AP":
-                raise ValueError("付款只能核销 AP 发票")
-            invoice_rows[str(inv.id)] = inv
+        # 核销分配：(发票, 金额)，发票行均已加锁
+        alloc: list[tuple[Invoice, Decimal]] = []
+        if strategy:
+            remaining = amount
+            candidates = _open_invoices_query(
+                db, book_id=book_id, party_id=party_id, invoice_type=invoice_type, currency_id=str(cur.id), strategy=strategy
+            ).with_for_update().all()
+            # 扣除其他未过账收/付款已占用的部分，避免同一张发票被重复核销
+            pending = _pending_applied(db, book_id, [str(inv.id) for inv in candidates])
+            for inv in candidates:
+                if remaining <= 0:
+                    break
+                available = _q2(_d(inv.outstanding_amount)) - pending.get(str(inv.id), Decimal("0"))
+                if available <= 0:
+                    continue
+                amt = min(remaining, available)
+                alloc.append((inv, amt))
+                remaining -= amt
+        elif apps:
+            ids = [str(x["invoice_id"]) for x in apps]
+            if len(set(ids)) != len(ids):
+                raise ValueError("同一张发票不能重复核销")
+            invoice_rows = {str(inv.id): inv for inv in db.query(Invoice).filter(Invoice.id.in_(ids)).order_by(Invoice.id.asc()).with_for_update().all()}
+            pending = _pending_applied(db, book_id, ids)
+            for x in apps:
+                inv = invoice_rows.get(str(x["invoice_id"]))
+                if not inv:
+                    raise ValueError(f"发票不存在: {x['invoice_id']}")
+                if str(inv.book_id) != str(book_id):
+                    raise ValueError("发票不属于当前账簿")
+                if str(inv.currency_id) != str(cur.id):
+                    raise ValueError("收/付款币种必须与发票币种一致（当前版本限制）")
+                if payment_type == "RECEIPT" and inv.invoice_type != "AR":
+                    raise ValueError("收款只能核销 AR 发票")
+                if payment_type == "DISBURSEMENT" and inv.invoice_type != "AP":
+                    raise ValueError("付款只能核销 AP 发票")
+                amt = _q2(_d(x["amount"]))
+                if amt <= 0:
+                    raise ValueError("核销金额必须 > 0")
+                held = pending.get(str(inv.id), Decimal("0"))
+                if amt > _q2(_d(inv.outstanding_amount)) - held:
+                    extra = f"，其中 {held} 已被待过账收/付款占用" if held else ""
+                    raise ValueError(f"核销金额超过发票未结金额：{inv.doc_no} 未结 {_q2(_d(inv.outstanding_amount))}{extra}")
+                alloc.append((inv, amt))
+        unapplied = _q2(amount - sum((amt for _, amt in alloc), Decimal("0")))
 
         # 写应用关系（核销）
-        for x in apps:
-            inv = invoice_rows[x["invoice_id"]]
-            amt = _q2(_d(x["amount"]))
-            if amt <= 0:
-                raise ValueError("核销金额必须 > 0")
-            db.add(PaymentApplication(payment_id=str(pay.id), invoice_id=str(inv.id), amount=amt, applied_at=datetime.utcnow()))
-        db.flush()
+        now = datetime.utcnow()
+        if alloc:
+            db.execute(
+                sa.insert(PaymentApplication.__table__),
+                [{"id": uuid_str(), "payment_id": pay.id, "invoice_id": inv.id, "amount": amt, "applied_at": now} for inv, amt in alloc],
+            )
 
         draft_id: str | None = None
         if create_draft:
-            # 控制科目：AR=1122, AP=2001
-            if payment_type == "RECEIPT":
-                control = _require_account_by_code(db, book_id, "1122")
-            elif payment_type == "DISBURSEMENT":
-                control = _require_account_by_code(db, book_id, "2001")
-            else:
-                raise ValueError("payment_type 非法")
+            control = _require_account_by_code(db, book_id, CONTROL_ACCOUNT_CODES[invoice_type])
+
+            # 还没有 lot 的发票批量补建
+            new_lots: list[dict] = []
+            for inv, _ in alloc:
+                if not inv.lot_id:
+                    inv.lot_id = uuid_str()
+                    new_lots.append(
+                        {
+                            "id": inv.lot_id,
+                            "book_id": book_id,
+                            "account_id": control.id,
+                            "title": f"{inv.invoice_type} 发票 {inv.doc_no}".strip(),
+                            "notes": "",
+                            "is_closed": False,
+                            "opened_at": now,
+                            "closed_at": None,
+                        }
+                    )
+            if new_lots:
+                db.execute(sa.insert(Lot.__table__), new_lots)
+            db.flush()
 
             draft = TransactionDraft(
                 book_id=book_id,
@@ -432,79 +618,135 @@ def create_payment(
                 created_by=actor_user_id,
                 approved_by=None,
                 posted_txn_id=None,
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow(),
+                created_at=now,
+                updated_at=now,
             )
             db.add(draft)
             db.flush()
 
-            def add_line(no: int, account_id: str, debit: Decimal, credit: Decimal, memo: str, aux: dict) -> None:
-                db.add(
-                    TransactionDraftLine(
-                        draft_id=str(draft.id),
-                        line_no=no,
-                        account_id=account_id,
-                        debit=_q2(debit),
-                        credit=_q2(credit),
-                        memo=memo or "",
-                        aux_json=aux,
-                    )
-                )
-
-            line_no = 1
-            if payment_type == "RECEIPT":
-                # 借：现金/银行；贷：应收（按每张发票拆行并带 lot_id）
-                add_line(
-                    line_no,
-                    str(cash.id),
-                    debit=amount,
-                    credit=Decimal("0"),
-                    memo="借：现金/银行",
-                    aux={"owner": "payment", "payment_id": str(pay.id), "role": "CASH"},
-                )
-                line_no += 1
-                for x in apps:
-                    inv = invoice_rows[x["invoice_id"]]
-                    lot = _get_or_create_invoice_lot(db, book_id=book_id, invoice=inv, control_account_id=str(control.id))
-                    add_line(
-                        line_no,
-                        str(control.id),
-                        debit=Decimal("0"),
-                        credit=_q2(_d(x["amount"])),
-                        memo="贷：应收账款",
-                        aux={"owner": "payment", "payment_id": str(pay.id), "invoice_id": str(inv.id), "role": "AR", "lot_id": str(lot.id)},
-                    )
-                    line_no += 1
-            else:
-                # 贷：现金/银行；借：应付（按发票拆行并带 lot_id）
-                add_line(
-                    line_no,
-                    str(cash.id),
-                    debit=Decimal("0"),
-                    credit=amount,
-                    memo="贷：现金/银行",
-                    aux={"owner": "payment", "payment_id": str(pay.id), "role": "CASH"},
-                )
-                line_no += 1
-                for x in apps:
-                    inv = invoice_rows[x["invoice_id"]]
-                    lot = _get_or_create_invoice_lot(db, book_id=book_id, invoice=inv, control_account_id=str(control.id))
-                    add_line(
-                        line_no,
-                        str(control.id),
-                        debit=_q2(_d(x["amount"])),
-                        credit=Decimal("0"),
-                        memo="借：应付账款",
-                        aux={"owner": "payment", "payment_id": str(pay.id), "invoice_id": str(inv.id), "role": "AP", "lot_id": str(lot.id)},
-                    )
-                    line_no += 1
-
+            lines = payment_draft_lines(
+                payment_type,
+                payment_id=str(pay.id),
+                cash_account_id=str(cash.id),
+                control_account_id=str(control.id),
+                amount=amount,
+                applied=[(str(inv.id), str(inv.lot_id), amt) for inv, amt in alloc],
+                unapplied=unapplied,
+            )
+            lines = [{"id": uuid_str(), "draft_id": draft.id, **ln} for ln in lines]
+            db.execute(sa.insert(TransactionDraftLine.__table__), lines)
             db.flush()
             append_revision(db, draft, action="CREATE", reason="", actor_id=actor_user_id)
             db.flush()
             draft_id = str(draft.id)
 
-        return CreatePaymentResult(payment_id=str(pay.id), draft_id=draft_id)
+        return CreatePaymentResult(payment_id=str(pay.id), draft_id=draft_id, unapplied=unapplied)
+
+
+def _set_invoice_amounts(inv: Invoice, applied: Decimal, now: datetime) -> None:
+    gross = _d(inv.total_gross)
+    inv.applied_amount = applied
+    inv.outstanding_amount = max(_q2(gross - applied), Decimal("0"))
+    if applied >= gross and inv.status != "VOID":
+        inv.status = "PAID"
+    elif inv.status == "PAID" and applied < gross:
+        inv.status = "POSTED" if inv.posted_txn_id else "DRAFT"
+    inv.updated_at = now
+
+
+def apply_posted_payment(db: Session, pay: Payment, *, sign: int = 1) -> list[Invoice]:
+    """
+    收/付款过账（sign=1）或作废（sign=-1）时调用，须在调用方的事务内：
+    锁定涉及的发票行，把该收/付款的核销额累加（或扣回）到 applied_amount，并同步 outstanding_amount 与 PAID 状态。
+    过账时核销后超过价税合计（例如驳回后又被重新审批的草稿，其占用已被别的收/付款用掉）则报错，整笔过账回滚。
+    """
+    rows = (
+        db.query(PaymentApplication.invoice_id, sa.func.sum(PaymentApplication.amount))
+        .filter(PaymentApplication.payment_id == pay.id)
+        .group_by(PaymentApplication.invoice_id)
+        .all()
+    )
+    delta = {str(iid): _q2(_d(s or 0)) for iid, s in rows}
+    if not delta:
+        return []
+    invs = db.query(Invoice).filter(Invoice.id.in_(list(delta))).order_by(Invoice.id.asc()).with_for_update().all()
+    now = datetime.utcnow()
+    for inv in invs:
+        applied = _q2(_d(inv.applied_amount) + sign * delta[str(inv.id)])
+        if sign > 0 and applied > _d(inv.total_gross):
+            raise ValueError(f"发票 {inv.doc_no} 未结金额不足，核销 {delta[str(inv.id)]} 后超过价税合计")
+        _set_invoice_amounts(inv, applied, now)
+    db.flush()
+    return invs
+
+
+def _actual_applied_subquery():
+    return (
+        sa.select(PaymentApplication.invoice_id, sa.func.sum(PaymentApplication.amount).label("applied"))
+        .join(Payment, Payment.id == PaymentApplication.payment_id)
+        .where(Payment.status == "POSTED")
+        .group_by(PaymentApplication.invoice_id)
+        .subquery()
+    )
+
+
+def find_invoice_amount_drift(db: Session, *, book_id: str | None = None, limit: int = 1000) -> list[dict]:
+    """物化列与按 payment_applications（已过账收/付款）重新汇总的结果不一致的发票。"""
+    actual = _actual_applied_subquery()
+    applied = sa.func.coalesce(actual.c.applied, 0)
+    expected_out = sa.case((Invoice.total_gross - applied < 0, 0), else_=Invoice.total_gross - applied)
+    q = (
+        sa.select(
+            Invoice.id,
+            Invoice.book_id,
+            Invoice.invoice_type,
+            Invoice.doc_no,
+            Invoice.applied_amount,
+            Invoice.outstanding_amount,
+            applied.label("expected_applied"),
+            expected_out.label("expected_outstanding"),
+        )
+        .select_from(Invoice)
+        .outerjoin(actual, actual.c.invoice_id == Invoice.id)
+        .where(
+            sa.or_(
+                sa.func.abs(Invoice.applied_amount - applied) >= Decimal("0.005"),
+                sa.func.abs(Invoice.outstanding_amount - expected_out) >= Decimal("0.005"),
+            )
+        )
+    )
+    if book_id:
+        q = q.where(Invoice.book_id == book_id)
+    return [
+        {
+            "invoice_id": str(r.id),
+            "book_id": str(r.book_id),
+            "invoice_type": r.invoice_type,
+            "doc_no": r.doc_no,
+            "applied_amount": _q2(_d(r.applied_amount)),
+            "outstanding_amount": _q2(_d(r.outstanding_amount)),
+            "expected_applied": _q2(_d(r.expected_applied)),
+            "expected_outstanding": _q2(_d(r.expected_outstanding)),
+        }
+        for r in db.execute(q.order_by(Invoice.id.asc()).limit(limit)).all()
+    ]
+
+
+def recompute_invoice_amounts(db: Session, invoice_ids: list[str]) -> int:
+    """按 payment_applications 重算指定发票的物化列（修复漂移用），须在调用方的事务内。"""
+    if not invoice_ids:
+        return 0
+    actual = _actual_applied_subquery()
+    applied = {
+        str(iid): _q2(_d(s or 0))
+        for iid, s in db.execute(sa.select(actual.c.invoice_id, actual.c.applied).where(actual.c.invoice_id.in_(invoice_ids))).all()
+    }
+    invs = db.query(Invoice).filter(Invoice.id.in_(invoice_ids)).order_by(Invoice.id.asc()).with_for_update().all()
+    now = datetime.utcnow()
+    for inv in invs:
+        _set_invoice_amounts(inv, applied.get(str(inv.id), Decimal("0")), now)
+    db.flush()
+    return len(invs)
 
 
 def bucket_for_days(days_past_due: int) -> str:
@@ -519,50 +761,127 @@ def bucket_for_days(days_past_due: int) -> str:
     return "90+"
 
 
-def aging_report(db: Session, *, book_id: str, as_of: date, invoice_type: str | None = None) -> list[dict]:
-    # 纯查询：不显式 begin
-    q = db.query(Invoice).filter(Invoice.book_id == book_id).filter(Invoice.status.in_(["POSTED", "PAID"]))
+# (bucket, 逾期天数下限, 上限)；与 bucket_for_days 一致
+AGING_BUCKETS: list[tuple[str, int | None, int | None]] = [
+    ("CURRENT", None, 0),
+    ("1-30", 1, 30),
+    ("31-60", 31, 60),
+    ("61-90", 61, 90),
+    ("90+", 91, None),
+]
+
+
+def _bucket_cond(as_of: date, lo: int | None, hi: int | None):
+    # 逾期天数 = as_of - due_date；换算成 due_date 的日期区间比较，不依赖各数据库的日期减法
+    due = Invoice.due_date
+    if lo is None:
+        return sa.or_(due.is_(None), due >= as_of - timedelta(days=hi))
+    cond = due <= as_of - timedelta(days=lo)
+    if hi is not None:
+        cond = sa.and_(cond, due >= as_of - timedelta(days=hi))
+    return cond
+
+
+def _aging_filters(book_id: str, invoice_type: str | None) -> list:
+    cond = [Invoice.book_id == book_id, Invoice.status.in_(["POSTED", "PAID"])]
     if invoice_type:
-        q = q.filter(Invoice.invoice_type == invoice_type)
-    invoices = q.order_by(Invoice.doc_date.desc()).limit(500).all()
-    if not invoices:
-        return []
+        cond.append(Invoice.invoice_type == invoice_type)
+    return cond
 
-    inv_ids = [str(x.id) for x in invoices]
-    apps = db.query(PaymentApplication.invoice_id, sa.func.sum(PaymentApplication.amount)).filter(PaymentApplication.invoice_id.in_(inv_ids)).group_by(PaymentApplication.invoice_id).all()  # type: ignore[name-defined]
-    applied = {str(iid): _q2(_d(s or 0)) for iid, s in apps}
 
-    # commodity code lookup
-    cur_ids = list({str(x.currency_id) for x in invoices})
-    curs = db.query(Commodity).filter(Commodity.id.in_(cur_ids)).all()
-    cur_by_id = {str(c.id): c.code for c in curs}
+def aging_report(
+    db: Session,
+    *,
+    book_id: str,
+    as_of: date,
+    invoice_type: str | None = None,
+    limit: int = 500,
+    after: tuple[datetime, str] | None = None,
+) -> list[dict]:
+    """
+    账龄明细（纯查询，不显式 begin）：核销合计/未结金额直接读发票上的物化列，账龄区间在 SQL 中计算，
+    按 (doc_date, id) 倒序做键集分页，after 为上一页最后一行的 (doc_date, invoice_id)。
+    """
+    bucket = sa.case(*[(_bucket_cond(as_of, lo, hi), name) for name, lo, hi in AGING_BUCKETS[:-1]], else_=AGING_BUCKETS[-1][0])
+    q = (
+        sa.select(
+            Invoice.id,
+            Invoice.invoice_type,
+            Invoice.party_id,
+            Invoice.doc_no,
+            Invoice.doc_date,
+            Invoice.due_date,
+            Commodity.code.label("currency_code"),
+            Invoice.total_gross,
+            Invoice.applied_amount,
+            Invoice.outstanding_amount,
+            bucket.label("bucket"),
+        )
+        .select_from(Invoice)
+        .outerjoin(Commodity, Commodity.id == Invoice.currency_id)
+        .where(*_aging_filters(book_id, invoice_type))
+    )
+    if after is not None:
+        after_date, after_id = after
+        q = q.where(sa.or_(Invoice.doc_date < after_date, sa.and_(Invoice.doc_date == after_date, Invoice.id < after_id)))
+    rows = db.execute(q.order_by(Invoice.doc_date.desc(), Invoice.id.desc()).limit(limit)).all()
 
     out: list[dict] = []
-    for inv in invoices:
-        app_amt = applied.get(str(inv.id), Decimal("0"))
-        outstanding = _q2(_d(inv.total_gross) - app_amt)
-        if outstanding < 0:
-            outstanding = Decimal("0")
-        dd = inv.due_date
-        days = 0
-        if dd:
-            days = max(0, (as_of - dd).days)
+    for r in rows:
+        days = max(0, (as_of - r.due_date).days) if r.due_date else 0
         out.append(
             {
-                "invoice_id": str(inv.id),
-                "invoice_type": inv.invoice_type,
-                "party_id": str(inv.party_id) if inv.party_id else None,
-                "doc_no": inv.doc_no,
-                "doc_date": inv.doc_date,
-                "due_date": inv.due_date,
-                "currency_code": cur_by_id.get(str(inv.currency_id), ""),
-                "total_gross": _q2(_d(inv.total_gross)),
-                "applied_amount": app_amt,
-                "outstanding_amount": outstanding,
+                "invoice_id": str(r.id),
+                "invoice_type": r.invoice_type,
+                "party_id": str(r.party_id) if r.party_id else None,
+                "doc_no": r.doc_no,
+                "doc_date": r.doc_date,
+                "due_date": r.due_date,
+                "currency_code": r.currency_code or "",
+                "total_gross": _q2(_d(r.total_gross)),
+                "applied_amount": _q2(_d(r.applied_amount)),
+                "outstanding_amount": _q2(_d(r.outstanding_amount)),
                 "days_past_due": int(days),
-                "bucket": bucket_for_days(int(days)),
+                "bucket": r.bucket,
             }
         )
     return out
 
 
+def aging_summary(db: Session, *, book_id: str, as_of: date, invoice_type: str | None = None) -> list[dict]:
+    """按 (类型, 往来单位, 币种) 汇总各账龄区间的未结金额：一条 GROUP BY 查询（走 ix_invoices_open），不限发票数量。"""
+    outstanding = Invoice.outstanding_amount
+    cols = [
+        sa.func.sum(sa.case((_bucket_cond(as_of, lo, hi), outstanding), else_=0)).label(f"b{i}")
+        for i, (_name, lo, hi) in enumerate(AGING_BUCKETS)
+    ]
+    rows = db.execute(
+        sa.select(
+            Invoice.invoice_type,
+            Invoice.party_id,
+            Party.name.label("party_name"),
+            Commodity.code.label("currency_code"),
+            sa.func.count().label("invoice_count"),
+            sa.func.sum(outstanding).label("total"),
+            *cols,
+        )
+        .select_from(Invoice)
+        .outerjoin(Party, Party.id == Invoice.party_id)
+        .outerjoin(Commodity, Commodity.id == Invoice.currency_id)
+        .where(Invoice.book_id == book_id, Invoice.status == "POSTED", outstanding > 0)
+        .where(*([Invoice.invoice_type == invoice_type] if invoice_type else []))
+        .group_by(Invoice.invoice_type, Invoice.party_id, Party.name, Commodity.code)
+        .order_by(Invoice.invoice_type.asc(), Party.name.asc(), Commodity.code.asc())
+    ).all()
+    return [
+        {
+            "invoice_type": r.invoice_type,
+            "party_id": str(r.party_id) if r.party_id else None,
+            "party_name": r.party_name or "",
+            "currency_code": r.currency_code or "",
+            "invoice_count": int(r.invoice_count),
+            "buckets": {name: _q2(_d(getattr(r, f"b{i}") or 0)) for i, (name, _lo, _hi) in enumerate(AGING_BUCKETS)},
+            "total": _q2(_d(r.total or 0)),
+        }
+        for r in rows
+    ]
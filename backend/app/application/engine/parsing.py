@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import re
+
+_DIGITS = re.compile(r"\d+")
+
+
+def _grouped(s: str, sep: str) -> bool:
+    """整数部分是否为合法的千分位写法（不含分隔符也算）。"""
+    if sep not in s:
+        return bool(_DIGITS.fullmatch(s))
+    return re.fullmatch(rf"\d{{1,3}}(?:{re.escape(sep)}\d{{3}})+", s) is not None
+
+
+def normalize_number(s: str, *, decimal_comma: bool = False) -> str | None:
+    """把带千分位 / 小数逗号的数字文本规整为 Decimal 可解析的形式。
+
+    - 同时出现 "." 与 ","：最后出现的那个是小数点，另一个必须是合法的千分位；
+    - 只有一个 ","：其后为 1~2 位数字时视为小数逗号（decimal_comma=True 时不限位数，
+      用于分号分隔的欧式 CSV）；多个 "," 且分组合法时视为千分位；
+    - 其余写法（如 "1,234"）无法判断小数点位置，返回 None，由调用方拒绝。
+    """
+    body = s.lstrip("+-")
+    sign = s[: len(s) - len(body)]
+    dot, comma = body.rfind("."), body.rfind(",")
+    if dot >= 0 and comma >= 0:
+        dec, grp = (".", ",") if dot > comma else (",", ".")
+        int_part, frac = body.rsplit(dec, 1)
+        if not _grouped(int_part, grp) or not _DIGITS.fullmatch(frac):
+            return None
+        return f"{sign}{int_part.replace(grp, '')}.{frac}"
+    if comma >= 0:
+        int_part, frac = body.rsplit(",", 1)
+        if "," not in int_part and _DIGITS.fullmatch(int_part) and _DIGITS.fullmatch(frac):
+            if decimal_comma or len(frac) <= 2:
+                return f"{sign}{int_part}.{frac}"
+            return None
+        return sign + body.replace(",", "") if _grouped(body, ",") else None
+    if body.count(".") > 1:
+        return sign + body.replace(".", "") if _grouped(body, ".") else None
+    return s
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy.orm import Session
+
+from app.application.engine.versions import PRICES_VERSION_KEY, get_versions
+from app.infra.db.models import Book, Price
+
+
+@dataclass(frozen=True)
+class PriceSeries:
+    """
+    某 (commodity, currency) 的价格序列：按日期升序的平行数组。
+    同一天有多条（不同 source/type）时只保留最后写入的一条。
+    """
+
+    ordinals: array  # date.toordinal()
+    values: tuple[Decimal, ...]
+    ids: tuple[str, ...]
+
+    def index_as_of(self, as_of: date) -> int | None:
+        i = bisect_right(self.ordinals, as_of.toordinal())
+        return i - 1 if i else None
+
+    def value_as_of(self, as_of: date) -> Decimal | None:
+        i = self.index_as_of(as_of)
+        return self.values[i] if i is not None else None
+
+
+@dataclass(frozen=True)
+class PriceBook:
+    """某账簿全部价格的只读快照；按 (commodity_id, currency_id) 查“截至某日的最新价格”。"""
+
+    book_id: str
+    version: int
+    series: dict[tuple[str, str], PriceSeries]
+    base_currency_id: str | None = None
+    # 按日期缓存的价格图与已解析的交叉汇率（快照只读，缓存随版本一起失效）
+    _graphs: dict[int, dict[str, tuple[str, ...]]] = field(default_factory=dict, compare=False, repr=False)
+    _rates: dict[tuple[int, str, str], tuple[Decimal, Decimal] | None] = field(default_factory=dict, compare=False, repr=False)
+
+    def latest(self, commodity_id: str, currency_id: str, as_of: date) -> Decimal | None:
+        s = self.series.get((str(commodity_id), str(currency_id)))
+        return s.value_as_of(as_of) if s else None
+
+    def latest_id(self, commodity_id: str, currency_id: str, as_of: date) -> str | None:
+        s = self.series.get((str(commodity_id), str(currency_id)))
+        if not s:
+            return None
+        i = s.index_as_of(as_of)
+        return s.ids[i] if i is not None else None
+
+    def _edge(self, from_id: str, to_id: str, as_of: date) -> tuple[Decimal, Decimal] | None:
+        # 1 from = num/den to；优先用 (to, from) 的报价（与原直连逻辑一致），其次 (from, to)
+        v = self.latest(to_id, from_id, as_of)
+        if v:
+            return Decimal("1"), v
+        v = self.latest(from_id, to_id, as_of)
+        if v:
+            return v, Decimal("1")
+        return None
+
+    def _graph(self, as_of: date) -> dict[str, tuple[str, ...]]:
+        o = as_of.toordinal()
+        g = self._graphs.get(o)
+        if g is not None:
+            return g
+        adj: dict[str, set[str]] = {}
+        for (com, cur), s in self.series.items():
+            if com != cur and s.value_as_of(as_of):
+                adj.setdefault(com, set()).add(cur)
+                adj.setdefault(cur, set()).add(com)
+        base = self.base_currency_id
+        # 本位币排在最前：同样跳数时优先经本位币折算
+        g = {k: tuple(sorted(v, key=lambda x: (x != base, x))) for k, v in adj.items()}
+        if len(self._graphs) >= _MEMO_MAX:
+            self._graphs.clear()
+        self._graphs[o] = g
+        return g
+
+    def cross_rate(self, from_id: str, to_id: str, as_of: date) -> tuple[Decimal, Decimal] | None:
+        """
+        截至 as_of，1 单位 from 折合多少 to，返回 (num, den)，即 to = from * num / den。
+        先直连/反向报价，找不到时沿价格图走最短路径（同跳数优先经本位币）；无路径返回 None。
+        """
+        from_id, to_id = str(from_id), str(to_id)
+        if from_id == to_id:
+            return Decimal("1"), Decimal("1")
+        key = (as_of.toordinal(), from_id, to_id)
+        if key in self._rates:
+            return self._rates[key]
+
+        rate = self._edge(from_id, to_id, as_of)
+        if rate is None:
+            g = self._graph(as_of)
+            prev: dict[str, str] = {from_id: from_id}
+            queue = deque([from_id])
+            while queue and to_id not in prev:
+                node = queue.popleft()
+                for nxt in g.get(node, ()):
+                    if nxt not in prev:
+                        prev[nxt] = node
+                        queue.append(nxt)
+            if to_id in prev:
+                path = [to_id]
+                while path[-1] != from_id:
+                    path.append(prev[path[-1]])
+                path.reverse()
+                num, den = Decimal("1"), Decimal("1")
+                for a, b in zip(path, path[1:]):
+                    n, d = self._edge(a, b, as_of)
+                    num, den = num * n, den * d
+                rate = (num, den)
+
+        if len(self._rates) >= _MEMO_MAX:
+            self._rates.clear()
+        self._rates[key] = rate
+        return rate
+
+    def convert(self, value: Decimal, from_id: str, to_id: str, as_of: date) -> Decimal | None:
+        rate = self.cross_rate(from_id, to_id, as_of)
+        if rate is None:
+            return None
+        num, den = rate
+        return value * num / den
+
+
+# 单个快照内按日期缓存的图/交叉汇率条目上限，超过即整体清空
+_MEMO_MAX = 4096
+
+
+def load_price_book(db: Session, book_id: str, version: int = 0) -> PriceBook:
+    rows = (
+        db.query(Price.id, Price.commodity_id, Price.currency_id, Price.price_date, Price.value)
+        .filter(Price.book_id == book_id)
+        .order_by(Price.commodity_id, Price.currency_id, Price.price_date, Price.created_at, Price.id)
+        .all()
+    )
+    grouped: dict[tuple[str, str], tuple[array, list[Decimal], list[str]]] = {}
+    for pid, com, cur, d, v in rows:
+        ords, vals, ids = grouped.setdefault((str(com), str(cur)), (array("l"), [], []))
+        o = d.toordinal()
+        value = v if isinstance(v, Decimal) else Decimal(str(v))
+        if ords and ords[-1] == o:
+            vals[-1], ids[-1] = value, str(pid)
+            continue
+        ords.append(o)
+        vals.append(value)
+        ids.append(str(pid))
+    base_currency_id = db.query(Book.base_currency_id).filter(Book.id == book_id).scalar()
+    return PriceBook(
+        book_id=str(book_id),
+        version=version,
+        base_currency_id=str(base_currency_id) if base_currency_id else None,
+        series={k: PriceSeries(ordinals=o, values=tuple(v), ids=tuple(i)) for k, (o, v, i) in grouped.items()},
+    )
+
+
+# 进程内缓存：key = (book_id, prices_version)；写价格时递增版本号即失效
+_CACHE_MAX = 64
+_cache_guard = threading.Lock()
+_cache: OrderedDict[tuple[str, int], PriceBook] = OrderedDict()
+
+
+def get_price_book(db: Session, book_id: str) -> PriceBook:
+    vkey = ("book", str(book_id), PRICES_VERSION_KEY)
+    version = get_versions(db, [vkey])[vkey]
+    key = (str(book_id), version)
+
+    with _cache_guard:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+            return hit
+
+    pb = load_price_book(db, str(book_id), version)
+    with _cache_guard:
+        _cache[key] = pb
+        _cache.move_to_end(key)
+        while len(_cache) > _CACHE_MAX:
+            _cache.popitem(last=False)
+    return pb
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from typing import Iterable
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.infra.db.models import ObjectKV, utcnow
+
+# 结构版本号（存于 ObjectKV，value_json={"v": n}）：用于进程内缓存失效判断
+ACCOUNTS_VERSION_KEY = "accounts_version"  # owner_type="book"
+MAPPINGS_VERSION_KEY = "mappings_version"  # owner_type="report_basis"
+PRICES_VERSION_KEY = "prices_version"  # owner_type="book"
+
+
+def get_versions(db: Session, keys: Iterable[tuple[str, str, str]]) -> dict[tuple[str, str, str], int]:
+    """一次查询读取多个 (owner_type, owner_id, key) 的版本号；不存在视为 0。"""
+    keys = list(keys)
+    out = {k: 0 for k in keys}
+    if not keys:
+        return out
+    cond = sa.or_(*[sa.and_(ObjectKV.owner_type == t, ObjectKV.owner_id == oid, ObjectKV.key == k) for t, oid, k in keys])
+    for row in db.query(ObjectKV.owner_type, ObjectKV.owner_id, ObjectKV.key, ObjectKV.value_json).filter(cond).all():
+        out[(row[0], str(row[1]), row[2])] = int((row[3] or {}).get("v", 0))
+    return out
+
+
+def bump_version(db: Session, owner_type: str, owner_id: str, key: str) -> int:
+    # 为兼容 MySQL：行锁 + insert/update（不依赖 ON CONFLICT）
+    row = (
+        db.query(ObjectKV)
+        .filter(ObjectKV.owner_type == owner_type, ObjectKV.owner_id == owner_id, ObjectKV.key == key)
+        .with_for_update()
+        .one_or_none()
+    )
+    if row is None:
+        row = ObjectKV(owner_type=owner_type, owner_id=owner_id, key=key, value_json={"v": 1}, updated_at=utcnow())
+        db.add(row)
+        db.flush()
+        return 1
+    v = int((row.value_json or {}).get("v", 0)) + 1
+    row.value_json = {"v": v}
+    row.updated_at = utcnow()
+    db.flush()
+    return v
+
+
+def bump_accounts_version(db: Session, book_id: str) -> int:
+    return bump_version(db, "book", str(book_id), ACCOUNTS_VERSION_KEY)
+
+
+def bump_mappings_version(db: Session, basis_id: str) -> int:
+    return bump_version(db, "report_basis", str(basis_id), MAPPINGS_VERSION_KEY)
+
+
+def bump_prices_version(db: Session, book_id: str) -> int:
+    return bump_version(db, "book", str(book_id), PRICES_VERSION_KEY)
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from functools import lru_cache
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.application.gl.draft_workflow import append_revision
+from app.application.gl.scheduled import add_months
+from app.infra.db.models import (
+    Account,
+    AccountingPeriod,
+    AmortizationEntry,
+    AmortizationSchedule,
+    TransactionDraft,
+    TransactionDraftLine,
+    utcnow,
+    uuid_str,
+)
+
+METHOD_STRAIGHT_LINE = "STRAIGHT_LINE"
+METHOD_DECLINING_BALANCE = "DECLINING_BALANCE"
+KINDS = {"ASSET", "PREPAID", "ACCRUAL"}
+DRAFT_SOURCE_TYPE = "AMORTIZATION"
+
+
+def _decimal(v) -> Decimal:
+    if isinstance(v, Decimal):
+        return v
+    return Decimal(str(v))
+
+
+def _q2(v: Decimal) -> Decimal:
+    return v.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def validate_schedule(method: str, cost: Decimal, salvage: Decimal, life_months: int, db_factor: Decimal) -> None:
+    if (method or "").upper() not in (METHOD_STRAIGHT_LINE, METHOD_DECLINING_BALANCE):
+        raise ValueError("method 必须是 STRAIGHT_LINE/DECLINING_BALANCE")
+    if cost <= 0:
+        raise ValueError("cost 必须 > 0")
+    if salvage < 0 or salvage >= cost:
+        raise ValueError("salvage 必须在 0 与 cost 之间")
+    if life_months < 1 or life_months > 1200:
+        raise ValueError("life_months 必须在 1..1200 之间")
+    if db_factor <= 0:
+        raise ValueError("db_factor 必须 > 0")
+
+
+@lru_cache(maxsize=4096)
+def _declining_balance(cost: Decimal, salvage: Decimal, life: int, factor: Decimal) -> tuple[Decimal, ...]:
+    # 月折旧率 = 倍数 / 月数；当直线法（剩余净值 / 剩余月数）更大时改用直线法；末期补齐到残值
+    rate = factor / life
+    bv = cost
+    out: list[Decimal] = []
+    for i in range(life):
+        if i == life - 1:
+            amt = bv - salvage
+        else:
+            amt = max(_q2(bv * rate), _q2((bv - salvage) / (life - i)))
+            amt = min(amt, bv - salvage)
+        out.append(amt)
+        bv -= amt
+    return tuple(out)
+
+
+def compute_schedule(method: str, cost: Decimal, salvage: Decimal, life_months: int, db_factor: Decimal = Decimal("2")) -> list[Decimal]:
+    """整张摊销表（每期金额）。各期按分四舍五入，末期吸收舍入差，合计恰为 cost - salvage。"""
+    validate_schedule(method, cost, salvage, life_months, db_factor)
+    if method.upper() == METHOD_DECLINING_BALANCE:
+        return list(_declining_balance(cost, salvage, life_months, db_factor))
+    per = _q2((cost - salvage) / life_months)
+    return [per] * (life_months - 1) + [cost - salvage - per * (life_months - 1)]
+
+
+def period_amount(method: str, cost: Decimal, salvage: Decimal, life_months: int, db_factor: Decimal, k: int) -> Decimal:
+    """第 k 期（从 0 开始）的金额：直线法直接按公式算，不展开整张表。"""
+    if k < 0 or k >= life_months:
+        return Decimal("0")
+    if method.upper() == METHOD_DECLINING_BALANCE:
+        return _declining_balance(cost, salvage, life_months, db_factor)[k]
+    per = _q2((cost - salvage) / life_months)
+    return per if k < life_months - 1 else cost - salvage - per * (life_months - 1)
+
+
+def _month_index(y: int, m: int) -> int:
+    return y * 12 + (m - 1)
+
+
+@dataclass(frozen=True)
+class AmortizationRunResult:
+    book_id: str
+    period_id: str
+    draft_id: str | None  # 本期没有需要计提的计划时为 None
+    schedules: int
+    total: Decimal
+
+
+def run_amortization(db: Session, *, book_id: str, period_id: str, actor_user_id: str | None) -> AmortizationRunResult:
+    """
+    为一个期间生成当期折旧/摊销的汇总草稿（每个账簿每次一张，走正常的审批/过账流程）：
+    - 只处理该期间尚未计入的计划；之前生成的草稿被驳回后，其计入记录作废、可重新生成；
+    - 同一借/贷科目的金额合并成一行。
+    """
+    with db.begin():
+        period = (
+            db.query(AccountingPeriod)
+            .filter(AccountingPeriod.id == period_id, AccountingPeriod.book_id == book_id)
+            .with_for_update()
+            .one_or_none()
+        )
+        if not period:
+            raise ValueError("会计期间不存在或不属于该账簿")
+        if period.status != "OPEN":
+            raise ValueError("会计期间已关闭")
+
+        ae = AmortizationEntry.__table__
+        td = TransactionDraft.__table__
+        rejected = sa.select(td.c.id).where(td.c.book_id == book_id, td.c.source_type == DRAFT_SOURCE_TYPE, td.c.status == "REJECTED")
+        db.execute(ae.delete().where(ae.c.period_id == period.id, ae.c.draft_id.in_(rejected)))
+        done = {str(r[0]) for r in db.query(AmortizationEntry.schedule_id).filter(AmortizationEntry.period_id == period.id).all()}
+
+        idx = _month_index(int(period.year), int(period.month))
+        s = AmortizationSchedule.__table__
+        rows = db.execute(
+            sa.select(
+                s.c.id, s.c.method, s.c.cost, s.c.salvage, s.c.start_date, s.c.life_months, s.c.db_factor,
+                s.c.expense_account_id, s.c.contra_account_id,
+            ).where(s.c.book_id == book_id, s.c.enabled.is_(True))
+        ).all()
+
+        entries: list[tuple[str, int, Decimal]] = []
+        debits: dict[str, Decimal] = {}
+        credits: dict[str, Decimal] = {}
+        for r in rows:
+            k = idx - _month_index(r.start_date.year, r.start_date.month)
+            if k < 0 or k >= int(r.life_months) or str(r.id) in done:
+                continue
+            amt = period_amount(r.method, _decimal(r.cost), _decimal(r.salvage), int(r.life_months), _decimal(r.db_factor), k)
+            if amt == 0:
+                continue
+            entries.append((str(r.id), k + 1, amt))
+            debits[str(r.expense_account_id)] = debits.get(str(r.expense_account_id), Decimal("0")) + amt
+            credits[str(r.contra_account_id)] = credits.get(str(r.contra_account_id), Decimal("0")) + amt
+
+        if not entries:
+            return AmortizationRunResult(book_id=book_id, period_id=str(period.id), draft_id=None, schedules=0, total=Decimal("0"))
+
+        codes = {str(a.id): a.code for a in db.query(Account.id, Account.code).filter(Account.id.in_(set(debits) | set(credits))).all()}
+        maxv = (
+            db.query(sa.func.coalesce(sa.func.max(TransactionDraft.version), 0))
+            .filter(TransactionDraft.book_id == book_id, TransactionDraft.source_type == DRAFT_SOURCE_TYPE, TransactionDraft.source_id == str(period.id))
+            .scalar()
+        )
+        month_end = add_months(date(int(period.year), int(period.month), 1), 1) - timedelta(days=1)
+        desc = f"{int(period.year)}-{int(period.month):02d} 折旧/摊销"
+        draft = TransactionDraft(
+            book_id=book_id,
+            period_id=str(period.id),
+            txn_date=datetime.combine(month_end, time()),
+            source_type=DRAFT_SOURCE_TYPE,
+            source_id=str(period.id),
+            version=int(maxv or 0) + 1,
+            description=desc,
+            status="DRAFT",
+            created_by=actor_user_id,
+        )
+        db.add(draft)
+        db.flush()
+
+        lines: list[dict] = []
+        for aid in sorted(debits, key=lambda x: codes.get(x, x)):
+            lines.append({"account_id": aid, "debit": debits[aid], "credit": Decimal("0")})
+        for aid in sorted(credits, key=lambda x: codes.get(x, x)):
+            lines.append({"account_id": aid, "debit": Decimal("0"), "credit": credits[aid]})
+        db.execute(
+            sa.insert(TransactionDraftLine.__table__),
+            [{"id": uuid_str(), "draft_id": draft.id, "line_no": i, "memo": desc, "aux_json": None, **ln} for i, ln in enumerate(lines, start=1)],
+        )
+        now = utcnow()
+        for k in range(0, len(entries), 1000):
+            db.execute(
+                sa.insert(ae),
+                [
+                    {"id": uuid_str(), "schedule_id": sid, "period_id": period.id, "period_no": no, "amount": amt, "draft_id": draft.id, "created_at": now}
+                    for sid, no, amt in entries[k : k + 1000]
+                ],
+            )
+        db.flush()
+        append_revision(db, draft, action="CREATE", reason="AMORTIZATION_RUN", actor_id=actor_user_id)
+        db.flush()
+        return AmortizationRunResult(
+            book_id=book_id,
+            period_id=str(period.id),
+            draft_id=str(draft.id),
+            schedules=len(entries),
+            total=sum((amt for _, _, amt in entries), Decimal("0")),
+        )
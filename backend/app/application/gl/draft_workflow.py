@@ -15,6 +15,27 @@ def _decimal(v) -> Decimal:
     return Decimal(str(v))
 
 
+def draft_snapshot_payload(draft: dict, lines: list[dict]) -> dict:
+    """修订快照（payload_json）；批量生成草稿时直接用内存中的行构造，不必回查。"""
+    return {
+        "draft": {
+            k: draft.get(k)
+            for k in ("id", "book_id", "period_id", "source_type", "source_id", "version", "description", "status", "posted_txn_id")
+        },
+        "lines": [
+            {
+                "line_no": l["line_no"],
+                "account_id": l["account_id"],
+                "debit": str(_decimal(l["debit"])),
+                "credit": str(_decimal(l["credit"])),
+                "memo": l["memo"],
+                "aux_json": l["aux_json"],
+            }
+            for l in lines
+        ],
+    }
+
+
 def _draft_snapshot(db: Session, draft: TransactionDraft) -> dict:
     lines = (
         db.query(TransactionDraftLine)
@@ -22,8 +43,8 @@ def _draft_snapshot(db: Session, draft: TransactionDraft) -> dict:
         .order_by(TransactionDraftLine.line_no.asc())
         .all()
     )
-    return {
-        "draft": {
+    return draft_snapshot_payload(
+        {
             "id": draft.id,
             "book_id": draft.book_id,
             "period_id": draft.period_id,
@@ -34,18 +55,11 @@ def _draft_snapshot(db: Session, draft: TransactionDraft) -> dict:
             "status": draft.status,
             "posted_txn_id": draft.posted_txn_id,
         },
-        "lines": [
-            {
-                "line_no": l.line_no,
-                "account_id": l.account_id,
-                "debit": str(_decimal(l.debit)),
-                "credit": str(_decimal(l.credit)),
-                "memo": l.memo,
-                "aux_json": l.aux_json,
-            }
+        [
+            {"line_no": l.line_no, "account_id": l.account_id, "debit": l.debit, "credit": l.credit, "memo": l.memo, "aux_json": l.aux_json}
             for l in lines
         ],
-    }
+    )
 
 
 def append_revision(db: Session, draft: TransactionDraft, action: str, reason: str, actor_id: str | None) -> None:
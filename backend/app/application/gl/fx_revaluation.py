@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.application.engine.prices import get_price_book
+from app.application.gl.draft_workflow import append_revision
+from app.application.gl.scheduled import add_months
+from app.infra.db.models import (
+    Account,
+    AccountingPeriod,
+    Book,
+    Commodity,
+    Split,
+    Transaction,
+    TransactionDraft,
+    TransactionDraftLine,
+    uuid_str,
+)
+
+DRAFT_SOURCE_TYPE = "FX_REVALUATION"
+REVERSAL_SOURCE_TYPE = "FX_REVALUATION_REVERSAL"
+# 重估行只调整本位币金额（split.value），不改变外币数量（split.amount 记 0）
+FX_REVAL_ROLE = "FX_REVAL"
+
+
+def _decimal(v) -> Decimal:
+    if isinstance(v, Decimal):
+        return v
+    return Decimal(str(v))
+
+
+def _q(v: Decimal, prec: int) -> Decimal:
+    return v.quantize(Decimal(1).scaleb(-prec), rounding=ROUND_HALF_UP)
+
+
+def _month_end(year: int, month: int) -> date:
+    return add_months(date(year, month, 1), 1) - timedelta(days=1)
+
+
+@dataclass(frozen=True)
+class FxRevaluationItem:
+    account_id: str
+    account_code: str
+    commodity_code: str
+    amount: Decimal  # 外币余额
+    carrying_value: Decimal  # 账面本位币金额
+    rate: Decimal  # 期末汇率：1 外币 = rate 本位币
+    revalued_value: Decimal
+    adjustment: Decimal  # >0 汇兑收益，<0 汇兑损失
+
+
+@dataclass(frozen=True)
+class FxRevaluationResult:
+    book_id: str
+    period_id: str
+    rate_date: date
+    draft_id: str | None  # 无差额或 dry_run 时为 None
+    gain: Decimal
+    loss: Decimal
+    items: list[FxRevaluationItem]
+    dry_run: bool
+
+
+def _require_offset_account(db: Session, book_id: str, account_id: str, base_currency_id: str) -> Account:
+    a = db.query(Account).filter(Account.id == account_id).one_or_none()
+    if not a or str(a.book_id) != str(book_id):
+        raise ValueError("汇兑损益科目不存在或不属于该账簿")
+    if not a.is_active or not a.allow_post or a.is_placeholder:
+        raise ValueError(f"科目 {a.code} 不允许记账")
+    if str(a.commodity_id) != str(base_currency_id):
+        raise ValueError("汇兑损益科目必须是本位币科目")
+    return a
+
+
+def _next_period(db: Session, book_id: str, period: AccountingPeriod) -> AccountingPeriod | None:
+    nxt = add_months(date(int(period.year), int(period.month), 1), 1)
+    return (
+        db.query(AccountingPeriod)
+        .filter(AccountingPeriod.book_id == book_id, AccountingPeriod.year == nxt.year, AccountingPeriod.month == nxt.month)
+        .one_or_none()
+    )
+
+
+def run_fx_revaluation(
+    db: Session,
+    *,
+    book_id: str,
+    period_id: str,
+    gain_account_id: str,
+    loss_account_id: str | None = None,
+    dry_run: bool = False,
+    actor_user_id: str | None,
+) -> FxRevaluationResult:
+    """
+    期末外币重估：按期末汇率重估所有外币科目余额，差额生成一张未实现汇兑损益草稿（走正常审批/过账）。
+    - 外币余额与账面本位币金额用一条分组聚合取出：本位币交易按科目汇总，外币交易再按交易日分组，按交易日汇率折回本位币；
+    - 期末汇率取价格缓存（支持经价格图三角折算）；
+    - 草稿过账后自动在下一期间生成冲回草稿，因此下一期间必须已开放。
+    """
+    with db.begin():
+        period = (
+            db.query(AccountingPeriod)
+            .filter(AccountingPeriod.id == period_id, AccountingPeriod.book_id == book_id)
+            .with_for_update()
+            .one_or_none()
+        )
+        if not period:
+            raise ValueError("会计期间不存在或不属于该账簿")
+        if period.status != "OPEN":
+            raise ValueError("会计期间已关闭")
+        nxt = _next_period(db, book_id, period)
+        if not nxt or nxt.status != "OPEN":
+            raise ValueError("下一会计期间不存在或未开放，无法生成冲回分录")
+
+        book = db.query(Book).filter(Book.id == book_id).one()
+        base_id = str(book.base_currency_id)
+        base_prec = int(book.base_currency.precision or 2)
+        gain_acc = _require_offset_account(db, book_id, gain_account_id, base_id)
+        loss_acc = _require_offset_account(db, book_id, loss_account_id or gain_account_id, base_id)
+
+        pending = (
+            db.query(TransactionDraft.id)
+            .filter(
+                TransactionDraft.book_id == book_id,
+                TransactionDraft.source_type == DRAFT_SOURCE_TYPE,
+                TransactionDraft.source_id == str(period.id),
+                TransactionDraft.status.in_(("DRAFT", "SUBMITTED", "APPROVED")),
+            )
+            .first()
+        )
+        if pending:
+            raise ValueError("本期已有未过账的汇兑重估草稿")
+
+        rate_date = _month_end(int(period.year), int(period.month))
+        cutoff = datetime.combine(rate_date + timedelta(days=1), time())
+        t, s, a, c = Transaction.__table__, Split.__table__, Account.__table__, Commodity.__table__
+        txn_cur = sa.func.coalesce(t.c.currency_id, base_id)
+        # 本位币交易不区分日期；外币交易按交易日分组，以便按当日汇率折算
+        txn_day = sa.case((txn_cur == base_id, sa.null()), else_=t.c.txn_date)
+        rows = db.execute(
+            sa.select(
+                a.c.id,
+                a.c.code,
+                a.c.commodity_id,
+                c.c.code.label("commodity_code"),
+                c.c.precision,
+                txn_cur.label("txn_currency_id"),
+                txn_day.label("txn_day"),
+                sa.func.sum(s.c.amount).label("amount"),
+                sa.func.sum(s.c.value).label("value"),
+            )
+            .select_from(s.join(t, t.c.id == s.c.txn_id).join(a, a.c.id == s.c.account_id).join(c, c.c.id == a.c.commodity_id))
+            .where(
+                t.c.book_id == book_id,
+                t.c.status == "POSTED",
+                t.c.txn_date < cutoff,
+                a.c.book_id == book_id,
+                a.c.commodity_id != base_id,
+                c.c.type == "CURRENCY",
+            )
+            .group_by(a.c.id, a.c.code, a.c.commodity_id, c.c.code, c.c.precision, txn_cur, txn_day)
+        ).all()
+
+        prices = get_price_book(db, book_id)
+        accounts: dict[str, dict] = {}
+        for r in rows:
+            acc = accounts.setdefault(
+                str(r.id),
+                {"code": r.code, "commodity_id": str(r.commodity_id), "commodity_code": r.commodity_code, "prec": int(r.precision or 2),
+                 "amount": Decimal("0"), "carrying": Decimal("0")},
+            )
+            acc["amount"] += _decimal(r.amount or 0)
+            value = _decimal(r.value or 0)
+            if str(r.txn_currency_id) != base_id:
+                day = r.txn_day if isinstance(r.txn_day, datetime) else datetime.fromisoformat(str(r.txn_day))
+                converted = prices.convert(value, str(r.txn_currency_id), base_id, day.date())
+                if converted is None:
+                    raise ValueError(f"缺少 {day.date().isoformat()} 的交易币种对本位币汇率，无法计算 {r.code} 的账面金额")
+                value = _q(converted, base_prec)
+            acc["carrying"] += value
+
+        items: list[FxRevaluationItem] = []
+        for aid, acc in sorted(accounts.items(), key=lambda kv: kv[1]["code"]):
+            cross = prices.cross_rate(acc["commodity_id"], base_id, rate_date)
+            if cross is None:
+                raise ValueError(f"缺少 {acc['commodity_code']} 在 {rate_date.isoformat()} 的期末汇率")
+            num, den = cross
+            revalued = _q(acc["amount"] * num / den, base_prec)
+            adj = revalued - acc["carrying"]
+            if adj == 0:
+                continue
+            items.append(
+                FxRevaluationItem(
+                    account_id=aid,
+                    account_code=acc["code"],
+                    commodity_code=acc["commodity_code"],
+                    amount=acc["amount"],
+                    carrying_value=acc["carrying"],
+                    rate=num / den,
+                    revalued_value=revalued,
+                    adjustment=adj,
+                )
+            )
+
+        gain = sum((x.adjustment for x in items if x.adjustment > 0), Decimal("0"))
+        loss = -sum((x.adjustment for x in items if x.adjustment < 0), Decimal("0"))
+        if dry_run or not items:
+            return FxRevaluationResult(book_id, str(period.id), rate_date, None, gain, loss, items, dry_run)
+
+        desc = f"{int(period.year)}-{int(period.month):02d} 外币重估"
+        lines: list[dict] = []
+        for x in items:
+            d, cr = (x.adjustment, Decimal("0")) if x.adjustment > 0 else (Decimal("0"), -x.adjustment)
+            lines.append({"account_id": x.account_id, "debit": d, "credit": cr, "aux_json": {"role": FX_REVAL_ROLE}})
+        if str(gain_acc.id) == str(loss_acc.id):
+            net = gain - loss
+            if net > 0:
+                lines.append({"account_id": str(gain_acc.id), "debit": Decimal("0"), "credit": net, "aux_json": None})
+            elif net < 0:
+                lines.append({"account_id": str(gain_acc.id), "debit": -net, "credit": Decimal("0"), "aux_json": None})
+        else:
+            if loss:
+                lines.append({"account_id": str(loss_acc.id), "debit": loss, "credit": Decimal("0"), "aux_json": None})
+            if gain:
+                lines.append({"account_id": str(gain_acc.id), "debit": Decimal("0"), "credit": gain, "aux_json": None})
+
+        maxv = (
+            db.query(sa.func.coalesce(sa.func.max(TransactionDraft.version), 0))
+            .filter(TransactionDraft.book_id == book_id, TransactionDraft.source_type == DRAFT_SOURCE_TYPE, TransactionDraft.source_id == str(period.id))
+            .scalar()
+        )
+        draft = TransactionDraft(
+            book_id=book_id,
+            period_id=str(period.id),
+            currency_id=base_id,
+            txn_date=datetime.combine(rate_date, time()),
+            source_type=DRAFT_SOURCE_TYPE,
+            source_id=str(period.id),
+            version=int(maxv or 0) + 1,
+            description=desc,
+            status="DRAFT",
+            created_by=actor_user_id,
+        )
+        db.add(draft)
+        db.flush()
+        db.execute(
+            sa.insert(TransactionDraftLine.__table__),
+            [{"id": uuid_str(), "draft_id": draft.id, "line_no": i, "memo": desc, **ln} for i, ln in enumerate(lines, start=1)],
+        )
+        db.flush()
+        append_revision(db, draft, action="CREATE", reason="FX_REVALUATION_RUN", actor_id=actor_user_id)
+        db.flush()
+        return FxRevaluationResult(book_id, str(period.id), rate_date, str(draft.id), gain, loss, items, False)
+
+
+def create_fx_reversal_draft(db: Session, draft: TransactionDraft, actor_user_id: str | None) -> TransactionDraft:
+    """重估草稿过账时调用（在过账事务内）：在下一期间首日生成借贷对调的冲回草稿。"""
+    period = db.query(AccountingPeriod).filter(AccountingPeriod.id == draft.period_id).one()
+    nxt = _next_period(db, str(draft.book_id), period)
+    if not nxt or nxt.status != "OPEN":
+        raise ValueError("下一会计期间不存在或未开放，无法生成冲回分录")
+    lines = (
+        db.query(TransactionDraftLine)
+        .filter(TransactionDraftLine.draft_id == draft.id)
+        .order_by(TransactionDraftLine.line_no.asc())
+        .all()
+    )
+    rev = TransactionDraft(
+        book_id=draft.book_id,
+        period_id=str(nxt.id),
+        currency_id=draft.currency_id,
+        txn_date=datetime.combine(date(int(nxt.year), int(nxt.month), 1), time()),
+        source_type=REVERSAL_SOURCE_TYPE,
+        source_id=str(draft.id),
+        version=1,
+        description=f"冲回：{draft.description}",
+        status="DRAFT",
+        created_by=actor_user_id,
+    )
+    db.add(rev)
+    db.flush()
+    db.execute(
+        sa.insert(TransactionDraftLine.__table__),
+        [
+            {
+                "id": uuid_str(),
+                "draft_id": rev.id,
+                "line_no": ln.line_no,
+                "account_id": ln.account_id,
+                "debit": ln.credit,
+                "credit": ln.debit,
+                "memo": rev.description,
+                "aux_json": ln.aux_json,
+            }
+            for ln in lines
+        ],
+    )
+    db.flush()
+    append_revision(db, rev, action="CREATE", reason="FX_REVALUATION_REVERSAL", actor_id=actor_user_id)
+    db.flush()
+    return rev
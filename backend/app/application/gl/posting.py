@@ -6,7 +6,6 @@ from dataclasses import dataclass
 from datetime import datetime
 from decimal import Decimal, ROUND_HALF_UP
 
-import sqlalchemy as sa
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
@@ -21,8 +20,6 @@ from app.infra.db.models import (
     Invoice,
     Lot,
     Payment,
-    PaymentApplication,
-    Price,
     ReportSnapshot,
     Split,
     Transaction,
@@ -30,7 +27,10 @@ from app.infra.db.models import (
     TransactionDraftLine,
     VoucherSequence,
 )
+from app.application.ar_ap.service import apply_posted_payment
+from app.application.engine.prices import PriceBook, get_price_book
 from app.application.gl.draft_workflow import append_revision
+from app.application.gl.fx_revaluation import DRAFT_SOURCE_TYPE as FX_REVAL_SOURCE_TYPE, FX_REVAL_ROLE, create_fx_reversal_draft
 
 
 @dataclass(frozen=True)
@@ -194,32 +194,9 @@ def _q2(v: Decimal) -> Decimal:
     return v.quantize(Decimal("0.01"))
 
 
-def _get_latest_price_value(
-    db: Session,
-    *,
-    book_id: str,
-    commodity_id: str,
-    currency_id: str,
-    as_of: date,
-) -> Decimal | None:
-    row = (
-        db.query(Price)
-        .filter(
-            Price.book_id == book_id,
-            Price.commodity_id == commodity_id,
-            Price.currency_id == currency_id,
-            Price.price_date <= as_of,
-        )
-        .order_by(Price.price_date.desc())
-        .first()
-    )
-    return _decimal(row.value) if row else None
-
-
 def _convert_value_to_amount(
-    db: Session,
+    prices: PriceBook,
     *,
-    book_id: str,
     as_of: date,
     value_in_txn_currency: Decimal,
     account_commodity: Commodity,
@@ -231,28 +208,12 @@ def _convert_value_to_amount(
     if str(account_commodity.id) == str(txn_currency.id):
         return value_in_txn_currency
 
-    # price: 1 account_commodity = price.value txn_currency
-    direct = _get_latest_price_value(
-        db,
-        book_id=book_id,
-        commodity_id=str(account_commodity.id),
-        currency_id=str(txn_currency.id),
-        as_of=as_of,
+    # 直连/反向报价优先；都没有时经价格图三角折算（如 EUR→CNY→USD），交叉汇率按 (账簿, 日期) 缓存
+    amt = prices.convert(
+        value_in_txn_currency, str(txn_currency.id), str(account_commodity.id), as_of
     )
-    if direct and direct != 0:
-        amt = value_in_txn_currency / direct
-    else:
-        # reverse: 1 txn_currency = price.value account_commodity
-        rev = _get_latest_price_value(
-            db,
-            book_id=book_id,
-            commodity_id=str(txn_currency.id),
-            currency_id=str(account_commodity.id),
-            as_of=as_of,
-        )
-        if not rev or rev == 0:
-            raise ValueError("缺少汇率/价格（Price），无法进行多币种换算")
-        amt = value_in_txn_currency * rev
+    if amt is None:
+        raise ValueError("缺少汇率/价格（Price），无法进行多币种换算")
 
     # round by commodity precision
     prec = int(account_commodity.precision or 2)
@@ -358,19 +319,27 @@ def post_draft(db: Session, draft_id: str, actor_user_id: str | None) -> PostRes
 
         # 写 splits + 更新余额（余额用 account commodity 的 amount 口径）
         deltas: dict[str, Decimal] = {}
+        prices: PriceBook | None = None  # 有外币行时才取，一次过账只取一次（get_price_book 每次都要查版本号）
         for ln in lines:
             v = _decimal(ln.debit) - _decimal(ln.credit)  # value in txn currency
             acc = db.query(Account).filter(Account.id == ln.account_id).one()
             acc_commodity = db.query(Commodity).filter(Commodity.id == acc.commodity_id).one()
-            amt = _convert_value_to_amount(
-                db,
-                book_id=str(draft.book_id),
-                as_of=txn_date.date(),
-                value_in_txn_currency=v,
-                account_commodity=acc_commodity,
-                txn_currency=txn_currency,
-            )
             aux = ln.aux_json or {}
+            if aux.get("role") == FX_REVAL_ROLE:
+                # 外币重估行：只调整本位币金额，外币数量不变
+                amt = Decimal("0")
+            elif str(acc_commodity.id) == str(txn_currency.id):
+                amt = v
+            else:
+                if prices is None:
+                    prices = get_price_book(db, str(draft.book_id))
+                amt = _convert_value_to_amount(
+                    prices,
+                    as_of=txn_date.date(),
+                    value_in_txn_currency=v,
+                    account_commodity=acc_commodity,
+                    txn_currency=txn_currency,
+                )
             sp = Split(
                 txn_id=txn.id,
                 line_no=ln.line_no,
@@ -447,29 +416,17 @@ def post_draft(db: Session, draft_id: str, actor_user_id: str | None) -> PostRes
                 pay.txn_id = txn.id
                 pay.status = "POSTED"
                 pay.updated_at = datetime.utcnow()
-                # 结清判断：同币种限制下，按 payment_applications 汇总
-                apps = db.query(PaymentApplication).filter(PaymentApplication.payment_id == pay.id).all()
-                inv_ids = list({str(x.invoice_id) for x in apps})
-                if inv_ids:
-                    sums = (
-                        db.query(PaymentApplication.invoice_id, sa.func.sum(PaymentApplication.amount))
-                        .filter(PaymentApplication.invoice_id.in_(inv_ids))
-                        .group_by(PaymentApplication.invoice_id)
-                        .all()
-                    )
-                    paid_by_inv = {str(iid): _decimal(s or 0) for iid, s in sums}
-                    invs = db.query(Invoice).filter(Invoice.id.in_(inv_ids)).all()
-                    for inv in invs:
-                        paid = paid_by_inv.get(str(inv.id), Decimal("0"))
-                        if paid >= _decimal(inv.total_gross):
-                            inv.status = "PAID"
-                            inv.updated_at = datetime.utcnow()
-                            if inv.lot_id:
-                                lot = db.query(Lot).filter(Lot.id == inv.lot_id).one_or_none()
-                                if lot and not lot.is_closed:
-                                    lot.is_closed = True
-                                    lot.closed_at = datetime.utcnow()
-                                    db.flush()
+                # 结清判断：核销额累加到发票物化列（applied/outstanding），结清的发票关闭 lot
+                for inv in apply_posted_payment(db, pay):
+                    if inv.status == "PAID" and inv.lot_id:
+                        lot = db.query(Lot).filter(Lot.id == inv.lot_id).one_or_none()
+                        if lot and not lot.is_closed:
+                            lot.is_closed = True
+                            lot.closed_at = datetime.utcnow()
+                            db.flush()
+        # 外币重估：过账后自动生成下一期间的冲回草稿
+        if draft.source_type == FX_REVAL_SOURCE_TYPE:
+            create_fx_reversal_draft(db, draft, actor_user_id)
         append_revision(db, draft, action="POST", reason="", actor_id=actor_user_id)
         db.flush()
 
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import base64
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.infra.db.models import Account, AccountBalance, AccountingPeriod, Split, Transaction
+
+_CREDIT_TYPES = {"LIABILITY", "EQUITY", "INCOME", "AP"}
+
+
+def _decimal(v) -> Decimal:
+    if isinstance(v, Decimal):
+        return v
+    return Decimal(str(v))
+
+
+@dataclass(frozen=True)
+class RegisterRow:
+    split_id: str
+    txn_id: str
+    txn_num: str
+    txn_date: str
+    description: str
+    split_line_no: int
+    value: Decimal
+    amount: Decimal
+    memo: str
+    reconcile_state: str
+    balance: Decimal
+
+
+@dataclass(frozen=True)
+class RegisterPage:
+    account_id: str
+    items: list[RegisterRow]  # 新 -> 旧
+    opening_balance: Decimal  # 本页最早一行之前的余额
+    before_cursor: str | None  # 传给 before= 取更早一页
+    after_cursor: str | None  # 传给 after= 取更新一页
+
+
+# 排序键：(期间 key, 交易日期, txn_id, 分录行号)，全局唯一，可直接做 keyset 分页。
+# 先按期间排序，保证“期初余额 = 之前各期间 balance cache 之和”与窗口累计口径一致。
+def pack_cursor(*key) -> str:
+    """keyset 分页游标：排序键编码为不透明的 URL 安全字符串（日期/时间存 ISO 格式）。各分页接口共用。"""
+    raw = json.dumps([k.isoformat() if isinstance(k, (date, datetime)) else k for k in key], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def unpack_cursor(cursor: str) -> list:
+    """pack_cursor 的逆过程；日期字段由调用方按需 fromisoformat。"""
+    try:
+        pad = "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(cursor + pad).decode("utf-8"))
+    except Exception:
+        raise ValueError("分页游标无效")
+    if not isinstance(key, list):
+        raise ValueError("分页游标无效")
+    return key
+
+
+def encode_cursor(pkey: int, txn_date: datetime, txn_id: str, line_no: int) -> str:
+    return pack_cursor(int(pkey), txn_date, str(txn_id), int(line_no))
+
+
+def decode_cursor(cursor: str) -> tuple[int, datetime, str, int]:
+    try:
+        pkey, d, tid, ln = unpack_cursor(cursor)
+        return int(pkey), datetime.fromisoformat(d), str(tid), int(ln)
+    except (TypeError, ValueError):
+        raise ValueError("分页游标无效")
+
+
+def _opening_from_cache(db: Session, account_id: str, before_pkey: int) -> Decimal:
+    # balance cache 按期间存“本期发生额”（account commodity 口径），累加之前期间即为期初
+    pe = AccountingPeriod.__table__
+    ab = AccountBalance.__table__
+    q = (
+        sa.select(sa.func.coalesce(sa.func.sum(ab.c.balance_value), 0))
+        .select_from(ab.join(pe, ab.c.period_id == pe.c.id))
+        .where(ab.c.account_id == account_id)
+        .where((pe.c.year * 100 + pe.c.month) < before_pkey)
+    )
+    return _decimal(db.execute(q).scalar_one())
+
+
+def load_register_page(
+    db: Session,
+    account_id: str,
+    *,
+    period_id: str | None = None,
+    limit: int = 100,
+    before: str | None = None,
+    after: str | None = None,
+) -> RegisterPage:
+    if before and after:
+        raise ValueError("before 与 after 不能同时指定")
+    acc = db.query(Account).filter(Account.id == account_id).one_or_none()
+    if not acc:
+        raise ValueError("科目不存在")
+    sign = Decimal("-1") if (acc.type or "").upper() in _CREDIT_TYPES else Decimal("1")
+
+    sp = Split.__table__
+    tx = Transaction.__table__
+    pe = AccountingPeriod.__table__
+    pkey_col = (pe.c.year * 100 + pe.c.month).label("pkey")
+    key_cols = (pkey_col, tx.c.txn_date, sp.c.txn_id, sp.c.line_no)
+    key = sa.tuple_(pe.c.year * 100 + pe.c.month, tx.c.txn_date, sp.c.txn_id, sp.c.line_no)
+    base_from = sp.join(tx, sp.c.txn_id == tx.c.id).join(pe, tx.c.period_id == pe.c.id)
+
+    # 1) keyset 取本页（多取一行判断是否还有下一页）
+    q_page = sa.select(*key_cols).select_from(base_from).where(sp.c.account_id == account_id)
+    if period_id:
+        q_page = q_page.where(tx.c.period_id == period_id)
+    if after:
+        q_page = q_page.where(key > sa.tuple_(*decode_cursor(after)))
+        q_page = q_page.order_by(*(c.asc() for c in key_cols))
+    else:
+        if before:
+            q_page = q_page.where(key < sa.tuple_(*decode_cursor(before)))
+        q_page = q_page.order_by(*(c.desc() for c in key_cols))
+    keys = [tuple(r) for r in db.execute(q_page.limit(limit + 1)).all()]
+    has_more = len(keys) > limit
+    keys = sorted(keys[:limit])
+
+    if not keys:
+        return RegisterPage(account_id=account_id, items=[], opening_balance=Decimal("0"), before_cursor=None, after_cursor=None)
+
+    first, last = keys[0], keys[-1]
+
+    # 2) 期初：取 balance cache 中“本页最早期间之前”的累计，窗口只需覆盖该期间起至本页末行
+    opening_anchor = _opening_from_cache(db, account_id, int(first[0]))
+    running = sa.func.sum(sp.c.amount).over(order_by=[pe.c.year * 100 + pe.c.month, tx.c.txn_date, sp.c.txn_id, sp.c.line_no])
+    inner = (
+        sa.select(
+            pkey_col,
+            tx.c.txn_date,
+            sp.c.txn_id,
+            sp.c.line_no,
+            sp.c.id.label("split_id"),
+            tx.c.num,
+            tx.c.description,
+            sp.c.value,
+            sp.c.amount,
+            sp.c.memo,
+            sp.c.reconcile_state,
+            running.label("running"),
+        )
+        .select_from(base_from)
+        .where(sp.c.account_id == account_id)
+        .where((pe.c.year * 100 + pe.c.month) >= int(first[0]))
+        .where(key <= sa.tuple_(*last))
+        .subquery()
+    )
+    q_rows = (
+        sa.select(inner)
+        .where(sa.tuple_(inner.c.pkey, inner.c.txn_date, inner.c.txn_id, inner.c.line_no) >= sa.tuple_(*first))
+        .order_by(inner.c.pkey.desc(), inner.c.txn_date.desc(), inner.c.txn_id.desc(), inner.c.line_no.desc())
+    )
+    rows = db.execute(q_rows).mappings().all()
+
+    items = [
+        RegisterRow(
+            split_id=str(r["split_id"]),
+            txn_id=str(r["txn_id"]),
+            txn_num=r["num"],
+            txn_date=r["txn_date"].date().isoformat(),
+            description=r["description"],
+            split_line_no=int(r["line_no"]),
+            value=_decimal(r["value"]),
+            amount=_decimal(r["amount"]),
+            memo=r["memo"],
+            reconcile_state=r["reconcile_state"],
+            balance=sign * (opening_anchor + _decimal(r["running"])),
+        )
+        for r in rows
+    ]
+    oldest = items[-1]
+    opening_balance = oldest.balance - sign * oldest.amount
+
+    # 3) 游标：向旧方向是否还有数据由 has_more(desc) 判断；向新方向同理
+    more_before = has_more if not after else True
+    more_after = has_more if after else bool(before)
+    return RegisterPage(
+        account_id=account_id,
+        items=items,
+        opening_balance=opening_balance,
+        before_cursor=encode_cursor(*first) if more_before else None,
+        after_cursor=encode_cursor(*last) if more_after else None,
+    )
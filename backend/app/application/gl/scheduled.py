@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Callable
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.infra.db.models import (
+    AccountingPeriod,
+    Book,
+    ScheduledRun,
+    ScheduledTransaction,
+    TransactionDraft,
+    TransactionDraftLine,
+    utcnow,
+    uuid_str,
+)
+
+
+def _decimal(v) -> Decimal:
+    if isinstance(v, Decimal):
+        return v
+    return Decimal(str(v))
+
+
+def add_months(d: date, months: int) -> date:
+    y = d.year + (d.month - 1 + months) // 12
+    m = (d.month - 1 + months) % 12 + 1
+    # clamp day to last day of month
+    if m == 12:
+        last = date(y + 1, 1, 1) - timedelta(days=1)
+    else:
+        last = date(y, m + 1, 1) - timedelta(days=1)
+    day = min(d.day, last.day)
+    return date(y, m, day)
+
+
+def next_run_date(rule: str, interval: int, d: date) -> date:
+    rule_u = (rule or "").upper()
+    if rule_u == "DAILY":
+        return d + timedelta(days=interval)
+    if rule_u == "WEEKLY":
+        return d + timedelta(days=7 * interval)
+    if rule_u == "MONTHLY":
+        return add_months(d, interval)
+    raise ValueError("rule 必须是 DAILY/WEEKLY/MONTHLY")
+
+
+def validate_template(lines: list[dict]) -> None:
+    if not lines or len(lines) < 2:
+        raise ValueError("template.lines 至少 2 行")
+    s_deb = sum((_decimal(x.get("debit", 0)) for x in lines), start=Decimal("0"))
+    s_cred = sum((_decimal(x.get("credit", 0)) for x in lines), start=Decimal("0"))
+    if s_deb != s_cred:
+        raise ValueError(f"模板不平衡：debit={s_deb} credit={s_cred}")
+
+
+@dataclass(frozen=True)
+class CatchUpResult:
+    sched_id: str
+    created: int  # 本批生成的草稿数
+    skipped: int  # 已有 OK/SKIPPED 记录而跳过的日期数
+    next_run_date: date
+    failed_date: date | None = None
+    error: str = ""
+    more: bool = False  # 还有未补跑的到期日（超过本批上限）
+
+
+def catch_up_schedule(
+    db: Session, sched_id: str, today: date, *, max_occurrences: int = 100, actor_user_id: str | None = None
+) -> CatchUpResult:
+    """
+    在一个事务内补跑某定期交易从 next_run_date 到 today 的所有到期日（最多 max_occurrences 个）：
+    - 草稿、草稿行、运行记录都按批量 INSERT 写入；
+    - 某一日失败（期间不存在/已关闭/模板不平衡）时记一条 FAILED 并停在该日，下次调度重试；
+    - 与手工 :run 共用 (sched_id, run_date) 唯一约束与行锁，互不重复生成。
+    """
+    with db.begin():
+        s = db.query(ScheduledTransaction).filter(ScheduledTransaction.id == sched_id).with_for_update().one_or_none()
+        if not s or not s.enabled:
+            return CatchUpResult(sched_id=sched_id, created=0, skipped=0, next_run_date=s.next_run_date if s else today)
+
+        due: list[date] = []
+        d = s.next_run_date
+        while d <= today and (s.end_date is None or d <= s.end_date) and len(due) <= max_occurrences:
+            due.append(d)
+            d = next_run_date(s.rule, int(s.interval), d)
+        more = len(due) > max_occurrences
+        due = due[:max_occurrences]
+        if not due:
+            return CatchUpResult(sched_id=sched_id, created=0, skipped=0, next_run_date=s.next_run_date)
+
+        existing = {
+            r.run_date: r
+            for r in db.query(ScheduledRun).filter(ScheduledRun.sched_id == s.id, ScheduledRun.run_date.in_(due)).all()
+        }
+        keys = {(x.year, x.month) for x in due}
+        periods = {
+            (int(p.year), int(p.month)): p
+            for p in db.query(AccountingPeriod)
+            .filter(AccountingPeriod.book_id == s.book_id)
+            .filter(AccountingPeriod.year.in_({k[0] for k in keys}))
+            .all()
+            if (int(p.year), int(p.month)) in keys
+        }
+
+        tpl = s.template_json or {}
+        lines = tpl.get("lines") or []
+        desc = (tpl.get("description") or s.description or s.name or "").strip()
+        try:
+            validate_template(lines)
+            tpl_error = ""
+        except ValueError as e:
+            tpl_error = str(e)
+
+        maxv = (
+            db.query(sa.func.coalesce(sa.func.max(TransactionDraft.version), 0))
+            .filter(TransactionDraft.book_id == s.book_id, TransactionDraft.source_type == "SCHEDULED", TransactionDraft.source_id == str(s.id))
+            .scalar()
+        )
+        ver = int(maxv or 0)
+
+        now = utcnow()
+        drafts: list[dict] = []
+        draft_lines: list[dict] = []
+        runs: list[dict] = []
+        skipped = 0
+        failed_date: date | None = None
+        error = ""
+        next_d = s.next_run_date
+        for run_d in due:
+            prev = existing.get(run_d)
+            if prev is not None and prev.status != "FAILED":
+                skipped += 1
+                next_d = next_run_date(s.rule, int(s.interval), run_d)
+                continue
+
+            period = periods.get((run_d.year, run_d.month))
+            if tpl_error:
+                error = tpl_error
+            elif not period:
+                error = "period not found"
+            elif period.status != "OPEN":
+                error = "period closed"
+            if error:
+                failed_date = run_d
+                if prev is not None:
+                    prev.error = error
+                else:
+                    runs.append({"id": uuid_str(), "sched_id": s.id, "run_date": run_d, "draft_id": None, "status": "FAILED", "error": error, "created_at": now})
+                break
+
+            ver += 1
+            draft_id = uuid_str()
+            drafts.append(
+                {
+                    "id": draft_id,
+                    "book_id": s.book_id,
+                    "period_id": period.id,
+                    "txn_date": datetime.combine(run_d, time()),
+                    "source_type": "SCHEDULED",
+                    "source_id": str(s.id),
+                    "version": ver,
+                    "description": desc,
+                    "status": "DRAFT",
+                    "created_by": actor_user_id,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+            )
+            for i, ln in enumerate(lines, start=1):
+                draft_lines.append(
+                    {
+                        "id": uuid_str(),
+                        "draft_id": draft_id,
+                        "line_no": i,
+                        "account_id": ln["account_id"],
+                        "debit": _decimal(ln.get("debit", 0)),
+                        "credit": _decimal(ln.get("credit", 0)),
+                        "memo": ln.get("memo") or "",
+                        "aux_json": ln.get("aux_json"),
+                    }
+                )
+            if prev is not None:
+                # 之前失败过的日期：改写原记录
+                prev.status, prev.error, prev.draft_id = "OK", "", draft_id
+            else:
+                runs.append({"id": uuid_str(), "sched_id": s.id, "run_date": run_d, "draft_id": draft_id, "status": "OK", "error": "", "created_at": now})
+            next_d = next_run_date(s.rule, int(s.interval), run_d)
+
+        if drafts:
+            db.execute(sa.insert(TransactionDraft.__table__), drafts)
+        if draft_lines:
+            db.execute(sa.insert(TransactionDraftLine.__table__), draft_lines)
+        db.flush()
+        if runs:
+            db.execute(sa.insert(ScheduledRun.__table__), runs)
+
+        s.next_run_date = next_d
+        s.updated_at = now
+        db.flush()
+        return CatchUpResult(
+            sched_id=str(s.id),
+            created=len(drafts),
+            skipped=skipped,
+            next_run_date=next_d,
+            failed_date=failed_date,
+            error=error,
+            more=more and failed_date is None,
+        )
+
+
+def due_schedule_ids(db: Session, today: date) -> list[str]:
+    # 按账簿逐个查询，走 ix_sched_book_next (book_id, next_run_date)
+    book_ids = [str(r[0]) for r in db.query(Book.id).order_by(Book.id.asc()).all()]
+    out: list[str] = []
+    for book_id in book_ids:
+        out += [
+            str(r[0])
+            for r in db.query(ScheduledTransaction.id)
+            .filter(ScheduledTransaction.book_id == book_id, ScheduledTransaction.next_run_date <= today)
+            .filter(ScheduledTransaction.enabled.is_(True))
+            .order_by(ScheduledTransaction.next_run_date.asc())
+            .all()
+        ]
+    return out
+
+
+def run_due_schedules(
+    session_factory: Callable[[], Session], today: date, *, max_occurrences: int = 100
+) -> list[CatchUpResult]:
+    """补跑所有到期的定期交易；每个定期交易按 max_occurrences 分批、每批一个事务。"""
+    with session_factory() as db:
+        ids = due_schedule_ids(db, today)
+    results: list[CatchUpResult] = []
+    for sched_id in ids:
+        while True:
+            with session_factory() as db:
+                res = catch_up_schedule(db, sched_id, today, max_occurrences=max_occurrences)
+            results.append(res)
+            if not res.more:
+                break
+    return results
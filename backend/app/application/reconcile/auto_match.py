@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import re
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.infra.db.models import (
+    BankStatementLine,
+    ReconcileMatch,
+    ReconcileMatchProposal,
+    ReconcileSession,
+    Split,
+    Transaction,
+    utcnow,
+    uuid_str,
+)
+
+RULE_EXACT = "EXACT"
+RULE_REFERENCE = "REFERENCE"
+RULE_COMBINATION = "COMBINATION"
+
+# 组合匹配（多笔分录合计 = 一行对账单）的搜索上限：窗口内最多取最近的 N 笔候选、组合最多 K 笔
+_COMBO_CANDIDATES = 14
+_COMBO_MAX_SIZE = 4
+# 出现在过多分录里的词（如 “转账”“payment”）没有区分度，不参与文本匹配
+_TOKEN_MAX_POSTINGS = 50
+_TOKEN_RE = re.compile(r"[0-9A-Za-z]{3,}|[\u4e00-\u9fff]{2,}")
+
+
+@dataclass(frozen=True)
+class LineIn:
+    id: str
+    txn_date: date
+    cents: int
+    text: str  # 摘要 + 参考号 + 对方户名
+    reference: str = ""
+
+
+@dataclass(frozen=True)
+class SplitIn:
+    id: str
+    txn_date: date
+    cents: int  # 分录 value（与对账单同向：借方/流入为正）
+    text: str  # 分录 memo + 凭证摘要 + 凭证号
+
+
+@dataclass(frozen=True)
+class Proposal:
+    line_id: str
+    split_ids: tuple[str, ...]
+    rule: str
+    confidence: float
+
+
+def _cents(v) -> int:
+    return int((Decimal(str(v)) * 100).to_integral_value())
+
+
+def _tokens(text: str) -> set[str]:
+    return {t.lower() for t in _TOKEN_RE.findall(text or "")}
+
+
+def _date_conf(base: float, days: int, per_day: float, floor: float) -> float:
+    return round(max(floor, base - per_day * days), 2)
+
+
+def match_lines(lines: list[LineIn], splits: list[SplitIn], *, window_days: int = 3) -> list[Proposal]:
+    """
+    纯内存匹配（不访问数据库），三轮依次进行，已配对的行/分录不再参与后续轮次：
+    1) 精确：金额相同（按分单位哈希）且日期相差不超过 window_days，取日期最近者；
+    2) 参考号/摘要：金额相同、日期放宽到 4 倍窗口，要求文本有共同关键词（倒排索引）；
+    3) 组合：窗口内同向的若干分录合计等于一行对账单（有界子集和）。
+    每轮都按日期有序 + 哈希/二分定位候选，整体 O(n log n)。
+    """
+    order = sorted(range(len(splits)), key=lambda i: (splits[i].txn_date, splits[i].id))
+    used = [False] * len(splits)
+    done: set[str] = set()
+    out: list[Proposal] = []
+
+    # 金额（分）-> 按日期有序的 (日期序数列表, 分录下标列表)，日期窗口用二分定位
+    by_cents: dict[int, tuple[list[int], list[int]]] = {}
+    for i in order:
+        ords, idx = by_cents.setdefault(splits[i].cents, ([], []))
+        ords.append(splits[i].txn_date.toordinal())
+        idx.append(i)
+
+    def outward(ords: list[int], d: int, max_days: int):
+        # 从日期 d 向两侧交替展开，按日期距离由近到远产出下标
+        left, right = bisect_left(ords, d) - 1, bisect_left(ords, d)
+        while True:
+            dl = d - ords[left] if left >= 0 and d - ords[left] <= max_days else None
+            dr = ords[right] - d if right < len(ords) and ords[right] - d <= max_days else None
+            if dl is None and dr is None:
+                return
+            if dr is None or (dl is not None and dl <= dr):
+                yield left, dl
+                left -= 1
+            else:
+                yield right, dr
+                right += 1
+
+    def nearest(line: LineIn, bucket: tuple[list[int], list[int]], max_days: int) -> tuple[int | None, int, bool]:
+        # 返回最近的未用分录、相差天数、窗口内是否还有其他同金额候选
+        ords, idx = bucket
+        best, best_days = None, 0
+        for k, days in outward(ords, line.txn_date.toordinal(), max_days):
+            i = idx[k]
+            if used[i]:
+                continue
+            if best is not None:
+                return best, best_days, True
+            best, best_days = i, days
+        return best, best_days, False
+
+    lines_sorted = sorted(lines, key=lambda x: (x.txn_date, x.id))
+
+    # 1) 精确匹配
+    for line in lines_sorted:
+        bucket = by_cents.get(line.cents)
+        if not bucket:
+            continue
+        i, days, ambiguous = nearest(line, bucket, window_days)
+        if i is None:
+            continue
+        used[i] = True
+        done.add(line.id)
+        conf = _date_conf(0.99, days, 0.04, 0.8)
+        if ambiguous:
+            # 同金额有多笔可选：日期最近只是猜测
+            conf = round(conf - 0.1, 2)
+        out.append(Proposal(line_id=line.id, split_ids=(splits[i].id,), rule=RULE_EXACT, confidence=conf))
+
+    # 2) 参考号/摘要相似
+    postings: dict[str, list[int]] = {}
+    split_tokens: dict[int, set[str]] = {}
+    for i in order:
+        if used[i]:
+            continue
+        toks = _tokens(splits[i].text)
+        split_tokens[i] = toks
+        for t in toks:
+            postings.setdefault(t, []).append(i)
+    for line in lines_sorted:
+        if line.id in done:
+            continue
+        toks = _tokens(line.text)
+        scores: dict[int, int] = {}
+        for t in toks:
+            plist = postings.get(t)
+            if not plist or len(plist) > _TOKEN_MAX_POSTINGS:
+                continue
+            for i in plist:
+                if not used[i] and splits[i].cents == line.cents:
+                    scores[i] = scores.get(i, 0) + 1
+        best, best_key = None, None
+        for i, shared in scores.items():
+            days = abs((splits[i].txn_date - line.txn_date).days)
+            if days > window_days * 4:
+                continue
+            key = (-shared, days, splits[i].id)
+            if best_key is None or key < best_key:
+                best, best_key = i, key
+        if best is None:
+            continue
+        used[best] = True
+        done.add(line.id)
+        sim = -best_key[0] / max(1, min(len(toks), len(split_tokens[best])))
+        ref_hit = bool(line.reference) and line.reference.lower() in splits[best].text.lower()
+        conf = 0.9 if ref_hit else round(0.6 + 0.25 * min(1.0, sim), 2)
+        out.append(Proposal(line_id=line.id, split_ids=(splits[best].id,), rule=RULE_REFERENCE, confidence=conf))
+
+    # 3) 多笔分录 -> 一行对账单
+    rest = [i for i in order if not used[i]]
+    dates = [splits[i].txn_date.toordinal() for i in rest]
+    for line in lines_sorted:
+        if line.id in done or line.cents == 0:
+            continue
+        # 只取日期最近的 _COMBO_CANDIDATES 笔同向候选
+        pool: list[int] = []
+        for k, _days in outward(dates, line.txn_date.toordinal(), window_days):
+            i = rest[k]
+            if not used[i] and splits[i].cents != 0 and (splits[i].cents > 0) == (line.cents > 0):
+                pool.append(i)
+                if len(pool) >= _COMBO_CANDIDATES:
+                    break
+        if len(pool) < 2:
+            continue
+        combo = _subset_sum([(i, splits[i].cents) for i in pool], line.cents)
+        if not combo:
+            continue
+        for i in combo:
+            used[i] = True
+        done.add(line.id)
+        conf = round(0.7 - 0.05 * (len(combo) - 2), 2)
+        out.append(Proposal(line_id=line.id, split_ids=tuple(splits[i].id for i in combo), rule=RULE_COMBINATION, confidence=conf))
+
+    return out
+
+
+def _subset_sum(items: list[tuple[int, int]], target: int) -> list[int] | None:
+    """有界 DFS：2..K 笔、绝对值降序剪枝；候选数与组合大小均有上限，单行代价为常数。"""
+    items = sorted(items, key=lambda x: -abs(x[1]))
+    goal = abs(target)
+    vals = [abs(v) for _, v in items]
+    suffix = [0] * (len(vals) + 1)
+    for k in range(len(vals) - 1, -1, -1):
+        suffix[k] = suffix[k + 1] + vals[k]
+    pick: list[int] = []
+
+    def dfs(start: int, remaining: int) -> bool:
+        if remaining == 0:
+            return len(pick) >= 2
+        if len(pick) >= _COMBO_MAX_SIZE or suffix[start] < remaining:
+            return False
+        for k in range(start, len(vals)):
+            if vals[k] > remaining:
+                continue
+            pick.append(k)
+            if dfs(k + 1, remaining - vals[k]):
+                return True
+            pick.pop()
+        return False
+
+    if not dfs(0, goal):
+        return None
+    return [items[k][0] for k in pick]
+
+
+@dataclass(frozen=True)
+class ProposeResult:
+    session_id: str
+    lines_considered: int
+    candidates_considered: int
+    proposals: int
+    by_rule: dict[str, int]
+
+
+def propose_matches(db: Session, session_id: str, *, window_days: int = 3) -> ProposeResult:
+    """
+    对会话中尚未配对的对账单行生成匹配建议，写入 reconcile_match_proposals（覆盖该会话旧建议）。
+    候选分录与对账详情一致（本科目、未对账、尚未选中），日期放宽到截止日后 window_days 天。
+    """
+    if window_days < 0 or window_days > 31:
+        raise ValueError("window_days 必须在 0..31 之间")
+    with db.begin():
+        sess = db.query(ReconcileSession).filter(ReconcileSession.id == session_id).with_for_update().one_or_none()
+        if not sess:
+            raise ValueError("对账会话不存在")
+        if sess.status != "OPEN":
+            raise ValueError("会话已结束")
+
+        bl = BankStatementLine.__table__
+        rm = ReconcileMatch.__table__
+        sp = Split.__table__
+        tx = Transaction.__table__
+        pr = ReconcileMatchProposal.__table__
+
+        matched_lines = sa.select(rm.c.statement_line_id).where(rm.c.session_id == sess.id, rm.c.statement_line_id.is_not(None))
+        lines = [
+            LineIn(
+                id=str(r.id),
+                txn_date=r.txn_date,
+                cents=_cents(r.amount),
+                text=f"{r.description} {r.reference} {r.counterparty}",
+                reference=r.reference or "",
+            )
+            for r in db.execute(
+                sa.select(bl.c.id, bl.c.txn_date, bl.c.amount, bl.c.description, bl.c.reference, bl.c.counterparty)
+                .where(bl.c.session_id == sess.id)
+                .where(bl.c.id.not_in(matched_lines))
+            ).all()
+        ]
+        cutoff = datetime.combine(sess.statement_date + timedelta(days=window_days), time.max)
+        selected = sa.select(rm.c.split_id).where(rm.c.session_id == sess.id)
+        splits = [
+            SplitIn(id=str(r.id), txn_date=r.txn_date.date(), cents=_cents(r.value), text=f"{r.memo} {r.description} {r.num}")
+            for r in db.execute(
+                sa.select(sp.c.id, sp.c.value, sp.c.memo, tx.c.txn_date, tx.c.description, tx.c.num)
+                .select_from(sp.join(tx, sp.c.txn_id == tx.c.id))
+                .where(sp.c.account_id == sess.account_id)
+                .where(tx.c.txn_date <= cutoff)
+                .where(sp.c.reconcile_state != "y")
+                .where(sp.c.id.not_in(selected))
+            ).all()
+        ]
+
+        proposals = match_lines(lines, splits, window_days=window_days)
+
+        db.execute(pr.delete().where(pr.c.session_id == sess.id))
+        now = utcnow()
+        rows = [
+            {
+                "id": uuid_str(),
+                "session_id": sess.id,
+                "group_no": n,
+                "statement_line_id": p.line_id,
+                "split_id": sid,
+                "rule": p.rule,
+                "confidence": Decimal(str(p.confidence)),
+                "created_at": now,
+            }
+            for n, p in enumerate(proposals, start=1)
+            for sid in p.split_ids
+        ]
+        for k in range(0, len(rows), 1000):
+            db.execute(sa.insert(pr), rows[k : k + 1000])
+
+        by_rule: dict[str, int] = {}
+        for p in proposals:
+            by_rule[p.rule] = by_rule.get(p.rule, 0) + 1
+        return ProposeResult(
+            session_id=str(sess.id),
+            lines_considered=len(lines),
+            candidates_considered=len(splits),
+            proposals=len(proposals),
+            by_rule=by_rule,
+        )
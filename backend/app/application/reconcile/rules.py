@@ -0,0 +1,330 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from datetime import datetime, time
+from decimal import Decimal
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.application.gl.draft_workflow import draft_snapshot_payload
+from app.infra.db.models import (
+    Account,
+    AccountingPeriod,
+    BankRule,
+    BankStatementLine,
+    ReconcileMatch,
+    ReconcileSession,
+    TransactionDraft,
+    TransactionDraftLine,
+    TransactionDraftRevision,
+    utcnow,
+    uuid_str,
+)
+
+MATCH_KEYWORD = "KEYWORD"
+MATCH_REGEX = "REGEX"
+DRAFT_SOURCE_TYPE = "BANK_STATEMENT"
+
+# 合并成一个正则后各规则的分组编号会错位，所以不允许反向引用；命名分组改写为非捕获分组
+_BACKREF_RE = re.compile(r"\\[1-9]|\(\?P=")
+_NAMED_GROUP_RE = re.compile(r"\(\?P<\w+>")
+# 开头的全局内联标志（如 (?i)）放进分组后不再合法，改写为作用于整个规则的局部标志 (?i:...)
+_LEADING_FLAGS_RE = re.compile(r"^\(\?([aiLmsux]+)\)")
+
+
+def _decimal(v) -> Decimal:
+    if isinstance(v, Decimal):
+        return v
+    return Decimal(str(v))
+
+
+@dataclass(frozen=True)
+class RuleIn:
+    id: str
+    name: str
+    priority: int
+    match_type: str
+    pattern: str
+    counter_account_id: str
+    counterparty: str = ""
+    min_amount: Decimal | None = None
+    max_amount: Decimal | None = None
+    memo: str = ""
+
+
+def rule_regex(match_type: str, pattern: str) -> str:
+    mt = (match_type or "").upper()
+    if mt == MATCH_KEYWORD:
+        return re.escape(pattern)
+    if mt != MATCH_REGEX:
+        raise ValueError("match_type 必须是 KEYWORD/REGEX")
+    if _BACKREF_RE.search(pattern):
+        raise ValueError("规则正则不支持反向引用")
+    flags = ""
+    m = _LEADING_FLAGS_RE.match(pattern)
+    while m:
+        flags += m.group(1)
+        pattern = pattern[m.end() :]
+        m = _LEADING_FLAGS_RE.match(pattern)
+    piece = _NAMED_GROUP_RE.sub("(?:", pattern)
+    if flags:
+        piece = f"(?{flags}:{piece})"
+    # 按合并时的包裹形式校验，保证能放进 RuleMatcher 的交替式
+    try:
+        re.compile(f"(?P<r0>{piece})", re.IGNORECASE)
+    except re.error as e:
+        raise ValueError(f"规则正则无效：{e}")
+    return piece
+
+
+def _trie_regex(words: list[str]) -> str:
+    """关键词集合 -> 前缀树形状的正则（每个位置只按首字符分支，较长的词优先）。"""
+    trie: dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def emit(node: dict) -> str:
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if "" in node:
+            return f"(?:{body})?"
+        return body
+
+    return emit(trie)
+
+
+class RuleMatcher:
+    """
+    把一个账簿的规则编译成两个正则，每行对账单各扫描一遍：
+    - 关键词规则（不区分大小写）合成一个前缀树正则，零宽前瞻下在每个位置取最长命中，
+      再由“最长词 -> 其所有前缀关键词对应的规则”一次查表，不会漏掉重叠/互为前缀的关键词；
+    - 正则规则合成一个命名分组 r<i> 的交替式，同一位置只记下优先级最高的分组。
+    """
+
+    def __init__(self, rules: list[RuleIn]) -> None:
+        self.rules = sorted(rules, key=lambda r: (r.priority, r.id))
+        self._always: set[int] = set()
+        self._single: list[re.Pattern | None] = []
+        by_word: dict[str, set[int]] = {}
+        alts: list[str] = []
+        for i, r in enumerate(self.rules):
+            self._single.append(None)
+            if not r.pattern:
+                self._always.add(i)
+            elif (r.match_type or "").upper() == MATCH_KEYWORD:
+                by_word.setdefault(r.pattern.lower(), set()).add(i)
+            else:
+                # 库里已有的无效规则只跳过该条，不影响整个账簿的分类
+                try:
+                    piece = rule_regex(r.match_type, r.pattern)
+                    single = re.compile(piece, re.IGNORECASE)
+                except (ValueError, re.error):
+                    continue
+                alts.append(f"(?P<r{i}>{piece})")
+                self._single[i] = single
+        # 最长命中词 -> 所有作为其前缀的关键词的规则
+        self._word_rules = {w: set().union(*(ids for k, ids in by_word.items() if w.startswith(k))) for w in by_word}
+        self._words = re.compile("(?=(" + _trie_regex(list(by_word)) + "))") if by_word else None
+        self._combined = re.compile("(?=(?:" + "|".join(alts) + "))", re.IGNORECASE) if alts else None
+
+    @staticmethod
+    def _filters_ok(r: RuleIn, counterparty: str, amount: Decimal) -> bool:
+        if r.min_amount is not None and amount < r.min_amount:
+            return False
+        if r.max_amount is not None and amount > r.max_amount:
+            return False
+        if r.counterparty and r.counterparty.lower() not in (counterparty or "").lower():
+            return False
+        return True
+
+    def match(self, text: str, counterparty: str, amount: Decimal) -> RuleIn | None:
+        text = text or ""
+        hits = set(self._always)
+        if self._words is not None:
+            for w in {m.group(1) for m in self._words.finditer(text.lower())}:
+                hits |= self._word_rules[w]
+        if self._combined is not None:
+            for m in self._combined.finditer(text):
+                hits.add(int(m.lastgroup[1:]))
+        if not hits:
+            return None
+        # 正则规则被同位置更高优先级的分组“遮住”时不会出现在 hits 里：
+        # 只有当前面的命中被金额/户名条件否决后，才需要对通过条件的正则规则单独复核（很少发生）
+        failed = False
+        for i in range(min(hits), len(self.rules)):
+            r = self.rules[i]
+            if i in hits:
+                if self._filters_ok(r, counterparty, amount):
+                    return r
+                failed = True
+            elif failed and self._single[i] is not None and self._filters_ok(r, counterparty, amount) and self._single[i].search(text):
+                return r
+        return None
+
+
+@dataclass(frozen=True)
+class CategorizeResult:
+    session_id: str
+    lines_considered: int
+    matched: int
+    drafts_created: int
+    skipped_period: int  # 所属期间不存在或已关闭
+    by_rule: dict[str, int]
+    dry_run: bool
+
+
+def load_rules(db: Session, book_id: str, *, exclude_account_id: str | None = None) -> list[RuleIn]:
+    # 对方科目已停用/不允许记账的规则直接跳过
+    rows = (
+        db.query(BankRule)
+        .join(Account, Account.id == BankRule.counter_account_id)
+        .filter(BankRule.book_id == book_id, BankRule.enabled.is_(True))
+        .filter(Account.is_active.is_(True), Account.allow_post.is_(True), Account.is_placeholder.is_(False))
+        .all()
+    )
+    return [
+        RuleIn(
+            id=str(r.id),
+            name=r.name,
+            priority=int(r.priority),
+            match_type=r.match_type,
+            pattern=r.pattern or "",
+            counter_account_id=str(r.counter_account_id),
+            counterparty=r.counterparty or "",
+            min_amount=_decimal(r.min_amount) if r.min_amount is not None else None,
+            max_amount=_decimal(r.max_amount) if r.max_amount is not None else None,
+            memo=r.memo or "",
+        )
+        for r in rows
+        if str(r.counter_account_id) != str(exclude_account_id)
+    ]
+
+
+def categorize_statement(db: Session, session_id: str, *, dry_run: bool = False, actor_user_id: str | None = None) -> CategorizeResult:
+    """
+    用账簿的分类规则处理会话中既未配对、也未生成过草稿的对账单行：
+    命中的行生成“银行科目 vs 对方科目”两行平衡草稿（source_type=BANK_STATEMENT，source_id=行 id，币种取银行科目的币种），
+    草稿/草稿行/CREATE 修订批量 INSERT；同一行重复执行不会重复生成（uq_draft_source）。
+    """
+    with db.begin():
+        sess = db.query(ReconcileSession).filter(ReconcileSession.id == session_id).with_for_update().one_or_none()
+        if not sess:
+            raise ValueError("对账会话不存在")
+        if sess.status != "OPEN":
+            raise ValueError("会话已结束")
+
+        matcher = RuleMatcher(load_rules(db, str(sess.book_id), exclude_account_id=str(sess.account_id)))
+        currency_id = db.execute(sa.select(Account.commodity_id).where(Account.id == sess.account_id)).scalar_one()
+
+        bl = BankStatementLine.__table__
+        rm = ReconcileMatch.__table__
+        td = TransactionDraft.__table__
+        matched_lines = sa.select(rm.c.statement_line_id).where(rm.c.session_id == sess.id, rm.c.statement_line_id.is_not(None))
+        drafted = sa.select(td.c.source_id).where(td.c.book_id == sess.book_id, td.c.source_type == DRAFT_SOURCE_TYPE)
+        lines = db.execute(
+            sa.select(bl.c.id, bl.c.txn_date, bl.c.amount, bl.c.description, bl.c.reference, bl.c.counterparty)
+            .where(bl.c.session_id == sess.id)
+            .where(bl.c.id.not_in(matched_lines))
+            .where(bl.c.id.not_in(drafted))
+            .order_by(bl.c.line_no.asc())
+        ).all()
+
+        periods = {
+            (int(p.year), int(p.month)): str(p.id)
+            for p in db.query(AccountingPeriod).filter(AccountingPeriod.book_id == sess.book_id, AccountingPeriod.status == "OPEN").all()
+        }
+
+        now = utcnow()
+        drafts: list[dict] = []
+        draft_lines: list[dict] = []
+        revisions: list[dict] = []
+        by_rule: dict[str, int] = {}
+        matched = 0
+        skipped_period = 0
+        for ln in lines:
+            amount = _decimal(ln.amount)
+            if amount == 0:
+                continue
+            r = matcher.match(f"{ln.description} {ln.reference}", ln.counterparty, amount)
+            if r is None:
+                continue
+            matched += 1
+            by_rule[r.id] = by_rule.get(r.id, 0) + 1
+            period_id = periods.get((ln.txn_date.year, ln.txn_date.month))
+            if period_id is None:
+                skipped_period += 1
+                continue
+            if dry_run:
+                continue
+            draft_id = uuid_str()
+            memo = (r.memo or ln.description or r.name)[:256]
+            drafts.append(
+                {
+                    "id": draft_id,
+                    "book_id": sess.book_id,
+                    "period_id": period_id,
+                    "currency_id": currency_id,
+                    "txn_date": datetime.combine(ln.txn_date, time()),
+                    "source_type": DRAFT_SOURCE_TYPE,
+                    "source_id": str(ln.id),
+                    "version": 1,
+                    "description": memo,
+                    "status": "DRAFT",
+                    "created_by": actor_user_id,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+            )
+            # 收入：借银行、贷对方；支出反之
+            amt = abs(amount)
+            bank_dr, bank_cr = (amt, Decimal("0")) if amount > 0 else (Decimal("0"), amt)
+            pair = [
+                {"id": uuid_str(), "draft_id": draft_id, "line_no": 1, "account_id": sess.account_id, "debit": bank_dr, "credit": bank_cr, "memo": memo, "aux_json": None},
+                {
+                    "id": uuid_str(),
+                    "draft_id": draft_id,
+                    "line_no": 2,
+                    "account_id": r.counter_account_id,
+                    "debit": bank_cr,
+                    "credit": bank_dr,
+                    "memo": memo,
+                    "aux_json": {"bank_rule_id": r.id},
+                },
+            ]
+            draft_lines.extend(pair)
+            revisions.append(
+                {
+                    "id": uuid_str(),
+                    "draft_id": draft_id,
+                    "rev_no": 1,
+                    "action": "CREATE",
+                    "reason": "BANK_RULE",
+                    "actor_id": actor_user_id,
+                    "at": now,
+                    "payload_json": draft_snapshot_payload(drafts[-1], pair),
+                }
+            )
+
+        for k in range(0, len(drafts), 1000):
+            db.execute(sa.insert(TransactionDraft.__table__), drafts[k : k + 1000])
+        for k in range(0, len(draft_lines), 1000):
+            db.execute(sa.insert(TransactionDraftLine.__table__), draft_lines[k : k + 1000])
+        for k in range(0, len(revisions), 1000):
+            db.execute(sa.insert(TransactionDraftRevision.__table__), revisions[k : k + 1000])
+
+        return CategorizeResult(
+            session_id=str(sess.id),
+            lines_considered=len(lines),
+            matched=matched,
+            drafts_created=len(drafts),
+            skipped_period=skipped_period,
+            by_rule=by_rule,
+            dry_run=dry_run,
+        )
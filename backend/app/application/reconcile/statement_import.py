@@ -0,0 +1,400 @@
+from __future__ import annotations
+
+import csv
+import io
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import BinaryIO, Iterator
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.application.engine.parsing import normalize_number
+from app.infra.db.models import BankStatementLine, ReconcileMatch, ReconcileMatchProposal, ReconcileSession, utcnow, uuid_str
+
+_BATCH_SIZE = 1000
+_HEAD_BYTES = 64 * 1024
+_MAX_WARNINGS = 20
+
+FORMATS = ("CSV", "OFX", "CAMT053")
+
+
+@dataclass(frozen=True)
+class StatementLineIn:
+    txn_date: date
+    amount: Decimal  # 本账户角度：收入为正、支出为负
+    description: str = ""
+    reference: str = ""
+    counterparty: str = ""
+
+
+@dataclass
+class _ParseState:
+    skipped: int = 0
+    warnings: list[str] = field(default_factory=list)
+    closing_balance: Decimal | None = None
+
+    def warn(self, msg: str) -> None:
+        self.skipped += 1
+        if len(self.warnings) < _MAX_WARNINGS:
+            self.warnings.append(msg)
+
+
+@dataclass(frozen=True)
+class StatementImportResult:
+    session_id: str
+    format: str
+    encoding: str
+    inserted: int
+    skipped: int
+    closing_balance: Decimal | None
+    warnings: list[str]
+
+
+def _detect_encoding(head: bytes) -> str:
+    # 与科目 CSV 导入一致：utf-8-sig（Excel BOM）→ utf-8 → gbk；只看文件头，允许截断在多字节字符中间
+    if b"CHARSET:1252" in head[:1024]:
+        return "cp1252"
+    for enc in ("utf-8-sig", "utf-8", "gbk"):
+        for cut in range(0, 4):
+            try:
+                head[: len(head) - cut].decode(enc)
+                return enc
+            except UnicodeDecodeError:
+                continue
+    return "utf-8"
+
+
+def detect_format(filename: str | None, head: bytes) -> str:
+    name = (filename or "").lower()
+    if name.endswith((".ofx", ".qfx")):
+        return "OFX"
+    sample = head[:4096]
+    if b"BkToCstmrStmt" in sample or b"camt.053" in sample:
+        return "CAMT053"
+    if b"OFXHEADER" in sample or b"<OFX>" in sample.upper():
+        return "OFX"
+    return "CSV"
+
+
+def _parse_amount(v: str | None, *, decimal_comma: bool = False) -> Decimal | None:
+    s = (v or "").strip()
+    if not s:
+        return None
+    neg = False
+    if s.startswith("(") and s.endswith(")"):
+        neg, s = True, s[1:-1]
+    if s.endswith("-"):
+        neg, s = True, s[:-1]
+    # 小数点按 normalize_number 规则判定（"12,50" / "1.234,56"）；"1,234" 这类歧义写法按无法解析处理
+    s = normalize_number(re.sub(r"[^\d.,\-+]", "", s), decimal_comma=decimal_comma)
+    if s is None:
+        return None
+    try:
+        d = Decimal(s)
+    except InvalidOperation:
+        return None
+    return (-d if neg else d).quantize(Decimal("0.01"))
+
+
+_DATE_FORMATS = (("%Y-%m-%d", 10), ("%Y/%m/%d", 10), ("%Y.%m.%d", 10), ("%d.%m.%Y", 10), ("%Y%m%d", 8))
+
+
+def _parse_date(v: str | None) -> date | None:
+    s = (v or "").strip()
+    for fmt, n in _DATE_FORMATS:
+        try:
+            return datetime.strptime(s[:n], fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+# ---------- CSV ----------
+
+_CSV_ALIASES = {
+    "date": {"date", "txn_date", "booking_date", "posted", "交易日期", "记账日期", "日期"},
+    "amount": {"amount", "金额", "交易金额"},
+    "inflow": {"inflow", "credit", "deposit", "收入", "收入金额", "贷方发生额", "存入"},
+    "outflow": {"outflow", "debit", "withdrawal", "支出", "支出金额", "借方发生额", "取出"},
+    "description": {"description", "memo", "narrative", "摘要", "用途", "备注", "交易描述"},
+    "reference": {"reference", "ref", "fitid", "流水号", "交易流水号", "参考号"},
+    "counterparty": {"counterparty", "payee", "对方户名", "对方名称", "交易对方"},
+}
+
+
+def _norm_header(h: str) -> str:
+    return (h or "").strip().lower().replace(" ", "").replace("-", "_")
+
+
+def _pick(headers: list[str], key: str) -> int | None:
+    aliases = {_norm_header(a) for a in _CSV_ALIASES[key]}
+    for i, h in enumerate(headers):
+        if _norm_header(h) in aliases:
+            return i
+    return None
+
+
+def _sniff_delimiter(first_line: str) -> str:
+    counts = {d: first_line.count(d) for d in ("\t", ";", ",")}
+    best = max(counts, key=lambda d: counts[d])
+    return best if counts[best] > 0 else ","
+
+
+def _iter_csv(text: io.TextIOBase, delimiter: str | None, st: _ParseState) -> Iterator[StatementLineIn]:
+    header_line = text.readline()
+    if not header_line:
+        raise ValueError("对账单为空")
+    delim = delimiter or _sniff_delimiter(header_line)
+    dec_comma = delim == ";"  # 分号分隔的欧式 CSV 以逗号为小数点
+    headers = next(csv.reader([header_line], delimiter=delim))
+    c_date = _pick(headers, "date")
+    c_amount = _pick(headers, "amount")
+    c_in = _pick(headers, "inflow")
+    c_out = _pick(headers, "outflow")
+    c_desc = _pick(headers, "description")
+    c_ref = _pick(headers, "reference")
+    c_cp = _pick(headers, "counterparty")
+    if c_date is None or (c_amount is None and c_in is None and c_out is None):
+        raise ValueError("CSV 必须包含日期列，以及金额列或收入/支出列")
+
+    def cell(row: list[str], i: int | None) -> str:
+        return row[i].strip() if i is not None and i < len(row) else ""
+
+    for row_no, row in enumerate(csv.reader(text, delimiter=delim), start=2):
+        if not row or not any(x.strip() for x in row):
+            continue
+        d = _parse_date(cell(row, c_date))
+        if c_amount is not None:
+            amt = _parse_amount(cell(row, c_amount), decimal_comma=dec_comma)
+        else:
+            inflow = _parse_amount(cell(row, c_in), decimal_comma=dec_comma) or Decimal("0")
+            outflow = _parse_amount(cell(row, c_out), decimal_comma=dec_comma) or Decimal("0")
+            amt = inflow - abs(outflow)
+        if d is None or amt is None:
+            st.warn(f"第 {row_no} 行日期或金额无法解析，已跳过")
+            continue
+        yield StatementLineIn(
+            txn_date=d,
+            amount=amt,
+            description=cell(row, c_desc),
+            reference=cell(row, c_ref),
+            counterparty=cell(row, c_cp),
+        )
+
+
+# ---------- OFX（1.x SGML / 2.x XML；按块扫描标签，不建 DOM） ----------
+
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+def _iter_ofx_tags(text: io.TextIOBase) -> Iterator[tuple[bool, str, str]]:
+    buf = ""
+    while True:
+        chunk = text.read(_HEAD_BYTES)
+        if not chunk:
+            break
+        buf += chunk
+        cut = buf.rfind("<")
+        if cut <= 0:
+            continue
+        for m in _OFX_TAG.finditer(buf, 0, cut):
+            yield m.group(1) == "/", m.group(2).upper(), m.group(3).strip()
+        buf = buf[cut:]
+    for m in _OFX_TAG.finditer(buf):
+        yield m.group(1) == "/", m.group(2).upper(), m.group(3).strip()
+
+
+def _iter_ofx(text: io.TextIOBase, st: _ParseState) -> Iterator[StatementLineIn]:
+    cur: dict[str, str] | None = None
+    in_ledger = False
+    n = 0
+    for closing, tag, value in _iter_ofx_tags(text):
+        if tag == "STMTTRN":
+            if not closing:
+                cur = {}
+                continue
+            n += 1
+            d = _parse_date((cur or {}).get("DTPOSTED"))
+            amt = _parse_amount((cur or {}).get("TRNAMT"))
+            if d is None or amt is None:
+                st.warn(f"第 {n} 笔交易日期或金额无法解析，已跳过")
+            else:
+                name = (cur or {}).get("NAME", "")
+                yield StatementLineIn(
+                    txn_date=d,
+                    amount=amt,
+                    description=(cur or {}).get("MEMO") or name,
+                    reference=(cur or {}).get("FITID", ""),
+                    counterparty=name,
+                )
+            cur = None
+        elif tag == "LEDGERBAL":
+            in_ledger = not closing
+        elif not closing and value:
+            if cur is not None:
+                cur[tag] = value
+            elif in_ledger and tag == "BALAMT":
+                st.closing_balance = _parse_amount(value)
+
+
+# ---------- CAMT.053（iterparse，处理完的 Ntry 立即从树上摘除） ----------
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _child(e: ET.Element | None, *path: str) -> ET.Element | None:
+    for name in path:
+        if e is None:
+            return None
+        e = next((c for c in e if _local(c.tag) == name), None)
+    return e
+
+
+def _text(e: ET.Element | None, *path: str) -> str:
+    x = _child(e, *path) if path else e
+    return (x.text or "").strip() if x is not None else ""
+
+
+def _signed_amount(e: ET.Element) -> Decimal | None:
+    amt = _parse_amount(_text(e, "Amt"))
+    if amt is None:
+        return None
+    return -amt if _text(e, "CdtDbtInd") == "DBIT" else amt
+
+
+def _camt_line(ntry: ET.Element) -> StatementLineIn | None:
+    amt = _signed_amount(ntry)
+    d = _parse_date(_text(ntry, "BookgDt", "Dt") or _text(ntry, "BookgDt", "DtTm") or _text(ntry, "ValDt", "Dt"))
+    if amt is None or d is None:
+        return None
+    tx = _child(ntry, "NtryDtls", "TxDtls")
+    ref = _text(ntry, "AcctSvcrRef") or _text(tx, "Refs", "EndToEndId")
+    if ref == "NOTPROVIDED":
+        ref = ""
+    ustrd = _child(tx, "RmtInf")
+    desc = " ".join(_text(u) for u in ustrd if _local(u.tag) == "Ustrd") if ustrd is not None else ""
+    desc = desc or _text(ntry, "AddtlNtryInf") or _text(tx, "AddtlTxInf")
+    party = "Dbtr" if amt >= 0 else "Cdtr"
+    cp = _text(tx, "RltdPties", party, "Nm") or _text(tx, "RltdPties", party, "Pty", "Nm")
+    return StatementLineIn(txn_date=d, amount=amt, description=desc, reference=ref, counterparty=cp)
+
+
+def _iter_camt(fp: BinaryIO, st: _ParseState) -> Iterator[StatementLineIn]:
+    stack: list[ET.Element] = []
+    n = 0
+    try:
+        for event, elem in ET.iterparse(fp, events=("start", "end")):
+            if event == "start":
+                stack.append(elem)
+                continue
+            stack.pop()
+            name = _local(elem.tag)
+            if name == "Ntry":
+                n += 1
+                line = _camt_line(elem)
+                if line is None:
+                    st.warn(f"第 {n} 笔分录日期或金额无法解析，已跳过")
+                else:
+                    yield line
+            elif name == "Bal":
+                if _text(elem, "Tp", "CdOrPrtry", "Cd") == "CLBD":
+                    st.closing_balance = _signed_amount(elem)
+            else:
+                continue
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+    except ET.ParseError as e:
+        raise ValueError(f"CAMT.053 XML 解析失败：{e}")
+
+
+def _iter_lines(fp: BinaryIO, fmt: str, encoding: str, delimiter: str | None, st: _ParseState) -> Iterator[StatementLineIn]:
+    if fmt == "CAMT053":
+        # XML 自带编码声明，直接交给解析器
+        yield from _iter_camt(fp, st)
+        return
+    text = io.TextIOWrapper(fp, encoding=encoding, errors="replace", newline="")
+    try:
+        if fmt == "OFX":
+            yield from _iter_ofx(text, st)
+        else:
+            yield from _iter_csv(text, delimiter, st)
+    finally:
+        text.detach()
+
+
+def import_bank_statement(
+    db: Session,
+    session_id: str,
+    fp: BinaryIO,
+    *,
+    filename: str | None = None,
+    fmt: str | None = None,
+    delimiter: str | None = None,
+) -> StatementImportResult:
+    """
+    流式导入银行对账单到 bank_statement_lines（覆盖该会话之前导入的明细）。
+    逐行解析、每 _BATCH_SIZE 行批量插入一次，内存占用与文件大小无关。
+    """
+    head = fp.read(_HEAD_BYTES)
+    fp.seek(0)
+    fmt = (fmt or detect_format(filename, head)).upper()
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的对账单格式：{fmt}（支持 {'/'.join(FORMATS)}）")
+    encoding = "xml" if fmt == "CAMT053" else _detect_encoding(head)
+
+    st = _ParseState()
+    inserted = 0
+    with db.begin():
+        sess = db.query(ReconcileSession).filter(ReconcileSession.id == session_id).with_for_update().one_or_none()
+        if not sess:
+            raise ValueError("对账会话不存在")
+        if sess.status != "OPEN":
+            raise ValueError("会话已结束")
+
+        # 旧明细上的匹配建议一并作废；已接受的匹配保留（只是不再关联到具体行）
+        pr = ReconcileMatchProposal.__table__
+        rm = ReconcileMatch.__table__
+        db.execute(pr.delete().where(pr.c.session_id == sess.id))
+        db.execute(rm.update().where(rm.c.session_id == sess.id).values(statement_line_id=None))
+        tbl = BankStatementLine.__table__
+        db.execute(tbl.delete().where(tbl.c.session_id == sess.id))
+
+        now = utcnow()
+        batch: list[dict] = []
+        for line in _iter_lines(fp, fmt, encoding, delimiter, st):
+            inserted += 1
+            batch.append(
+                {
+                    "id": uuid_str(),
+                    "session_id": sess.id,
+                    "line_no": inserted,
+                    "txn_date": line.txn_date,
+                    "amount": line.amount,
+                    "description": line.description[:512],
+                    "reference": line.reference[:128],
+                    "counterparty": line.counterparty[:255],
+                    "created_at": now,
+                }
+            )
+            if len(batch) >= _BATCH_SIZE:
+                db.execute(sa.insert(tbl), batch)
+                batch = []
+        if batch:
+            db.execute(sa.insert(tbl), batch)
+
+    return StatementImportResult(
+        session_id=session_id,
+        format=fmt,
+        encoding=encoding,
+        inserted=inserted,
+        skipped=st.skipped,
+        closing_balance=st.closing_balance,
+        warnings=st.warnings,
+    )
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from decimal import Decimal
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.application.engine.accounts import build_account_children_map, collect_descendants, list_accounts
+from app.infra.db.models import Account, AccountingPeriod, ObjectKV, Split, Transaction
+
+_CASH_TYPES = {"CASH", "BANK"}
+
+# 现金科目口径：ObjectKV(owner_type="book", key=CF_CASH_ACCOUNTS_KEY, value_json={"account_ids": [...]})，
+# 含下级科目；未配置时按科目类型 CASH/BANK 识别。
+CF_CASH_ACCOUNTS_KEY = "cf_cash_accounts"
+
+CF_OPERATING = "OPERATING"
+CF_INVESTING = "INVESTING"
+CF_FINANCING = "FINANCING"
+
+
+def _decimal(v) -> Decimal:
+    if isinstance(v, Decimal):
+        return v
+    return Decimal(str(v))
+
+
+@dataclass(frozen=True)
+class CashFlowResult:
+    begin_cash: Decimal
+    net_cash: Decimal
+    end_cash: Decimal
+    by_category: dict[str, Decimal]  # OPERATING / INVESTING / FINANCING
+    unclassified: Decimal  # 对方科目合计与现金净额的差（正常应为 0）
+
+
+def resolve_cash_account_ids(db: Session, book_id: str) -> set[str]:
+    row = (
+        db.query(ObjectKV)
+        .filter(ObjectKV.owner_type == "book", ObjectKV.owner_id == str(book_id), ObjectKV.key == CF_CASH_ACCOUNTS_KEY)
+        .one_or_none()
+    )
+    roots = [str(x) for x in ((row.value_json or {}).get("account_ids") or [])] if row else []
+    if roots:
+        children_map = build_account_children_map(list_accounts(db, str(book_id)))
+        out: set[str] = set()
+        for rid in roots:
+            out |= collect_descendants(children_map, rid)
+        return out
+    return {
+        str(r[0])
+        for r in db.query(Account.id).filter(Account.book_id == book_id, Account.type.in_(list(_CASH_TYPES))).all()
+    }
+
+
+def compute_direct_cash_flow(
+    db: Session,
+    *,
+    book_id: str,
+    period_id: str,
+    pkey: int,
+    cash_ids: set[str],
+    investing_ids: set[str],
+    financing_ids: set[str],
+) -> CashFlowResult:
+    """
+    直接法现金流量表：对每笔涉及现金科目的凭证，按对方科目分类归集（对方分录 value 取反即现金流入）。
+    现金科目之间的划转没有对方分录，自然不计入任何类别。
+    期初现金、本期现金净额、按对方科目分类的流量在同一条语句（UNION ALL）中一次算出，
+    查询次数与凭证数量无关。
+    """
+    zero = Decimal("0")
+    empty = {CF_OPERATING: zero, CF_INVESTING: zero, CF_FINANCING: zero}
+    if not cash_ids:
+        return CashFlowResult(begin_cash=zero, net_cash=zero, end_cash=zero, by_category=empty, unclassified=zero)
+
+    sp = Split.__table__
+    tx = Transaction.__table__
+    pe = AccountingPeriod.__table__
+    cash_sp = sp.alias("cash_sp")
+    other_sp = sp.alias("other_sp")
+
+    cash_in = cash_sp.c.account_id.in_(sa.bindparam("cash_ids", expanding=True))
+
+    # 本期涉及现金的凭证（自连接的现金侧）
+    cash_txns = (
+        sa.select(cash_sp.c.txn_id)
+        .select_from(cash_sp.join(tx, cash_sp.c.txn_id == tx.c.id))
+        .where(tx.c.period_id == sa.bindparam("period_id"))
+        .where(cash_in)
+        .distinct()
+        .subquery("cash_txns")
+    )
+    category = sa.case(
+        (other_sp.c.account_id.in_(sa.bindparam("investing_ids", expanding=True)), sa.literal_column(f"'{CF_INVESTING}'")),
+        (other_sp.c.account_id.in_(sa.bindparam("financing_ids", expanding=True)), sa.literal_column(f"'{CF_FINANCING}'")),
+        else_=sa.literal_column(f"'{CF_OPERATING}'"),
+    )
+    counter = (
+        sa.select(category.label("cat"), (-other_sp.c.value).label("flow"))
+        .select_from(other_sp.join(cash_txns, other_sp.c.txn_id == cash_txns.c.txn_id))
+        .where(other_sp.c.account_id.not_in(sa.bindparam("cash_ids_x", expanding=True)))
+        .subquery("counter")
+    )
+    q_flows = sa.select(counter.c.cat, sa.func.coalesce(sa.func.sum(counter.c.flow), 0)).group_by(counter.c.cat)
+
+    q_begin = (
+        sa.select(sa.literal_column("'BEGIN'"), sa.func.coalesce(sa.func.sum(cash_sp.c.value), 0))
+        .select_from(cash_sp.join(tx, cash_sp.c.txn_id == tx.c.id).join(pe, tx.c.period_id == pe.c.id))
+        .where(cash_in)
+        .where((pe.c.year * 100 + pe.c.month) < sa.bindparam("pkey"))
+    )
+    q_net = (
+        sa.select(sa.literal_column("'NET'"), sa.func.coalesce(sa.func.sum(cash_sp.c.value), 0))
+        .select_from(cash_sp.join(tx, cash_sp.c.txn_id == tx.c.id))
+        .where(cash_in)
+        .where(tx.c.period_id == sa.bindparam("period_id"))
+    )
+
+    ids = sorted(cash_ids)
+    rows = db.execute(
+        sa.union_all(q_flows, q_begin, q_net),
+        {
+            "period_id": period_id,
+            "pkey": pkey,
+            "cash_ids": ids,
+            "cash_ids_x": ids,
+            "investing_ids": sorted(investing_ids - cash_ids),
+            "financing_ids": sorted(financing_ids - cash_ids),
+        },
+    ).all()
+
+    by_category = dict(empty)
+    begin = zero
+    net = zero
+    for cat, amt in rows:
+        if cat == "BEGIN":
+            begin = _decimal(amt)
+        elif cat == "NET":
+            net = _decimal(amt)
+        else:
+            by_category[str(cat)] = _decimal(amt)
+
+    classified = sum(by_category.values(), start=zero)
+    return CashFlowResult(
+        begin_cash=begin,
+        net_cash=net,
+        end_cash=begin + net,
+        by_category=by_category,
+        unclassified=net - classified,
+    )
+
+
+def counter_account_flows(db: Session, *, period_id: str, cash_ids: set[str]) -> dict[str, Decimal]:
+    """本期涉及现金凭证中，按对方科目汇总的现金流（对方分录 value 取反）；供映射预览在内存中重新分类。"""
+    if not cash_ids:
+        return {}
+    sp = Split.__table__
+    tx = Transaction.__table__
+    cash_sp = sp.alias("cash_sp")
+    other_sp = sp.alias("other_sp")
+    cash_txns = (
+        sa.select(cash_sp.c.txn_id)
+        .select_from(cash_sp.join(tx, cash_sp.c.txn_id == tx.c.id))
+        .where(tx.c.period_id == period_id)
+        .where(cash_sp.c.account_id.in_(sa.bindparam("cash_ids", expanding=True)))
+        .distinct()
+        .subquery("cash_txns")
+    )
+    q = (
+        sa.select(other_sp.c.account_id, sa.func.coalesce(sa.func.sum(-other_sp.c.value), 0))
+        .select_from(other_sp.join(cash_txns, other_sp.c.txn_id == cash_txns.c.txn_id))
+        .where(other_sp.c.account_id.not_in(sa.bindparam("cash_ids_x", expanding=True)))
+        .group_by(other_sp.c.account_id)
+    )
+    ids = sorted(cash_ids)
+    return {str(r[0]): _decimal(r[1]) for r in db.execute(q, {"cash_ids": ids, "cash_ids_x": ids}).all()}
+
+
+def classify_cash_flow(
+    flows: dict[str, Decimal],
+    *,
+    begin_cash: Decimal,
+    net_cash: Decimal,
+    investing_ids: set[str],
+    financing_ids: set[str],
+) -> CashFlowResult:
+    zero = Decimal("0")
+    by_category = {CF_OPERATING: zero, CF_INVESTING: zero, CF_FINANCING: zero}
+    for aid, amt in flows.items():
+        if aid in investing_ids:
+            by_category[CF_INVESTING] += amt
+        elif aid in financing_ids:
+            by_category[CF_FINANCING] += amt
+        else:
+            by_category[CF_OPERATING] += amt
+    return CashFlowResult(
+        begin_cash=begin_cash,
+        net_cash=net_cash,
+        end_cash=begin_cash + net_cash,
+        by_category=by_category,
+        unclassified=net_cash - sum(by_category.values(), start=zero),
+    )
@@ -8,6 +8,7 @@ import sqlalchemy as sa
 from sqlalchemy.orm import Session
 
 from app.application.engine.accounts import build_account_children_map, collect_descendants, list_accounts
+from app.application.reports.mappings import get_mapping_index
 from app.infra.db.models import (
     Account,
     AccountingPeriod,
@@ -15,7 +16,6 @@ from app.infra.db.models import (
     BusinessDocument,
     BusinessDocumentLine,
     ReportItem,
-    ReportMapping,
     ReportSnapshot,
     Split,
     Transaction,
@@ -92,17 +92,8 @@ def _expand_item_accounts(db: Session, snap: ReportSnapshot, statement_type: str
     if not item:
         raise ValueError("报表项目不存在")
 
-    mappings = db.query(ReportMapping).filter(ReportMapping.basis_id == snap.basis_id, ReportMapping.item_id == item.id).all()
-    if not mappings:
-        return item, set()
-
-    accounts = list_accounts(db, str(snap.book_id))
-    children_map = build_account_children_map(accounts)
-
-    acc_ids: set[str] = set()
-    for m in mappings:
-        rid = str(m.account_id)
-        acc_ids |= collect_descendants(children_map, rid) if m.include_children else {rid}
+    index = get_mapping_index(db, str(snap.book_id), str(snap.basis_id))
+    acc_ids = index.accounts_of(statement_type, item_code)
     return item, acc_ids
 
 
@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.application.gl.scheduled import add_months, next_run_date
+from app.application.reports.cash_flow import resolve_cash_account_ids
+from app.infra.db.models import Account, Book, Invoice, ScheduledTransaction, Split, Transaction
+
+GRANULARITY_WEEK = "WEEK"
+GRANULARITY_MONTH = "MONTH"
+_MAX_HORIZON = {GRANULARITY_WEEK: 104, GRANULARITY_MONTH: 36}
+
+
+def _decimal(v) -> Decimal:
+    if isinstance(v, Decimal):
+        return v
+    return Decimal(str(v))
+
+
+@dataclass(frozen=True)
+class ForecastBucket:
+    start: date
+    end: date  # 含
+
+
+@dataclass(frozen=True)
+class AccountForecast:
+    account_id: str
+    code: str
+    name: str
+    opening: Decimal
+    net: list[Decimal]  # 每个区间的净流量（定期交易；若指定了结算科目，还含发票）
+    balance: list[Decimal]  # 每个区间末的预计余额
+
+
+@dataclass(frozen=True)
+class CashForecastResult:
+    book_id: str
+    as_of: date
+    granularity: str
+    buckets: list[ForecastBucket]
+    accounts: list[AccountForecast]
+    opening: Decimal
+    scheduled_net: list[Decimal]
+    receivables: list[Decimal]  # AR 未收
+    payables: list[Decimal]  # AP 未付（正数）
+    balance: list[Decimal]  # 全部现金科目合计的预计余额
+    schedules: int
+    invoices: int
+    skipped_invoices: int  # 非本位币发票，未计入
+
+
+def build_buckets(as_of: date, granularity: str, horizon: int) -> list[ForecastBucket]:
+    g = (granularity or "").upper()
+    if g not in _MAX_HORIZON:
+        raise ValueError("granularity 必须是 WEEK/MONTH")
+    if horizon < 1 or horizon > _MAX_HORIZON[g]:
+        raise ValueError(f"horizon 必须在 1..{_MAX_HORIZON[g]} 之间")
+    out: list[ForecastBucket] = []
+    start = as_of
+    for _ in range(horizon):
+        if g == GRANULARITY_WEEK:
+            nxt = start + timedelta(days=7)
+        else:
+            # 首个区间到当月月末为止，之后按自然月
+            nxt = add_months(date(start.year, start.month, 1), 1)
+        out.append(ForecastBucket(start=start, end=nxt - timedelta(days=1)))
+        start = nxt
+    return out
+
+
+def occurrence_counts(rule: str, interval: int, first: date, end: date | None, bucket_starts: list[int], last: int) -> list[int]:
+    """
+    定期交易在各区间内的发生次数（日期均为 ordinal，bucket_starts 升序，last 为最后区间末日）。
+    DAILY/WEEKLY 是等差数列，按区间边界直接算次数，不逐日展开；
+    MONTHLY 沿用 next_run_date 的逐期推算（与调度补跑生成的日期一致），一年最多十几次。
+    早于首个区间的（已过期未补跑）计入首个区间。
+    """
+    n = len(bucket_starts)
+    counts = [0] * n
+    stop = min(last, end.toordinal()) if end is not None else last
+    f = first.toordinal()
+    if f > stop:
+        return counts
+    rule_u = (rule or "").upper()
+    if rule_u in ("DAILY", "WEEKLY"):
+        step = interval * (7 if rule_u == "WEEKLY" else 1)
+
+        def upto(x: int) -> int:
+            # 日期 <= x 的发生次数
+            return 0 if x < f else (x - f) // step + 1
+
+        prev = 0
+        for k in range(n):
+            hi = bucket_starts[k + 1] - 1 if k + 1 < n else last
+            c = upto(min(hi, stop))
+            counts[k] = c - prev
+            prev = c
+        return counts
+    d = first
+    while d.toordinal() <= stop:
+        counts[max(0, bisect_right(bucket_starts, d.toordinal()) - 1)] += 1
+        d = next_run_date(rule_u, interval, d)
+    return counts
+
+
+def cash_forecast(
+    db: Session,
+    *,
+    book_id: str,
+    as_of: date,
+    granularity: str = GRANULARITY_WEEK,
+    horizon: int = 13,
+    settlement_account_id: str | None = None,
+) -> CashForecastResult:
+    """
+    现金预测（纯查询）：
+    - 期初：各现金/银行科目截至 as_of 的余额；
+    - 定期交易：按模板中现金科目的借贷净额 × 各区间发生次数；
+    - 发票：POSTED 且未核销完的 AR/AP，按到期日（无到期日按单据日）归入区间，逾期的计入首个区间；
+      发票不带收付款科目，默认只进合计行，指定 settlement_account_id 时并入该科目。
+    """
+    book = db.query(Book).filter(Book.id == book_id).one_or_none()
+    if not book:
+        raise ValueError("账簿不存在")
+    buckets = build_buckets(as_of, granularity, horizon)
+    starts = [b.start.toordinal() for b in buckets]
+    last = buckets[-1].end.toordinal()
+    n = len(buckets)
+    zero = Decimal("0")
+
+    cash_ids = resolve_cash_account_ids(db, book_id)
+    if settlement_account_id and settlement_account_id not in cash_ids:
+        raise ValueError("settlement_account_id 必须是现金/银行科目")
+    accounts = (
+        db.query(Account.id, Account.code, Account.name)
+        .filter(Account.id.in_(cash_ids))
+        .order_by(Account.code.asc())
+        .all()
+        if cash_ids
+        else []
+    )
+    opening: dict[str, Decimal] = {}
+    if cash_ids:
+        for aid, s in (
+            db.query(Split.account_id, sa.func.sum(Split.amount))
+            .join(Transaction, Transaction.id == Split.txn_id)
+            .filter(Split.account_id.in_(cash_ids))
+            .filter(Transaction.txn_date <= datetime.combine(as_of, time.max))
+            .group_by(Split.account_id)
+            .all()
+        ):
+            opening[str(aid)] = _decimal(s or 0)
+
+    # 定期交易：先把模板折算成 {现金科目: 每次净额}，再乘发生次数
+    net = {str(a.id): [zero] * n for a in accounts}
+    scheduled_net = [zero] * n
+    schedules = 0
+    for s in (
+        db.query(ScheduledTransaction)
+        .filter(ScheduledTransaction.book_id == book_id, ScheduledTransaction.enabled.is_(True))
+        .filter(ScheduledTransaction.next_run_date <= buckets[-1].end)
+        .all()
+    ):
+        per_run: dict[str, Decimal] = {}
+        for ln in (s.template_json or {}).get("lines") or []:
+            aid = str(ln.get("account_id") or "")
+            if aid in net:
+                per_run[aid] = per_run.get(aid, zero) + _decimal(ln.get("debit", 0)) - _decimal(ln.get("credit", 0))
+        per_run = {k: v for k, v in per_run.items() if v != 0}
+        if not per_run:
+            continue
+        counts = occurrence_counts(s.rule, int(s.interval), s.next_run_date, s.end_date, starts, last)
+        schedules += 1
+        for k, c in enumerate(counts):
+            if not c:
+                continue
+            for aid, v in per_run.items():
+                net[aid][k] += v * c
+                scheduled_net[k] += v * c
+
+    # 发票：直接读物化的未结金额，走 ix_invoices_open 部分索引
+    receivables = [zero] * n
+    payables = [zero] * n
+    invoices = 0
+    skipped = 0
+    horizon_end = buckets[-1].end
+    rows = db.execute(
+        sa.select(Invoice.invoice_type, Invoice.currency_id, Invoice.due_date, Invoice.doc_date, Invoice.outstanding_amount)
+        .where(Invoice.book_id == book_id, Invoice.status == "POSTED", Invoice.outstanding_amount > 0)
+        .where(
+            sa.or_(
+                Invoice.due_date <= horizon_end,
+                sa.and_(Invoice.due_date.is_(None), Invoice.doc_date <= datetime.combine(horizon_end, time.max)),
+            )
+        )
+    ).all()
+    for inv_type, currency_id, due_date, doc_date, open_amount in rows:
+        due = due_date or doc_date.date()
+        outstanding = _decimal(open_amount or 0)
+        if outstanding <= 0:
+            continue
+        if str(currency_id) != str(book.base_currency_id):
+            skipped += 1
+            continue
+        invoices += 1
+        k = max(0, bisect_right(starts, due.toordinal()) - 1)
+        if inv_type == "AR":
+            receivables[k] += outstanding
+        else:
+            payables[k] += outstanding
+
+    if settlement_account_id:
+        for k in range(n):
+            net[settlement_account_id][k] += receivables[k] - payables[k]
+
+    out_accounts: list[AccountForecast] = []
+    for a in accounts:
+        aid = str(a.id)
+        bal, run = [], opening.get(aid, zero)
+        for v in net[aid]:
+            run += v
+            bal.append(run)
+        out_accounts.append(AccountForecast(account_id=aid, code=a.code, name=a.name, opening=opening.get(aid, zero), net=net[aid], balance=bal))
+
+    total_opening = sum(opening.values(), zero)
+    total_bal, run = [], total_opening
+    for k in range(n):
+        run += scheduled_net[k] + receivables[k] - payables[k]
+        total_bal.append(run)
+
+    return CashForecastResult(
+        book_id=str(book_id),
+        as_of=as_of,
+        granularity=granularity.upper(),
+        buckets=buckets,
+        accounts=out_accounts,
+        opening=total_opening,
+        scheduled_net=scheduled_net,
+        receivables=receivables,
+        payables=payables,
+        balance=total_bal,
+        schedules=schedules,
+        invoices=invoices,
+        skipped_invoices=skipped,
+    )
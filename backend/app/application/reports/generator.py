@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import hashlib
 import json
+import threading
 from dataclasses import dataclass
 from datetime import datetime
 from decimal import Decimal
@@ -9,13 +10,20 @@ from decimal import Decimal
 import sqlalchemy as sa
 from sqlalchemy.orm import Session
 
-from app.application.engine.accounts import build_account_children_map, collect_descendants, list_accounts
+from app.application.reports.cash_flow import (
+    CF_FINANCING,
+    CF_INVESTING,
+    CF_OPERATING,
+    CashFlowResult,
+    compute_direct_cash_flow,
+    resolve_cash_account_ids,
+)
+from app.application.reports.mappings import MappingIndex, get_mapping_index
 from app.infra.db.models import (
     Account,
     AccountingPeriod,
     ReportBasis,
     ReportItem,
-    ReportMapping,
     ReportSnapshot,
     Split,
     Transaction,
@@ -34,7 +42,6 @@ def _decimal(v) -> Decimal:
 
 
 _CREDIT_TYPES = {"LIABILITY", "EQUITY", "INCOME", "AP"}
-_CASH_TYPES = {"CASH", "BANK"}
 
 
 @dataclass(frozen=True)
@@ -42,242 +49,286 @@ class GenerateResult:
     snapshot_id: str
 
 
+class _Flight:
+    """同一 params_hash 的一次在途生成：leader 计算，followers 等待结果。"""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: GenerateResult | None = None
+        self.error: BaseException | None = None
+
+
+# 进程内 single-flight：同一 worker 内并发请求同一报表时只计算一次
+_FLIGHT_WAIT_SECONDS = 300
+_inflight_guard = threading.Lock()
+_inflight: dict[str, _Flight] = {}
+
+
+def _acquire_generation_lock(db: Session, ph: str) -> str | None:
+    """
+    跨 worker 互斥：同一 params_hash 同时只有一个事务在生成。
+    - PostgreSQL：事务级 advisory lock，提交/回滚自动释放
+    - MySQL：GET_LOCK（会话级），返回锁名由调用方释放
+    - 其他方言（如 SQLite 本地调试）：仅依赖进程内 single-flight
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect.startswith("postgres"):
+        key = int(ph[:16], 16)
+        if key >= 1 << 63:
+            key -= 1 << 64
+        db.execute(sa.text("SELECT pg_advisory_xact_lock(:k)"), {"k": key})
+        return None
+    if dialect == "mysql":
+        name = f"af_report:{ph[:48]}"
+        got = db.execute(sa.text("SELECT GET_LOCK(:n, :t)"), {"n": name, "t": _FLIGHT_WAIT_SECONDS}).scalar()
+        if got != 1:
+            raise ValueError("报表正在生成中，请稍后重试")
+        return name
+    return None
+
+
+def _release_generation_lock(db: Session, name: str | None) -> None:
+    if name:
+        db.execute(sa.text("SELECT RELEASE_LOCK(:n)"), {"n": name})
+
+
 def generate_reports(db: Session, book_id: str, period_id: str, basis_code: str, actor_user_id: str | None) -> GenerateResult:
+    """
+    生成（或复用）报表快照。
+
+    并发请求同一 params_hash 时合并为一次计算：同 worker 内后到者等待在途结果；
+    跨 worker 由数据库锁串行化，后到者拿到锁后直接复用刚生成的非 stale 快照。
+    """
+    ph = _params_hash({"book_id": book_id, "period_id": period_id, "basis_code": basis_code})
+    with _inflight_guard:
+        flight = _inflight.get(ph)
+        leader = flight is None
+        if leader:
+            flight = _inflight[ph] = _Flight()
+
+    if not leader:
+        if not flight.done.wait(timeout=_FLIGHT_WAIT_SECONDS):
+            raise ValueError("报表生成超时，请稍后重试")
+        if flight.error is not None:
+            raise flight.error
+        assert flight.result is not None
+        return flight.result
+
+    try:
+        flight.result = _generate_reports(db, book_id, period_id, basis_code, actor_user_id)
+        return flight.result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _inflight_guard:
+            _inflight.pop(ph, None)
+        flight.done.set()
+
+
+def _generate_reports(db: Session, book_id: str, period_id: str, basis_code: str, actor_user_id: str | None) -> GenerateResult:
     # 该函数包含写快照，统一用一个事务（避免“session 已隐式开启事务”导致 begin 嵌套错误）
     with db.begin():
-        period = (
-            db.query(AccountingPeriod)
-            .filter(AccountingPeriod.id == period_id, AccountingPeriod.book_id == book_id)
-            .one()
-        )
-        basis = db.query(ReportBasis).filter(ReportBasis.code == basis_code).one_or_none()
-        if not basis:
-            raise ValueError(f"报表口径不存在：{basis_code}")
-
         params = {"book_id": book_id, "period_id": period_id, "basis_code": basis_code}
         ph = _params_hash(params)
-
-        existing = (
-            db.query(ReportSnapshot)
-            .filter(ReportSnapshot.book_id == book_id, ReportSnapshot.params_hash == ph)
-            .one_or_none()
+        # 先拿锁再读：保证锁内看到的是其他 worker 已提交的快照
+        lock_name = _acquire_generation_lock(db, ph)
+        try:
+            return _compute_snapshot(db, book_id, period_id, basis_code, actor_user_id, params, ph)
+        finally:
+            _release_generation_lock(db, lock_name)
+
+
+def _compute_snapshot(
+    db: Session,
+    book_id: str,
+    period_id: str,
+    basis_code: str,
+    actor_user_id: str | None,
+    params: dict,
+    ph: str,
+) -> GenerateResult:
+    period = (
+        db.query(AccountingPeriod)
+        .filter(AccountingPeriod.id == period_id, AccountingPeriod.book_id == book_id)
+        .one()
+    )
+    basis = db.query(ReportBasis).filter(ReportBasis.code == basis_code).one_or_none()
+    if not basis:
+        raise ValueError(f"报表口径不存在：{basis_code}")
+
+    existing = (
+        db.query(ReportSnapshot)
+        .filter(ReportSnapshot.book_id == book_id, ReportSnapshot.params_hash == ph)
+        .one_or_none()
+    )
+    if existing and not existing.is_stale:
+        return GenerateResult(snapshot_id=str(existing.id))
+
+    # 计算：按“科目→报表项目映射”。展开与冲突校验结果按 (科目版本, 映射版本) 缓存，
+    # 科目树或映射未变时不再重复展开。
+    items = db.query(ReportItem).order_by(ReportItem.statement_type.asc(), ReportItem.display_order.asc()).all()
+    index = get_mapping_index(db, book_id, str(basis.id))
+    if not index.mapping_count:
+        raise ValueError("该口径未配置任何科目映射，无法生成报表")
+    if index.overlap_errors:
+        raise ValueError("映射规则冲突：存在重复计入科目，无法生成报表")
+
+    all_accounts = index.mapped_account_ids()
+    if not all_accounts:
+        raise ValueError("映射展开后无任何科目，无法生成报表")
+
+    # period key，用于“截至本期”的累计
+    pkey = int(period.year) * 100 + int(period.month)
+
+    acc_tbl = Account.__table__
+    sp_tbl = Split.__table__
+    tx_tbl = Transaction.__table__
+    pe_tbl = AccountingPeriod.__table__
+
+    norm_value = sa.case(
+        (acc_tbl.c.type.in_(list(_CREDIT_TYPES)), -sp_tbl.c.value),
+        else_=sp_tbl.c.value,
+    )
+
+    q_balance = (
+        sa.select(sp_tbl.c.account_id, sa.func.coalesce(sa.func.sum(norm_value), 0).label("amt"))
+        .select_from(
+            sp_tbl.join(tx_tbl, sp_tbl.c.txn_id == tx_tbl.c.id)
+            .join(pe_tbl, tx_tbl.c.period_id == pe_tbl.c.id)
+            .join(acc_tbl, sp_tbl.c.account_id == acc_tbl.c.id)
         )
-        if existing and not existing.is_stale:
-            return GenerateResult(snapshot_id=str(existing.id))
-
-        # 计算：按“科目→报表项目映射”
-        accounts = list_accounts(db, book_id)
-        children_map = build_account_children_map(accounts)
-
-        items = db.query(ReportItem).order_by(ReportItem.statement_type.asc(), ReportItem.display_order.asc()).all()
-        item_by_id = {str(i.id): i for i in items}
-
-        mappings = db.query(ReportMapping).filter(ReportMapping.basis_id == basis.id).all()
-        if not mappings:
-            raise ValueError("该口径未配置任何科目映射，无法生成报表")
-
-        # 1) 展开映射 account set（处理 include_children）
-        expanded: dict[tuple[str, str], set[str]] = {}  # (statement_type, item_code) -> set(account_id)
-        overlap_errors: list[dict] = []
-        per_statement_used: dict[str, set[str]] = {"BS": set(), "IS": set(), "CF": set()}
-
-        for m in mappings:
-            item = item_by_id.get(str(m.item_id))
-            if not item:
-                continue
-            stmt = item.statement_type
-            key = (stmt, item.code)
-            rid = str(m.account_id)
-            acc_set: set[str] = collect_descendants(children_map, rid) if m.include_children else {rid}
-
-            overlap = per_statement_used[stmt] & acc_set
-            if overlap:
-                overlap_errors.append(
-                    {
-                        "statement_type": stmt,
-                        "item_code": item.code,
-                        "overlap_account_ids": sorted(list(overlap))[:50],
-                        "message": "同一科目在同一口径下被重复计入（违反映射规则）",
-                    }
-                )
-            per_statement_used[stmt] |= acc_set
-            expanded[key] = expanded.get(key, set()) | acc_set
-
-        if overlap_errors:
-            raise ValueError("映射规则冲突：存在重复计入科目，无法生成报表")
-
-        all_accounts: set[str] = set()
-        for s in expanded.values():
-            all_accounts |= s
-        if not all_accounts:
-            raise ValueError("映射展开后无任何科目，无法生成报表")
-
-        # period key，用于“截至本期”的累计
-        pkey = int(period.year) * 100 + int(period.month)
-
-        acc_tbl = Account.__table__
-        sp_tbl = Split.__table__
-        tx_tbl = Transaction.__table__
-        pe_tbl = AccountingPeriod.__table__
-
-        norm_value = sa.case(
-            (acc_tbl.c.type.in_(list(_CREDIT_TYPES)), -sp_tbl.c.value),
-            else_=sp_tbl.c.value,
+        .where(acc_tbl.c.book_id == sa.bindparam("book_id"))
+        .where(sp_tbl.c.account_id.in_(sa.bindparam("acc_ids", expanding=True)))
+        .where((pe_tbl.c.year * 100 + pe_tbl.c.month) <= sa.bindparam("pkey"))
+        .group_by(sp_tbl.c.account_id)
+    )
+
+    q_activity = (
+        sa.select(sp_tbl.c.account_id, sa.func.coalesce(sa.func.sum(norm_value), 0).label("amt"))
+        .select_from(sp_tbl.join(tx_tbl, sp_tbl.c.txn_id == tx_tbl.c.id).join(acc_tbl, sp_tbl.c.account_id == acc_tbl.c.id))
+        .where(acc_tbl.c.book_id == sa.bindparam("book_id"))
+        .where(tx_tbl.c.period_id == sa.bindparam("period_id"))
+        .where(sp_tbl.c.account_id.in_(sa.bindparam("acc_ids", expanding=True)))
+        .group_by(sp_tbl.c.account_id)
+    )
+
+    balance_rows = db.execute(q_balance, {"book_id": book_id, "pkey": pkey, "acc_ids": list(all_accounts)}).all()
+    activity_rows = db.execute(q_activity, {"book_id": book_id, "period_id": period_id, "acc_ids": list(all_accounts)}).all()
+    balance_by_acc = {str(r[0]): _decimal(r[1]) for r in balance_rows}
+    activity_by_acc = {str(r[0]): _decimal(r[1]) for r in activity_rows}
+
+    # 5) 现金流量表（直接法）：按涉及现金凭证的对方科目分类；投资/筹资类对方科目取自 CF 映射
+    cf = compute_direct_cash_flow(
+        db,
+        book_id=book_id,
+        period_id=period_id,
+        pkey=pkey,
+        cash_ids=resolve_cash_account_ids(db, book_id),
+        investing_ids=index.accounts_of("CF", "CF_INVESTING"),
+        financing_ids=index.accounts_of("CF", "CF_FINANCING"),
+    )
+    out, checks = assemble_statements(items, index, balance_by_acc, activity_by_acc, cf)
+
+    log = {
+        "mapping": {"basis_code": basis_code, "expanded_account_count": len(all_accounts)},
+        "checks": checks,
+        "generated_at": datetime.utcnow().isoformat(),
+    }
+    result = {"statements": out, "checks": log["checks"], "params": params}
+
+    if existing:
+        existing.period_id = period_id
+        existing.basis_id = basis.id
+        existing.generated_by = actor_user_id if actor_user_id else None
+        existing.generated_at = datetime.utcnow()
+        existing.is_stale = False
+        existing.result_json = result
+        existing.log_json = log
+        db.flush()
+        sid = str(existing.id)
+    else:
+        snap = ReportSnapshot(
+            book_id=book_id,
+            period_id=period_id,
+            basis_id=basis.id,
+            params_hash=ph,
+            generated_by=actor_user_id if actor_user_id else None,
+            generated_at=datetime.utcnow(),
+            is_stale=False,
+            result_json=result,
+            log_json=log,
         )
-
-        q_balance = (
-            sa.select(sp_tbl.c.account_id, sa.func.coalesce(sa.func.sum(norm_value), 0).label("amt"))
-            .select_from(
-                sp_tbl.join(tx_tbl, sp_tbl.c.txn_id == tx_tbl.c.id)
-                .join(pe_tbl, tx_tbl.c.period_id == pe_tbl.c.id)
-                .join(acc_tbl, sp_tbl.c.account_id == acc_tbl.c.id)
-            )
-            .where(acc_tbl.c.book_id == sa.bindparam("book_id"))
-            .where(sp_tbl.c.account_id.in_(sa.bindparam("acc_ids", expanding=True)))
-            .where((pe_tbl.c.year * 100 + pe_tbl.c.month) <= sa.bindparam("pkey"))
-            .group_by(sp_tbl.c.account_id)
-        )
-
-        q_activity = (
-            sa.select(sp_tbl.c.account_id, sa.func.coalesce(sa.func.sum(norm_value), 0).label("amt"))
-            .select_from(sp_tbl.join(tx_tbl, sp_tbl.c.txn_id == tx_tbl.c.id).join(acc_tbl, sp_tbl.c.account_id == acc_tbl.c.id))
-            .where(acc_tbl.c.book_id == sa.bindparam("book_id"))
-            .where(tx_tbl.c.period_id == sa.bindparam("period_id"))
-            .where(sp_tbl.c.account_id.in_(sa.bindparam("acc_ids", expanding=True)))
-            .group_by(sp_tbl.c.account_id)
-        )
-
-        balance_rows = db.execute(q_balance, {"book_id": book_id, "pkey": pkey, "acc_ids": list(all_accounts)}).all()
-        activity_rows = db.execute(q_activity, {"book_id": book_id, "period_id": period_id, "acc_ids": list(all_accounts)}).all()
-        balance_by_acc = {str(r[0]): _decimal(r[1]) for r in balance_rows}
-        activity_by_acc = {str(r[0]): _decimal(r[1]) for r in activity_rows}
-
-        def item_amount(stmt: str, item_code: str) -> Decimal:
-            accs = expanded.get((stmt, item_code), set())
-            item = next((i for i in items if i.statement_type == stmt and i.code == item_code), None)
-            if not item:
-                return Decimal("0")
-            src = balance_by_acc if item.calc_mode == "BALANCE" else activity_by_acc
-            return sum((src.get(aid, Decimal("0")) for aid in accs), start=Decimal("0"))
-
-        out: dict[str, list[dict]] = {"BS": [], "IS": [], "CF": []}
-        for it in items:
-            amt = item_amount(it.statement_type, it.code)
-            out[it.statement_type].append({"code": it.code, "name": it.name, "amount": str(amt)})
-
-        # 4) 公式项（避免“同一科目重复计入”）：总计由明细项计算，不做重复映射
-        def _set_or_append(stmt: str, code: str, name: str, amt: Decimal):
-            for x in out[stmt]:
-                if x["code"] == code:
-                    x["name"] = name
-                    x["amount"] = str(amt)
-                    return
-            out[stmt].append({"code": code, "name": name, "amount": str(amt)})
-
-        bs_assets = item_amount("BS", "BS_ASSETS")
-        bs_liab = item_amount("BS", "BS_LIABILITIES")
-        bs_equity = item_amount("BS", "BS_EQUITY")
-        bs_assets_total = bs_assets
-        bs_le_total = bs_liab + bs_equity
-
-        _set_or_append("BS", "BS_ASSETS_TOTAL", "资产合计", bs_assets_total)
-        _set_or_append("BS", "BS_LIAB_EQUITY_TOTAL", "负债与所有者权益合计", bs_le_total)
-
-        is_rev = item_amount("IS", "IS_REVENUE")
-        is_exp = item_amount("IS", "IS_EXPENSE")
-        is_profit = is_rev - is_exp
-        _set_or_append("IS", "IS_NET_PROFIT", "净利润", is_profit)
-
-        tol = Decimal("0.5")
-        bs_ok = abs(bs_assets_total - bs_le_total) <= tol
-
-        cash_ids = [
-            str(r[0])
-            for r in db.query(Account.id).filter(Account.book_id == book_id, Account.type.in_(list(_CASH_TYPES))).all()
-        ]
-        cash_begin = Decimal("0")
-        cash_end = Decimal("0")
-        cash_net = Decimal("0")
-        if cash_ids:
-            q_cash_end = (
-                sa.select(sa.func.coalesce(sa.func.sum(norm_value), 0))
-                .select_from(
-                    sp_tbl.join(tx_tbl, sp_tbl.c.txn_id == tx_tbl.c.id)
-                    .join(pe_tbl, tx_tbl.c.period_id == pe_tbl.c.id)
-                    .join(acc_tbl, sp_tbl.c.account_id == acc_tbl.c.id)
-                )
-                .where(acc_tbl.c.book_id == book_id)
-                .where(sp_tbl.c.account_id.in_(cash_ids))
-                .where((pe_tbl.c.year * 100 + pe_tbl.c.month) <= pkey)
-            )
-            q_cash_begin = (
-                sa.select(sa.func.coalesce(sa.func.sum(norm_value), 0))
-                .select_from(
-                    sp_tbl.join(tx_tbl, sp_tbl.c.txn_id == tx_tbl.c.id)
-                    .join(pe_tbl, tx_tbl.c.period_id == pe_tbl.c.id)
-                    .join(acc_tbl, sp_tbl.c.account_id == acc_tbl.c.id)
-                )
-                .where(acc_tbl.c.book_id == book_id)
-                .where(sp_tbl.c.account_id.in_(cash_ids))
-                .where((pe_tbl.c.year * 100 + pe_tbl.c.month) < pkey)
-            )
-            q_cash_net = (
-                sa.select(sa.func.coalesce(sa.func.sum(norm_value), 0))
-                .select_from(sp_tbl.join(tx_tbl, sp_tbl.c.txn_id == tx_tbl.c.id).join(acc_tbl, sp_tbl.c.account_id == acc_tbl.c.id))
-                .where(acc_tbl.c.book_id == book_id)
-                .where(tx_tbl.c.period_id == period_id)
-                .where(sp_tbl.c.account_id.in_(cash_ids))
-            )
-            cash_end = _decimal(db.execute(q_cash_end).scalar_one())
-            cash_begin = _decimal(db.execute(q_cash_begin).scalar_one())
-            cash_net = _decimal(db.execute(q_cash_net).scalar_one())
-
-        for x in out["CF"]:
-            if x["code"] == "CF_BEGIN_CASH":
-                x["amount"] = str(cash_begin)
-            if x["code"] == "CF_NET_CASH":
-                x["amount"] = str(cash_net)
-            if x["code"] == "CF_END_CASH":
-                x["amount"] = str(cash_end)
-
-        log = {
-            "mapping": {"basis_code": basis_code, "expanded_account_count": len(all_accounts)},
-            "checks": {
-                "BS_BALANCE_OK": bs_ok,
-                "BS_ASSETS_TOTAL": str(bs_assets_total),
-                "BS_LIAB_EQUITY_TOTAL": str(bs_le_total),
-                "tolerance": str(tol),
-            },
-            "generated_at": datetime.utcnow().isoformat(),
-        }
-        result = {"statements": out, "checks": log["checks"], "params": params}
-
-        if existing:
-            existing.period_id = period_id
-            existing.basis_id = basis.id
-            existing.generated_by = actor_user_id if actor_user_id else None
-            existing.generated_at = datetime.utcnow()
-            existing.is_stale = False
-            existing.result_json = result
-            existing.log_json = log
-            db.flush()
-            sid = str(existing.id)
-        else:
-            snap = ReportSnapshot(
-                book_id=book_id,
-                period_id=period_id,
-                basis_id=basis.id,
-                params_hash=ph,
-                generated_by=actor_user_id if actor_user_id else None,
-                generated_at=datetime.utcnow(),
-                is_stale=False,
-                result_json=result,
-                log_json=log,
-            )
-            db.add(snap)
-            db.flush()
-            sid = str(snap.id)
+        db.add(snap)
+        db.flush()
+        sid = str(snap.id)
 
     return GenerateResult(snapshot_id=sid)
 
 
+def assemble_statements(
+    items: list[ReportItem],
+    index: MappingIndex,
+    balance_by_acc: dict[str, Decimal],
+    activity_by_acc: dict[str, Decimal],
+    cf: CashFlowResult,
+) -> tuple[dict[str, list[dict]], dict]:
+    """由映射索引 + 按科目汇总的余额/发生额组装三张表（纯内存，生成与预览共用）。"""
+    item_by_key = {(i.statement_type, i.code): i for i in items}
+
+    def item_amount(stmt: str, item_code: str) -> Decimal:
+        item = item_by_key.get((stmt, item_code))
+        idx = index.item_accounts.get((stmt, item_code))
+        if not item or not idx:
+            return Decimal("0")
+        src = balance_by_acc if item.calc_mode == "BALANCE" else activity_by_acc
+        ids = index.account_ids
+        return sum((src.get(ids[i], Decimal("0")) for i in idx), start=Decimal("0"))
+
+    out: dict[str, list[dict]] = {"BS": [], "IS": [], "CF": []}
+    for it in items:
+        amt = item_amount(it.statement_type, it.code)
+        out[it.statement_type].append({"code": it.code, "name": it.name, "amount": str(amt)})
+
+    # 公式项（避免“同一科目重复计入”）：总计由明细项计算，不做重复映射
+    def _set_or_append(stmt: str, code: str, name: str, amt: Decimal):
+        for x in out[stmt]:
+            if x["code"] == code:
+                x["name"] = name
+                x["amount"] = str(amt)
+                return
+        out[stmt].append({"code": code, "name": name, "amount": str(amt)})
+
+    bs_assets = item_amount("BS", "BS_ASSETS")
+    bs_liab = item_amount("BS", "BS_LIABILITIES")
+    bs_equity = item_amount("BS", "BS_EQUITY")
+    bs_assets_total = bs_assets
+    bs_le_total = bs_liab + bs_equity
+
+    _set_or_append("BS", "BS_ASSETS_TOTAL", "资产合计", bs_assets_total)
+    _set_or_append("BS", "BS_LIAB_EQUITY_TOTAL", "负债与所有者权益合计", bs_le_total)
+
+    is_rev = item_amount("IS", "IS_REVENUE")
+    is_exp = item_amount("IS", "IS_EXPENSE")
+    is_profit = is_rev - is_exp
+    _set_or_append("IS", "IS_NET_PROFIT", "净利润", is_profit)
+
+    tol = Decimal("0.5")
+    bs_ok = abs(bs_assets_total - bs_le_total) <= tol
+
+    _set_or_append("CF", "CF_OPERATING", "经营活动产生的现金流量净额", cf.by_category[CF_OPERATING])
+    _set_or_append("CF", "CF_INVESTING", "投资活动产生的现金流量净额", cf.by_category[CF_INVESTING])
+    _set_or_append("CF", "CF_FINANCING", "筹资活动产生的现金流量净额", cf.by_category[CF_FINANCING])
+    _set_or_append("CF", "CF_BEGIN_CASH", "期初现金", cf.begin_cash)
+    _set_or_append("CF", "CF_NET_CASH", "本期现金净增加额", cf.net_cash)
+    _set_or_append("CF", "CF_END_CASH", "期末现金", cf.end_cash)
+
+    checks = {
+        "BS_BALANCE_OK": bs_ok,
+        "BS_ASSETS_TOTAL": str(bs_assets_total),
+        "BS_LIAB_EQUITY_TOTAL": str(bs_le_total),
+        "tolerance": str(tol),
+        "CF_DIRECT_OK": abs(cf.unclassified) <= tol,
+        "CF_UNCLASSIFIED": str(cf.unclassified),
+    }
+    return out, checks
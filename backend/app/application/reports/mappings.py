@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import threading
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable
+
+from sqlalchemy.orm import Session
+
+from app.application.engine.accounts import AccountRow, build_account_children_map, collect_descendants, list_accounts
+from app.application.engine.versions import (
+    ACCOUNTS_VERSION_KEY,
+    MAPPINGS_VERSION_KEY,
+    bump_mappings_version,
+    get_versions,
+)
+from app.infra.db.models import Account, ReportBasis, ReportItem, ReportMapping, ReportSnapshot
+
+_STATEMENTS = ("BS", "IS", "CF")
+
+
+@dataclass(frozen=True)
+class MappingSpec:
+    statement_type: str
+    item_code: str
+    account_id: str
+    include_children: bool = True
+    direction: str = "NET"
+
+
+@dataclass(frozen=True)
+class MappingIndex:
+    """
+    某账簿 + 某口径下的映射展开结果（紧凑整数下标）：
+    - account_ids：下标 -> 科目 id（该账簿全部科目，按 code 排序）
+    - item_accounts：(statement_type, item_code) -> 升序科目下标数组
+    - overlap_errors：同一报表内科目被重复计入的冲突（为空表示映射合法）
+    """
+
+    account_ids: tuple[str, ...]
+    item_accounts: dict[tuple[str, str], array]
+    overlap_errors: tuple[dict, ...]
+    mapping_count: int
+
+    def accounts_of(self, statement_type: str, item_code: str) -> set[str]:
+        idx = self.item_accounts.get((statement_type, item_code))
+        if not idx:
+            return set()
+        return {self.account_ids[i] for i in idx}
+
+    def mapped_account_ids(self) -> set[str]:
+        out: set[int] = set()
+        for idx in self.item_accounts.values():
+            out.update(idx)
+        return {self.account_ids[i] for i in out}
+
+
+def expand_mappings(accounts: list[AccountRow], specs: Iterable[MappingSpec]) -> MappingIndex:
+    """纯内存展开（处理 include_children）并做同报表重复计入校验；不访问数据库。"""
+    account_ids = tuple(a.id for a in accounts)
+    pos = {aid: i for i, aid in enumerate(account_ids)}
+    children_map = build_account_children_map(accounts)
+    descendants: dict[str, list[int]] = {}
+
+    used = {st: bytearray(len(account_ids)) for st in _STATEMENTS}
+    item_sets: dict[tuple[str, str], set[int]] = {}
+    overlap_errors: list[dict] = []
+    count = 0
+
+    for m in specs:
+        count += 1
+        rid = str(m.account_id)
+        if m.include_children:
+            if rid not in descendants:
+                descendants[rid] = [pos[x] for x in collect_descendants(children_map, rid) if x in pos]
+            idx = descendants[rid]
+        else:
+            idx = [pos[rid]] if rid in pos else []
+
+        stmt = m.statement_type
+        flags = used.setdefault(stmt, bytearray(len(account_ids)))
+        overlap = [i for i in idx if flags[i]]
+        if overlap:
+            overlap_errors.append(
+                {
+                    "statement_type": stmt,
+                    "item_code": m.item_code,
+                    "overlap_account_ids": sorted(account_ids[i] for i in overlap)[:50],
+                    "message": "同一科目在同一口径下被重复计入（违反映射规则）",
+                }
+            )
+        for i in idx:
+            flags[i] = 1
+        item_sets.setdefault((stmt, m.item_code), set()).update(idx)
+
+    return MappingIndex(
+        account_ids=account_ids,
+        item_accounts={k: array("l", sorted(v)) for k, v in item_sets.items()},
+        overlap_errors=tuple(overlap_errors),
+        mapping_count=count,
+    )
+
+
+def load_mapping_specs(db: Session, basis_id: str) -> list[MappingSpec]:
+    rows = (
+        db.query(ReportMapping, ReportItem)
+        .join(ReportItem, ReportMapping.item_id == ReportItem.id)
+        .filter(ReportMapping.basis_id == basis_id)
+        .all()
+    )
+    return [
+        MappingSpec(
+            statement_type=it.statement_type,
+            item_code=it.code,
+            account_id=str(m.account_id),
+            include_children=bool(m.include_children),
+            direction=m.direction or "NET",
+        )
+        for m, it in rows
+    ]
+
+
+# 进程内缓存：key = (book_id, basis_id, accounts_version, mappings_version)
+_CACHE_MAX = 64
+_cache_guard = threading.Lock()
+_cache: OrderedDict[tuple[str, str, int, int], MappingIndex] = OrderedDict()
+
+
+def get_mapping_index(db: Session, book_id: str, basis_id: str) -> MappingIndex:
+    acc_key = ("book", str(book_id), ACCOUNTS_VERSION_KEY)
+    map_key = ("report_basis", str(basis_id), MAPPINGS_VERSION_KEY)
+    versions = get_versions(db, [acc_key, map_key])
+    key = (str(book_id), str(basis_id), versions[acc_key], versions[map_key])
+
+    with _cache_guard:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+            return hit
+
+    index = expand_mappings(list_accounts(db, str(book_id)), load_mapping_specs(db, str(basis_id)))
+    with _cache_guard:
+        _cache[key] = index
+        _cache.move_to_end(key)
+        while len(_cache) > _CACHE_MAX:
+            _cache.popitem(last=False)
+    return index
+
+
+def validate_mapping_specs(
+    db: Session, book_id: str, specs: list[MappingSpec], *, items: dict[tuple[str, str], ReportItem] | None = None
+) -> list[AccountRow]:
+    """校验映射项引用的报表项目/科目是否存在；返回该账簿科目列表（供展开使用）。"""
+    if items is None:
+        items = {(i.statement_type, i.code): i for i in db.query(ReportItem).all()}
+    accounts = list_accounts(db, book_id)
+    acc_ids = {a.id for a in accounts}
+    for s in specs:
+        if (s.statement_type, s.item_code) not in items:
+            raise ValueError(f"报表项目不存在：{s.statement_type}/{s.item_code}")
+        if s.account_id not in acc_ids:
+            raise ValueError(f"科目不存在或不属于该账簿：{s.account_id}")
+        if s.direction not in ("NET", "DEBIT", "CREDIT"):
+            raise ValueError("direction 必须为 NET/DEBIT/CREDIT")
+    return accounts
+
+
+@dataclass(frozen=True)
+class ReplaceMappingsResult:
+    basis_code: str
+    mapping_count: int
+    mappings_version: int
+
+
+def replace_basis_mappings(db: Session, *, book_id: str, basis_code: str, specs: list[MappingSpec]) -> ReplaceMappingsResult:
+    """
+    整体替换某口径在该账簿下的映射。冲突（同一报表重复计入）在此处一次性校验，
+    校验通过才落库并递增映射版本；报表生成时直接复用缓存的校验结果。
+    """
+    with db.begin():
+        basis = db.query(ReportBasis).filter(ReportBasis.code == basis_code).with_for_update().one_or_none()
+        if not basis:
+            raise ValueError(f"报表口径不存在：{basis_code}")
+
+        items = {(i.statement_type, i.code): i for i in db.query(ReportItem).all()}
+        accounts = validate_mapping_specs(db, book_id, specs, items=items)
+        index = expand_mappings(accounts, specs)
+        if index.overlap_errors:
+            first = index.overlap_errors[0]
+            raise ValueError(
+                f"映射规则冲突：{first['statement_type']}/{first['item_code']} 与其他项目重复计入 {len(first['overlap_account_ids'])} 个科目"
+            )
+
+        # 口径是全局的，这里只替换属于本账簿科目的映射
+        book_acc_ids = db.query(Account.id).filter(Account.book_id == book_id)
+        db.query(ReportMapping).filter(ReportMapping.basis_id == basis.id, ReportMapping.account_id.in_(book_acc_ids)).delete(
+            synchronize_session=False
+        )
+        db.add_all(
+            [
+                ReportMapping(
+                    basis_id=basis.id,
+                    statement_type=s.statement_type,
+                    item_id=items[(s.statement_type, s.item_code)].id,
+                    account_id=s.account_id,
+                    include_children=s.include_children,
+                    direction=s.direction,
+                )
+                for s in specs
+            ]
+        )
+        db.flush()
+        # 口径映射变化后，该账簿此口径下的既有快照需重新生成
+        db.query(ReportSnapshot).filter(ReportSnapshot.book_id == book_id, ReportSnapshot.basis_id == basis.id).update(
+            {ReportSnapshot.is_stale: True}, synchronize_session=False
+        )
+        v = bump_mappings_version(db, str(basis.id))
+        return ReplaceMappingsResult(basis_code=basis_code, mapping_count=len(specs), mappings_version=v)
@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from itertools import groupby
+from datetime import date, datetime, time, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.application.engine.prices import get_price_book
+from app.infra.db.models import Account, Book, Commodity, Split, Transaction
+
+METHOD_FIFO = "FIFO"
+METHOD_AVERAGE = "AVERAGE"
+METHODS = (METHOD_FIFO, METHOD_AVERAGE)
+
+_ZERO = Decimal("0")
+
+
+def _q2(v: Decimal) -> Decimal:
+    return v.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+@dataclass(frozen=True)
+class LotHolding:
+    lot_id: str | None  # 买入分录未挂 lot 时为 None
+    opened: date
+    quantity: Decimal
+    cost: Decimal
+
+
+@dataclass(frozen=True)
+class PositionValuation:
+    account_id: str
+    account_code: str
+    account_name: str
+    commodity_id: str
+    commodity_code: str
+    quantity: Decimal
+    cost_basis: Decimal
+    price: Decimal | None  # 1 单位证券折合本位币；缺价格时为 None
+    market_value: Decimal | None
+    unrealised: Decimal | None
+    realised: Decimal
+    lots: list[LotHolding]  # FIFO 下的未平仓 lot；AVERAGE 下为空
+
+
+@dataclass(frozen=True)
+class PortfolioValuation:
+    book_id: str
+    as_of: date
+    method: str
+    positions: list[PositionValuation]
+    cost_basis: Decimal
+    market_value: Decimal  # 只含有价格的持仓
+    unrealised: Decimal
+    realised: Decimal
+    unpriced: int  # 缺价格、未计入市值的持仓数
+
+
+def _div(a: int, b: int) -> int:
+    # 整数（分）按比例分摊成本时四舍五入
+    return (2 * a + b) // (2 * b)
+
+
+def _cents(v: int) -> Decimal:
+    return Decimal(v).scaleb(-2)
+
+
+class _Position:
+    """
+    单个证券科目的持仓状态，数量/金额均以“分”为单位的整数累计（避免逐笔 Decimal 运算）。
+    FIFO 用 lot 队列，AVERAGE 只记总数量/总成本。
+    """
+
+    __slots__ = ("lots", "qty", "cost", "realised")
+
+    def __init__(self) -> None:
+        self.lots: deque[list] = deque()  # [lot_id, opened, qty, cost]
+        self.qty = 0
+        self.cost = 0
+        self.realised = 0
+
+    def buy(self, fifo: bool, lot_id: str | None, opened, qty: int, cost: int) -> None:
+        self.qty += qty
+        self.cost += cost
+        if not fifo:
+            return
+        if lot_id:
+            for lot in self.lots:
+                if lot[0] == lot_id:
+                    lot[2] += qty
+                    lot[3] += cost
+                    return
+        self.lots.append([lot_id, opened, qty, cost])
+
+    def adjust_cost(self, fifo: bool, lot_id: str | None, cost: int) -> None:
+        # 只有金额没有数量（费用、重估等）：计入指定 lot，否则计入最近一个 lot
+        self.cost += cost
+        if not fifo or not self.lots:
+            return
+        target = next((lot for lot in self.lots if lot[0] == lot_id), None) if lot_id else None
+        (target or self.lots[-1])[3] += cost
+
+    def _take(self, lot: list, left: int) -> tuple[int, int]:
+        take = left if left < lot[2] else lot[2]
+        part = lot[3] if take == lot[2] else _div(lot[3] * take, lot[2])
+        lot[2] -= take
+        lot[3] -= part
+        return take, part
+
+    def sell(self, fifo: bool, lot_id: str | None, qty: int, proceeds: int, in_range: bool) -> None:
+        if fifo:
+            cost_out = 0
+            left = qty
+            # 指定了 lot 的卖出先从该 lot 出，其余按先进先出
+            if lot_id:
+                for lot in self.lots:
+                    if lot[0] == lot_id and lot[2] > 0:
+                        take, part = self._take(lot, left)
+                        left -= take
+                        cost_out += part
+                        break
+                self.lots = deque(lot for lot in self.lots if lot[2] > 0)
+            lots = self.lots
+            while left > 0 and lots:
+                take, part = self._take(lots[0], left)
+                left -= take
+                cost_out += part
+                if lots[0][2] <= 0:
+                    lots.popleft()
+            sold = qty - left
+        else:
+            sold = (qty if qty < self.qty else self.qty) if self.qty > 0 else 0
+            cost_out = self.cost if sold == self.qty else (_div(self.cost * sold, self.qty) if sold else 0)
+        # 卖出超过持仓的部分没有可匹配的成本，按零成本处理
+        self.qty -= sold
+        self.cost -= cost_out
+        if in_range:
+            self.realised += proceeds - cost_out
+
+
+# 进程内缓存：book_id -> (水位, 按科目分组的证券分录)。已过账分录只追加不修改，
+# 因此证券科目上的分录条数即可作为水位；新过账后条数变化即重新加载
+_SCAN_CACHE_MAX = 4
+_scan_guard = threading.Lock()
+_scan_cache: OrderedDict[str, tuple[int, dict[str, list[tuple]]]] = OrderedDict()
+
+
+def _load_trades(db: Session, book_id: str) -> dict[str, list[tuple]]:
+    """证券科目的全部已过账分录，按科目分组、组内按交易顺序排列：(txn_date, currency_id, 数量分, 金额分, lot_id)。"""
+    a, c = Account.__table__, Commodity.__table__
+    t, s = Transaction.__table__, Split.__table__
+    sec_accounts = sa.select(a.c.id).join(c, c.c.id == a.c.commodity_id).where(a.c.book_id == book_id, c.c.type == "SECURITY")
+    watermark = int(db.execute(sa.select(sa.func.count()).select_from(s).where(s.c.account_id.in_(sec_accounts))).scalar() or 0)
+    with _scan_guard:
+        hit = _scan_cache.get(str(book_id))
+        if hit is not None and hit[0] == watermark:
+            _scan_cache.move_to_end(str(book_id))
+            return hit[1]
+
+    # 数量/金额在库里换算成“分”的整数，逐笔匹配时不做 Decimal 运算
+    rows = db.execute(
+        sa.select(
+            s.c.account_id,
+            t.c.txn_date,
+            t.c.currency_id,
+            sa.cast(sa.func.round(s.c.amount * 100), sa.BigInteger),
+            sa.cast(sa.func.round(s.c.value * 100), sa.BigInteger),
+            s.c.lot_id,
+        )
+        .select_from(s.join(t, t.c.id == s.c.txn_id))
+        .where(s.c.account_id.in_(sec_accounts), t.c.book_id == book_id, t.c.status == "POSTED")
+        .order_by(s.c.account_id, t.c.txn_date, t.c.posted_at, t.c.id, s.c.line_no)
+    ).all()
+    trades = {str(aid): [tuple(r)[1:] for r in grp] for aid, grp in groupby(rows, key=lambda r: r[0])}
+    with _scan_guard:
+        _scan_cache[str(book_id)] = (watermark, trades)
+        _scan_cache.move_to_end(str(book_id))
+        while len(_scan_cache) > _SCAN_CACHE_MAX:
+            _scan_cache.popitem(last=False)
+    return trades
+
+
+def value_portfolio(
+    db: Session,
+    *,
+    book_id: str,
+    as_of: date,
+    method: str = METHOD_FIFO,
+    realised_from: date | None = None,
+) -> PortfolioValuation:
+    """
+    证券持仓估值：证券科目（commodity.type = SECURITY）上 split.amount 为数量、split.value 为成本/卖出所得（交易币种）。
+    - 证券分录一条查询按科目、交易顺序取出（按水位缓存），数量/金额按整数分单趟扫描完成 lot 匹配（FIFO 或移动平均）；
+    - 外币交易按交易日汇率、持仓按 as_of 的价格折算本位币，价格均取自进程内价格缓存（支持三角折算）；
+    - realised 为 [realised_from, as_of] 内卖出的已实现损益（不指定起始日则自建仓起）；缺价格的持仓不计市值。
+    """
+    m = (method or "").upper()
+    if m not in METHODS:
+        raise ValueError(f"method 必须是 {'/'.join(METHODS)}")
+    fifo = m == METHOD_FIFO
+    book = db.query(Book).filter(Book.id == book_id).one_or_none()
+    if not book:
+        raise ValueError("账簿不存在")
+    base_id = str(book.base_currency_id)
+    prices = get_price_book(db, book_id)
+
+    cutoff = datetime.combine(as_of + timedelta(days=1), time())
+    range_start = datetime.combine(realised_from, time()) if realised_from else None
+
+    positions: dict[str, _Position] = {}
+    for account_id, trades in _load_trades(db, book_id).items():
+        pos = positions[account_id] = _Position()
+        for txn_date, currency_id, qty, v, lot_id in trades:
+            if txn_date >= cutoff:
+                break
+            if v and currency_id and currency_id != base_id:
+                converted = prices.convert(_cents(v), str(currency_id), base_id, txn_date.date())
+                if converted is None:
+                    raise ValueError(f"缺少 {txn_date.date().isoformat()} 的交易币种对本位币汇率，无法计算证券成本")
+                v = int(_q2(converted).scaleb(2))
+            if qty > 0:
+                pos.buy(fifo, lot_id, txn_date, qty, v)
+            elif qty < 0:
+                pos.sell(fifo, lot_id, -qty, -v, range_start is None or txn_date >= range_start)
+            elif v:
+                pos.adjust_cost(fifo, lot_id, v)
+
+    accounts = {
+        str(r.id): r
+        for r in db.query(Account.id, Account.code, Account.name, Account.commodity_id, Commodity.code.label("commodity_code"))
+        .join(Commodity, Commodity.id == Account.commodity_id)
+        .filter(Account.book_id == book_id, Commodity.type == "SECURITY")
+        .all()
+    }
+
+    out: list[PositionValuation] = []
+    unpriced = 0
+    for aid, p in sorted(positions.items(), key=lambda kv: accounts[kv[0]].code):
+        acc = accounts[aid]
+        if p.qty == 0 and p.realised == 0:
+            continue
+        qty, cost = _cents(p.qty), _cents(p.cost)
+        price = market = unrealised = None
+        if p.qty != 0:
+            rate = prices.cross_rate(str(acc.commodity_id), base_id, as_of)
+            if rate is None:
+                unpriced += 1
+            else:
+                num, den = rate
+                price = num / den
+                market = _q2(qty * num / den)
+                unrealised = market - cost
+        out.append(
+            PositionValuation(
+                account_id=aid,
+                account_code=acc.code,
+                account_name=acc.name,
+                commodity_id=str(acc.commodity_id),
+                commodity_code=acc.commodity_code,
+                quantity=qty,
+                cost_basis=cost,
+                price=price,
+                market_value=market,
+                unrealised=unrealised,
+                realised=_cents(p.realised),
+                lots=[
+                    LotHolding(lot_id=str(x[0]) if x[0] else None, opened=x[1].date(), quantity=_cents(x[2]), cost=_cents(x[3]))
+                    for x in p.lots
+                    if x[2] > 0
+                ],
+            )
+        )
+
+    return PortfolioValuation(
+        book_id=str(book_id),
+        as_of=as_of,
+        method=m,
+        positions=out,
+        cost_basis=sum((x.cost_basis for x in out), _ZERO),
+        market_value=sum((x.market_value for x in out if x.market_value is not None), _ZERO),
+        unrealised=sum((x.unrealised for x in out if x.unrealised is not None), _ZERO),
+        realised=sum((x.realised for x in out), _ZERO),
+        unpriced=unpriced,
+    )
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from decimal import Decimal
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.application.reports.cash_flow import classify_cash_flow, counter_account_flows, resolve_cash_account_ids
+from app.application.reports.generator import assemble_statements
+from app.application.reports.mappings import MappingSpec, expand_mappings, validate_mapping_specs
+from app.infra.db.models import Account, AccountBalance, AccountingPeriod, ReportBasis, ReportItem, ReportSnapshot
+
+_CREDIT_TYPES = {"LIABILITY", "EQUITY", "INCOME", "AP"}
+
+
+def _decimal(v) -> Decimal:
+    if isinstance(v, Decimal):
+        return v
+    return Decimal(str(v))
+
+
+@dataclass(frozen=True)
+class _LedgerVectors:
+    balance_by_acc: dict[str, Decimal]  # 截至本期累计（已按科目方向规范化）
+    activity_by_acc: dict[str, Decimal]  # 本期发生额（已按科目方向规范化）
+    cash_ids: frozenset[str]
+    counter_flows: dict[str, Decimal]  # 本期现金凭证按对方科目汇总
+
+
+@dataclass(frozen=True)
+class PreviewDiffRow:
+    statement_type: str
+    code: str
+    name: str
+    current: Decimal | None
+    proposed: Decimal
+    delta: Decimal
+
+
+@dataclass(frozen=True)
+class MappingPreview:
+    book_id: str
+    period_id: str
+    basis_code: str
+    snapshot_id: str | None
+    statements: dict[str, list[dict]]
+    checks: dict
+    conflicts: list[dict]
+    diff: list[PreviewDiffRow]
+
+
+# 进程内缓存：key = (book_id, period_id, 现金科目集合, balance cache 戳)
+_CACHE_MAX = 32
+_cache_guard = threading.Lock()
+_cache: OrderedDict[tuple, _LedgerVectors] = OrderedDict()
+
+
+def _ledger_stamp(db: Session, book_id: str) -> tuple:
+    # balance cache 每次过账都会更新行（updated_at/balance_value），据此判断向量是否过期
+    ab = AccountBalance.__table__
+    row = db.execute(
+        sa.select(sa.func.count(), sa.func.max(ab.c.updated_at), sa.func.coalesce(sa.func.sum(ab.c.balance_value), 0)).where(
+            ab.c.book_id == book_id
+        )
+    ).one()
+    return int(row[0]), str(row[1]), str(_decimal(row[2]))
+
+
+def _load_vectors(db: Session, book_id: str, period: AccountingPeriod) -> _LedgerVectors:
+    cash_ids = frozenset(resolve_cash_account_ids(db, book_id))
+    key = (book_id, str(period.id), cash_ids, _ledger_stamp(db, book_id))
+    with _cache_guard:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+            return hit
+
+    ab = AccountBalance.__table__
+    pe = AccountingPeriod.__table__
+    acc = Account.__table__
+    pkey = int(period.year) * 100 + int(period.month)
+    sign = sa.case((acc.c.type.in_(list(_CREDIT_TYPES)), -1), else_=1)
+    q = (
+        sa.select(
+            ab.c.account_id,
+            sa.func.coalesce(sa.func.sum(ab.c.balance_value * sign), 0),
+            sa.func.coalesce(sa.func.sum(sa.case((ab.c.period_id == str(period.id), ab.c.balance_value * sign), else_=0)), 0),
+        )
+        .select_from(ab.join(pe, ab.c.period_id == pe.c.id).join(acc, ab.c.account_id == acc.c.id))
+        .where(ab.c.book_id == book_id)
+        .where((pe.c.year * 100 + pe.c.month) <= pkey)
+        .group_by(ab.c.account_id)
+    )
+    balance_by_acc: dict[str, Decimal] = {}
+    activity_by_acc: dict[str, Decimal] = {}
+    for aid, cum, act in db.execute(q).all():
+        balance_by_acc[str(aid)] = _decimal(cum)
+        activity_by_acc[str(aid)] = _decimal(act)
+
+    vectors = _LedgerVectors(
+        balance_by_acc=balance_by_acc,
+        activity_by_acc=activity_by_acc,
+        cash_ids=cash_ids,
+        counter_flows=counter_account_flows(db, period_id=str(period.id), cash_ids=set(cash_ids)),
+    )
+    with _cache_guard:
+        _cache[key] = vectors
+        _cache.move_to_end(key)
+        while len(_cache) > _CACHE_MAX:
+            _cache.popitem(last=False)
+    return vectors
+
+
+def preview_mappings(db: Session, *, book_id: str, period_id: str, basis_code: str, specs: list[MappingSpec]) -> MappingPreview:
+    """
+    映射“试算”：用拟定映射在内存中重算三张表，返回冲突与相对当前快照的差异，不写库。
+    金额取自 balance cache（科目本币金额）；外币科目与正式生成（按交易 value）可能存在折算差。
+    """
+    period = db.query(AccountingPeriod).filter(AccountingPeriod.id == period_id, AccountingPeriod.book_id == book_id).one_or_none()
+    if not period:
+        raise ValueError("期间不存在或不属于该账簿")
+    basis = db.query(ReportBasis).filter(ReportBasis.code == basis_code).one_or_none()
+    if not basis:
+        raise ValueError(f"报表口径不存在：{basis_code}")
+
+    items = db.query(ReportItem).order_by(ReportItem.statement_type.asc(), ReportItem.display_order.asc()).all()
+    accounts = validate_mapping_specs(db, book_id, specs, items={(i.statement_type, i.code): i for i in items})
+    index = expand_mappings(accounts, specs)
+
+    vec = _load_vectors(db, book_id, period)
+    cash_end = sum((vec.balance_by_acc.get(a, Decimal("0")) for a in vec.cash_ids), start=Decimal("0"))
+    cash_net = sum((vec.activity_by_acc.get(a, Decimal("0")) for a in vec.cash_ids), start=Decimal("0"))
+    cf = classify_cash_flow(
+        vec.counter_flows,
+        begin_cash=cash_end - cash_net,
+        net_cash=cash_net,
+        investing_ids=index.accounts_of("CF", "CF_INVESTING"),
+        financing_ids=index.accounts_of("CF", "CF_FINANCING"),
+    )
+    statements, checks = assemble_statements(items, index, vec.balance_by_acc, vec.activity_by_acc, cf)
+
+    snap = (
+        db.query(ReportSnapshot)
+        .filter(ReportSnapshot.book_id == book_id, ReportSnapshot.period_id == period_id, ReportSnapshot.basis_id == basis.id)
+        .order_by(ReportSnapshot.generated_at.desc())
+        .first()
+    )
+    current: dict[tuple[str, str], Decimal] = {}
+    if snap:
+        for stmt, rows in ((snap.result_json or {}).get("statements") or {}).items():
+            for x in rows:
+                current[(stmt, x["code"])] = _decimal(x["amount"])
+
+    diff: list[PreviewDiffRow] = []
+    for stmt, rows in statements.items():
+        for x in rows:
+            proposed = _decimal(x["amount"])
+            cur = current.get((stmt, x["code"]))
+            delta = proposed - (cur if cur is not None else Decimal("0"))
+            if cur is None or delta != 0:
+                diff.append(PreviewDiffRow(statement_type=stmt, code=x["code"], name=x["name"], current=cur, proposed=proposed, delta=delta))
+
+    return MappingPreview(
+        book_id=book_id,
+        period_id=period_id,
+        basis_code=basis_code,
+        snapshot_id=str(snap.id) if snap else None,
+        statements=statements,
+        checks=checks,
+        conflicts=list(index.overlap_errors),
+        diff=diff,
+    )
@@ -194,6 +194,14 @@ class Split(Base):
     __table_args__ = (
         sa.UniqueConstraint("txn_id", "line_no", name="uq_splits_txn_line_no"),
         sa.CheckConstraint("reconcile_state in ('n','c','y')", name="ck_splits_reconcile_state"),
+        # 对账候选（未对账分录）按科目检索；PG/SQLite 上为部分索引，只收录 reconcile_state <> 'y'
+        sa.Index(
+            "ix_splits_account_recstate",
+            "account_id",
+            "reconcile_state",
+            postgresql_where=sa.text("reconcile_state <> 'y'"),
+            sqlite_where=sa.text("reconcile_state <> 'y'"),
+        ),
     )
 
 
@@ -234,6 +242,48 @@ class ScheduledRun(Base):
     __table_args__ = (sa.UniqueConstraint("sched_id", "run_date", name="uq_sched_run_date"),)
 
 
+class AmortizationSchedule(Base):
+    """
+    摊销/折旧计划：固定资产折旧、待摊费用摊销、预提费用计提共用。
+    每期：借 expense_account，贷 contra_account（累计折旧 / 待摊费用 / 预提负债）。
+    """
+
+    __tablename__ = "amortization_schedules"
+
+    id: Mapped[str] = mapped_column(sa.String(36), primary_key=True, default=uuid_str)
+    book_id: Mapped[str] = mapped_column(sa.String(36), sa.ForeignKey("books.id"), nullable=False, index=True)
+    name: Mapped[str] = mapped_column(sa.String(128), nullable=False)
+    kind: Mapped[str] = mapped_column(sa.String(16), nullable=False, default="ASSET")  # ASSET/PREPAID/ACCRUAL
+    method: Mapped[str] = mapped_column(sa.String(24), nullable=False, default="STRAIGHT_LINE")  # STRAIGHT_LINE/DECLINING_BALANCE
+    cost: Mapped[sa.Numeric] = mapped_column(sa.Numeric(18, 2), nullable=False)
+    salvage: Mapped[sa.Numeric] = mapped_column(sa.Numeric(18, 2), nullable=False, default=0)
+    start_date: Mapped[date] = mapped_column(sa.Date(), nullable=False)  # 按月：首期为该日所在月份
+    life_months: Mapped[int] = mapped_column(sa.Integer, nullable=False)
+    db_factor: Mapped[sa.Numeric] = mapped_column(sa.Numeric(6, 4), nullable=False, default=2)  # 余额递减倍数（2 = 双倍）
+    expense_account_id: Mapped[str] = mapped_column(sa.String(36), sa.ForeignKey("accounts.id"), nullable=False)
+    contra_account_id: Mapped[str] = mapped_column(sa.String(36), sa.ForeignKey("accounts.id"), nullable=False)
+    enabled: Mapped[bool] = mapped_column(sa.Boolean, nullable=False, default=True)
+    created_by: Mapped[str | None] = mapped_column(sa.String(36), sa.ForeignKey("users.id"), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(sa.DateTime(), default=utcnow, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(sa.DateTime(), default=utcnow, onupdate=utcnow, nullable=False)
+
+
+class AmortizationEntry(Base):
+    """某计划在某期间已计入的金额（指向当期汇总草稿）；草稿被驳回后可重新生成。"""
+
+    __tablename__ = "amortization_entries"
+
+    id: Mapped[str] = mapped_column(sa.String(36), primary_key=True, default=uuid_str)
+    schedule_id: Mapped[str] = mapped_column(sa.String(36), sa.ForeignKey("amortization_schedules.id"), nullable=False)
+    period_id: Mapped[str] = mapped_column(sa.String(36), sa.ForeignKey("accounting_periods.id"), nullable=False, index=True)
+    period_no: Mapped[int] = mapped_column(sa.Integer, nullable=False)  # 第几期（从 1 开始）
+    amount: Mapped[sa.Numeric] = mapped_column(sa.Numeric(18, 2), nullable=False)
+    draft_id: Mapped[str] = mapped_column(sa.String(36), sa.ForeignKey("transaction_drafts.id"), nullable=False, index=True)
+    created_at: Mapped[datetime] = mapped_column(sa.DateTime(), default=utcnow, nullable=False)
+
+    __table_args__ = (sa.UniqueConstraint("schedule_id", "period_id", name="uq_amort_entry_period"),)
+
+
 class ReconcileSession(Base):
     __tablename__ = "reconcile_sessions"
 
@@ -242,7 +292,13 @@ class ReconcileSession(Base):
     account_id: Mapped[str] = mapped_column(sa.String(36), sa.ForeignKey("accounts.id"), nullable=False, index=True)
     statement_date: Mapped[date] = mapped_column(sa.Date(), nullable=False)
     ending_balance: Mapped[sa.Numeric] = mapped_column(sa.Numeric(18, 2), nullable=False)
+    # 建会话时取自 reconcile_balances 的期初已对账余额（按科目方向规范化）
+    opening_balance: Mapped[sa.Numeric] = mapped_column(sa.Numeric(18, 2), nullable=False, default=0)
     status: Mapped[str] = mapped_column(sa.String(16), nullable=False, default="OPEN")  # OPEN/FINISHED
+    # 由 toggle 增量维护的合计（按科目方向规范化），避免每次点击重读全部候选
+    selected_total: Mapped[sa.Numeric] = mapped_column(sa.Numeric(18, 2), nullable=False, default=0)
+    selected_count: Mapped[int] = mapped_column(sa.Integer, nullable=False, default=0)
+    account_total: Mapped[sa.Numeric] = mapped_column(sa.Numeric(18, 2), nullable=False, default=0)
     created_by: Mapped[str | None] = mapped_column(sa.String(36), sa.ForeignKey("users.id"), nullable=True)
     created_at: Mapped[datetime] = mapped_column(sa.DateTime(), default=utcnow, nullable=False)
     finished_at: Mapped[datetime | None] = mapped_column(sa.DateTime(), nullable=True)
@@ -253,17 +309,103 @@ class ReconcileSession(Base):
     )
 
 
+class ReconcileBalance(Base):
+    """每个科目最近一次完成对账后的已对账余额（按科目方向规范化），作为下一次会话的期初。"""
+
+    __tablename__ = "reconcile_balances"
+
+    account_id: Mapped[str] = mapped_column(sa.String(36), sa.ForeignKey("accounts.id"), primary_key=True)
+    book_id: Mapped[str] = mapped_column(sa.String(36), sa.ForeignKey("books.id"), nullable=False, index=True)
+    balance: Mapped[sa.Numeric] = mapped_column(sa.Numeric(18, 2), nullable=False, default=0)
+    statement_date: Mapped[date] = mapped_column(sa.Date(), nullable=False)
+    session_id: Mapped[str | None] = mapped_column(sa.String(36), sa.ForeignKey("reconcile_sessions.id"), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(sa.DateTime(), default=utcnow, onupdate=utcnow, nullable=False)
+
+
 class ReconcileMatch(Base):
     __tablename__ = "reconcile_matches"
 
     id: Mapped[str] = mapped_column(sa.String(36), primary_key=True, default=uuid_str)
     session_id: Mapped[str] = mapped_column(sa.String(36), sa.ForeignKey("reconcile_sessions.id"), nullable=False, index=True)
     split_id: Mapped[str] = mapped_column(sa.String(36), sa.ForeignKey("splits.id"), nullable=False)
+    # 由自动匹配建议接受而来时，记录对应的对账单行与置信度；手工勾选为空
+    statement_line_id: Mapped[str | None] = mapped_column(sa.String(36), nullable=True)
+    confidence: Mapped[sa.Numeric | None] = mapped_column(sa.Numeric(5, 4), nullable=True)
     created_at: Mapped[datetime] = mapped_column(sa.DateTime(), default=utcnow, nullable=False)
 
     __table_args__ = (sa.UniqueConstraint("session_id", "split_id", name="uq_recon_session_split"),)
 
 
+class ReconcileMatchProposal(Base):
+    """自动匹配建议：同一 group_no 的若干分录共同对应一行对账单（组合匹配时多于一行）。"""
+
+    __tablename__ = "reconcile_match_proposals"
+
+    id: Mapped[str] = mapped_column(sa.String(36), primary_key=True, default=uuid_str)
+    session_id: Mapped[str] = mapped_column(sa.String(36), sa.ForeignKey("reconcile_sessions.id"), nullable=False)
+    group_no: Mapped[int] = mapped_column(sa.Integer, nullable=False)
+    statement_line_id: Mapped[str] = mapped_column(sa.String(36), sa.ForeignKey("bank_statement_lines.id"), nullable=False)
+    split_id: Mapped[str] = mapped_column(sa.String(36), sa.ForeignKey("splits.id"), nullable=False)
+    rule: Mapped[str] = mapped_column(sa.String(16), nullable=False)  # EXACT/REFERENCE/COMBINATION
+    confidence: Mapped[sa.Numeric] = mapped_column(sa.Numeric(5, 4), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(sa.DateTime(), default=utcnow, nullable=False)
+
+    __table_args__ = (
+        sa.UniqueConstraint("session_id", "split_id", name="uq_recon_proposal_split"),
+        sa.Index("ix_recon_proposal_session_group", "session_id", "group_no"),
+    )
+
+
+class BankStatementLine(Base):
+    """
+    银行对账单明细（CSV/OFX/CAMT.053 导入），挂在对账会话下。
+    amount：从本账户角度的收支（收入为正、支出为负）。
+    """
+
+    __tablename__ = "bank_statement_lines"
+
+    id: Mapped[str] = mapped_column(sa.String(36), primary_key=True, default=uuid_str)
+    session_id: Mapped[str] = mapped_column(sa.String(36), sa.ForeignKey("reconcile_sessions.id"), nullable=False)
+    line_no: Mapped[int] = mapped_column(sa.Integer, nullable=False)
+    txn_date: Mapped[date] = mapped_column(sa.Date(), nullable=False)
+    amount: Mapped[sa.Numeric] = mapped_column(sa.Numeric(18, 2), nullable=False)
+    description: Mapped[str] = mapped_column(sa.String(512), nullable=False, default="")
+    reference: Mapped[str] = mapped_column(sa.String(128), nullable=False, default="")
+    counterparty: Mapped[str] = mapped_column(sa.String(255), nullable=False, default="")
+    created_at: Mapped[datetime] = mapped_column(sa.DateTime(), default=utcnow, nullable=False)
+
+    __table_args__ = (
+        sa.UniqueConstraint("session_id", "line_no", name="uq_bank_stmt_session_line"),
+        sa.Index("ix_bank_stmt_session_date", "session_id", "txn_date"),
+    )
+
+
+class BankRule(Base):
+    """
+    对账单分类规则：摘要关键词/正则 + 金额区间 + 对方户名 -> 对方科目。
+    按 priority 升序取第一条命中的规则，生成“银行科目 vs 对方科目”的两行草稿。
+    """
+
+    __tablename__ = "bank_rules"
+
+    id: Mapped[str] = mapped_column(sa.String(36), primary_key=True, default=uuid_str)
+    book_id: Mapped[str] = mapped_column(sa.String(36), sa.ForeignKey("books.id"), nullable=False)
+    name: Mapped[str] = mapped_column(sa.String(128), nullable=False)
+    priority: Mapped[int] = mapped_column(sa.Integer, nullable=False, default=100)
+    enabled: Mapped[bool] = mapped_column(sa.Boolean, nullable=False, default=True)
+    match_type: Mapped[str] = mapped_column(sa.String(16), nullable=False, default="KEYWORD")  # KEYWORD/REGEX
+    pattern: Mapped[str] = mapped_column(sa.String(256), nullable=False, default="")  # 空：不限摘要
+    counterparty: Mapped[str] = mapped_column(sa.String(255), nullable=False, default="")  # 包含匹配，空：不限
+    min_amount: Mapped[sa.Numeric | None] = mapped_column(sa.Numeric(18, 2), nullable=True)  # 对账单金额（带符号）
+    max_amount: Mapped[sa.Numeric | None] = mapped_column(sa.Numeric(18, 2), nullable=True)
+    counter_account_id: Mapped[str] = mapped_column(sa.String(36), sa.ForeignKey("accounts.id"), nullable=False)
+    memo: Mapped[str] = mapped_column(sa.String(256), nullable=False, default="")  # 空：用对账单摘要
+    created_at: Mapped[datetime] = mapped_column(sa.DateTime(), default=utcnow, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(sa.DateTime(), default=utcnow, onupdate=utcnow, nullable=False)
+
+    __table_args__ = (sa.Index("ix_bank_rules_book_priority", "book_id", "priority"),)
+
+
 class AccountBalance(Base):
     __tablename__ = "account_balances"
 
@@ -447,6 +589,7 @@ class Lot(Base):
     """
     GnuCash-like lot：用于应收/应付等需要“核销/结清/部分结清”的场景。
     在本项目里，Split 可选关联到 Lot（Split.lot_id）。
+    证券科目上买入分录挂的 lot 即持仓批次，卖出分录挂 lot 表示指定批次卖出（见 reports/portfolio.py）。
     """
 
     __tablename__ = "lots"
@@ -542,6 +685,9 @@ class Invoice(Base):
     total_net: Mapped[sa.Numeric] = mapped_column(sa.Numeric(18, 2), nullable=False, default=0)
     total_tax: Mapped[sa.Numeric] = mapped_column(sa.Numeric(18, 2), nullable=False, default=0)
     total_gross: Mapped[sa.Numeric] = mapped_column(sa.Numeric(18, 2), nullable=False, default=0)
+    # 物化的核销结果：只统计已过账收/付款的核销，随收/付款过账在同一事务内维护
+    applied_amount: Mapped[sa.Numeric] = mapped_column(sa.Numeric(18, 2), nullable=False, default=0)
+    outstanding_amount: Mapped[sa.Numeric] = mapped_column(sa.Numeric(18, 2), nullable=False, default=0)  # max(total_gross - applied, 0)
 
     posted_txn_id: Mapped[str | None] = mapped_column(sa.String(36), sa.ForeignKey("transactions.id"), nullable=True, index=True)
     lot_id: Mapped[str | None] = mapped_column(sa.String(36), sa.ForeignKey("lots.id"), nullable=True, index=True)
@@ -549,7 +695,18 @@ class Invoice(Base):
     created_at: Mapped[datetime] = mapped_column(sa.DateTime(), default=utcnow, nullable=False)
     updated_at: Mapped[datetime] = mapped_column(sa.DateTime(), default=utcnow, onupdate=utcnow, nullable=False)
 
-    __table_args__ = (sa.UniqueConstraint("book_id", "invoice_type", "doc_no", name="uq_invoices_book_type_no"),)
+    __table_args__ = (
+        sa.UniqueConstraint("book_id", "invoice_type", "doc_no", name="uq_invoices_book_type_no"),
+        # 未结发票（账龄/核销/敞口查询）；PG/SQLite 上为部分索引
+        sa.Index(
+            "ix_invoices_open",
+            "book_id",
+            "invoice_type",
+            "due_date",
+            postgresql_where=sa.text("status = 'POSTED' AND outstanding_amount > 0"),
+            sqlite_where=sa.text("status = 'POSTED' AND outstanding_amount > 0"),
+        ),
+    )
 
 
 class InvoiceLine(Base):
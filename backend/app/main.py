@@ -8,7 +8,7 @@ from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy import inspect, text
 
-from app.api.routers import accounts, ar_ap, attachments, auth, books, business, gl_drafts, imports, periods, reconcile, reports, scheduled
+from app.api.routers import accounts, amortization, ar_ap, attachments, auth, books, business, gl_drafts, imports, periods, reconcile, reports, scheduled
 from app.core.config import settings
 from app.infra.db.session import engine
 
@@ -71,6 +71,9 @@ def health_schema():
         "scheduled_runs",
         "reconcile_sessions",
         "reconcile_matches",
+        "bank_statement_lines",
+        "reconcile_match_proposals",
+        "reconcile_balances",
         "lots",
         "prices",
         "object_kv",
@@ -142,5 +145,6 @@ app.include_router(attachments.router)
 app.include_router(imports.router)
 app.include_router(scheduled.router)
 app.include_router(reconcile.router)
+app.include_router(amortization.router)
 
 
@@ -0,0 +1,161 @@
+"""
+定期交易调度进程：python -m app.scheduler [--once] [--interval 300] [--batch 100]
+
+- 每轮选出所有 enabled 且 next_run_date <= 今天 的定期交易，把错过的每个到期日都补生成草稿；
+- 多副本部署时只有一个进程（leader）干活：PG 用 pg_try_advisory_lock，MySQL 用 GET_LOCK，
+  都在一条常驻连接上持有，进程退出/连接断开即自动释放；其他数据库退化为 object_kv 租约行。
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import signal
+import socket
+import threading
+from datetime import date, datetime, timedelta
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+
+from app.application.gl.scheduled import run_due_schedules
+from app.infra.db.models import ObjectKV, utcnow
+from app.infra.db.session import SessionLocal, engine
+
+_LOCK_NAME = "accountingflow_scheduler"
+_LOCK_KEY = 0x5CED0001  # pg advisory lock key（任意固定 bigint）
+_LEASE_OWNER = ("system", "scheduler", "leader_lease")
+
+
+class LeaderLock:
+    def __init__(self, lease_seconds: int) -> None:
+        self.dialect = engine.dialect.name
+        self.lease_seconds = lease_seconds
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+        self._conn: Connection | None = None
+
+    def acquire(self) -> bool:
+        """已是 leader 时校验锁仍有效（连接可用/租约续期）；否则尝试获取。"""
+        if self.dialect.startswith("postgres") or self.dialect == "mysql":
+            return self._acquire_session_lock()
+        try:
+            return self._acquire_lease()
+        except IntegrityError:
+            # 另一实例同时插入了租约行
+            return False
+
+    def _acquire_session_lock(self) -> bool:
+        if self._conn is not None:
+            try:
+                self._conn.execute(sa.text("SELECT 1"))
+                # 结束探活开启的事务，避免这条长连接一直 idle in transaction
+                self._conn.commit()
+                return True
+            except Exception:
+                # 连接断开，锁已随之释放；丢弃后重新竞争
+                self._close()
+        conn = engine.connect()
+        if self.dialect == "mysql":
+            ok = conn.execute(sa.text("SELECT GET_LOCK(:n, 0)"), {"n": _LOCK_NAME}).scalar()
+        else:
+            ok = conn.execute(sa.text("SELECT pg_try_advisory_lock(:k)"), {"k": _LOCK_KEY}).scalar()
+        conn.commit()
+        if ok:
+            self._conn = conn
+            return True
+        conn.close()
+        return False
+
+    def _acquire_lease(self) -> bool:
+        owner_type, owner_id, key = _LEASE_OWNER
+        now = utcnow()
+        with SessionLocal() as db, db.begin():
+            row = (
+                db.query(ObjectKV)
+                .filter(ObjectKV.owner_type == owner_type, ObjectKV.owner_id == owner_id, ObjectKV.key == key)
+                .with_for_update()
+                .one_or_none()
+            )
+            value = {"holder": self.holder, "expires_at": (now + timedelta(seconds=self.lease_seconds)).isoformat()}
+            if row is None:
+                db.add(ObjectKV(owner_type=owner_type, owner_id=owner_id, key=key, value_json=value, updated_at=now))
+                return True
+            cur = row.value_json or {}
+            expired = not cur.get("expires_at") or datetime.fromisoformat(cur["expires_at"]) <= now
+            if cur.get("holder") == self.holder or expired:
+                row.value_json = value
+                row.updated_at = now
+                return True
+            return False
+
+    def release(self) -> None:
+        if self._conn is not None:
+            try:
+                if self.dialect == "mysql":
+                    self._conn.execute(sa.text("SELECT RELEASE_LOCK(:n)"), {"n": _LOCK_NAME})
+                else:
+                    self._conn.execute(sa.text("SELECT pg_advisory_unlock(:k)"), {"k": _LOCK_KEY})
+                self._conn.commit()
+            except Exception:
+                pass
+            self._close()
+            return
+        if not (self.dialect.startswith("postgres") or self.dialect == "mysql"):
+            owner_type, owner_id, key = _LEASE_OWNER
+            with SessionLocal() as db, db.begin():
+                row = (
+                    db.query(ObjectKV)
+                    .filter(ObjectKV.owner_type == owner_type, ObjectKV.owner_id == owner_id, ObjectKV.key == key)
+                    .with_for_update()
+                    .one_or_none()
+                )
+                if row is not None and (row.value_json or {}).get("holder") == self.holder:
+                    db.delete(row)
+
+    def _close(self) -> None:
+        try:
+            if self._conn is not None:
+                self._conn.close()
+        finally:
+            self._conn = None
+
+
+def run_once(batch: int, today: date | None = None) -> None:
+    results = run_due_schedules(SessionLocal, today or date.today(), max_occurrences=batch)
+    created = sum(r.created for r in results)
+    failed = [r for r in results if r.failed_date]
+    print(f"[scheduler] {utcnow().isoformat()} schedules={len({r.sched_id for r in results})} drafts={created} failed={len(failed)}", flush=True)
+    for r in failed:
+        print(f"[scheduler]   {r.sched_id} {r.failed_date}: {r.error}", flush=True)
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(prog="python -m app.scheduler", description="补跑所有到期的定期交易")
+    ap.add_argument("--once", action="store_true", help="只执行一轮后退出（适合 cron）")
+    ap.add_argument("--interval", type=int, default=300, help="轮询间隔（秒）")
+    ap.add_argument("--batch", type=int, default=100, help="每个定期交易每个事务最多生成的草稿数")
+    args = ap.parse_args(argv)
+
+    lock = LeaderLock(lease_seconds=max(60, args.interval * 3))
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    try:
+        while not stop.is_set():
+            if lock.acquire():
+                try:
+                    run_once(args.batch)
+                except Exception as e:  # 单轮失败不退出进程，下一轮重试
+                    print(f"[scheduler] run failed: {e!r}", flush=True)
+            elif args.once:
+                print("[scheduler] another instance holds the leader lock; skip", flush=True)
+            if args.once:
+                break
+            stop.wait(args.interval)
+    finally:
+        lock.release()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+校验发票物化金额（applied_amount / outstanding_amount）与 payment_applications 是否一致：
+    python -m app.scripts.check_invoice_amounts [--book-id ID] [--fix]
+有漂移时逐条打印并以退出码 1 结束；--fix 会按已过账收/付款的核销记录重算这些发票。
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from app.application.ar_ap.service import find_invoice_amount_drift, recompute_invoice_amounts
+from app.infra.db.session import SessionLocal
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m app.scripts.check_invoice_amounts", description="校验发票已核销/未结金额")
+    ap.add_argument("--book-id", default=None, help="只校验该账簿")
+    ap.add_argument("--fix", action="store_true", help="按核销记录重算有漂移的发票")
+    ap.add_argument("--limit", type=int, default=1000, help="每次最多处理的发票数")
+    args = ap.parse_args(argv)
+
+    with SessionLocal() as db, db.begin():
+        drift = find_invoice_amount_drift(db, book_id=args.book_id, limit=args.limit)
+        for d in drift:
+            print(
+                f"{d['invoice_type']} {d['doc_no']} ({d['invoice_id']}): "
+                f"applied {d['applied_amount']} -> {d['expected_applied']}, "
+                f"outstanding {d['outstanding_amount']} -> {d['expected_outstanding']}",
+                flush=True,
+            )
+        if drift and args.fix:
+            n = recompute_invoice_amounts(db, [d["invoice_id"] for d in drift])
+            print(f"fixed {n}", flush=True)
+            return 0
+    print(f"drift {len(drift)}", flush=True)
+    return 1 if drift else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,47 @@
+"""
+批量导入价格/汇率（CSV / JSONL）：
+    python -m app.scripts.import_prices --book-id ID rates.csv [--format CSV|JSONL] [--delimiter ,] [--dry-run]
+逐行校验，按批 upsert；有失败行时打印前若干条并以退出码 1 结束。
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from app.application.ar_ap.price_import import import_prices
+from app.infra.db.session import SessionLocal
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m app.scripts.import_prices", description="批量导入价格/汇率")
+    ap.add_argument("file", help="CSV/JSONL 文件路径")
+    ap.add_argument("--book-id", required=True, help="账簿 ID")
+    ap.add_argument("--format", default=None, help="CSV 或 JSONL（默认按扩展名/内容识别）")
+    ap.add_argument("--delimiter", default=None, help="CSV 分隔符（默认自动识别）")
+    ap.add_argument("--chunk-size", type=int, default=1000, help="每个事务写入的行数")
+    ap.add_argument("--dry-run", action="store_true", help="只校验，不写库")
+    args = ap.parse_args(argv)
+
+    with open(args.file, "rb") as fp, SessionLocal() as db:
+        try:
+            res = import_prices(
+                db,
+                args.book_id,
+                fp,
+                filename=args.file,
+                fmt=args.format,
+                delimiter=args.delimiter,
+                dry_run=args.dry_run,
+                chunk_size=args.chunk_size,
+            )
+        except ValueError as e:
+            print(f"error: {e}", flush=True)
+            return 2
+    for e in res.errors[:50]:
+        print(f"row {e.row_no}: {e.error}", flush=True)
+    print(f"rows {res.rows}, upserted {res.upserted}, chunks {res.chunks}, failed {res.failed}{' (dry run)' if res.dry_run else ''}", flush=True)
+    return 1 if res.failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
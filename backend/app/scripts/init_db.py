@@ -4,6 +4,7 @@ from datetime import datetime
 
 from sqlalchemy.orm import Session
 
+from app.application.engine.versions import bump_accounts_version, bump_mappings_version, bump_prices_version
 from app.core.config import settings
 from app.core.security import hash_password
 from app.infra.db.models import (
@@ -255,6 +256,7 @@ def main() -> None:
                 source="APP",
                 type_="LAST",
             )
+            bump_prices_version(db, str(book.id))
 
             # 科目树（最小闭环）
             assets = _get_or_create_account(db, book_id=book.id, parent_id=None, code="1000", name="资产", type_="ASSET", commodity_id=cny.id, allow_post=False)
@@ -315,6 +317,9 @@ def main() -> None:
 
             # Cash Flow (minimal)
             _get_or_create_item(db, "CF", "CF_BEGIN_CASH", "期初现金", 10, "BALANCE")
+            _get_or_create_item(db, "CF", "CF_OPERATING", "经营活动产生的现金流量净额", 11, "ACTIVITY")
+            _get_or_create_item(db, "CF", "CF_INVESTING", "投资活动产生的现金流量净额", 12, "ACTIVITY")
+            cf_fin = _get_or_create_item(db, "CF", "CF_FINANCING", "筹资活动产生的现金流量净额", 13, "ACTIVITY")
             _get_or_create_item(db, "CF", "CF_NET_CASH", "本期现金净增加额", 20, "ACTIVITY")
             _get_or_create_item(db, "CF", "CF_END_CASH", "期末现金", 90, "BALANCE")
 
@@ -324,6 +329,13 @@ def main() -> None:
                 _get_or_create_mapping(db, basis_id=basis.id, item=bs_eq, account_id=equity.id, include_children=True)
                 _get_or_create_mapping(db, basis_id=basis.id, item=is_rev, account_id=income.id, include_children=True)
                 _get_or_create_mapping(db, basis_id=basis.id, item=is_exp, account_id=expense.id, include_children=True)
+                # 现金流量表（直接法）：对方科目为所有者权益 -> 筹资活动；未映射的对方科目默认归入经营活动
+                _get_or_create_mapping(db, basis_id=basis.id, item=cf_fin, account_id=equity.id, include_children=True)
+
+            # 科目树/映射可能已变化：递增版本号，使进程内映射缓存失效
+            bump_accounts_version(db, str(book.id))
+            for basis in [legal, mgmt]:
+                bump_mappings_version(db, str(basis.id))
 
             # seed 客户/供应商（用于后续 UC001/UC002/UC003）
             if not db.query(Party).filter(Party.type == "CUSTOMER", Party.name == "示例客户").one_or_none():
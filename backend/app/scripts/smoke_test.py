@@ -16,6 +16,7 @@ from datetime import date, datetime
 from decimal import Decimal
 
 from app.application.ar_ap.service import aging_report, create_invoice, create_payment
+from app.application.engine.versions import bump_prices_version
 from app.application.gl.draft_workflow import approve_draft
 from app.application.gl.posting import post_draft
 from app.infra.db.models import (
@@ -160,6 +161,8 @@ def main() -> None:
                     value=Decimal("7.2"),  # 1 USD = 7.2 CNY
                 )
                 db.add(pr)
+                db.flush()
+                bump_prices_version(db, book_id)
 
             usd_bank = db.query(Account).filter(Account.book_id == book_id, Account.code == "1002").one_or_none()
             if not usd_bank:
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+
+from app.application.gl.amortization import compute_schedule, period_amount, run_amortization
+from app.application.gl.draft_workflow import reject_draft
+from app.infra.db.models import Account, AccountingPeriod, AmortizationSchedule, Book, TransactionDraftLine
+from app.infra.db.session import SessionLocal
+from app.scripts.init_db import main as seed_main
+
+
+def test_schedules_sum_exactly_with_last_period_correction():
+    sl = compute_schedule("STRAIGHT_LINE", Decimal("1000"), Decimal("0"), 3)
+    assert sl == [Decimal("333.33"), Decimal("333.33"), Decimal("333.34")]
+    ddb = compute_schedule("DECLINING_BALANCE", Decimal("10000"), Decimal("1000"), 36)
+    assert ddb[0] == Decimal("555.56")
+    assert sum(ddb) == Decimal("9000")
+    assert [period_amount("STRAIGHT_LINE", Decimal("1000"), Decimal("0"), 3, Decimal("2"), k) for k in range(4)] == sl + [Decimal("0")]
+
+
+def test_run_creates_one_consolidated_draft_per_period(migrated_db):
+    seed_main()
+    with SessionLocal() as db, db.begin():
+        book_id = str(db.query(Book).first().id)
+        fee_id = str(db.query(Account).filter(Account.code == "5001").one().id)
+        bank_id = str(db.query(Account).filter(Account.code == "1002").one().id)
+        p = db.query(AccountingPeriod).filter(AccountingPeriod.book_id == book_id, AccountingPeriod.status == "OPEN").first()
+        period_id = str(p.id)
+        start = date(int(p.year), int(p.month), 1)
+        for name, method, cost in (("电脑", "STRAIGHT_LINE", "1200"), ("汽车", "DECLINING_BALANCE", "3600")):
+            db.add(
+                AmortizationSchedule(
+                    book_id=book_id,
+                    name=name,
+                    method=method,
+                    cost=Decimal(cost),
+                    salvage=Decimal("0"),
+                    start_date=start,
+                    life_months=12,
+                    db_factor=Decimal("2"),
+                    expense_account_id=fee_id,
+                    contra_account_id=bank_id,
+                )
+            )
+
+    with SessionLocal() as db:
+        r = run_amortization(db, book_id=book_id, period_id=period_id, actor_user_id=None)
+    assert r.schedules == 2 and r.total == Decimal("100") + Decimal("600")
+    with SessionLocal() as db:
+        lines = db.query(TransactionDraftLine).filter(TransactionDraftLine.draft_id == r.draft_id).order_by(TransactionDraftLine.line_no).all()
+        assert [(str(x.account_id), x.debit, x.credit) for x in lines] == [(fee_id, Decimal("700"), Decimal("0")), (bank_id, Decimal("0"), Decimal("700"))]
+
+    # 已计入的期间不重复生成；草稿被驳回后可重新生成
+    with SessionLocal() as db:
+        assert run_amortization(db, book_id=book_id, period_id=period_id, actor_user_id=None).draft_id is None
+    with SessionLocal() as db:
+        reject_draft(db, r.draft_id, None, "重做")
+    with SessionLocal() as db:
+        again = run_amortization(db, book_id=book_id, period_id=period_id, actor_user_id=None)
+    assert again.draft_id not in (None, r.draft_id) and again.total == r.total
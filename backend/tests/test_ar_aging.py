@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from uuid import uuid4
+
+from fastapi.testclient import TestClient
+
+from app.api.deps import CurrentUser, get_current_user
+from app.application.ar_ap.service import aging_report, aging_summary, bucket_for_days, recompute_invoice_amounts
+from app.infra.db.models import Book, Invoice, Party, Payment, PaymentApplication, User
+from app.infra.db.session import SessionLocal
+from app.main import app
+from app.scripts.init_db import main as seed_main
+
+
+def test_aging_in_sql_covers_all_invoices(migrated_db):
+    seed_main()
+    as_of = date(2026, 6, 30)
+    tag = uuid4().hex[:8]
+    with SessionLocal() as db, db.begin():
+        book = db.query(Book).first()
+        book_id, cur = str(book.id), str(book.base_currency_id)
+        party = Party(type="CUSTOMER", name="客户A")
+        db.add(party)
+        pay = Payment(book_id=book_id, payment_type="RECEIPT", status="POSTED", currency_id=cur, amount=Decimal("0"))
+        db.add(pay)
+        db.flush()
+        party_id = str(party.id)
+        ids: list[str] = []
+        for i in range(12):
+            inv = Invoice(
+                book_id=book_id,
+                invoice_type="AR",
+                status="POSTED",
+                doc_no=f"AR-{tag}-{i}",
+                doc_date=datetime(2026, 1, 1) + timedelta(days=i),
+                due_date=as_of - timedelta(days=i * 10),
+                party_id=party.id,
+                currency_id=cur,
+                total_gross=Decimal("100"),
+            )
+            db.add(inv)
+            db.flush()
+            if i % 3 == 0:
+                db.add(PaymentApplication(payment_id=pay.id, invoice_id=inv.id, amount=Decimal("40")))
+            ids.append(str(inv.id))
+        db.flush()
+        # 直接插入的核销记录：按 payment_applications 重算发票上的物化金额
+        assert recompute_invoice_amounts(db, ids) == 12
+
+    items: list[dict] = []
+    after = None
+    with SessionLocal() as db:
+        while True:
+            page = aging_report(db, book_id=book_id, as_of=as_of, invoice_type="AR", limit=5, after=after)
+            items += page
+            if len(page) < 5:
+                break
+            after = (page[-1]["doc_date"], page[-1]["invoice_id"])
+        summary = aging_summary(db, book_id=book_id, as_of=as_of, invoice_type="AR")
+
+    # 账簿由各测试共享：只看本测试建的发票
+    assert len({x["invoice_id"] for x in items}) == len(items)
+    items = [x for x in items if x["invoice_id"] in ids]
+    assert len(items) == 12
+    assert all(x["bucket"] == bucket_for_days(x["days_past_due"]) for x in items)
+    assert sum(x["outstanding_amount"] for x in items) == Decimal("1200") - 4 * Decimal("40")
+
+    row = next(x for x in summary if x["party_id"] == party_id)
+    assert row["party_name"] == "客户A" and row["invoice_count"] == 12
+    assert row["total"] == Decimal("1040")
+    # 逾期 0/10/.../110 天：CURRENT 1 张、1-30 3 张、31-60 3 张、61-90 3 张、90+ 2 张（i=0,3,6,9 各核销 40）
+    assert row["buckets"] == {
+        "CURRENT": Decimal("60"),
+        "1-30": Decimal("260"),
+        "31-60": Decimal("260"),
+        "61-90": Decimal("260"),
+        "90+": Decimal("200"),
+    }
+
+    # 接口分页：next_cursor 与登记簿同一种不透明编码，原样传回 after 取下一页
+    with SessionLocal() as db:
+        uid = str(db.query(User).filter(User.username == "admin").one().id)
+    app.dependency_overrides[get_current_user] = lambda: CurrentUser(id=uid, username="admin", role="admin")
+    c = TestClient(app)
+    try:
+        params = {"book_id": book_id, "as_of": as_of.isoformat(), "invoice_type": "AR", "limit": 5}
+        seen: list[str] = []
+        cursor = None
+        while True:
+            page = c.get("/ar-ap/aging", params={**params, **({"after": cursor} if cursor else {})}).json()
+            seen += [x["invoice_id"] for x in page["items"]]
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+            assert "|" not in cursor
+        with SessionLocal() as db:
+            assert seen == [x["invoice_id"] for x in aging_report(db, book_id=book_id, as_of=as_of, invoice_type="AR", limit=10_000)]
+        assert c.get("/ar-ap/aging", params={**params, "after": "2026-01-01|x"}).status_code == 400
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+
+from fastapi.testclient import TestClient
+
+from app.api.deps import CurrentUser, get_current_user
+from app.application.reconcile.rules import RuleIn, RuleMatcher, rule_regex
+from app.infra.db.models import Account, AccountingPeriod, Book, TransactionDraft, TransactionDraftLine, TransactionDraftRevision, User
+from app.infra.db.session import SessionLocal
+from app.main import app
+from app.scripts.init_db import main as seed_main
+
+
+def _client() -> TestClient:
+    with SessionLocal() as db:
+        u = db.query(User).filter(User.username == "admin").one()
+        uid = str(u.id)
+    app.dependency_overrides[get_current_user] = lambda: CurrentUser(id=uid, username="admin", role="admin")
+    return TestClient(app)
+
+
+def test_matcher_priority_overlap_and_filters():
+    rules = [
+        RuleIn(id="fee", name="fee", priority=10, match_type="KEYWORD", pattern="FEE", counter_account_id="a", max_amount=Decimal("-1")),
+        RuleIn(id="feed", name="feed", priority=20, match_type="KEYWORD", pattern="feedback", counter_account_id="b"),
+        RuleIn(id="inv", name="inv", priority=30, match_type="REGEX", pattern=r"inv-(?P<no>\d+)", counter_account_id="c"),
+        RuleIn(id="bank", name="bank", priority=40, match_type="KEYWORD", pattern="", counter_account_id="d", counterparty="bank"),
+    ]
+    m = RuleMatcher(rules)
+    assert m.match("Monthly fee", "", Decimal("-5")).id == "fee"
+    # “fee” 是 “feedback” 的前缀：金额条件否决 fee 后仍能命中 feedback
+    assert m.match("customer FEEDBACK", "", Decimal("5")).id == "feed"
+    assert m.match("payment INV-001", "", Decimal("5")).id == "inv"
+    assert m.match("interest", "China Bank", Decimal("5")).id == "bank"
+    assert m.match("interest", "", Decimal("5")) is None
+
+
+def test_regex_rule_with_leading_inline_flags():
+    # 开头的全局标志在合并后的交替式里不合法，需改写为局部标志
+    assert rule_regex("REGEX", "(?s)rent.x") == "(?s:rent.x)"
+    m = RuleMatcher(
+        [
+            RuleIn(id="rent", name="rent", priority=10, match_type="REGEX", pattern="(?i)rent", counter_account_id="a"),
+            RuleIn(id="inv", name="inv", priority=20, match_type="REGEX", pattern=r"inv-\d+", counter_account_id="b"),
+            # 校验之前保存的无效规则只跳过自身
+            RuleIn(id="bad", name="bad", priority=5, match_type="REGEX", pattern="a(?i)b", counter_account_id="c"),
+        ]
+    )
+    assert m.match("office RENT", "", Decimal("-5")).id == "rent"
+    assert m.match("inv-7", "", Decimal("5")).id == "inv"
+    assert m.match("ab", "", Decimal("5")) is None
+
+
+def test_categorize_creates_balanced_drafts_once(migrated_db):
+    seed_main()
+    with SessionLocal() as db:
+        book_id = str(db.query(Book).first().id)
+        cash_id = str(db.query(Account).filter(Account.code == "1001").one().id)
+        fee_id = str(db.query(Account).filter(Account.code == "5001").one().id)
+        cash_currency_id = str(db.query(Account).filter(Account.id == cash_id).one().commodity_id)
+        p = db.query(AccountingPeriod).filter(AccountingPeriod.book_id == book_id, AccountingPeriod.status == "OPEN").first()
+        y, m = int(p.year), int(p.month)
+
+    c = _client()
+    try:
+        rule = c.post(
+            "/reconcile/rules",
+            json={"book_id": book_id, "name": "手续费", "pattern": "fee", "max_amount": "0", "counter_account_id": fee_id, "memo": "银行手续费"},
+        )
+        assert rule.status_code == 200
+        bad = c.post("/reconcile/rules", json={"book_id": book_id, "name": "x", "match_type": "REGEX", "pattern": "(", "counter_account_id": fee_id})
+        assert bad.status_code == 400
+
+        sess = c.post(
+            "/reconcile/sessions",
+            json={"book_id": book_id, "account_id": cash_id, "statement_date": date(y, m, 28).isoformat(), "ending_balance": "0"},
+        ).json()
+        csv_data = (
+            "date,amount,description,reference\n"
+            f"{y}-{m:02d}-03,-12.50,Bank FEE,F1\n"
+            f"{y}-{m:02d}-04,300,fee refund,F2\n"
+            f"{y}-{m:02d}-05,-8,service fee,F3\n"
+        ).encode()
+        assert c.post(f"/reconcile/sessions/{sess['id']}/statement", files={"file": ("s.csv", csv_data)}).status_code == 200
+
+        dry = c.post(f"/reconcile/sessions/{sess['id']}:categorize", json={"dry_run": True}).json()
+        assert dry["matched"] == 2 and dry["drafts_created"] == 0
+        r = c.post(f"/reconcile/sessions/{sess['id']}:categorize", json={}).json()
+        assert r["drafts_created"] == 2 and r["by_rule"] == {rule.json()["id"]: 2}
+        again = c.post(f"/reconcile/sessions/{sess['id']}:categorize", json={}).json()
+        assert again["lines_considered"] == 1 and again["drafts_created"] == 0
+    finally:
+        app.dependency_overrides.clear()
+
+    with SessionLocal() as db:
+        drafts = db.query(TransactionDraft).filter(TransactionDraft.source_type == "BANK_STATEMENT").all()
+        assert len(drafts) == 2
+        for d in drafts:
+            lines = db.query(TransactionDraftLine).filter(TransactionDraftLine.draft_id == d.id).order_by(TransactionDraftLine.line_no).all()
+            assert [str(x.account_id) for x in lines] == [cash_id, fee_id]
+            assert lines[0].credit == lines[1].debit > 0
+            assert d.description == "银行手续费" and str(d.currency_id) == cash_currency_id
+            rev = db.query(TransactionDraftRevision).filter(TransactionDraftRevision.draft_id == d.id).one()
+            assert rev.action == "CREATE" and [x["account_id"] for x in rev.payload_json["lines"]] == [cash_id, fee_id]
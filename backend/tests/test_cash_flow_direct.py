@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from decimal import Decimal
+from uuid import uuid4
+
+from app.application.gl.draft_workflow import approve_draft
+from app.application.gl.posting import post_draft
+from app.application.reports.generator import generate_reports
+from app.infra.db.models import Account, ReportSnapshot, TransactionDraft, TransactionDraftLine
+from app.infra.db.session import SessionLocal
+from app.scripts.init_db import main as seed_main
+
+
+def _cash_flow(book_id: str, period_id: str) -> tuple[dict[str, Decimal], bool]:
+    with SessionLocal() as db:
+        snap_id = generate_reports(db, book_id=book_id, period_id=period_id, basis_code="LEGAL", actor_user_id=None).snapshot_id
+    with SessionLocal() as db:
+        snap = db.query(ReportSnapshot).filter(ReportSnapshot.id == snap_id).one()
+        cf = {x["code"]: Decimal(x["amount"]) for x in snap.result_json["statements"]["CF"]}
+        return cf, snap.log_json["checks"]["CF_DIRECT_OK"]
+
+
+def test_direct_cash_flow_classified_by_counter_account(migrated_db):
+    seed_main()
+    # 账簿由各测试共享：不动示例草稿 seed-1，自己过账一笔，断言现金流量表的增量
+    with SessionLocal() as db, db.begin():
+        seed = db.query(TransactionDraft).filter(TransactionDraft.source_id == "seed-1").one()
+        book_id, period_id = str(seed.book_id), str(seed.period_id)
+        cash_id = str(db.query(Account).filter(Account.book_id == book_id, Account.code == "1001").one().id)
+        capital_id = str(db.query(Account).filter(Account.book_id == book_id, Account.code == "3001").one().id)
+        draft = TransactionDraft(book_id=book_id, period_id=period_id, source_type="MANUAL", source_id=f"cf-{uuid4().hex}", description="投入资本")
+        db.add(draft)
+        db.flush()
+        db.add(TransactionDraftLine(draft_id=draft.id, line_no=1, account_id=cash_id, debit=Decimal("100"), credit=Decimal("0")))
+        db.add(TransactionDraftLine(draft_id=draft.id, line_no=2, account_id=capital_id, debit=Decimal("0"), credit=Decimal("100")))
+        draft_id = str(draft.id)
+
+    before, _ = _cash_flow(book_id, period_id)
+    with SessionLocal() as db:
+        approve_draft(db, draft_id, actor_id=None)
+    with SessionLocal() as db:
+        post_draft(db, draft_id, actor_user_id=None)
+    cf, ok = _cash_flow(book_id, period_id)
+
+    # 借：库存现金 / 贷：实收资本 -> 筹资活动流入
+    assert cf["CF_FINANCING"] - before["CF_FINANCING"] == Decimal("100")
+    assert cf["CF_NET_CASH"] - before["CF_NET_CASH"] == Decimal("100")
+    assert cf["CF_OPERATING"] + cf["CF_INVESTING"] + cf["CF_FINANCING"] == cf["CF_NET_CASH"]
+    assert cf["CF_END_CASH"] == cf["CF_BEGIN_CASH"] + cf["CF_NET_CASH"]
+    assert ok is True
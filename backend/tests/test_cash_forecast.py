@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from uuid import uuid4
+
+from app.application.reports.forecast import cash_forecast, occurrence_counts
+from app.infra.db.models import Book, Invoice, ScheduledTransaction
+from app.infra.db.session import SessionLocal
+from app.scripts.init_db import main as seed_main
+
+
+def test_occurrence_counts_arithmetic_matches_expansion():
+    starts = [date(2026, 1, 1).toordinal() + 7 * k for k in range(13)]
+    last = starts[-1] + 6
+    # 每 3 天一次，从首个区间之前开始：已过期的并入首个区间
+    counts = occurrence_counts("DAILY", 3, date(2025, 12, 26), None, starts, last)
+    expanded = [0] * 13
+    d = date(2025, 12, 26)
+    while d.toordinal() <= last:
+        expanded[max(0, sum(1 for s in starts if s <= d.toordinal()) - 1)] += 1
+        d += timedelta(days=3)
+    assert counts == expanded
+    assert sum(occurrence_counts("WEEKLY", 2, date(2026, 1, 1), date(2026, 2, 1), starts, last)) == 3
+
+
+def test_weekly_forecast_combines_schedules_and_open_invoices(migrated_db):
+    seed_main()
+    as_of = date.today()
+    tag = uuid4().hex[:8]
+    # 账簿由各测试共享：不动示例定期交易，先取一次基准，再断言本测试新建的每周房租与发票带来的增量
+    with SessionLocal() as db:
+        seed = db.query(ScheduledTransaction).filter(ScheduledTransaction.name == "示例：每月房租").one()
+        book_id, template = str(seed.book_id), seed.template_json
+        base = cash_forecast(db, book_id=book_id, as_of=as_of, granularity="WEEK", horizon=13)
+
+    with SessionLocal() as db, db.begin():
+        weekly = ScheduledTransaction(book_id=book_id, name=f"每周房租-{tag}", enabled=True, rule="WEEKLY", interval=1, next_run_date=as_of, template_json=template)
+        db.add(weekly)
+        db.flush()
+        schedule_id = str(weekly.id)
+        currency_id = str(db.query(Book).filter(Book.id == book_id).one().base_currency_id)
+        doc_date = datetime.combine(as_of, datetime.min.time())
+        db.add(Invoice(book_id=book_id, invoice_type="AR", status="POSTED", doc_no=f"AR-{tag}", doc_date=doc_date, due_date=as_of + timedelta(days=10), currency_id=currency_id, total_gross=Decimal("5000"), outstanding_amount=Decimal("5000")))
+        # 已逾期的应付并入首周
+        db.add(Invoice(book_id=book_id, invoice_type="AP", status="POSTED", doc_no=f"AP-{tag}", doc_date=doc_date, due_date=as_of - timedelta(days=30), currency_id=currency_id, total_gross=Decimal("300"), outstanding_amount=Decimal("300")))
+        db.add(Invoice(book_id=book_id, invoice_type="AR", status="DRAFT", doc_no=f"AR-{tag}-D", doc_date=doc_date, due_date=as_of, currency_id=currency_id, total_gross=Decimal("999"), outstanding_amount=Decimal("999")))
+
+    try:
+        with SessionLocal() as db:
+            r = cash_forecast(db, book_id=book_id, as_of=as_of, granularity="WEEK", horizon=13)
+    finally:
+        # 停用本测试的定期交易，免得之后的调度测试替它生成草稿
+        with SessionLocal() as db, db.begin():
+            db.query(ScheduledTransaction).filter(ScheduledTransaction.id == schedule_id).update({ScheduledTransaction.enabled: False})
+    assert len(r.buckets) == 13
+    assert r.opening == base.opening
+    assert [a - b for a, b in zip(r.scheduled_net, base.scheduled_net)] == [Decimal("-2000")] * 13
+    assert r.receivables[1] - base.receivables[1] == Decimal("5000") and sum(r.receivables) - sum(base.receivables) == Decimal("5000")
+    assert r.payables[0] - base.payables[0] == Decimal("300") and sum(r.payables) - sum(base.payables) == Decimal("300")
+    assert r.balance[0] - base.balance[0] == -2000 - 300
+    assert r.balance[-1] - base.balance[-1] == -2000 * 13 + 5000 - 300
+    assert r.invoices - base.invoices == 2
+
+    # 房租从现金科目付出：该科目期末比基准少 13 周房租
+    before = {a.account_id: a.balance[-1] for a in base.accounts}
+    assert any(a.balance[-1] - before.get(a.account_id, a.opening) == Decimal("-2000") * 13 for a in r.accounts)
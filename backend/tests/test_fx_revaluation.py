@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from app.application.engine.versions import bump_prices_version
+from app.application.gl.draft_workflow import approve_draft
+from app.application.gl.fx_revaluation import REVERSAL_SOURCE_TYPE, run_fx_revaluation
+from app.application.gl.posting import post_draft
+from app.application.gl.scheduled import add_months
+from app.infra.db.models import (
+    Account,
+    AccountingPeriod,
+    Book,
+    Commodity,
+    Price,
+    Split,
+    TransactionDraft,
+    TransactionDraftLine,
+)
+from app.infra.db.session import SessionLocal
+from app.scripts.init_db import main as seed_main
+
+
+def _post(draft_id: str) -> str:
+    with SessionLocal() as db:
+        approve_draft(db, draft_id, actor_id=None)
+    with SessionLocal() as db:
+        return post_draft(db, draft_id, actor_user_id=None).txn_id
+
+
+def test_revaluation_draft_and_reversal(migrated_db):
+    seed_main()
+    with SessionLocal() as db, db.begin():
+        book = db.query(Book).first()
+        book_id, cny = str(book.id), str(book.base_currency_id)
+        period = db.query(AccountingPeriod).filter(AccountingPeriod.book_id == book_id, AccountingPeriod.status == "OPEN").first()
+        period_id, y, m = str(period.id), int(period.year), int(period.month)
+        nxt = add_months(date(y, m, 1), 1)
+        db.add(AccountingPeriod(book_id=book_id, year=nxt.year, month=nxt.month, status="OPEN"))
+        usd = db.query(Commodity).filter(Commodity.type == "CURRENCY", Commodity.code == "USD").one_or_none()
+        if usd is None:
+            usd = Commodity(type="CURRENCY", code="USD", name="美元", precision=2)
+            db.add(usd)
+            db.flush()
+        usd_id = str(usd.id)
+        ids = {a.code: str(a.id) for a in db.query(Account).filter(Account.book_id == book_id)}
+        usd_bank = Account(book_id=book_id, parent_id=None, code="100201", name="银行存款-美元", type="BANK", commodity_id=usd_id)
+        fx = Account(book_id=book_id, parent_id=None, code="6603", name="汇兑损益", type="EXPENSE", commodity_id=cny)
+        db.add_all([usd_bank, fx])
+        db.flush()
+        usd_bank_id, fx_id = str(usd_bank.id), str(fx.id)
+        month_end = nxt - timedelta(days=1)
+        for d, v in ((date(y, m, 1), "7.0"), (month_end, "7.2")):
+            db.add(Price(book_id=book_id, commodity_id=usd_id, currency_id=cny, price_date=d, value=Decimal(v)))
+        bump_prices_version(db, book_id)
+
+        # 本位币交易：700 CNY 换 100 USD；美元交易：收入 50 USD（按 7.0 折合 350 CNY）
+        drafts = []
+        for src, cur, lines in (
+            ("fx-1", cny, [(usd_bank_id, "700", "0"), (ids["1001"], "0", "700")]),
+            ("fx-2", usd_id, [(usd_bank_id, "50", "0"), (ids["4001"], "0", "50")]),
+        ):
+            d = TransactionDraft(book_id=book_id, period_id=period_id, currency_id=cur, txn_date=datetime(y, m, 1), source_type="MANUAL", source_id=src)
+            db.add(d)
+            db.flush()
+            for i, (aid, dr, cr) in enumerate(lines, start=1):
+                db.add(TransactionDraftLine(draft_id=d.id, line_no=i, account_id=aid, debit=Decimal(dr), credit=Decimal(cr)))
+            drafts.append(str(d.id))
+    for d in drafts:
+        _post(d)
+
+    kw = dict(book_id=book_id, period_id=period_id, gain_account_id=fx_id, actor_user_id=None)
+    with SessionLocal() as db:
+        preview = run_fx_revaluation(db, dry_run=True, **kw)
+    assert preview.draft_id is None
+    [item] = preview.items
+    assert (item.amount, item.carrying_value, item.revalued_value, item.adjustment) == (Decimal("150"), Decimal("1050"), Decimal("1080"), Decimal("30"))
+
+    with SessionLocal() as db:
+        r = run_fx_revaluation(db, **kw)
+    assert (r.gain, r.loss) == (Decimal("30"), Decimal("0"))
+    with SessionLocal() as db:
+        # 未过账时不能重复生成
+        try:
+            run_fx_revaluation(db, **kw)
+            raise AssertionError("expected ValueError")
+        except ValueError:
+            pass
+
+    txn_id = _post(r.draft_id)
+    with SessionLocal() as db:
+        sp = db.query(Split).filter(Split.txn_id == txn_id, Split.account_id == usd_bank_id).one()
+        assert (sp.amount, sp.value) == (0, Decimal("30"))
+        rev = db.query(TransactionDraft).filter(TransactionDraft.source_type == REVERSAL_SOURCE_TYPE, TransactionDraft.source_id == r.draft_id).one()
+        assert (rev.txn_date.year, rev.txn_date.month, rev.txn_date.day) == (nxt.year, nxt.month, 1)
+        lines = db.query(TransactionDraftLine).filter(TransactionDraftLine.draft_id == rev.id).order_by(TransactionDraftLine.line_no).all()
+        assert [(x.account_id, x.debit, x.credit) for x in lines] == [(usd_bank_id, 0, Decimal("30")), (fx_id, Decimal("30"), 0)]
+
+    # 已重估过的余额不再产生差额
+    with SessionLocal() as db:
+        again = run_fx_revaluation(db, **kw)
+    assert again.items == [] and again.draft_id is None
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+
+from app.application.engine.prices import get_price_book
+from app.application.engine.versions import bump_prices_version
+from app.infra.db.models import Book, Commodity, Price
+from app.infra.db.session import SessionLocal
+from app.scripts.init_db import main as seed_main
+
+
+def test_cross_rate_falls_back_to_path_through_base_currency(migrated_db):
+    seed_main()
+    with SessionLocal() as db, db.begin():
+        book = db.query(Book).first()
+        book_id, cny = str(book.id), str(book.base_currency_id)
+        ids = {}
+        for code in ("USD", "EUR", "JPY", "GBP"):
+            c = db.query(Commodity).filter(Commodity.type == "CURRENCY", Commodity.code == code).one_or_none()
+            if c is None:
+                c = Commodity(type="CURRENCY", code=code, name=code, precision=2)
+                db.add(c)
+                db.flush()
+            ids[code] = str(c.id)
+        usd, eur, jpy, gbp = ids["USD"], ids["EUR"], ids["JPY"], ids["GBP"]
+        for com, cur, d, v in (
+            (usd, cny, date(2026, 1, 1), "7"),
+            (eur, cny, date(2026, 1, 1), "8"),
+            # 另一条同样两跳的路径：EUR→GBP→USD，不应被选中
+            (eur, gbp, date(2026, 1, 1), "1"),
+            (gbp, usd, date(2026, 1, 1), "1"),
+            # JPY 只对 USD 报价，2 月才有
+            (usd, jpy, date(2026, 2, 1), "150"),
+        ):
+            db.add(Price(book_id=book_id, commodity_id=com, currency_id=cur, price_date=d, value=Decimal(v), source="test", type="last"))
+        bump_prices_version(db, book_id)
+
+    with SessionLocal() as db:
+        pb = get_price_book(db, book_id)
+    # 1 EUR = 8 CNY = 8/7 USD（经本位币）
+    assert pb.convert(Decimal("70"), eur, usd, date(2026, 1, 15)) == Decimal("80")
+    assert pb.convert(Decimal("80"), usd, eur, date(2026, 1, 15)) == Decimal("70")
+    # 直连报价仍优先
+    assert pb.cross_rate(usd, cny, date(2026, 1, 15)) == (Decimal("7"), Decimal("1"))
+    # 三跳：EUR→CNY→USD→JPY；2 月前无 USD/JPY 报价
+    assert pb.convert(Decimal("7"), eur, jpy, date(2026, 2, 1)) == Decimal("1200")
+    assert pb.convert(Decimal("7"), eur, jpy, date(2026, 1, 31)) is None
+    # 同一快照内解析结果被缓存
+    assert (date(2026, 1, 15).toordinal(), eur, usd) in pb._rates
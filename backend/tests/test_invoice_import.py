@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import io
+import json
+from uuid import uuid4
+from decimal import Decimal
+
+from app.application.ar_ap.invoice_import import import_invoices
+from app.application.gl.draft_workflow import approve_draft
+from app.application.gl.posting import post_draft
+from app.infra.db.models import AccountingPeriod, Book, Invoice, InvoiceLine, Party, TransactionDraft, TransactionDraftLine, TransactionDraftRevision
+from app.infra.db.session import SessionLocal
+from app.scripts.init_db import main as seed_main
+
+
+def test_bulk_import_reports_row_errors_and_creates_postable_drafts(migrated_db):
+    seed_main()
+    with SessionLocal() as db, db.begin():
+        book_id = str(db.query(Book).first().id)
+        p = db.query(AccountingPeriod).filter(AccountingPeriod.book_id == book_id, AccountingPeriod.status == "OPEN").first()
+        day = f"{int(p.year)}-{int(p.month):02d}-05"
+        db.add(Party(type="CUSTOMER", name="客户甲"))
+
+    csv_data = (
+        "invoice_type,doc_no,doc_date,party,account_code,description,quantity,unit_price,tax_rate\n"
+        f"AR,INV-1,{day},客户甲,4001,咨询,2,100,0.06\n"
+        f"AR,INV-1,{day},客户甲,4001,差旅,1,50,0\n"
+        f"AP,BILL-1,{day},,5001,房租,1,300,0\n"
+        f"AR,INV-2,{day},,9999,未知科目,1,10,0\n"
+        f"AR,INV-3,{day},不存在的客户,4001,x,1,10,0\n"
+        f"AR,INV-1,{day},,4001,重复发票号,1,10,0\n"
+    ).encode()
+    with SessionLocal() as db:
+        r = import_invoices(db, book_id, io.BytesIO(csv_data), filename="invoices.csv")
+    assert (r.format, r.invoices, r.lines, r.drafts, r.failed) == ("CSV", 2, 3, 2, 3)
+    assert [e.doc_no for e in r.errors] == ["INV-2", "INV-3", "INV-1"]
+    assert r.errors[0].row_no == 5 and "科目不存在" in r.errors[0].error
+
+    jsonl = "\n".join(
+        json.dumps(x, ensure_ascii=False)
+        for x in (
+            {"invoice_type": "AR", "doc_no": "J-1", "doc_date": day, "lines": [{"account_code": "4001", "unit_price": "80"}]},
+            {"invoice_type": "XX", "doc_no": "J-2", "lines": []},
+        )
+    ).encode()
+    with SessionLocal() as db:
+        dry = import_invoices(db, book_id, io.BytesIO(jsonl), dry_run=True)
+    assert (dry.format, dry.invoices, dry.failed, dry.drafts) == ("JSONL", 1, 1, 0)
+
+    with SessionLocal() as db:
+        inv = db.query(Invoice).filter(Invoice.doc_no == "INV-1").one()
+        assert (inv.total_net, inv.total_tax, inv.total_gross, inv.outstanding_amount) == (Decimal("250"), Decimal("12"), Decimal("262"), Decimal("262"))
+        assert inv.party_id and inv.lot_id
+        assert db.query(InvoiceLine).filter(InvoiceLine.invoice_id == inv.id).count() == 2
+        draft = db.query(TransactionDraft).filter(TransactionDraft.source_type == "INVOICE_AR", TransactionDraft.source_id == inv.id).one()
+        lines = db.query(TransactionDraftLine).filter(TransactionDraftLine.draft_id == draft.id).all()
+        assert sum(x.debit for x in lines) == sum(x.credit for x in lines) == Decimal("262")
+        rev = db.query(TransactionDraftRevision).filter(TransactionDraftRevision.draft_id == draft.id).one()
+        assert rev.action == "CREATE" and len(rev.payload_json["lines"]) == len(lines)
+        draft_id = str(draft.id)
+
+    with SessionLocal() as db:
+        approve_draft(db, draft_id, actor_id=None)
+    with SessionLocal() as db:
+        post_draft(db, draft_id, actor_user_id=None)
+    with SessionLocal() as db:
+        assert db.query(Invoice).filter(Invoice.doc_no == "INV-1").one().status == "POSTED"
+
+
+def test_import_rejects_non_finite_and_out_of_range_numbers(migrated_db):
+    seed_main()
+    with SessionLocal() as db, db.begin():
+        book_id = str(db.query(Book).first().id)
+        p = db.query(AccountingPeriod).filter(AccountingPeriod.book_id == book_id, AccountingPeriod.status == "OPEN").first()
+        day = f"{int(p.year)}-{int(p.month):02d}-05"
+
+    tag = uuid4().hex[:6]
+    rows = [
+        ("OK", "1", "10", "0"),
+        ("NAN", "NaN", "10", "0"),
+        ("SNAN", "1", "sNaN", "0"),
+        ("INF", "1", "10", "inf"),
+        ("BIG", "1", "1e40", "0"),
+        # 各自在范围内，但乘积超出金额列
+        ("PROD", "99999999999999", "99999999999999", "0"),
+    ]
+    header = "invoice_type,doc_no,doc_date,account_code,quantity,unit_price,tax_rate\n"
+    csv_data = (header + "".join(f"AR,{tag}-{no},{day},4001,{q},{u},{t}\n" for no, q, u, t in rows)).encode()
+    with SessionLocal() as db:
+        r = import_invoices(db, book_id, io.BytesIO(csv_data), filename="invoices.csv")
+    assert (r.invoices, r.failed) == (1, 5)
+    assert [e.doc_no.split("-")[1] for e in r.errors] == ["NAN", "SNAN", "INF", "BIG", "PROD"]
+    assert "无法解析" in r.errors[0].error and "超出范围" in r.errors[3].error
+
+
+def test_import_detects_decimal_comma(migrated_db):
+    seed_main()
+    with SessionLocal() as db, db.begin():
+        book_id = str(db.query(Book).first().id)
+        p = db.query(AccountingPeriod).filter(AccountingPeriod.book_id == book_id, AccountingPeriod.status == "OPEN").first()
+        day = f"{int(p.year)}-{int(p.month):02d}-05"
+
+    tag = uuid4().hex[:6]
+    # 逗号分隔：带引号的 "12,50" 是小数逗号，"1.234,5" 以最后的逗号为小数点，"1,234" 无法判断
+    header = "invoice_type,doc_no,doc_date,account_code,quantity,unit_price,tax_rate\n"
+    rows = f'AR,{tag}-A,{day},4001,1,"12,50",0\nAR,{tag}-B,{day},4001,"1.234,5",1,0\nAR,{tag}-C,{day},4001,1,"1,234",0\n'
+    with SessionLocal() as db:
+        r = import_invoices(db, book_id, io.BytesIO((header + rows).encode()), filename="invoices.csv")
+    assert (r.invoices, r.failed) == (2, 1)
+    assert r.errors[0].doc_no == f"{tag}-C" and "小数点不明确" in r.errors[0].error
+
+    # 分号分隔：逗号即小数点
+    rows = f"AR;{tag}-D;{day};4001;2;1234,5;0,06\n"
+    with SessionLocal() as db:
+        r = import_invoices(db, book_id, io.BytesIO((header.replace(",", ";") + rows).encode()), filename="invoices.csv")
+    assert (r.invoices, r.failed) == (1, 0)
+
+    with SessionLocal() as db:
+        gross = {x.doc_no.split("-")[1]: x.total_gross for x in db.query(Invoice).filter(Invoice.doc_no.like(f"{tag}-%"))}
+    assert gross == {"A": Decimal("12.50"), "B": Decimal("1234.50"), "D": Decimal("2617.14")}
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from app.application.ar_ap.service import create_invoice, create_payment, find_invoice_amount_drift
+from app.application.gl.draft_workflow import approve_draft
+from app.application.gl.posting import post_draft
+from app.infra.db.models import Account, AccountingPeriod, Book, Invoice, User
+from app.infra.db.session import SessionLocal
+from app.scripts.check_invoice_amounts import main as check_main
+from app.scripts.init_db import main as seed_main
+
+
+def _pay(book_id, period_id, cash_id, user_id, inv_id, amount, *, create_draft=True):
+    with SessionLocal() as db:
+        return create_payment(
+            db,
+            book_id=book_id,
+            period_id=period_id,
+            payment_type="RECEIPT",
+            pay_date=datetime.utcnow(),
+            party_id=None,
+            currency_type="CURRENCY",
+            currency_code="CNY",
+            amount=amount,
+            cash_account_id=cash_id,
+            method="BANK",
+            reference_no="",
+            notes="",
+            applications=[{"invoice_id": inv_id, "amount": amount}],
+            actor_user_id=user_id,
+            create_draft=create_draft,
+        )
+
+
+def _approve_post(draft_id, user_id):
+    with SessionLocal() as db:
+        approve_draft(db, draft_id, actor_id=user_id)
+    with SessionLocal() as db:
+        post_draft(db, draft_id, actor_user_id=user_id)
+
+
+def test_posting_payments_maintains_outstanding(migrated_db):
+    seed_main()
+    with SessionLocal() as db:
+        book_id = str(db.query(Book).first().id)
+        period_id = str(db.query(AccountingPeriod).filter(AccountingPeriod.book_id == book_id, AccountingPeriod.status == "OPEN").first().id)
+        cash_id = str(db.query(Account).filter(Account.code == "1001").one().id)
+        revenue_id = str(db.query(Account).filter(Account.code == "4001").one().id)
+        user_id = str(db.query(User).filter(User.username == "admin").one().id)
+
+    with SessionLocal() as db:
+        r = create_invoice(
+            db,
+            book_id=book_id,
+            period_id=period_id,
+            invoice_type="AR",
+            doc_no="AR-OUT-1",
+            doc_date=datetime.utcnow(),
+            due_date=None,
+            party_id=None,
+            currency_type="CURRENCY",
+            currency_code="CNY",
+            notes="",
+            lines=[{"description": "服务费", "account_id": revenue_id, "quantity": Decimal("1"), "unit_price": Decimal("100"), "tax_rate": Decimal("0"), "memo": ""}],
+            actor_user_id=user_id,
+            create_draft=True,
+        )
+        inv_id = r.invoice_id
+    _approve_post(r.draft_id, user_id)
+
+    # 未过账的收款不计入；过账后一次性累加到发票上
+    p1 = _pay(book_id, period_id, cash_id, user_id, inv_id, Decimal("60"))
+    with SessionLocal() as db:
+        inv = db.query(Invoice).filter(Invoice.id == inv_id).one()
+        assert (inv.applied_amount, inv.outstanding_amount) == (Decimal("0"), Decimal("100"))
+    _approve_post(p1.draft_id, user_id)
+    with SessionLocal() as db:
+        inv = db.query(Invoice).filter(Invoice.id == inv_id).one()
+        assert (inv.applied_amount, inv.outstanding_amount, inv.status) == (Decimal("60"), Decimal("40"), "POSTED")
+
+    with pytest.raises(ValueError, match="未结金额"):
+        _pay(book_id, period_id, cash_id, user_id, inv_id, Decimal("50"))
+
+    p2 = _pay(book_id, period_id, cash_id, user_id, inv_id, Decimal("40"))
+    _approve_post(p2.draft_id, user_id)
+    with SessionLocal() as db:
+        inv = db.query(Invoice).filter(Invoice.id == inv_id).one()
+        assert (inv.applied_amount, inv.outstanding_amount, inv.status) == (Decimal("100"), Decimal("0"), "PAID")
+        assert find_invoice_amount_drift(db, book_id=book_id) == []
+
+    # 人为篡改后校验命令能发现漂移，--fix 后恢复一致
+    with SessionLocal() as db, db.begin():
+        db.query(Invoice).filter(Invoice.id == inv_id).update({Invoice.outstanding_amount: Decimal("7")})
+    assert check_main(["--book-id", book_id]) == 1
+    assert check_main(["--book-id", book_id, "--fix"]) == 0
+    assert check_main(["--book-id", book_id]) == 0
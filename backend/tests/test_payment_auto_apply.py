@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import uuid4
+
+import pytest
+
+from app.application.ar_ap.service import create_payment
+from app.application.gl.draft_workflow import approve_draft, reject_draft
+from app.application.gl.posting import post_draft
+from app.infra.db.models import Account, AccountingPeriod, Book, Invoice, Party, PaymentApplication, TransactionDraft, TransactionDraftLine
+from app.infra.db.session import SessionLocal
+from app.scripts.init_db import main as seed_main
+
+
+def test_auto_apply_allocates_oldest_due_first_and_keeps_remainder(migrated_db):
+    seed_main()
+    with SessionLocal() as db, db.begin():
+        book = db.query(Book).first()
+        book_id, cur = str(book.id), str(book.base_currency_id)
+        period_id = str(db.query(AccountingPeriod).filter(AccountingPeriod.book_id == book_id, AccountingPeriod.status == "OPEN").first().id)
+        cash_id = str(db.query(Account).filter(Account.code == "1001").one().id)
+        party = Party(type="CUSTOMER", name="客户乙")
+        db.add(party)
+        db.flush()
+        party_id = str(party.id)
+        # 到期日乱序插入；另一家客户与草稿发票都不参与分配
+        for doc_no, due, gross, status, pid in (
+            ("B", date(2026, 3, 1), "200", "POSTED", party_id),
+            ("A", date(2026, 1, 1), "100", "POSTED", party_id),
+            ("C", date(2026, 5, 1), "300", "POSTED", party_id),
+            ("D", date(2025, 1, 1), "999", "DRAFT", party_id),
+            ("E", date(2025, 1, 1), "999", "POSTED", None),
+        ):
+            db.add(
+                Invoice(
+                    book_id=book_id,
+                    invoice_type="AR",
+                    status=status,
+                    doc_no=doc_no,
+                    doc_date=datetime(2025, 12, 1),
+                    due_date=due,
+                    party_id=pid,
+                    currency_id=cur,
+                    total_gross=Decimal(gross),
+                    outstanding_amount=Decimal(gross),
+                )
+            )
+
+    def pay(amount: str):
+        with SessionLocal() as db:
+            return create_payment(
+                db,
+                book_id=book_id,
+                period_id=period_id,
+                payment_type="RECEIPT",
+                pay_date=datetime.utcnow(),
+                party_id=party_id,
+                currency_type="CURRENCY",
+                currency_code="CNY",
+                amount=Decimal(amount),
+                cash_account_id=cash_id,
+                method="BANK",
+                reference_no="",
+                notes="",
+                applications=[],
+                actor_user_id=None,
+                create_draft=True,
+                auto_apply="DUE_DATE",
+            )
+
+    r = pay("250")
+    assert r.unapplied == Decimal("0")
+    with SessionLocal() as db:
+        apps = {db.get(Invoice, x.invoice_id).doc_no: x.amount for x in db.query(PaymentApplication).filter(PaymentApplication.payment_id == r.payment_id)}
+        assert apps == {"A": Decimal("100"), "B": Decimal("150")}
+        lines = db.query(TransactionDraftLine).filter(TransactionDraftLine.draft_id == r.draft_id).order_by(TransactionDraftLine.line_no).all()
+        assert [x.debit for x in lines] == [Decimal("250"), 0, 0]
+        assert all(x.aux_json.get("lot_id") for x in lines[1:])
+    with SessionLocal() as db:
+        approve_draft(db, r.draft_id, actor_id=None)
+    with SessionLocal() as db:
+        post_draft(db, r.draft_id, actor_user_id=None)
+
+    # 剩余 50 + 300 分配完后，多出的 100 作为未核销余额挂在应收科目上
+    r2 = pay("450")
+    assert r2.unapplied == Decimal("100")
+    with SessionLocal() as db:
+        lines = db.query(TransactionDraftLine).filter(TransactionDraftLine.draft_id == r2.draft_id).order_by(TransactionDraftLine.line_no).all()
+        assert [x.credit for x in lines[1:]] == [Decimal("50"), Decimal("300"), Decimal("100")]
+        assert lines[-1].aux_json["role"] == "UNAPPLIED" and "lot_id" not in lines[-1].aux_json
+    with SessionLocal() as db:
+        approve_draft(db, r2.draft_id, actor_id=None)
+    with SessionLocal() as db:
+        post_draft(db, r2.draft_id, actor_user_id=None)
+    with SessionLocal() as db:
+        status = {x.doc_no: (x.status, x.outstanding_amount) for x in db.query(Invoice).filter(Invoice.party_id == party_id)}
+        assert status["A"] == status["B"] == status["C"] == ("PAID", Decimal("0"))
+        assert status["D"] == ("DRAFT", Decimal("999"))
+
+
+def test_unposted_payments_reserve_their_applications(migrated_db):
+    seed_main()
+    with SessionLocal() as db, db.begin():
+        book = db.query(Book).first()
+        book_id, cur = str(book.id), str(book.base_currency_id)
+        period_id = str(db.query(AccountingPeriod).filter(AccountingPeriod.book_id == book_id, AccountingPeriod.status == "OPEN").first().id)
+        cash_id = str(db.query(Account).filter(Account.code == "1001").one().id)
+        party = Party(type="CUSTOMER", name="客户丙")
+        db.add(party)
+        db.flush()
+        party_id = str(party.id)
+        inv = Invoice(
+            book_id=book_id,
+            invoice_type="AR",
+            status="POSTED",
+            doc_no=f"R-{uuid4().hex[:8]}",
+            doc_date=datetime(2025, 12, 1),
+            due_date=date(2026, 1, 1),
+            party_id=party_id,
+            currency_id=cur,
+            total_gross=Decimal("100"),
+            outstanding_amount=Decimal("100"),
+        )
+        db.add(inv)
+        db.flush()
+        invoice_id = str(inv.id)
+
+    def pay(amount: str, *, auto: bool = True):
+        with SessionLocal() as db:
+            return create_payment(
+                db,
+                book_id=book_id,
+                period_id=period_id,
+                payment_type="RECEIPT",
+                pay_date=datetime.utcnow(),
+                party_id=party_id,
+                currency_type="CURRENCY",
+                currency_code="CNY",
+                amount=Decimal(amount),
+                cash_account_id=cash_id,
+                method="BANK",
+                reference_no="",
+                notes="",
+                applications=[] if auto else [{"invoice_id": invoice_id, "amount": amount}],
+                actor_user_id=None,
+                create_draft=True,
+                auto_apply="DUE_DATE" if auto else None,
+            )
+
+    # 第一笔收款的草稿未过账前，第二笔只能核销剩下的 40
+    r1 = pay("60")
+    assert r1.unapplied == Decimal("0")
+    r2 = pay("80")
+    assert r2.unapplied == Decimal("40")
+    with pytest.raises(ValueError, match="已被待过账收/付款占用"):
+        pay("1", auto=False)
+
+    # 驳回后释放占用
+    with SessionLocal() as db:
+        reject_draft(db, r1.draft_id, actor_id=None, reason="重复")
+    r3 = pay("60", auto=False)
+    assert r3.unapplied == Decimal("0")
+
+    with SessionLocal() as db:
+        approve_draft(db, r2.draft_id, actor_id=None)
+    with SessionLocal() as db:
+        post_draft(db, r2.draft_id, actor_user_id=None)
+    with SessionLocal() as db:
+        assert db.get(Invoice, invoice_id).outstanding_amount == Decimal("60")
+
+    # 驳回的 r1 被重新审批：它的 60 已被 r3 用掉，过账时超额核销，整笔回滚
+    with SessionLocal() as db:
+        approve_draft(db, r3.draft_id, actor_id=None)
+    with SessionLocal() as db:
+        post_draft(db, r3.draft_id, actor_user_id=None)
+    with SessionLocal() as db:
+        approve_draft(db, r1.draft_id, actor_id=None)
+    with SessionLocal() as db, pytest.raises(ValueError, match="未结金额不足"):
+        post_draft(db, r1.draft_id, actor_user_id=None)
+    with SessionLocal() as db:
+        inv = db.get(Invoice, invoice_id)
+        assert (inv.status, inv.applied_amount, inv.outstanding_amount) == ("PAID", Decimal("100"), Decimal("0"))
+        assert db.get(TransactionDraft, r1.draft_id).status == "APPROVED"
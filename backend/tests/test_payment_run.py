@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import csv
+import io
+from datetime import date, datetime
+from decimal import Decimal
+
+from app.application.ar_ap.payment_run import payment_run_csv, run_ap_payments
+from app.application.gl.draft_workflow import approve_draft, reject_draft
+from app.application.gl.posting import post_draft
+from app.infra.db.models import Account, AccountingPeriod, Book, Invoice, Party, Payment, TransactionDraftLine
+from app.infra.db.session import SessionLocal
+from app.scripts.init_db import main as seed_main
+
+
+def test_payment_run_pays_due_invoices_per_vendor(migrated_db):
+    seed_main()
+    with SessionLocal() as db, db.begin():
+        book = db.query(Book).first()
+        book_id, cur = str(book.id), str(book.base_currency_id)
+        period_id = str(db.query(AccountingPeriod).filter(AccountingPeriod.book_id == book_id, AccountingPeriod.status == "OPEN").first().id)
+        bank_id = str(db.query(Account).filter(Account.code == "1002").one().id)
+        v1 = Party(type="VENDOR", name="供应商一", contact_json={"bank_name": "工商银行", "bank_account": "6222"})
+        v2 = Party(type="VENDOR", name="供应商二")
+        db.add_all([v1, v2])
+        db.flush()
+        vendor_ids = [str(v1.id), str(v2.id)]
+        for doc_no, party, due, gross in (
+            ("P1", v1, date(2026, 1, 10), "100"),
+            ("P2", v1, date(2026, 1, 20), "50"),
+            ("P3", v2, date(2026, 1, 15), "70"),
+            ("P4", v2, date(2026, 2, 15), "999"),  # 未到期
+        ):
+            db.add(
+                Invoice(
+                    book_id=book_id,
+                    invoice_type="AP",
+                    status="POSTED",
+                    doc_no=doc_no,
+                    doc_date=datetime(2026, 1, 1),
+                    due_date=due,
+                    party_id=party.id,
+                    currency_id=cur,
+                    total_gross=Decimal(gross),
+                    outstanding_amount=Decimal(gross),
+                )
+            )
+
+    # 只跑本测试建的两家供应商，账簿里其他测试留下的发票不参与
+    kw = dict(
+        book_id=book_id,
+        period_id=period_id,
+        pay_date=datetime(2026, 1, 31),
+        due_on_or_before=date(2026, 1, 31),
+        cash_account_id=bank_id,
+        party_ids=vendor_ids,
+    )
+    with SessionLocal() as db:
+        dry = run_ap_payments(db, dry_run=True, **kw)
+    assert (dry.payments, dry.invoices, dry.total) == (2, 3, Decimal("220"))
+    with SessionLocal() as db:
+        assert db.query(Payment).filter(Payment.party_id.in_(vendor_ids)).count() == 0
+
+    with SessionLocal() as db:
+        r = run_ap_payments(db, chunk_parties=1, **kw)
+    assert [(x.party_name, x.amount, x.invoice_count) for x in r.items] == [("供应商一", Decimal("150"), 2), ("供应商二", Decimal("70"), 1)]
+
+    with SessionLocal() as db:
+        rows = list(csv.DictReader(io.StringIO(payment_run_csv(db, book_id=book_id, run_ref=r.run_ref))))
+    assert [(x["vendor"], x["bank_account"], x["amount"], x["invoices"]) for x in rows] == [("供应商一", "6222", "150.00", "P1 P2"), ("供应商二", "", "70.00", "P3")]
+
+    draft_id = r.items[0].draft_id
+    with SessionLocal() as db:
+        lines = db.query(TransactionDraftLine).filter(TransactionDraftLine.draft_id == draft_id).order_by(TransactionDraftLine.line_no).all()
+        assert [(x.debit, x.credit) for x in lines] == [(0, Decimal("150")), (Decimal("100"), 0), (Decimal("50"), 0)]
+    with SessionLocal() as db:
+        approve_draft(db, draft_id, actor_id=None)
+    with SessionLocal() as db:
+        post_draft(db, draft_id, actor_user_id=None)
+    with SessionLocal() as db:
+        assert {x.doc_no: x.status for x in db.query(Invoice).filter(Invoice.party_id.in_(vendor_ids))} == {"P1": "PAID", "P2": "PAID", "P3": "POSTED", "P4": "POSTED"}
+
+    # 再跑一次：P1/P2 已结清，P3 的付款草稿尚未过账，都不会重复付款
+    with SessionLocal() as db:
+        again = run_ap_payments(db, dry_run=True, **kw)
+    assert (again.payments, again.invoices) == (0, 0)
+
+    # P3 的付款草稿被驳回后不再占用，下一批次重新付款
+    with SessionLocal() as db:
+        reject_draft(db, r.items[1].draft_id, actor_id=None, reason="金额有误")
+    with SessionLocal() as db:
+        retry = run_ap_payments(db, dry_run=True, **kw)
+    assert [(x.party_name, x.amount) for x in retry.items] == [("供应商二", Decimal("70"))]
+
+
+def test_payment_run_skips_invoices_reserved_by_earlier_run(migrated_db):
+    seed_main()
+    with SessionLocal() as db, db.begin():
+        book = db.query(Book).first()
+        book_id, cur = str(book.id), str(book.base_currency_id)
+        period_id = str(db.query(AccountingPeriod).filter(AccountingPeriod.book_id == book_id, AccountingPeriod.status == "OPEN").first().id)
+        bank_id = str(db.query(Account).filter(Account.code == "1002").one().id)
+        vendor = Party(type="VENDOR", name="并发供应商")
+        db.add(vendor)
+        db.flush()
+        vendor_id = str(vendor.id)
+
+    def add_invoice(doc_no: str, gross: str) -> None:
+        with SessionLocal() as db, db.begin():
+            db.add(
+                Invoice(
+                    book_id=book_id,
+                    invoice_type="AP",
+                    status="POSTED",
+                    doc_no=doc_no,
+                    doc_date=datetime(2026, 1, 1),
+                    due_date=date(2026, 1, 10),
+                    party_id=vendor_id,
+                    currency_id=cur,
+                    total_gross=Decimal(gross),
+                    outstanding_amount=Decimal(gross),
+                )
+            )
+
+    kw = dict(
+        book_id=book_id,
+        period_id=period_id,
+        pay_date=datetime(2026, 1, 31),
+        due_on_or_before=date(2026, 1, 31),
+        cash_account_id=bank_id,
+        party_ids=[vendor_id],
+    )
+    add_invoice("C1", "100")
+    add_invoice("C2", "40")
+    with SessionLocal() as db:
+        first = run_ap_payments(db, **kw)
+    assert [(x.amount, x.invoice_count) for x in first.items] == [(Decimal("140"), 2)]
+
+    # 第二批次同一供应商又有新到期发票：锁定后剔除已被第一批次占用的 C1/C2，只付 C3
+    add_invoice("C3", "25")
+    with SessionLocal() as db:
+        second = run_ap_payments(db, **kw)
+    assert [(x.amount, x.invoice_count) for x in second.items] == [(Decimal("25"), 1)]
+    with SessionLocal() as db:
+        paid = db.query(Payment).filter(Payment.party_id == vendor_id).order_by(Payment.amount.desc()).all()
+        assert [(p.reference_no, p.amount) for p in paid] == [(first.run_ref, Decimal("140")), (second.run_ref, Decimal("25"))]
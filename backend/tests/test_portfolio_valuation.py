@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from datetime import date, datetime
+from decimal import Decimal
+
+from app.application.engine.versions import bump_prices_version
+from app.application.gl.draft_workflow import approve_draft
+from app.application.gl.posting import post_draft
+from app.application.reports.portfolio import value_portfolio
+from app.infra.db.models import Account, AccountingPeriod, Book, Commodity, Price, TransactionDraft, TransactionDraftLine
+from app.infra.db.session import SessionLocal
+from app.scripts.init_db import main as seed_main
+
+
+def test_fifo_and_average_cost_valuation(migrated_db):
+    seed_main()
+    with SessionLocal() as db, db.begin():
+        book = db.query(Book).first()
+        book_id, cny = str(book.id), str(book.base_currency_id)
+        period = db.query(AccountingPeriod).filter(AccountingPeriod.book_id == book_id, AccountingPeriod.status == "OPEN").first()
+        period_id, y, m = str(period.id), int(period.year), int(period.month)
+        sec = Commodity(type="SECURITY", code="600000", name="浦发银行", precision=2)
+        db.add(sec)
+        db.flush()
+        acc = Account(book_id=book_id, code="1101", name="交易性金融资产-600000", type="ASSET", commodity_id=sec.id)
+        db.add(acc)
+        db.flush()
+        sec_id, acc_id = str(sec.id), str(acc.id)
+        cash_id = str(db.query(Account).filter(Account.code == "1001").one().id)
+        for day, v in ((1, "100"), (2, "110"), (3, "120"), (4, "130")):
+            db.add(Price(book_id=book_id, commodity_id=sec_id, currency_id=cny, price_date=date(y, m, day), value=Decimal(v)))
+        bump_prices_version(db, book_id)
+
+        # 过账时按当日价格把金额折成股数：买 10 股 @100、10 股 @110，卖 15 股 @120
+        drafts = []
+        for day, amount, buy in ((1, "1000", True), (2, "1100", True), (3, "1800", False), (4, "1300", True)):
+            d = TransactionDraft(book_id=book_id, period_id=period_id, txn_date=datetime(y, m, day), source_type="MANUAL", source_id=f"trade-{day}")
+            db.add(d)
+            db.flush()
+            dr, cr = (acc_id, cash_id) if buy else (cash_id, acc_id)
+            db.add(TransactionDraftLine(draft_id=d.id, line_no=1, account_id=dr, debit=Decimal(amount), credit=0))
+            db.add(TransactionDraftLine(draft_id=d.id, line_no=2, account_id=cr, debit=0, credit=Decimal(amount)))
+            drafts.append(str(d.id))
+    def post(draft_id: str) -> None:
+        with SessionLocal() as db:
+            approve_draft(db, draft_id, actor_id=None)
+        with SessionLocal() as db:
+            post_draft(db, draft_id, actor_user_id=None)
+
+    for draft_id in drafts[:3]:
+        post(draft_id)
+
+    with SessionLocal() as db:
+        fifo = value_portfolio(db, book_id=book_id, as_of=date(y, m, 4))
+    [p] = fifo.positions
+    assert (p.quantity, p.cost_basis, p.realised) == (Decimal("5"), Decimal("550"), Decimal("250"))
+    assert (p.price, p.market_value, p.unrealised) == (Decimal("130"), Decimal("650"), Decimal("100"))
+    assert [(x.opened, x.quantity, x.cost) for x in p.lots] == [(date(y, m, 2), Decimal("5"), Decimal("550"))]
+
+    with SessionLocal() as db:
+        avg = value_portfolio(db, book_id=book_id, as_of=date(y, m, 4), method="AVERAGE")
+    [p] = avg.positions
+    assert (p.cost_basis, p.realised, p.unrealised, p.lots) == (Decimal("525"), Decimal("225"), Decimal("125"), [])
+
+    with SessionLocal() as db:
+        # 只统计卖出日之后的已实现损益；卖出前的估值日不含卖出
+        assert value_portfolio(db, book_id=book_id, as_of=date(y, m, 4), realised_from=date(y, m, 4)).realised == 0
+        before = value_portfolio(db, book_id=book_id, as_of=date(y, m, 2))
+    assert (before.cost_basis, before.market_value, before.unrealised) == (Decimal("2100"), Decimal("2200"), Decimal("100"))
+
+    # 新过账的交易使缓存的分录失效
+    post(drafts[3])
+    with SessionLocal() as db:
+        after = value_portfolio(db, book_id=book_id, as_of=date(y, m, 4))
+    assert (after.positions[0].quantity, after.cost_basis, after.unrealised) == (Decimal("15"), Decimal("1850"), Decimal("100"))
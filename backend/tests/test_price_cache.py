@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+
+from fastapi.testclient import TestClient
+
+from app.api.deps import CurrentUser, get_current_user
+from app.application.engine.prices import get_price_book
+from app.infra.db.models import Book, Commodity, User
+from app.infra.db.session import SessionLocal
+from app.main import app
+from app.scripts.init_db import main as seed_main
+
+
+def test_latest_price_is_cached_and_invalidated_by_upsert(migrated_db):
+    seed_main()
+    with SessionLocal() as db, db.begin():
+        book_id = str(db.query(Book).first().id)
+        uid = str(db.query(User).filter(User.username == "admin").one().id)
+        if not db.query(Commodity).filter(Commodity.type == "CURRENCY", Commodity.code == "USD").one_or_none():
+            db.add(Commodity(type="CURRENCY", code="USD", name="美元", precision=2))
+    with SessionLocal() as db:
+        usd_id = str(db.query(Commodity).filter(Commodity.type == "CURRENCY", Commodity.code == "USD").one().id)
+        cny_id = str(db.query(Commodity).filter(Commodity.type == "CURRENCY", Commodity.code == "CNY").one().id)
+
+    app.dependency_overrides[get_current_user] = lambda: CurrentUser(id=uid, username="admin", role="admin")
+    try:
+        c = TestClient(app)
+        for d, v in (("2026-01-10", "7.10"), ("2026-01-01", "7.00"), ("2026-01-20", "7.20")):
+            body = {"book_id": book_id, "commodity_code": "USD", "currency_code": "CNY", "price_date": d, "value": v}
+            assert c.post("/ar-ap/prices", json=body).status_code == 200
+
+        def latest(as_of: str | None):
+            params = {"book_id": book_id, "commodity_code": "USD", "currency_code": "CNY"}
+            if as_of:
+                params["as_of"] = as_of
+            return c.get("/ar-ap/prices/latest", params=params)
+
+        assert Decimal(latest("2026-01-15").json()["value"]) == Decimal("7.10")
+        assert Decimal(latest("2026-01-10").json()["value"]) == Decimal("7.10")
+        assert latest("2025-12-31").status_code == 404
+        assert Decimal(latest(None).json()["value"]) == Decimal("7.20")
+
+        with SessionLocal() as db:
+            before = get_price_book(db, book_id)
+            assert get_price_book(db, book_id) is before
+        # 改价后缓存失效
+        body = {"book_id": book_id, "commodity_code": "USD", "currency_code": "CNY", "price_date": "2026-01-10", "value": "7.15"}
+        assert c.post("/ar-ap/prices", json=body).status_code == 200
+        assert Decimal(latest("2026-01-15").json()["value"]) == Decimal("7.15")
+    finally:
+        app.dependency_overrides.clear()
+
+    with SessionLocal() as db:
+        pb = get_price_book(db, book_id)
+        assert pb is not before and pb.version > before.version
+        assert pb.latest(usd_id, cny_id, date(2026, 1, 9)) == Decimal("7.00")
+        assert pb.latest(cny_id, usd_id, date(2026, 1, 9)) is None
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import io
+from datetime import date, timedelta
+from decimal import Decimal
+
+from app.application.ar_ap.price_import import import_prices
+from app.application.engine.prices import get_price_book
+from app.infra.db.models import Book, Commodity, Price
+from app.infra.db.session import SessionLocal
+from app.scripts.init_db import main as seed_main
+
+
+def test_bulk_price_import_upserts_in_chunks(migrated_db):
+    seed_main()
+    with SessionLocal() as db, db.begin():
+        book_id = str(db.query(Book).first().id)
+        for code in ("USD", "EUR"):
+            if not db.query(Commodity).filter(Commodity.type == "CURRENCY", Commodity.code == code).one_or_none():
+                db.add(Commodity(type="CURRENCY", code=code, name=code, precision=2))
+    with SessionLocal() as db:
+        ids = {c.code: str(c.id) for c in db.query(Commodity).filter(Commodity.type == "CURRENCY")}
+        before = get_price_book(db, book_id)
+
+    start = date(2026, 1, 1)
+    rows = ["commodity,currency,date,value"]
+    for i in range(30):
+        d = (start + timedelta(days=i)).isoformat()
+        rows.append(f"USD,CNY,{d},{Decimal('7.00') + Decimal(i) / 100}")
+        rows.append(f"EUR,CNY,{d},8.00")
+    rows += ["XXX,CNY,2026-01-01,1", "USD,CNY,2026-01-01,-1", "USD,CNY,2026-01-05,7.99"]  # 两行失败；最后一行覆盖同键
+    data = ("\n".join(rows) + "\n").encode("utf-8")
+
+    with SessionLocal() as db:
+        dry = import_prices(db, book_id, io.BytesIO(data), filename="rates.csv", dry_run=True)
+    assert (dry.rows, dry.failed, dry.chunks) == (61, 2, 0)
+    with SessionLocal() as db:
+        assert db.query(Price).filter(Price.source == "IMPORT").count() == 0
+
+    with SessionLocal() as db:
+        r = import_prices(db, book_id, io.BytesIO(data), filename="rates.csv", chunk_size=25)
+    assert (r.rows, r.failed, r.chunks) == (61, 2, 3)
+    assert [e.row_no for e in r.errors] == [62, 63]
+    with SessionLocal() as db:
+        assert db.query(Price).filter(Price.source == "IMPORT").count() == 60
+        pb = get_price_book(db, book_id)
+        assert pb.version == before.version + 1
+        assert pb.latest(ids["USD"], ids["CNY"], date(2026, 1, 5)) == Decimal("7.99")
+
+    # 再导入一次（JSONL）只更新，不新增
+    jsonl = b'{"commodity": "EUR", "currency": "CNY", "date": "2026-01-10", "value": "8.10"}\n'
+    with SessionLocal() as db:
+        r2 = import_prices(db, book_id, io.BytesIO(jsonl), filename="rates.jsonl")
+    assert (r2.format, r2.rows, r2.failed) == ("JSONL", 1, 0)
+    with SessionLocal() as db:
+        assert db.query(Price).filter(Price.source == "IMPORT").count() == 60
+        assert get_price_book(db, book_id).latest(ids["EUR"], ids["CNY"], date(2026, 1, 10)) == Decimal("8.10")
+
+    # 非有限值与超出 Numeric(18, 8) 的价格记为行错误，不中断导入
+    bad = "commodity,currency,date,value\nUSD,CNY,2026-03-01,NaN\nUSD,CNY,2026-03-02,inf\nUSD,CNY,2026-03-03,1e40\nUSD,CNY,2026-03-04,7.1\n"
+    with SessionLocal() as db:
+        r = import_prices(db, book_id, io.BytesIO(bad.encode()), filename="rates.csv", dry_run=True)
+    assert (r.rows, r.failed) == (1, 3)
+    assert [e.row_no for e in r.errors] == [2, 3, 4]
+
+    # 小数逗号：分号分隔的 CSV 里 "7,1234" 是 7.1234；逗号分隔时 "7,1234" 小数点不明确，记为行错误
+    euro = "commodity;currency;date;value\nUSD;CNY;2026-04-01;7,1234\n"
+    with SessionLocal() as db:
+        r = import_prices(db, book_id, io.BytesIO(euro.encode()), filename="rates.csv")
+    assert (r.rows, r.failed) == (1, 0)
+    with SessionLocal() as db:
+        assert get_price_book(db, book_id).latest(ids["USD"], ids["CNY"], date(2026, 4, 1)) == Decimal("7.1234")
+    ambiguous = 'commodity,currency,date,value\nUSD,CNY,2026-04-02,"7,1234"\nUSD,CNY,2026-04-03,"7,12"\n'
+    with SessionLocal() as db:
+        r = import_prices(db, book_id, io.BytesIO(ambiguous.encode()), filename="rates.csv", dry_run=True)
+    assert (r.rows, r.failed) == (1, 1) and "小数点不明确" in r.errors[0].error
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from datetime import date, datetime
+
+from fastapi.testclient import TestClient
+
+from app.api.deps import CurrentUser, get_current_user
+from app.application.gl.posting import post_draft
+from app.infra.db.models import Account, AccountingPeriod, Book, TransactionDraft, TransactionDraftLine, User
+from app.infra.db.session import SessionLocal
+from app.main import app
+from app.scripts.init_db import main as seed_main
+
+
+def _client() -> TestClient:
+    with SessionLocal() as db:
+        u = db.query(User).filter(User.username == "admin").one()
+        uid = str(u.id)
+    app.dependency_overrides[get_current_user] = lambda: CurrentUser(id=uid, username="admin", role="admin")
+    return TestClient(app)
+
+
+def _post_cash(book_id: str, period_id: str, when: datetime, amount: str, desc: str) -> None:
+    with SessionLocal() as db, db.begin():
+        cash = db.query(Account).filter(Account.code == "1001").one()
+        income = db.query(Account).filter(Account.code == "4001").one()
+        d = TransactionDraft(
+            book_id=book_id,
+            period_id=period_id,
+            source_type="MANUAL",
+            source_id=f"am-{desc}",
+            version=1,
+            description=desc,
+            status="APPROVED",
+            txn_date=when,
+        )
+        db.add(d)
+        db.flush()
+        db.add(TransactionDraftLine(draft_id=d.id, line_no=1, account_id=cash.id, debit=amount, credit=0, memo=desc))
+        db.add(TransactionDraftLine(draft_id=d.id, line_no=2, account_id=income.id, debit=0, credit=amount, memo=desc))
+        draft_id = str(d.id)
+    with SessionLocal() as db:
+        post_draft(db, draft_id, actor_user_id=None)
+
+
+def test_auto_match_and_accept(migrated_db):
+    seed_main()
+    with SessionLocal() as db:
+        book_id = str(db.query(Book).first().id)
+        cash_id = str(db.query(Account).filter(Account.code == "1001").one().id)
+        p = db.query(AccountingPeriod).filter(AccountingPeriod.book_id == book_id, AccountingPeriod.status == "OPEN").first()
+        period_id, y, m = str(p.id), int(p.year), int(p.month)
+    _post_cash(book_id, period_id, datetime(y, m, 5, 10), "120", "sale")
+    _post_cash(book_id, period_id, datetime(y, m, 1, 10), "77.70", "INV-99321 receipt")
+    _post_cash(book_id, period_id, datetime(y, m, 10, 10), "30", "pos a")
+    _post_cash(book_id, period_id, datetime(y, m, 11, 10), "45", "pos b")
+
+    c = _client()
+    try:
+        sess = c.post(
+            "/reconcile/sessions",
+            json={"book_id": book_id, "account_id": cash_id, "statement_date": date(y, m, 28).isoformat(), "ending_balance": "0"},
+        ).json()
+        csv_data = (
+            "date,amount,description,reference\n"
+            f"{y}-{m:02d}-06,120,sale,X1\n"
+            f"{y}-{m:02d}-12,77.70,payment,INV-99321\n"
+            f"{y}-{m:02d}-11,75,card batch,B1\n"
+            f"{y}-{m:02d}-20,999,unknown,U\n"
+        ).encode()
+        assert c.post(f"/reconcile/sessions/{sess['id']}/statement", files={"file": ("s.csv", csv_data)}).status_code == 200
+
+        r = c.post(f"/reconcile/sessions/{sess['id']}:auto_match", json={"window_days": 3}).json()
+        assert r["by_rule"] == {"EXACT": 1, "REFERENCE": 1, "COMBINATION": 1}
+        props = {p["rule"]: p for p in c.get(f"/reconcile/sessions/{sess['id']}/proposals").json()["proposals"]}
+        assert len(props["COMBINATION"]["splits"]) == 2
+        assert props["REFERENCE"]["line"]["reference"] == "INV-99321"
+
+        assert c.post(f"/reconcile/sessions/{sess['id']}:accept_proposals", json={}).status_code == 400
+        acc = c.post(f"/reconcile/sessions/{sess['id']}:accept_proposals", json={"min_confidence": "0.8"}).json()
+        assert acc["affected"] == 2 and acc["selected_count"] == 2
+        left = c.get(f"/reconcile/sessions/{sess['id']}/proposals").json()["proposals"]
+        assert [p["rule"] for p in left] == ["COMBINATION"]
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import uuid4
+
+from fastapi.testclient import TestClient
+
+from app.api.deps import CurrentUser, get_current_user
+from app.application.gl.draft_workflow import approve_draft
+from app.application.gl.posting import post_draft
+from app.infra.db.models import Account, AccountingPeriod, Book, TransactionDraft, TransactionDraftLine, User
+from app.infra.db.session import SessionLocal
+from app.main import app
+from app.scripts.init_db import main as seed_main
+
+
+def _client() -> TestClient:
+    with SessionLocal() as db:
+        u = db.query(User).filter(User.username == "admin").one()
+        uid = str(u.id)
+    app.dependency_overrides[get_current_user] = lambda: CurrentUser(id=uid, username="admin", role="admin")
+    return TestClient(app)
+
+
+def _own_bank_account(amounts: list[tuple[str, str]]) -> tuple[str, str, date]:
+    """新建一个银行科目并逐笔过账 (借, 贷)，返回 (book_id, account_id, 对账截止日)。"""
+    with SessionLocal() as db, db.begin():
+        book = db.query(Book).first()
+        book_id, cny = str(book.id), str(book.base_currency_id)
+        period = db.query(AccountingPeriod).filter(AccountingPeriod.book_id == book_id, AccountingPeriod.status == "OPEN").first()
+        y, m = int(period.year), int(period.month)
+        income_id = str(db.query(Account).filter(Account.book_id == book_id, Account.code == "4001").one().id)
+        bank = Account(book_id=book_id, parent_id=None, code=f"T{uuid4().hex[:8]}", name="对账测试银行", type="BANK", commodity_id=cny)
+        db.add(bank)
+        db.flush()
+        drafts: list[str] = []
+        for day, (dr, cr) in enumerate(amounts, start=1):
+            d = TransactionDraft(book_id=book_id, period_id=period.id, currency_id=cny, txn_date=datetime(y, m, day), source_type="MANUAL", source_id=f"rec-{uuid4().hex}")
+            db.add(d)
+            db.flush()
+            db.add(TransactionDraftLine(draft_id=d.id, line_no=1, account_id=bank.id, debit=Decimal(dr), credit=Decimal(cr)))
+            db.add(TransactionDraftLine(draft_id=d.id, line_no=2, account_id=income_id, debit=Decimal(cr), credit=Decimal(dr)))
+            drafts.append(str(d.id))
+        account_id = str(bank.id)
+    for draft_id in drafts:
+        with SessionLocal() as db:
+            approve_draft(db, draft_id, actor_id=None)
+        with SessionLocal() as db:
+            post_draft(db, draft_id, actor_user_id=None)
+    return book_id, account_id, date(y, m, 28)
+
+
+def test_toggle_maintains_session_totals(migrated_db):
+    seed_main()
+    book_id, bank_id, statement_date = _own_bank_account([("100", "0"), ("0", "40")])
+
+    c = _client()
+    try:
+        sess = c.post(
+            "/reconcile/sessions",
+            json={"book_id": book_id, "account_id": bank_id, "statement_date": statement_date.isoformat(), "ending_balance": "60"},
+        ).json()
+        detail = c.get(f"/reconcile/sessions/{sess['id']}").json()
+        assert Decimal(detail["account_total_asof_date"]) == Decimal("60")
+        assert Decimal(detail["difference"]) == Decimal("60")
+        item = next(x for x in detail["items"] if Decimal(x["value"]) == Decimal("-40"))
+        split_id = item["split_id"]
+
+        r = c.post(f"/reconcile/sessions/{sess['id']}:toggle", json={"split_id": split_id, "selected": True}).json()
+        assert r["item"]["split_id"] == split_id and r["item"]["selected"] is True
+        assert r["selected_count"] == 1 and Decimal(r["selected_total"]) == Decimal("-40")
+        assert Decimal(r["difference"]) == Decimal("100")
+        # 重复点击不重复计入
+        r2 = c.post(f"/reconcile/sessions/{sess['id']}:toggle", json={"split_id": split_id, "selected": True}).json()
+        assert r2["selected_count"] == 1 and r2["selected_total"] == r["selected_total"]
+
+        r3 = c.post(f"/reconcile/sessions/{sess['id']}:toggle", json={"split_id": split_id, "selected": False}).json()
+        assert r3["selected_count"] == 0 and Decimal(r3["selected_total"]) == 0
+        assert Decimal(r3["difference"]) == Decimal("60")
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_bulk_select_by_predicate(migrated_db):
+    seed_main()
+    book_id, cash_id, statement_date = _own_bank_account([("100", "0"), ("0", "40")])
+
+    c = _client()
+    try:
+        sess = c.post(
+            "/reconcile/sessions",
+            json={"book_id": book_id, "account_id": cash_id, "statement_date": statement_date.isoformat(), "ending_balance": "0"},
+        ).json()
+        assert c.post(f"/reconcile/sessions/{sess['id']}:bulk_select", json={}).status_code == 400
+
+        r = c.post(f"/reconcile/sessions/{sess['id']}:bulk_select", json={"amount_min": "100"}).json()
+        assert r["affected"] == 1 and Decimal(r["selected_total"]) == Decimal("100")
+        assert r["selected_count"] == r["affected"]
+        # 幂等：再次选中同一批不重复插入
+        again = c.post(f"/reconcile/sessions/{sess['id']}:bulk_select", json={"amount_min": "100"}).json()
+        assert again["affected"] == 0 and again["selected_count"] == r["selected_count"]
+
+        off = c.post(f"/reconcile/sessions/{sess['id']}:bulk_select", json={"selected": False, "cleared_only": True}).json()
+        assert off["selected_count"] == 0 and Decimal(off["selected_total"]) == 0
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_detail_keyset_paging(migrated_db):
+    seed_main()
+    book_id, cash_id, statement_date = _own_bank_account([("100", "0"), ("0", "40")])
+
+    c = _client()
+    try:
+        sess = c.post(
+            "/reconcile/sessions",
+            json={"book_id": book_id, "account_id": cash_id, "statement_date": statement_date.isoformat(), "ending_balance": "0"},
+        ).json()
+        full = c.get(f"/reconcile/sessions/{sess['id']}").json()
+        assert full["next_cursor"] is None
+        expected = [x["split_id"] for x in full["items"]]
+
+        seen: list[str] = []
+        cursor = None
+        while True:
+            params = {"limit": 1}
+            if cursor:
+                params["after"] = cursor
+            page = c.get(f"/reconcile/sessions/{sess['id']}", params=params).json()
+            seen += [x["split_id"] for x in page["items"]]
+            # 合计来自 SQL 聚合，与分页无关
+            assert page["account_total_asof_date"] == full["account_total_asof_date"]
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        assert seen == expected
+        assert c.get(f"/reconcile/sessions/{sess['id']}", params={"after": "bad"}).status_code == 400
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_finish_stores_opening_for_next_session(migrated_db):
+    seed_main()
+    book_id, cash_id, statement_date = _own_bank_account([("100", "0"), ("0", "40")])
+
+    c = _client()
+    try:
+        first = c.post(
+            "/reconcile/sessions",
+            json={"book_id": book_id, "account_id": cash_id, "statement_date": statement_date.isoformat(), "ending_balance": "0"},
+        ).json()
+        assert Decimal(first["opening_balance"]) == 0
+        sel = c.post(f"/reconcile/sessions/{first['id']}:bulk_select", json={"cleared_only": False, "amount_min": "-1000000000"}).json()
+        total = Decimal(sel["selected_total"])
+        assert total == Decimal("60")
+        c.post(
+            "/reconcile/sessions",
+            json={"book_id": book_id, "account_id": cash_id, "statement_date": statement_date.isoformat(), "ending_balance": str(total)},
+        )
+        assert c.post(f"/reconcile/sessions/{first['id']}:finish").json()["status"] == "FINISHED"
+
+        # 下一期：期初直接取上次完成时记下的已对账余额，差额 = 期末 - 期初 - 已选
+        nxt = c.post(
+            "/reconcile/sessions",
+            json={"book_id": book_id, "account_id": cash_id, "statement_date": date(2099, 12, 31).isoformat(), "ending_balance": str(total)},
+        ).json()
+        assert Decimal(nxt["opening_balance"]) == total
+        detail = c.get(f"/reconcile/sessions/{nxt['id']}").json()
+        assert detail["selected_count"] == 0 and Decimal(detail["difference"]) == 0
+        assert c.post(f"/reconcile/sessions/{nxt['id']}:finish").json()["status"] == "FINISHED"
+    finally:
+        app.dependency_overrides.clear()
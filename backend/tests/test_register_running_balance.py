@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from datetime import datetime
+from decimal import Decimal
+from uuid import uuid4
+
+from app.application.gl.draft_workflow import approve_draft
+from app.application.gl.posting import post_draft
+from app.application.gl.register import load_register_page
+from app.infra.db.models import Account, AccountingPeriod, Book, TransactionDraft, TransactionDraftLine
+from app.infra.db.session import SessionLocal
+from app.scripts.init_db import main as seed_main
+
+
+def test_register_running_balance_and_keyset_paging(migrated_db):
+    seed_main()
+    # 用本测试自己的现金科目，不受其他测试过账的影响
+    with SessionLocal() as db, db.begin():
+        book = db.query(Book).first()
+        book_id, cny = str(book.id), str(book.base_currency_id)
+        period = db.query(AccountingPeriod).filter(AccountingPeriod.book_id == book_id, AccountingPeriod.status == "OPEN").first()
+        income_id = str(db.query(Account).filter(Account.book_id == book_id, Account.code == "4001").one().id)
+        cash = Account(book_id=book_id, parent_id=None, code=f"T{uuid4().hex[:8]}", name="寄存器测试现金", type="CASH", commodity_id=cny)
+        db.add(cash)
+        db.flush()
+        cash_id = str(cash.id)
+        drafts: list[str] = []
+        for day, (dr, cr) in enumerate((("100", "0"), ("50", "0"), ("0", "30")), start=1):
+            d = TransactionDraft(
+                book_id=book_id,
+                period_id=period.id,
+                currency_id=cny,
+                txn_date=datetime(int(period.year), int(period.month), day),
+                source_type="MANUAL",
+                source_id=f"reg-{uuid4().hex}",
+            )
+            db.add(d)
+            db.flush()
+            db.add(TransactionDraftLine(draft_id=d.id, line_no=1, account_id=cash_id, debit=Decimal(dr), credit=Decimal(cr)))
+            db.add(TransactionDraftLine(draft_id=d.id, line_no=2, account_id=income_id, debit=Decimal(cr), credit=Decimal(dr)))
+            drafts.append(str(d.id))
+    for draft_id in drafts:
+        with SessionLocal() as db:
+            approve_draft(db, draft_id, actor_id=None)
+        with SessionLocal() as db:
+            post_draft(db, draft_id, actor_user_id=None)
+
+    with SessionLocal() as db:
+        page = load_register_page(db, cash_id, limit=1)
+        assert len(page.items) == 1
+        top = page.items[0]
+        # 最新一行的余额 = 期初 + 本行金额
+        assert (top.amount, top.balance, page.opening_balance) == (Decimal("-30"), Decimal("120"), Decimal("150"))
+        assert page.before_cursor
+
+        older = load_register_page(db, cash_id, limit=5, before=page.before_cursor)
+        assert [x.balance for x in older.items] == [Decimal("150"), Decimal("100")]
+        assert older.opening_balance == 0 and older.after_cursor
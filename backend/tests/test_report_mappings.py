@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import pytest
+
+from app.application.reports.mappings import MappingSpec, get_mapping_index, load_mapping_specs, replace_basis_mappings
+from app.application.reports.preview import preview_mappings
+from app.infra.db.models import Account, AccountingPeriod, Book, ReportBasis, ReportMapping
+from app.infra.db.session import SessionLocal
+from app.scripts.init_db import main as seed_main
+
+
+def test_mapping_overlap_rejected_on_write_and_index_cached(migrated_db):
+    seed_main()
+    with SessionLocal() as db:
+        book_id = str(db.query(Book).first().id)
+        basis_id = str(db.query(ReportBasis).filter(ReportBasis.code == "LEGAL").one().id)
+        cash_id = str(db.query(Account).filter(Account.code == "1001").one().id)
+        specs = load_mapping_specs(db, basis_id)
+
+    with SessionLocal() as db:
+        idx1 = get_mapping_index(db, book_id, basis_id)
+        idx2 = get_mapping_index(db, book_id, basis_id)
+        assert idx1 is idx2
+        assert not idx1.overlap_errors
+        assert cash_id in idx1.accounts_of("BS", "BS_ASSETS")
+
+    # 现金已通过“资产”父科目计入 BS_ASSETS，再映射到 BS_LIABILITIES 即重复计入
+    with SessionLocal() as db:
+        with pytest.raises(ValueError):
+            replace_basis_mappings(
+                db, book_id=book_id, basis_code="LEGAL", specs=specs + [MappingSpec("BS", "BS_LIABILITIES", cash_id, False)]
+            )
+
+    with SessionLocal() as db:
+        r = replace_basis_mappings(db, book_id=book_id, basis_code="LEGAL", specs=specs)
+        assert r.mapping_count == len(specs)
+    with SessionLocal() as db:
+        assert get_mapping_index(db, book_id, basis_id) is not idx1
+
+
+def test_mapping_preview_reports_conflicts_without_writing(migrated_db):
+    seed_main()
+    with SessionLocal() as db:
+        book_id = str(db.query(Book).first().id)
+        period_id = str(db.query(AccountingPeriod).filter(AccountingPeriod.book_id == book_id).first().id)
+        basis_id = str(db.query(ReportBasis).filter(ReportBasis.code == "LEGAL").one().id)
+        cash_id = str(db.query(Account).filter(Account.code == "1001").one().id)
+        specs = load_mapping_specs(db, basis_id)
+        before = db.query(ReportMapping).count()
+
+    with SessionLocal() as db:
+        ok = preview_mappings(db, book_id=book_id, period_id=period_id, basis_code="LEGAL", specs=specs)
+        assert ok.conflicts == []
+        assert {"BS", "IS", "CF"} <= set(ok.statements)
+
+        bad = preview_mappings(
+            db,
+            book_id=book_id,
+            period_id=period_id,
+            basis_code="LEGAL",
+            specs=specs + [MappingSpec("BS", "BS_LIABILITIES", cash_id, False)],
+        )
+        assert bad.conflicts and bad.conflicts[0]["item_code"] == "BS_LIABILITIES"
+
+    with SessionLocal() as db:
+        assert db.query(ReportMapping).count() == before
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from app.application.reports import generator
+from app.infra.db.models import TransactionDraft
+from app.infra.db.session import SessionLocal
+from app.scripts.init_db import main as seed_main
+
+_CALLERS = 5
+
+
+class _CountingEvent(threading.Event):
+    """记录有多少 follower 在等待在途结果。"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.waiters = 0
+        self._guard = threading.Lock()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        with self._guard:
+            self.waiters += 1
+        return super().wait(timeout)
+
+
+class _CountingFlight(generator._Flight):
+    def __init__(self) -> None:
+        super().__init__()
+        self.done = _CountingEvent()
+
+
+def _run_concurrently(monkeypatch, compute) -> tuple[list, list[BaseException], int]:
+    """_CALLERS 个线程同时以相同参数生成报表；leader 等到其余调用方都在等待后才执行 compute。"""
+    calls = 0
+
+    def leader_compute(*args):
+        nonlocal calls
+        calls += 1
+        flight = generator._inflight[args[-1]]
+        deadline = time.monotonic() + 10
+        while flight.done.waiters < _CALLERS - 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return compute(*args)
+
+    monkeypatch.setattr(generator, "_Flight", _CountingFlight)
+    monkeypatch.setattr(generator, "_compute_snapshot", leader_compute)
+
+    with SessionLocal() as db:
+        seed = db.query(TransactionDraft).filter(TransactionDraft.source_id == "seed-1").one()
+        book_id, period_id = str(seed.book_id), str(seed.period_id)
+    results: list = []
+    errors: list[BaseException] = []
+    start = threading.Barrier(_CALLERS)
+
+    def call() -> None:
+        start.wait()
+        try:
+            with SessionLocal() as db:
+                results.append(generator.generate_reports(db, book_id=book_id, period_id=period_id, basis_code="LEGAL", actor_user_id=None))
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(_CALLERS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=30)
+    return results, errors, calls
+
+
+def test_concurrent_generation_computes_once(migrated_db, monkeypatch):
+    seed_main()
+    results, errors, calls = _run_concurrently(monkeypatch, generator._compute_snapshot)
+    assert errors == [] and calls == 1
+    assert len(results) == _CALLERS and len({r.snapshot_id for r in results}) == 1
+    assert generator._inflight == {}
+
+
+def test_leader_error_is_shared_and_flight_cleared(migrated_db, monkeypatch):
+    seed_main()
+
+    def boom(*args):
+        raise RuntimeError("生成失败")
+
+    results, errors, calls = _run_concurrently(monkeypatch, boom)
+    assert results == [] and calls == 1
+    # followers 拿到的是 leader 抛出的同一个异常
+    assert len(errors) == _CALLERS and all(e is errors[0] for e in errors) and str(errors[0]) == "生成失败"
+    assert generator._inflight == {}
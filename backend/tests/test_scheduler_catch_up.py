@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from datetime import date
+
+from app.application.gl.scheduled import run_due_schedules
+from app.infra.db.models import AccountingPeriod, ScheduledRun, ScheduledTransaction, TransactionDraft, TransactionDraftLine
+from app.infra.db.session import SessionLocal
+from app.scripts.init_db import main as seed_main
+
+
+def test_catch_up_generates_every_missed_occurrence(migrated_db):
+    seed_main()
+    today = date.today()
+    first = date(today.year, today.month, 1)
+    run_day = date(today.year, today.month, 5)
+    with SessionLocal() as db, db.begin():
+        s = db.query(ScheduledTransaction).filter(ScheduledTransaction.name == "示例：每月房租").one()
+        s.rule, s.interval, s.next_run_date = "DAILY", 1, first
+        sched_id, book_id = str(s.id), str(s.book_id)
+
+    # 每批最多 2 个到期日：5 个错过的日期分 3 个事务补齐
+    results = [r for r in run_due_schedules(SessionLocal, run_day, max_occurrences=2) if r.sched_id == sched_id]
+    assert [r.created for r in results] == [2, 2, 1]
+    assert results[-1].next_run_date == date(today.year, today.month, 6)
+
+    with SessionLocal() as db:
+        drafts = (
+            db.query(TransactionDraft)
+            .filter(TransactionDraft.source_type == "SCHEDULED", TransactionDraft.source_id == sched_id)
+            .order_by(TransactionDraft.version.asc())
+            .all()
+        )
+        assert [d.txn_date.date().day for d in drafts] == [1, 2, 3, 4, 5]
+        assert [d.version for d in drafts] == [1, 2, 3, 4, 5]
+        assert db.query(TransactionDraftLine).filter(TransactionDraftLine.draft_id.in_([d.id for d in drafts])).count() == 10
+        assert db.query(ScheduledRun).filter(ScheduledRun.sched_id == sched_id, ScheduledRun.status == "OK").count() == 5
+
+    # 幂等：再跑一轮不重复生成
+    assert all(r.created == 0 for r in run_due_schedules(SessionLocal, run_day) if r.sched_id == sched_id)
+
+    # 期间关闭：记 FAILED 并停在该日；重新打开后补跑并改写失败记录
+    with SessionLocal() as db, db.begin():
+        p = db.query(AccountingPeriod).filter(
+            AccountingPeriod.book_id == book_id, AccountingPeriod.year == today.year, AccountingPeriod.month == today.month
+        ).one()
+        p.status = "CLOSED"
+        period_id = str(p.id)
+    day7 = date(today.year, today.month, 7)
+    failed = [r for r in run_due_schedules(SessionLocal, day7) if r.sched_id == sched_id]
+    assert failed[0].failed_date == date(today.year, today.month, 6) and failed[0].error == "period closed"
+    with SessionLocal() as db, db.begin():
+        db.query(AccountingPeriod).filter(AccountingPeriod.id == period_id).update({AccountingPeriod.status: "OPEN"})
+    retry = [r for r in run_due_schedules(SessionLocal, day7) if r.sched_id == sched_id]
+    assert retry[0].created == 2 and retry[0].failed_date is None
+    with SessionLocal() as db:
+        assert db.query(ScheduledRun).filter(ScheduledRun.sched_id == sched_id, ScheduledRun.status == "FAILED").count() == 0
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+
+from fastapi.testclient import TestClient
+
+from app.api.deps import CurrentUser, get_current_user
+from app.infra.db.models import Account, Book, User
+from app.infra.db.session import SessionLocal
+from app.main import app
+from app.scripts.init_db import main as seed_main
+
+_OFX = b"""OFXHEADER:100
+DATA:OFXSGML
+CHARSET:1252
+
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240115120000.000[-5:EST]<TRNAMT>-45.10<FITID>F1<NAME>Cafe<MEMO>coffee
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240116<TRNAMT>100<FITID>F2<NAME>ACME
+</STMTTRN>
+</BANKTRANLIST><LEDGERBAL><BALAMT>1234.56<DTASOF>20240131</LEDGERBAL></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+_CAMT = b"""<?xml version="1.0" encoding="UTF-8"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.02"><BkToCstmrStmt><Stmt>
+<Bal><Tp><CdOrPrtry><Cd>CLBD</Cd></CdOrPrtry></Tp><Amt Ccy="EUR">500.00</Amt><CdtDbtInd>CRDT</CdtDbtInd></Bal>
+<Ntry><Amt Ccy="EUR">12.50</Amt><CdtDbtInd>DBIT</CdtDbtInd><BookgDt><Dt>2024-02-03</Dt></BookgDt><AcctSvcrRef>A1</AcctSvcrRef>
+<NtryDtls><TxDtls><RltdPties><Cdtr><Nm>Payee</Nm></Cdtr></RltdPties><RmtInf><Ustrd>inv 1</Ustrd></RmtInf></TxDtls></NtryDtls></Ntry>
+</Stmt></BkToCstmrStmt></Document>
+"""
+
+
+def _client() -> TestClient:
+    with SessionLocal() as db:
+        u = db.query(User).filter(User.username == "admin").one()
+        uid = str(u.id)
+    app.dependency_overrides[get_current_user] = lambda: CurrentUser(id=uid, username="admin", role="admin")
+    return TestClient(app)
+
+
+def test_statement_import_formats(migrated_db):
+    seed_main()
+    with SessionLocal() as db:
+        book_id = str(db.query(Book).first().id)
+        cash_id = str(db.query(Account).filter(Account.code == "1001").one().id)
+
+    c = _client()
+    try:
+        sess = c.post(
+            "/reconcile/sessions",
+            json={"book_id": book_id, "account_id": cash_id, "statement_date": date.today().isoformat(), "ending_balance": "0"},
+        ).json()
+        url = f"/reconcile/sessions/{sess['id']}/statement"
+
+        # GBK 编码、收入/支出分列、带千分位与括号负数
+        rows = "".join(f"2024-01-{1 + i % 28:02d},项目{i},\"{'1,000.50' if i % 2 else ''}\",{'' if i % 2 else '(20)'},某公司,R{i}\n" for i in range(1500))
+        data = ("交易日期,摘要,收入,支出,对方户名,流水号\n" + rows + "bad,x,,,,\n").encode("gbk")
+        r = c.post(url, files={"file": ("s.csv", data, "text/csv")}).json()
+        assert r["format"] == "CSV" and r["encoding"] == "gbk"
+        assert r["inserted"] == 1500 and r["skipped"] == 1
+        page = c.get(url, params={"limit": 2}).json()
+        assert [x["line_no"] for x in page["lines"]] == [1, 2] and page["next_after_line_no"] == 2
+        assert Decimal(page["lines"][0]["amount"]) == Decimal("-20") and Decimal(page["lines"][1]["amount"]) == Decimal("1000.50")
+        assert page["lines"][1]["counterparty"] == "某公司" and page["lines"][1]["reference"] == "R1"
+
+        # 重新导入覆盖之前的明细
+        r = c.post(url, files={"file": ("s.ofx", _OFX)}).json()
+        assert r["format"] == "OFX" and r["inserted"] == 2 and Decimal(r["closing_balance"]) == Decimal("1234.56")
+        lines = c.get(url).json()["lines"]
+        assert [(x["reference"], Decimal(x["amount"])) for x in lines] == [("F1", Decimal("-45.10")), ("F2", Decimal("100"))]
+        assert lines[0]["txn_date"] == "2024-01-15" and lines[0]["description"] == "coffee"
+
+        # 小数逗号：两种分隔符同时出现时以最后一个为小数点；单个逗号后 1~2 位为小数；"1,234" 有歧义，跳过
+        data = 'date,amount\n2024-03-01,"12,50"\n2024-03-02,"1.234,56"\n2024-03-03,"-1,000.5"\n2024-03-04,"1,234"\n'.encode()
+        r = c.post(url, files={"file": ("s.csv", data)}).json()
+        assert r["inserted"] == 3 and r["skipped"] == 1
+        amounts = [Decimal(x["amount"]) for x in c.get(url).json()["lines"]]
+        assert amounts == [Decimal("12.50"), Decimal("1234.56"), Decimal("-1000.50")]
+
+        # 分号分隔的欧式 CSV：单个逗号即小数点
+        data = "date;amount\n01.03.2024;1234,5\n02.03.2024;-7,5\n".encode()
+        r = c.post(url, files={"file": ("s.csv", data)}).json()
+        assert r["inserted"] == 2 and r["skipped"] == 0
+        assert [Decimal(x["amount"]) for x in c.get(url).json()["lines"]] == [Decimal("1234.50"), Decimal("-7.50")]
+
+        r = c.post(url, files={"file": ("s.xml", _CAMT)}).json()
+        assert r["format"] == "CAMT053" and r["inserted"] == 1 and Decimal(r["closing_balance"]) == Decimal("500")
+        line = c.get(url).json()["lines"][0]
+        assert Decimal(line["amount"]) == Decimal("-12.50") and line["counterparty"] == "Payee" and line["description"] == "inv 1"
+
+        # 无法识别的表头：整体回滚，不影响已导入的明细
+        assert c.post(url, files={"file": ("s.csv", b"a,b\n1,2\n")}).status_code == 400
+        assert len(c.get(url).json()["lines"]) == 1
+    finally:
+        app.dependency_overrides.clear()
@@ -47,8 +47,11 @@ export const api = {
     const q = periodId ? `&period_id=${encodeURIComponent(periodId)}` : ''
     return await http<any>(`/accounts/tree?book_id=${encodeURIComponent(bookId)}${q}`)
   },
-  async getRegister(accountId: string, periodId?: string) {
-    const q = periodId ? `?period_id=${encodeURIComponent(periodId)}` : ''
+  async getRegister(accountId: string, periodId?: string, before?: string) {
+    const qs = new URLSearchParams()
+    if (periodId) qs.set('period_id', periodId)
+    if (before) qs.set('before', before)
+    const q = qs.toString() ? `?${qs.toString()}` : ''
     return await http<any>(`/accounts/${accountId}/register${q}`)
   },
   async setSplitReconcile(splitId: string, state: 'n' | 'c' | 'y') {
@@ -180,8 +183,9 @@ export const api = {
   async createReconcileSession(payload: any) {
     return await http<any>('/reconcile/sessions', { method: 'POST', body: JSON.stringify(payload) })
   },
-  async getReconcileSession(sessionId: string) {
-    return await http<any>(`/reconcile/sessions/${encodeURIComponent(sessionId)}`)
+  async getReconcileSession(sessionId: string, after?: string) {
+    const a = after ? `?after=${encodeURIComponent(after)}` : ''
+    return await http<any>(`/reconcile/sessions/${encodeURIComponent(sessionId)}${a}`)
   },
   async toggleReconcile(sessionId: string, splitId: string, selected: boolean) {
     return await http<any>(`/reconcile/sessions/${encodeURIComponent(sessionId)}:toggle`, {